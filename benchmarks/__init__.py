@@ -0,0 +1,6 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ベンチマーク
+合成データの生成と性能計測（python -m benchmarks.<モジュール名> で実行）
+"""
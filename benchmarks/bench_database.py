@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DatabaseManager のベンチマーク
+合成データベースの規模ごとに各メソッドの所要時間を計測し、JSONで保存する
+
+規模は商品数で指定する（在庫履歴は商品数の EVENTS_PER_PRODUCT 倍）。
+作成したデータベースは作業ディレクトリに残し、同じ規模・シード値なら次回も再利用する。
+
+使い方:
+    python -m benchmarks.bench_database --scales 1k 100k -o results.json
+    python -m benchmarks.bench_database --scales 1k --baseline old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Any, List
+
+from benchmarks.datagen import build_database
+from models.database import DatabaseManager
+from models.product import Product
+
+# 規模の名前と商品数
+SCALES = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '1m': 1_000_000
+}
+
+EVENTS_PER_PRODUCT = 5
+
+# 規模が大きいときに繰り返し回数を減らす目安（1メソッドあたりの計測時間の上限・秒）
+TIME_BUDGET_SECONDS = 10.0
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    並べ替えた値から指定した割合の位置の値を返す（線形補間）
+    """
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(durations: List[float]) -> Dict[str, Any]:
+    """
+    計測した所要時間（秒）をミリ秒の統計値にまとめる
+    """
+    milliseconds = [duration * 1000 for duration in durations]
+    return {
+        'repeat': len(milliseconds),
+        'min_ms': min(milliseconds),
+        'median_ms': statistics.median(milliseconds),
+        'mean_ms': statistics.fmean(milliseconds),
+        'p95_ms': percentile(milliseconds, 0.95),
+        'max_ms': max(milliseconds)
+    }
+
+
+def measure(func: Callable[[int], Any], repeat: int, warmup: int = 1) -> Dict[str, Any]:
+    """
+    関数を繰り返し実行して所要時間を計測
+
+    Args:
+        func: 計測する関数（何回目の実行かを受け取る）
+        repeat: 計測回数（時間がかかる場合は TIME_BUDGET_SECONDS で打ち切る）
+        warmup: 計測前に捨てる実行回数
+    """
+    for index in range(warmup):
+        func(-1 - index)
+
+    durations = []
+    budget_started = time.perf_counter()
+    for index in range(repeat):
+        started = time.perf_counter()
+        result = func(index)
+        # ジェネレーターは最後まで読み切った時間を計る
+        if hasattr(result, '__next__'):
+            for _ in result:
+                pass
+        durations.append(time.perf_counter() - started)
+        if time.perf_counter() - budget_started > TIME_BUDGET_SECONDS:
+            break
+    return summarize(durations)
+
+
+def benchmark_methods(db: DatabaseManager, product_count: int, repeat: int) -> Dict[str, Dict[str, Any]]:
+    """
+    DatabaseManager の各メソッドを計測
+
+    Args:
+        db: 計測対象の DatabaseManager（データベースは書き換えられる）
+        product_count: データベースの商品数
+        repeat: 1メソッドあたりの計測回数
+
+    Returns:
+        Dict[str, Dict[str, Any]]: メソッド名ごとの計測結果
+    """
+    # 商品IDは計測回ごとに散らして、同じ行ばかりキャッシュに乗らないようにする
+    def product_id(index):
+        return (index * 7919) % product_count + 1
+
+    hot_product_id = _most_active_product_id(db)
+    new_product_ids = []
+
+    def add_product(index):
+        product = Product(name=f"ベンチマーク商品 {index}", brand="bench", category="その他")
+        db.add_product(product)
+
+    def add_products(index):
+        db.add_products(
+            Product(name=f"一括追加商品 {index}-{number}", brand="bench", category="その他")
+            for number in range(1000)
+        )
+
+    def update_product(index):
+        product = db.get_product_object_by_id(product_id(index))
+        product.price = float(index % 1000)
+        db.update_product(product)
+
+    def update_stock(index):
+        pid = product_id(index)
+        product = db.get_product_object_by_id(pid)
+        db.update_stock_and_add_history({
+            'product_id': pid, 'operation_type': 'purchase',
+            'quantity_change': 1, 'stock_after': product.current_stock + 1,
+            'memo': "ベンチマーク"
+        })
+
+    def delete_product(index):
+        db.delete_product(new_product_ids.pop())
+
+    cases = [
+        ("get_product_by_id", lambda index: db.get_product_by_id(product_id(index))),
+        ("get_product_object_by_id", lambda index: db.get_product_object_by_id(product_id(index))),
+        ("product_exists", lambda index: db.product_exists(product_id(index))),
+        ("get_all_products", lambda index: db.get_all_products()),
+        ("get_products_as_objects", lambda index: db.get_products_as_objects()),
+        ("iter_products", lambda index: db.iter_products()),
+        ("iter_products_search", lambda index: db.iter_products(search="洗剤")),
+        ("iter_products_category", lambda index: db.iter_products(category="食品")),
+        ("get_stock_history_product", lambda index: db.get_stock_history(hot_product_id)),
+        ("get_stock_history_recent", lambda index: db.get_stock_history()),
+        ("get_stock_statistics", lambda index: db.get_stock_statistics(hot_product_id)),
+        ("get_stock_summary", lambda index: db.get_stock_summary()),
+        ("count_stock_history", lambda index: db.count_stock_history()),
+        ("add_product", add_product),
+        ("add_products_1000", add_products),
+        ("update_product", update_product),
+        ("update_stock_and_add_history", update_stock),
+    ]
+
+    results = {}
+    for name, func in cases:
+        results[name] = measure(func, repeat)
+
+    # 削除は計測用に追加した商品を対象にする
+    new_product_ids.extend(
+        row[0] for row in _query(db, "SELECT id FROM products WHERE brand = 'bench' ORDER BY id DESC LIMIT ?",
+                                 (repeat + 1,))
+    )
+    results["delete_product"] = measure(delete_product, min(repeat, len(new_product_ids) - 1))
+    return results
+
+
+def _query(db: DatabaseManager, sql: str, params=()) -> list:
+    """
+    計測の準備用にSQLを直接実行（内部用）
+    """
+    conn = sqlite3.connect(db.db_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def _most_active_product_id(db: DatabaseManager) -> int:
+    """
+    履歴が最も多い商品のIDを返す（履歴取得の最悪ケースを計るため・内部用）
+    """
+    rows = _query(db, """
+        SELECT product_id FROM stock_history
+        GROUP BY product_id ORDER BY COUNT(*) DESC LIMIT 1
+    """)
+    return rows[0][0] if rows else 1
+
+
+def run_scale(label: str, workdir: Path, seed: int, repeat: int) -> Dict[str, Any]:
+    """
+    1つの規模について、データベースを用意して計測する
+    """
+    product_count = SCALES[label]
+    event_count = product_count * EVENTS_PER_PRODUCT
+    pristine_path = workdir / f"bench-{label}-seed{seed}.db"
+    info_path = pristine_path.with_suffix(".json")
+
+    if pristine_path.exists() and info_path.exists():
+        with open(info_path, 'r', encoding='utf-8') as f:
+            build_info = json.load(f)
+        build_info['reused'] = True
+    else:
+        print(f"[{label}] データベース作成中（商品{product_count:,}件 / 履歴{event_count:,}件）...",
+              file=sys.stderr)
+        build_info = build_database(str(pristine_path), product_count, event_count, seed)
+        with open(info_path, 'w', encoding='utf-8') as f:
+            json.dump(build_info, f, ensure_ascii=False, indent=2)
+        build_info['reused'] = False
+
+    # 計測でデータベースが書き換わるため、毎回作成直後の状態の複製を使う
+    work_path = workdir / f"bench-{label}-work.db"
+    shutil.copyfile(pristine_path, work_path)
+
+    print(f"[{label}] 計測中...", file=sys.stderr)
+    db = DatabaseManager(str(work_path))
+    results = benchmark_methods(db, product_count, repeat)
+
+    work_path.unlink()
+    return {'products': product_count, 'events': event_count, 'build': build_info, 'results': results}
+
+
+def environment_info() -> Dict[str, Any]:
+    """
+    計測環境の情報を集める
+    """
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def print_comparison(current: Dict[str, Any], baseline: Dict[str, Any]):
+    """
+    以前の結果と中央値を比較して表示
+    """
+    for label, scale in current['scales'].items():
+        base_scale = baseline.get('scales', {}).get(label)
+        if not base_scale:
+            continue
+        print(f"\n=== {label}（前回比・中央値） ===")
+        for name, result in scale['results'].items():
+            base = base_scale['results'].get(name)
+            if not base:
+                continue
+            ratio = result['median_ms'] / base['median_ms'] if base['median_ms'] else float('inf')
+            print(f"{name:32s} {base['median_ms']:10.3f}ms → {result['median_ms']:10.3f}ms  ×{ratio:.2f}")
+
+
+def main(argv=None) -> int:
+    """
+    ベンチマークのメイン関数
+    """
+    parser = argparse.ArgumentParser(description="DatabaseManager のベンチマーク")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=['1k'], help="計測する規模")
+    parser.add_argument("--repeat", type=int, default=20, help="1メソッドあたりの計測回数")
+    parser.add_argument("--seed", type=int, default=42, help="合成データのシード値")
+    parser.add_argument("--workdir", help="合成データベースの保存先（省略時は一時ディレクトリ）")
+    parser.add_argument("--output", "-o", default="bench_database.json", help="結果のJSONファイル")
+    parser.add_argument("--baseline", help="比較する以前の結果のJSONファイル")
+    args = parser.parse_args(argv)
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.gettempdir()) / "inventory-bench"
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    report = {'benchmark': 'database', 'environment': environment_info(),
+              'seed': args.seed, 'scales': {}}
+    for label in args.scales:
+        report['scales'][label] = run_scale(label, workdir, args.seed, args.repeat)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for label, scale in report['scales'].items():
+        print(f"=== {label}（商品{scale['products']:,}件 / 履歴{scale['events']:,}件） ===")
+        for name, result in scale['results'].items():
+            print(f"{name:32s} median {result['median_ms']:10.3f}ms  p95 {result['p95_ms']:10.3f}ms"
+                  f"  (n={result['repeat']})")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            print_comparison(report, json.load(f))
+
+    print(f"\n結果を保存しました: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+画面操作の応答時間ベンチマーク
+合成データを読み込んだ MainWindow で検索入力やフィルタ変更を再現し、
+操作ごとの応答時間（p50 / p95 / p99）を計測してJSONで保存する
+
+画面を表示せずに実行できるよう、既定で QT_QPA_PLATFORM=offscreen を使う。
+1回の操作の応答時間は、操作してからイベントキューが空になる（再描画まで終わる）までの時間。
+
+使い方:
+    python -m benchmarks.bench_gui --products 200 1000 -o gui.json
+    python -m benchmarks.bench_gui --products 1000 --enforce-budget
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Any, List
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import Qt, QSettings
+from PySide6.QtTest import QTest
+from PySide6.QtWidgets import QApplication, QMessageBox
+
+from benchmarks.bench_database import EVENTS_PER_PRODUCT, environment_info, percentile
+from benchmarks.datagen import build_database
+from models.database import DatabaseManager
+
+# 操作ごとの応答時間の目標（p95・ミリ秒）
+PERFORMANCE_BUDGET_MS = {
+    'initial_load': 1000.0,
+    'reload_products': 500.0,
+    'search_keystroke': 100.0,
+    'search_backspace': 100.0,
+    'clear_search': 100.0,
+    'category_change': 100.0,
+    'stock_status_change': 100.0,
+    'expiry_change': 100.0,
+}
+
+# 検索欄に1文字ずつ入力する文字列（合成データの商品名は「名前 連番7桁」）
+SEARCH_QUERIES = ["0001", "00123", "99"]
+
+
+def summarize_latencies(durations: List[float]) -> Dict[str, Any]:
+    """
+    応答時間（秒）をミリ秒のパーセンタイルにまとめる
+    """
+    milliseconds = [duration * 1000 for duration in durations]
+    return {
+        'count': len(milliseconds),
+        'p50_ms': percentile(milliseconds, 0.50),
+        'p95_ms': percentile(milliseconds, 0.95),
+        'p99_ms': percentile(milliseconds, 0.99),
+        'max_ms': max(milliseconds)
+    }
+
+
+class _TimeLimitReached(Exception):
+    """
+    計測時間の上限に達したことを表す（内部用）
+    """
+
+
+class InteractionRecorder:
+    """
+    画面操作を実行して応答時間を記録するクラス
+    """
+
+    def __init__(self, app: QApplication, max_seconds: float):
+        self.app = app
+        self.deadline = time.perf_counter() + max_seconds
+        self.latencies: Dict[str, List[float]] = {}
+
+    def run(self, name: str, action: Callable[[], Any]):
+        """
+        操作を1回実行し、イベントを処理し終えるまでの時間を記録
+        """
+        if time.perf_counter() > self.deadline:
+            raise _TimeLimitReached()
+        started = time.perf_counter()
+        action()
+        self.app.processEvents()
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        操作ごとの集計結果を返す
+        """
+        return {name: summarize_latencies(values) for name, values in self.latencies.items()}
+
+
+def cycle_combo(recorder: InteractionRecorder, name: str, combo, rounds: int):
+    """
+    コンボボックスの選択肢を順に切り替えて最後に「すべて」へ戻す
+    """
+    for _ in range(rounds):
+        for index in list(range(1, combo.count())) + [0]:
+            recorder.run(name, lambda index=index: combo.setCurrentIndex(index))
+
+
+def benchmark_window(app: QApplication, db_path: str, rounds: int,
+                     max_seconds: float) -> Dict[str, Any]:
+    """
+    MainWindow を作成して一連の操作を計測
+
+    Args:
+        app: QApplication
+        db_path: 合成データベースのパス
+        rounds: 一連の操作を繰り返す回数
+        max_seconds: 計測時間の上限（超えた時点で残りの操作を打ち切る）
+
+    Returns:
+        Dict[str, Any]: 操作ごとの応答時間 (results) と打ち切ったか (truncated)
+    """
+    from views.main_window import MainWindow
+
+    recorder = InteractionRecorder(app, max_seconds)
+    truncated = False
+    holder = {}
+
+    def create_window():
+        holder['window'] = MainWindow(db_manager=DatabaseManager(db_path))
+        holder['window'].show()
+
+    recorder.run('initial_load', create_window)
+    window = holder['window']
+
+    try:
+        for _ in range(rounds):
+            recorder.run('reload_products', window.load_products)
+
+            # 検索欄への入力（1文字ごとに絞り込みが走る）
+            for query in SEARCH_QUERIES:
+                for char in query:
+                    recorder.run('search_keystroke',
+                                 lambda char=char: QTest.keyClick(window.search_input, char))
+                for _ in query:
+                    recorder.run('search_backspace',
+                                 lambda: QTest.keyClick(window.search_input, Qt.Key_Backspace))
+            QTest.keyClicks(window.search_input, "00")
+            app.processEvents()
+            recorder.run('clear_search', window.clear_search)
+
+            cycle_combo(recorder, 'category_change', window.category_combo, 1)
+            cycle_combo(recorder, 'stock_status_change', window.stock_status_combo, 1)
+            cycle_combo(recorder, 'expiry_change', window.expiry_combo, 1)
+    except _TimeLimitReached:
+        truncated = True
+    finally:
+        window.close()
+        window.deleteLater()
+        app.processEvents()
+
+    return {'results': recorder.summary(), 'truncated': truncated}
+
+
+def check_budget(results: Dict[str, Dict[str, Any]]) -> Dict[str, bool]:
+    """
+    p95 が目標以内かどうかを操作ごとに判定
+    """
+    return {
+        name: result['p95_ms'] <= PERFORMANCE_BUDGET_MS[name]
+        for name, result in results.items() if name in PERFORMANCE_BUDGET_MS
+    }
+
+
+def isolate_settings(directory: Path):
+    """
+    利用者の設定を読み書きしないよう、QSettings の保存先を作業ディレクトリに切り替える
+    """
+    QSettings.setDefaultFormat(QSettings.IniFormat)
+    QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, str(directory))
+    QSettings.setPath(QSettings.NativeFormat, QSettings.UserScope, str(directory))
+
+
+def main(argv=None) -> int:
+    """
+    ベンチマークのメイン関数
+    """
+    parser = argparse.ArgumentParser(description="画面操作の応答時間ベンチマーク")
+    parser.add_argument("--products", type=int, nargs="+", default=[200, 1000], help="商品数（複数指定可）")
+    parser.add_argument("--rounds", type=int, default=5, help="一連の操作を繰り返す回数")
+    parser.add_argument("--max-seconds", type=float, default=300.0,
+                        help="商品数ごとの計測時間の上限（秒）")
+    parser.add_argument("--seed", type=int, default=42, help="合成データのシード値")
+    parser.add_argument("--workdir", help="合成データベースの保存先（省略時は一時ディレクトリ）")
+    parser.add_argument("--output", "-o", default="bench_gui.json", help="結果のJSONファイル")
+    parser.add_argument("--enforce-budget", action="store_true",
+                        help="目標を超えた操作があれば終了コード1で終了")
+    args = parser.parse_args(argv)
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.gettempdir()) / "inventory-bench"
+    workdir.mkdir(parents=True, exist_ok=True)
+    isolate_settings(workdir / "settings")
+
+    app = QApplication.instance() or QApplication([])
+    # 計測中の停止は応答時間として集計するので、停止検知のログは出さない
+    logging.getLogger("utils.stall_watchdog").setLevel(logging.CRITICAL)
+    # 起動時の期限切れ警告などのモーダルダイアログで計測が止まらないようにする
+    QMessageBox.warning = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+
+    report = {'benchmark': 'gui', 'environment': environment_info(),
+              'qt_platform': os.environ.get("QT_QPA_PLATFORM"),
+              'seed': args.seed, 'budget_ms': PERFORMANCE_BUDGET_MS, 'catalogs': {}}
+    all_within_budget = True
+
+    for product_count in args.products:
+        db_path = workdir / f"bench-gui-{product_count}-seed{args.seed}.db"
+        print(f"[{product_count}件] データベース作成中...", file=sys.stderr)
+        build_database(str(db_path), product_count, product_count * EVENTS_PER_PRODUCT, args.seed)
+
+        print(f"[{product_count}件] 計測中...", file=sys.stderr)
+        measured = benchmark_window(app, str(db_path), args.rounds, args.max_seconds)
+
+        results = measured['results']
+        within_budget = check_budget(results)
+        all_within_budget = all_within_budget and all(within_budget.values())
+        report['catalogs'][str(product_count)] = {
+            'products': product_count, 'results': results,
+            'truncated': measured['truncated'], 'within_budget': within_budget
+        }
+
+        print(f"=== 商品{product_count:,}件 ===")
+        if measured['truncated']:
+            print(f"（{args.max_seconds:.0f}秒を超えたため途中で打ち切りました）")
+        for name, result in results.items():
+            mark = "✅" if within_budget.get(name, True) else "❌"
+            print(f"{mark} {name:22s} p50 {result['p50_ms']:9.2f}ms  p95 {result['p95_ms']:9.2f}ms"
+                  f"  p99 {result['p99_ms']:9.2f}ms  (n={result['count']})")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n結果を保存しました: {args.output}")
+
+    if args.enforce_budget and not all_within_budget:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成データ生成モジュール
+ベンチマーク用に、家庭の在庫らしい商品と在庫履歴を再現可能な乱数で生成する
+
+同じシード値と基準日を指定すれば、何度実行しても同じデータになる。
+
+使い方:
+    python -m benchmarks.datagen bench.db --products 1000 --events 5000 --seed 42
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional
+
+from models.database import DatabaseManager, create_database
+from models.product import Product
+
+# カテゴリごとの生成ルール
+# (出現比率, 商品名の候補, 保存場所と比率, 購入場所と比率, 消費期限がある割合, 期限までの最大日数)
+CATEGORY_PROFILES = {
+    "食品": (
+        25, ["パスタ", "米", "食パン", "カップ麺", "ツナ缶", "シリアル", "納豆", "豆腐", "卵", "ヨーグルト"],
+        {"キッチン": 5, "冷蔵庫": 5},
+        {"スーパー": 7, "コンビニ": 2, "ネット通販": 1},
+        0.95, 90
+    ),
+    "調味料": (
+        12, ["醤油", "味噌", "砂糖", "塩", "みりん", "マヨネーズ", "ケチャップ", "ドレッシング"],
+        {"キッチン": 6, "冷蔵庫": 4},
+        {"スーパー": 8, "ネット通販": 1, "ドン・キホーテ": 1},
+        0.9, 540
+    ),
+    "飲料": (
+        12, ["ミネラルウォーター", "緑茶", "コーヒー", "牛乳", "ジュース", "炭酸水"],
+        {"キッチン": 4, "冷蔵庫": 6},
+        {"スーパー": 5, "コンビニ": 2, "ネット通販": 3},
+        0.9, 365
+    ),
+    "冷凍食品": (
+        8, ["冷凍うどん", "餃子", "冷凍ピザ", "アイス", "冷凍野菜", "唐揚げ"],
+        {"冷凍庫": 1},
+        {"スーパー": 8, "コンビニ": 2},
+        0.9, 365
+    ),
+    "日用品": (
+        20, ["トイレットペーパー", "ティッシュ", "歯ブラシ", "ゴミ袋", "ラップ", "電池", "マスク"],
+        {"クローゼット": 5, "トイレ": 2, "洗面所": 2, "その他": 1},
+        {"ドラッグストア": 5, "ホームセンター": 2, "100円ショップ": 2, "ネット通販": 1},
+        0.0, 0
+    ),
+    "洗剤": (
+        15, ["食器用洗剤", "洗濯洗剤", "柔軟剤", "シャンプー", "ボディソープ", "トイレ用洗剤"],
+        {"洗面所": 4, "お風呂": 3, "キッチン": 2, "トイレ": 1},
+        {"ドラッグストア": 6, "スーパー": 2, "ネット通販": 2},
+        0.0, 0
+    ),
+    "その他": (
+        8, ["電球", "ガムテープ", "綿棒", "絆創膏", "カイロ"],
+        {"その他": 6, "クローゼット": 4},
+        {"ホームセンター": 4, "100円ショップ": 4, "ネット通販": 2},
+        0.3, 730
+    ),
+}
+
+BRANDS = ["花王", "ライオン", "P&G", "味の素", "キッコーマン", "日清", "明治", "サントリー",
+          "無印良品", "トップバリュ", "セブンプレミアム", "ニチレイ", "エリエール", "ユニ・チャーム"]
+SIZES = ["", "小", "中", "大", "100g", "500g", "1kg", "500ml", "1L", "2L", "12個入り", "詰め替え"]
+
+# 在庫操作の比率（使用が最も多い）
+OPERATION_WEIGHTS = {'use': 60, 'purchase': 35, 'adjust': 5}
+
+
+def _weighted_choice(rng: random.Random, weights: Dict[str, int]) -> str:
+    """
+    比率付きの候補から1つ選ぶ（内部用）
+    """
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def generate_products(count: int, seed: int = 42,
+                      reference_date: Optional[date] = None) -> Iterator[Dict[str, Any]]:
+    """
+    商品データを生成
+
+    Args:
+        count: 生成する商品数
+        seed: 乱数のシード値
+        reference_date: 消費期限の基準日（省略時は今日）
+
+    Yields:
+        Dict[str, Any]: 商品データ（Product に渡せる形式）
+    """
+    rng = random.Random(seed)
+    reference_date = reference_date or date.today()
+    categories = list(CATEGORY_PROFILES)
+    category_weights = [CATEGORY_PROFILES[category][0] for category in categories]
+
+    for index in range(count):
+        category = rng.choices(categories, weights=category_weights)[0]
+        _, names, storages, shops, expiry_ratio, expiry_days = CATEGORY_PROFILES[category]
+
+        expiry_date = None
+        if rng.random() < expiry_ratio:
+            # 1割弱は期限切れ、残りは期限までの日数を均等にばらつかせる
+            days = rng.randint(-30, -1) if rng.random() < 0.08 else rng.randint(0, expiry_days)
+            expiry_date = (reference_date + timedelta(days=days)).strftime("%Y-%m-%d")
+
+        min_stock = rng.choice([1, 1, 1, 2, 2, 3])
+        # 在庫切れ・在庫少・十分な在庫がおおよそ 1:2:7 になるようにする
+        roll = rng.random()
+        if roll < 0.1:
+            current_stock = 0
+        elif roll < 0.3:
+            current_stock = rng.randint(1, min_stock)
+        else:
+            current_stock = rng.randint(min_stock + 1, min_stock + 12)
+
+        yield {
+            # 商品名とブランドの組み合わせは一意にする（UNIQUE制約）
+            'name': f"{rng.choice(names)} {index + 1:07d}",
+            'brand': rng.choice(BRANDS),
+            'size': rng.choice(SIZES),
+            'category': category,
+            'current_stock': current_stock,
+            'min_stock': min_stock,
+            'purchase_location': _weighted_choice(rng, shops),
+            # 価格は低価格帯に偏る対数正規分布（10円単位）
+            'price': float(max(50, round(rng.lognormvariate(5.8, 0.7), -1))),
+            'storage_location': _weighted_choice(rng, storages),
+            'expiry_date': expiry_date
+        }
+
+
+def generate_history(product_count: int, count: int, seed: int = 42,
+                     reference_date: Optional[date] = None,
+                     days: int = 730) -> Iterator[Dict[str, Any]]:
+    """
+    在庫履歴（購入・使用・調整）を日時順に生成
+
+    よく使う商品ほど履歴が多くなるよう、商品IDの出現頻度に偏りを付ける。
+
+    Args:
+        product_count: 商品数（商品IDは1から連番とみなす）
+        count: 生成する履歴の件数
+        seed: 乱数のシード値
+        reference_date: 履歴の最終日（省略時は今日）
+        days: 履歴の期間（日数）
+
+    Yields:
+        Dict[str, Any]: 履歴データ（DatabaseManager.bulk_add_history に渡せる形式）
+    """
+    rng = random.Random(seed + 1)
+    reference_date = reference_date or date.today()
+    start = datetime.combine(reference_date - timedelta(days=days), datetime.min.time())
+    span_seconds = days * 24 * 3600
+    step = span_seconds / max(count, 1)
+
+    # 商品ごとの出現しやすさ（順位の0.8乗に反比例）をIDごとにばらばらに割り当てる
+    ranks = list(range(1, product_count + 1))
+    rng.shuffle(ranks)
+    cum_weights = list(accumulate(1.0 / rank ** 0.8 for rank in ranks))
+    product_ids = range(1, product_count + 1)
+    operations = list(OPERATION_WEIGHTS)
+    operation_weights = list(OPERATION_WEIGHTS.values())
+
+    for index in range(count):
+        operation = rng.choices(operations, weights=operation_weights)[0]
+        if operation == 'purchase':
+            quantity = rng.randint(1, 6)
+        elif operation == 'use':
+            quantity = rng.choice([1, 1, 1, 2])
+        else:
+            quantity = rng.randint(0, 10)
+        # 時刻は期間内で単調に増やし、間隔に揺らぎを持たせる
+        created_at = start + timedelta(seconds=int(step * (index + rng.random())))
+        yield {
+            'product_id': rng.choices(product_ids, cum_weights=cum_weights)[0],
+            'operation_type': operation,
+            'quantity': quantity,
+            'memo': None,
+            'created_at': created_at.strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+
+def build_database(db_path: str, product_count: int, event_count: int, seed: int = 42,
+                   reference_date: Optional[date] = None) -> Dict[str, Any]:
+    """
+    合成データ入りのデータベースを作成
+
+    Args:
+        db_path: 作成するデータベースファイルのパス（既存の場合は削除して作り直す）
+        product_count: 商品数
+        event_count: 在庫履歴の件数
+        seed: 乱数のシード値
+        reference_date: 消費期限・履歴の基準日（省略時は今日）
+
+    Returns:
+        Dict[str, Any]: 作成したデータの件数と所要時間（秒）
+    """
+    path = Path(db_path)
+    if path.exists():
+        path.unlink()
+    reference_date = reference_date or date.today()
+
+    create_database(str(path))
+    manager = DatabaseManager(str(path))
+
+    started = time.perf_counter()
+    products = manager.add_products(
+        Product(data) for data in generate_products(product_count, seed, reference_date)
+    )
+    products_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = manager.bulk_add_history(
+        generate_history(product_count, event_count, seed, reference_date)
+    )
+    history_seconds = time.perf_counter() - started
+
+    return {
+        'products': products,
+        'events': result.get('inserted', 0),
+        'seed': seed,
+        'reference_date': reference_date.strftime("%Y-%m-%d"),
+        'products_seconds': products_seconds,
+        'history_seconds': history_seconds,
+        'db_size_bytes': path.stat().st_size
+    }
+
+
+def main(argv=None) -> int:
+    """
+    コマンドラインから合成データベースを作成
+    """
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成データベースを作成")
+    parser.add_argument("db", help="作成するデータベースファイル")
+    parser.add_argument("--products", type=int, default=1000, help="商品数")
+    parser.add_argument("--events", type=int, default=5000, help="在庫履歴の件数")
+    parser.add_argument("--seed", type=int, default=42, help="乱数のシード値")
+    parser.add_argument("--reference-date", help="基準日 (YYYY-MM-DD、省略時は今日)")
+    args = parser.parse_args(argv)
+
+    reference_date = (datetime.strptime(args.reference_date, "%Y-%m-%d").date()
+                      if args.reference_date else None)
+    info = build_database(args.db, args.products, args.events, args.seed, reference_date)
+    print(f"✅ 作成完了: 商品{info['products']}件 / 履歴{info['events']}件 "
+          f"({info['products_seconds'] + info['history_seconds']:.1f}秒, "
+          f"{info['db_size_bytes'] / 1024 / 1024:.1f}MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
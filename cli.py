@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+在庫管理アプリケーション
+コマンドラインエントリーポイント（Qtを読み込まないヘッドレス版）
+
+使い方:
+    python cli.py list
+    python cli.py search 洗剤
+    python cli.py stock 3 use 1 --memo "朝の使用"
+    python cli.py import products.csv
+    python cli.py ingest-history receipts.csv
+    python cli.py export --output products.csv
+    python cli.py export --kind history --format jsonl --gzip -o history.jsonl.gz
+    python cli.py snapshot history_snapshot/
+    python cli.py report
+    python cli.py shopping-list --days 14
+    python cli.py shopping-list --format csv -o shopping.csv
+    python cli.py verify-stock --repair   # 履歴の連鎖と現在庫の食い違いを調整の履歴で修復
+    python cli.py compact-history --before 2024-01-01 --period month   # 古い履歴を月ごとにまとめる
+    python cli.py maintenance --budget 10
+    python cli.py backup --dir backups/ --keep 7
+    python cli.py slow-queries --plan   # しきい値を超えたSQL文と実行計画
+    python cli.py -v list          # 詳細なログも表示（-q で警告以上のみ）
+    python cli.py --trace trace.json report   # 処理の区間を Chrome trace 形式で保存
+"""
+
+import argparse
+import csv
+import os
+import sys
+from datetime import date
+
+from models.database import DatabaseManager, create_database
+from models.product import Product
+from utils.config import HISTORY_COMPACTION_AGE_DAYS, HISTORY_COMPACTION_PERIOD, SHOPPING_LIST_DAYS
+from utils.logging_setup import setup_logging
+from utils.tracing import TRACER
+
+STATUS_TEXT = {
+    'out_of_stock': '在庫切れ',
+    'low_stock': '在庫少',
+    'normal': '正常'
+}
+
+OPERATION_TYPES = ['purchase', 'use', 'adjust']
+
+# -q / -v の指定とログの出力レベル
+VERBOSITY_LEVELS = {-1: "WARNING", 0: "INFO", 1: "DEBUG"}
+
+
+def open_database(db_path: str) -> DatabaseManager:
+    """
+    データベースマネージャーを作成
+    """
+    create_database(db_path)
+    return DatabaseManager(db_path)
+
+
+def past_date(text: str) -> str:
+    """
+    argparse 用: 今日以前の日付 (YYYY-MM-DD) を履歴の日時と比べられる形にする
+    """
+    try:
+        value = date.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日付は YYYY-MM-DD で指定してください: {text}")
+    if value > date.today():
+        raise argparse.ArgumentTypeError(f"未来の日付は指定できません: {text}")
+    return f"{value.isoformat()} 00:00:00"
+
+
+def format_product_line(product: Product, today: date = None) -> str:
+    """
+    商品1件をタブ区切りの1行に整形
+
+    Args:
+        product: 商品
+        today: 期限切れの基準日（省略時は今日）
+    """
+    status_text = STATUS_TEXT.get(product.get_stock_status(), '不明')
+    if product.is_expired(today):
+        status_text += "・期限切れ"
+    return "\t".join([
+        str(product.product_id),
+        product.name,
+        product.brand or "",
+        product.category,
+        f"{product.current_stock}/{product.min_stock}",
+        status_text,
+        product.expiry_date or ""
+    ])
+
+
+def cmd_list(args) -> int:
+    """
+    商品一覧を表示
+    """
+    db = open_database(args.db)
+    today = date.today()
+    for product in db.iter_products(category=args.category):
+        print(format_product_line(product, today))
+    return 0
+
+
+def cmd_search(args) -> int:
+    """
+    商品名・ブランド名で検索
+    """
+    db = open_database(args.db)
+    today = date.today()
+    for product in db.iter_products(search=args.text, category=args.category):
+        print(format_product_line(product, today))
+    return 0
+
+
+def cmd_stock(args) -> int:
+    """
+    在庫を増減して履歴を記録
+    """
+    from models.stock_history import calculate_stock_change
+
+    db = open_database(args.db)
+    product = db.get_product_object_by_id(args.product_id)
+    if not product:
+        print(f"商品が見つかりません: ID={args.product_id}", file=sys.stderr)
+        return 1
+
+    quantity_change, stock_after = calculate_stock_change(
+        product.current_stock, args.operation, args.quantity
+    )
+    success = db.update_stock_and_add_history({
+        'product_id': product.product_id,
+        'operation_type': args.operation,
+        'quantity_change': quantity_change,
+        'stock_after': stock_after,
+        'memo': args.memo
+    })
+    return 0 if success else 1
+
+
+def product_from_csv_row(row: dict) -> Product:
+    """
+    CSVの1行から商品オブジェクトを作成
+    """
+    def text(key):
+        value = (row.get(key) or "").strip()
+        return value or None
+
+    return Product(
+        name=text("name") or "",
+        brand=text("brand"),
+        size=text("size"),
+        category=text("category") or "",
+        current_stock=int(text("current_stock") or 0),
+        min_stock=int(text("min_stock") or 1),
+        purchase_location=text("purchase_location"),
+        price=float(text("price") or 0.0),
+        storage_location=text("storage_location"),
+        expiry_date=text("expiry_date")
+    )
+
+
+def cmd_import(args) -> int:
+    """
+    CSVファイルから商品を一括登録
+    """
+    db = open_database(args.db)
+    skipped = 0
+
+    def valid_products(reader):
+        nonlocal skipped
+        for line_number, row in enumerate(reader, start=2):
+            try:
+                product = product_from_csv_row(row)
+            except ValueError as e:
+                print(f"{line_number}行目: 数値の形式が不正です ({e})", file=sys.stderr)
+                skipped += 1
+                continue
+            if not product.validate():
+                print(f"{line_number}行目: 商品名・カテゴリが空、または数値が負です", file=sys.stderr)
+                skipped += 1
+                continue
+            yield product
+
+    with open(args.file, newline='', encoding='utf-8-sig') as f:
+        added = db.add_products(valid_products(csv.DictReader(f)))
+
+    print(f"登録: {added}件 / スキップ: {skipped}件")
+    return 0
+
+
+def cmd_ingest_history(args) -> int:
+    """
+    CSVファイルから過去の在庫履歴を一括取り込み
+    """
+    db = open_database(args.db)
+
+    def events(reader):
+        for row in reader:
+            try:
+                product_id = int(row["product_id"])
+                quantity = int(row["quantity"])
+            except (KeyError, TypeError, ValueError):
+                # 取り込み側でスキップ件数として数える
+                product_id, quantity = None, None
+            yield {
+                'product_id': product_id,
+                'created_at': (row.get("created_at") or "").strip(),
+                'operation_type': (row.get("operation_type") or "").strip(),
+                'quantity': quantity,
+                'memo': (row.get("memo") or "").strip() or None
+            }
+
+    with open(args.file, newline='', encoding='utf-8-sig') as f:
+        result = db.bulk_add_history(events(csv.DictReader(f)), chunk_size=args.chunk_size)
+
+    print(f"取り込み: {result['inserted']}件 / スキップ: {result['skipped']}件 / "
+          f"対象商品: {result['products']}件 / 在庫分に減らした減少: {result['clamped_rows']}件")
+    return 1 if 'error' in result else 0
+
+
+def cmd_export(args) -> int:
+    """
+    商品・在庫履歴・統計をCSV/JSONL形式で逐次出力
+    """
+    from models.export import export_to_file, open_export_stream, write_export
+
+    db = open_database(args.db)
+    if args.output:
+        result = export_to_file(
+            db, args.kind, args.output, fmt=args.format, compress=args.gzip,
+            product_id=args.product_id
+        )
+    else:
+        out = open_export_stream(sys.stdout.buffer, compress=args.gzip)
+        try:
+            result = write_export(db, args.kind, out, fmt=args.format, product_id=args.product_id)
+        finally:
+            out.close()
+    return 0 if not result['cancelled'] else 1
+
+
+def cmd_snapshot(args) -> int:
+    """
+    在庫履歴の列指向スナップショット（NumPy .npy）を差分更新
+    """
+    from models.history_snapshot import HistorySnapshot
+
+    db = open_database(args.db)
+    snapshot = HistorySnapshot(args.directory)
+    appended = snapshot.refresh(db, rebuild=args.rebuild)
+    meta = snapshot.read_meta()
+    print(f"追記: {appended}件 / 合計: {meta['rows']}件 / 最終履歴ID: {meta['last_id']}")
+    return 0
+
+
+def cmd_report(args) -> int:
+    """
+    在庫状況のレポートを表示
+    """
+    db = open_database(args.db)
+    summary = db.get_stock_summary()
+    if not summary:
+        return 1
+
+    print("=== 在庫レポート ===")
+    print(f"商品数: {summary['total_products']}件")
+    print(f"在庫切れ: {summary['out_of_stock']}件")
+    print(f"在庫少: {summary['low_stock']}件")
+    print(f"期限切れ: {summary['expired']}件")
+    print(f"在庫金額: ¥{summary['stock_value']:,.0f}")
+
+    print("\n=== 要対応の商品 ===")
+    today = date.today()
+    for product in db.iter_products():
+        if product.get_stock_status() != 'normal' or product.is_expired(today):
+            print(format_product_line(product, today))
+    return 0
+
+
+def cmd_shopping_list(args) -> int:
+    """
+    買い物リストを購入場所ごとに表示・出力
+    """
+    from models.export import write_shopping_list
+    from models.forecast import format_days_of_cover
+
+    db = open_database(args.db)
+    shopping_list = db.generate_shopping_list(days=args.days)
+    if not shopping_list:
+        return 1
+
+    if args.format != 'text':
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8', newline='') as out:
+                write_shopping_list(shopping_list, out, fmt=args.format)
+        else:
+            write_shopping_list(shopping_list, sys.stdout, fmt=args.format)
+        return 0
+
+    print(f"=== 買い物リスト（{shopping_list['days']}日以内に在庫がなくなる商品を含む） ===")
+    for group in shopping_list['groups']:
+        print(f"\n[{group['purchase_location'] or '購入場所未設定'}]  約¥{group['estimated_cost']:,.0f}")
+        for item in group['items']:
+            print("\t".join([
+                str(item['product_id']),
+                item['name'],
+                item['brand'] or "",
+                f"{item['current_stock']}/{item['min_stock']}",
+                format_days_of_cover(item['days_of_cover']),
+                f"{item['suggested_quantity']}個",
+                "" if item['estimated_cost'] is None else f"¥{item['estimated_cost']:,.0f}"
+            ]))
+    print(f"\n合計: {shopping_list['item_count']}件 約¥{shopping_list['estimated_cost']:,.0f}"
+          + (f"（価格未設定 {shopping_list['unpriced_count']}件を除く）" if shopping_list['unpriced_count'] else ""))
+    return 0
+
+
+def cmd_verify_stock(args) -> int:
+    """
+    在庫履歴の stock_after の連鎖と現在庫を検証（--repair で調整の履歴を追加して修復）
+    """
+    db = open_database(args.db)
+    result = db.verify_stock_consistency(repair=args.repair, batch_size=args.batch_size,
+                                         max_issues=args.limit)
+    for issue in result['issues']:
+        kind_text = "連鎖の切れ目" if issue['kind'] == 'broken_chain' else "現在庫との差"
+        print("\t".join([
+            str(issue['product_id']),
+            str(issue['history_id']),
+            issue['created_at'] or "",
+            kind_text,
+            f"{issue['stock_after']} → {issue['expected_stock']}",
+            f"{issue['unrecorded_change']:+d}"
+        ]))
+    print(f"履歴: {result['checked_rows']}件 / 連鎖の切れ目: {result['broken_chains']}件 / "
+          f"現在庫との差: {result['stock_mismatches']}件 / 対象商品: {result['products']}件 / "
+          f"修復: {result['repaired']}件 / 修復不可: {result['unrepaired']}件")
+    if 'error' in result:
+        return 1
+    remaining = result['broken_chains'] + result['stock_mismatches'] - result['repaired']
+    return 1 if remaining else 0
+
+
+def cmd_compact_history(args) -> int:
+    """
+    古い在庫履歴を期間ごとのチェックポイント行にまとめる
+    """
+    db = open_database(args.db)
+    result = db.compact_stock_history(before=args.before, period=args.period, batch_size=args.batch_size)
+    print(f"まとめた期間: {result['periods']}件 / 削除した履歴: {result['compacted_rows']}件 / "
+          f"チェックポイント: {result['checkpoint_rows']}件")
+    return 1 if 'error' in result else 0
+
+
+def cmd_maintenance(args) -> int:
+    """
+    データベースの保守処理を実行
+    """
+    from models.maintenance import (
+        MaintenanceScheduler, enable_incremental_vacuum, run_basic_maintenance
+    )
+
+    if args.enable_incremental_vacuum:
+        if not enable_incremental_vacuum(args.db):
+            return 1
+
+    results = run_basic_maintenance(args.db) if args.check else {}
+    scheduler = MaintenanceScheduler(args.db, vacuum_pages_per_step=args.vacuum_pages)
+    # 持ち時間を使い切るまで1周分を進める
+    results.update(scheduler.run(budget_seconds=args.budget))
+    for step, result in results.items():
+        print(f"{step}: {result['result']} ({result['duration_ms']:.1f}ms)")
+    if scheduler.last_completed_at is None:
+        print(f"時間切れで未完了: {', '.join(scheduler.pending_steps)}")
+    return 0
+
+
+def cmd_backup(args) -> int:
+    """
+    データベースのバックアップを作成（古い世代は削除）
+    """
+    from models.backup import BackupService
+    from utils.config import get_backup_dir, BACKUP_PAGES_PER_STEP
+
+    service = BackupService(
+        args.db, args.dir or get_backup_dir(), keep_generations=args.keep,
+        compress=not args.no_compress, pages_per_step=BACKUP_PAGES_PER_STEP,
+        step_sleep=0
+    )
+    result = service.run_backup()
+    if not result['success']:
+        return 1
+    print(f"{result['path']}\t{result['pages']}ページ\t{result['duration']:.2f}秒")
+    for path in result['removed']:
+        print(f"削除: {path}")
+    return 0
+
+
+def cmd_slow_queries(args) -> int:
+    """
+    記録された遅いクエリを新しい順に表示（--clear で削除）
+    """
+    db = open_database(args.db)
+    if args.clear:
+        return 0 if db.clear_slow_queries() else 1
+
+    for entry in db.get_slow_queries(limit=args.limit):
+        print("\t".join([
+            entry.get('at', ""),
+            f"{entry.get('duration_ms', 0):.1f}ms",
+            f"{entry.get('rows', 0)}行",
+            entry.get('method') or "",
+            entry.get('sql', "")
+        ]))
+        if args.plan:
+            print(f"    パラメータ: {entry.get('params')}")
+            for line in entry.get('plan', []):
+                print(f"    {line}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    コマンドライン引数の定義を作成
+    """
+    parser = argparse.ArgumentParser(prog="inventory", description="在庫管理アプリ（コマンドライン版）")
+    parser.add_argument("--db", default="inventory.db", help="データベースファイルのパス")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", dest="verbosity", action="store_const", const=1,
+                           default=0, help="詳細なログも表示")
+    verbosity.add_argument("-q", "--quiet", dest="verbosity", action="store_const", const=-1,
+                           help="警告とエラーのみ表示")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="処理の区間を Chrome trace 形式のJSONで保存（Perfetto で表示）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="商品一覧を表示")
+    list_parser.add_argument("--category", help="カテゴリで絞り込み")
+    list_parser.set_defaults(func=cmd_list)
+
+    search_parser = subparsers.add_parser("search", help="商品名・ブランド名で検索")
+    search_parser.add_argument("text", help="検索文字列")
+    search_parser.add_argument("--category", help="カテゴリで絞り込み")
+    search_parser.set_defaults(func=cmd_search)
+
+    stock_parser = subparsers.add_parser("stock", help="在庫を増減して履歴を記録")
+    stock_parser.add_argument("product_id", type=int, help="商品ID")
+    stock_parser.add_argument("operation", choices=OPERATION_TYPES, help="操作種別")
+    stock_parser.add_argument("quantity", type=int, help="数量（adjustは調整後の在庫数）")
+    stock_parser.add_argument("--memo", help="メモ")
+    stock_parser.set_defaults(func=cmd_stock)
+
+    import_parser = subparsers.add_parser("import", help="CSVファイルから商品を一括登録")
+    import_parser.add_argument("file", help="CSVファイルのパス")
+    import_parser.set_defaults(func=cmd_import)
+
+    ingest_parser = subparsers.add_parser(
+        "ingest-history", help="CSVファイルから過去の在庫履歴を一括取り込み"
+    )
+    ingest_parser.add_argument(
+        "file", help="CSVファイルのパス（列: product_id, created_at, operation_type, quantity, memo・"
+                     "quantity は stock と同じく adjust の場合は調整後の在庫数）"
+    )
+    ingest_parser.add_argument("--chunk-size", type=int, default=50000, help="1トランザクションの件数")
+    ingest_parser.set_defaults(func=cmd_ingest_history)
+
+    export_parser = subparsers.add_parser("export", help="商品・在庫履歴・統計をCSV/JSONL形式で出力")
+    export_parser.add_argument("--kind", choices=["products", "history", "statistics"],
+                               default="products", help="エクスポート対象")
+    export_parser.add_argument("--format", choices=["csv", "jsonl"], default="csv", help="出力形式")
+    export_parser.add_argument("--gzip", action="store_true", help="gzip圧縮して出力")
+    export_parser.add_argument("--product-id", type=int, help="在庫履歴を特定の商品に限定")
+    export_parser.add_argument("--output", "-o", help="出力先ファイル（省略時は標準出力）")
+    export_parser.set_defaults(func=cmd_export)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="在庫履歴の列指向スナップショットを差分更新")
+    snapshot_parser.add_argument("directory", help="スナップショットの保存先ディレクトリ")
+    snapshot_parser.add_argument("--rebuild", action="store_true", help="全件を取り込み直す")
+    snapshot_parser.set_defaults(func=cmd_snapshot)
+
+    report_parser = subparsers.add_parser("report", help="在庫状況のレポートを表示")
+    report_parser.set_defaults(func=cmd_report)
+
+    shopping_parser = subparsers.add_parser("shopping-list", help="買い物リストを購入場所ごとに表示")
+    shopping_parser.add_argument("--days", type=int, default=SHOPPING_LIST_DAYS,
+                                 help="この日数以内に在庫がなくなる予測の商品も含める")
+    shopping_parser.add_argument("--format", choices=["text", "csv", "jsonl"], default="text", help="出力形式")
+    shopping_parser.add_argument("--output", "-o", help="出力先ファイル（csv/jsonl・省略時は標準出力）")
+    shopping_parser.set_defaults(func=cmd_shopping_list)
+
+    verify_parser = subparsers.add_parser("verify-stock", help="在庫履歴と現在庫の整合性を検証・修復")
+    verify_parser.add_argument("--repair", action="store_true", help="調整の履歴を追加して修復")
+    verify_parser.add_argument("--batch-size", type=int, default=200,
+                               help="1回のクエリ（修復は1トランザクション）で調べる商品IDの幅")
+    verify_parser.add_argument("--limit", type=int, default=20, help="表示する食い違いの件数")
+    verify_parser.set_defaults(func=cmd_verify_stock)
+
+    compact_parser = subparsers.add_parser("compact-history", help="古い在庫履歴を期間ごとのチェックポイントにまとめる")
+    compact_parser.add_argument("--before", type=past_date,
+                                help="この日時より前の履歴をまとめる（YYYY-MM-DD・省略時は"
+                                     f"{HISTORY_COMPACTION_AGE_DAYS}日前）")
+    compact_parser.add_argument("--period", choices=["day", "month", "year"], default=HISTORY_COMPACTION_PERIOD,
+                                help="まとめる期間")
+    compact_parser.add_argument("--batch-size", type=int, default=1000,
+                                help="1トランザクションで処理する商品IDの幅")
+    compact_parser.set_defaults(func=cmd_compact_history)
+
+    maintenance_parser = subparsers.add_parser("maintenance", help="データベースの保守処理を実行")
+    maintenance_parser.add_argument("--budget", type=float, default=30.0, help="持ち時間（秒）")
+    maintenance_parser.add_argument("--vacuum-pages", type=int, default=128,
+                                    help="段階的バキュームで1回に返却するページ数")
+    maintenance_parser.add_argument("--check", action="store_true", help="整合性チェックも行う")
+    maintenance_parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                                    help="既存のデータベースを段階的バキューム対応に変換（VACUUMを1回実行）")
+    maintenance_parser.set_defaults(func=cmd_maintenance)
+
+    backup_parser = subparsers.add_parser("backup", help="データベースのバックアップを作成")
+    backup_parser.add_argument("--dir", help="保存先ディレクトリ（省略時はアプリのデータフォルダ）")
+    backup_parser.add_argument("--keep", type=int, default=7, help="残す世代数")
+    backup_parser.add_argument("--no-compress", action="store_true", help="gzip圧縮しない")
+    backup_parser.set_defaults(func=cmd_backup)
+
+    slow_parser = subparsers.add_parser("slow-queries", help="記録された遅いクエリを表示")
+    slow_parser.add_argument("--limit", type=int, default=20, help="表示する件数")
+    slow_parser.add_argument("--plan", action="store_true", help="パラメータの型と実行計画も表示")
+    slow_parser.add_argument("--clear", action="store_true", help="記録を削除")
+    slow_parser.set_defaults(func=cmd_slow_queries)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    """
+    コマンドラインのメイン関数
+    """
+    args = build_parser().parse_args(argv)
+    # ログは標準エラー出力へ（標準出力はコマンドの結果だけにする）
+    setup_logging(levels={"": VERBOSITY_LEVELS[args.verbosity]}, fmt="%(message)s")
+    try:
+        with TRACER.span(f"cli.{args.command}", "cli"):
+            return args.func(args)
+    except BrokenPipeError:
+        # head などに出力を渡して途中で閉じられた場合は静かに終了
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 0
+    finally:
+        if args.trace:
+            TRACER.dump(args.trace)
+
+
+# このファイルが直接実行された場合のみmain()を呼び出す
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,7 @@
 メインエントリーポイント（メインウィンドウ版）
 """
 
+import logging
 import sys
 from pathlib import Path
 
@@ -14,6 +15,10 @@ from PySide6.QtWidgets import QApplication, QMessageBox
 # 自作モジュールをインポート
 from views.main_window import MainWindow
 from models.database import create_database
+from utils.config import get_log_path
+from utils.logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
 
 def initialize_app():
     """
@@ -22,17 +27,20 @@ def initialize_app():
     try:
         # データベースを作成（存在しない場合のみ）
         create_database()
-        print("データベースの初期化が完了しました")
+        logger.info("データベースの初期化が完了しました")
         return True
         
     except Exception as e:
-        print(f"アプリケーション初期化エラー: {e}")
+        logger.exception("アプリケーション初期化エラー: %s", e)
         return False
 
 def main():
     """
     アプリケーションのメイン関数
     """
+    # ログ出力を開始（コンソールとデータフォルダ内のログファイル、書き込みは別スレッド）
+    setup_logging(log_file=get_log_path())
+    
     # QApplicationオブジェクトを作成（PySide6アプリに必須）
     app = QApplication(sys.argv)
     
@@ -56,13 +64,13 @@ def main():
         # ウィンドウを表示
         main_window.show()
         
-        print("在庫管理アプリを開始しました")
+        logger.info("在庫管理アプリを開始しました")
         
         # アプリケーションのメインループを開始
         sys.exit(app.exec())
         
     except Exception as e:
-        print(f"アプリケーション実行エラー: {e}")
+        logger.exception("アプリケーション実行エラー: %s", e)
         QMessageBox.critical(None, "実行エラー", 
                            f"アプリケーションでエラーが発生しました:\n{e}")
         sys.exit(1)
@@ -1 +1,14 @@
- 
+"""
+データモデル層（Qtに依存しない）
+CLIやバッチ処理からも import models で利用できる
+"""
+
+from .product import (
+    Product, PRODUCT_COLUMNS, create_product_from_row, create_product_list_from_rows,
+    product_row_factory, parse_expiry_date
+)
+from .stock_history import (
+    StockHistory, HISTORY_COLUMNS, create_history_from_row, create_history_list_from_rows,
+    history_row_factory, calculate_stock_change
+)
+from .database import DatabaseManager, create_database
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+オンラインバックアップモジュール
+sqlite3 のバックアップAPIでアプリ使用中でも安全にデータベースを複製する（Qtに依存しない）
+
+数ページずつコピーしてはスリープするため、コピー中もアプリの書き込みを長時間止めない。
+バックアップは世代ごとにファイルを分け、古い世代から削除する。
+"""
+
+import gzip
+import logging
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _BackupAborted(Exception):
+    """
+    サービス停止によりバックアップを中断したことを表す（内部用）
+    """
+
+
+class _BackupRestartLimit(Exception):
+    """
+    コピーのやり直し回数が上限を超えたことを表す（内部用）
+    """
+
+
+class BackupService:
+    """
+    データベースのバックアップをワーカースレッドで定期実行するクラス
+    """
+
+    def __init__(self, db_path: str, backup_dir, keep_generations: int = 7,
+                 compress: bool = True, pages_per_step: int = 256,
+                 step_sleep: float = 0.05, verify: bool = True, max_restarts: int = 3,
+                 interval_seconds: Optional[float] = None,
+                 on_complete: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        バックアップサービスを初期化
+
+        Args:
+            db_path: バックアップ元のデータベースファイルのパス
+            backup_dir: バックアップの保存先ディレクトリ
+            keep_generations: 残すバックアップの世代数
+            compress: gzip圧縮して保存する場合True
+            pages_per_step: 1回のステップでコピーするページ数
+            step_sleep: ステップ間のスリープ秒数（この間は書き込みを妨げない）
+            verify: バックアップ後に整合性チェックを行う場合True
+            max_restarts: コピー中の書き込みによるやり直しの上限（超えたら一括コピー）
+            interval_seconds: 定期実行の間隔（秒）。Noneの場合は手動実行のみ
+            on_complete: バックアップ終了時に結果の辞書を受け取る関数（ワーカースレッドから呼ばれる）
+        """
+        self.db_path = str(db_path)
+        self.backup_dir = Path(backup_dir)
+        self.keep_generations = keep_generations
+        self.compress = compress
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.verify = verify
+        self.max_restarts = max_restarts
+        self.interval_seconds = interval_seconds
+        self.on_complete = on_complete
+
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._lock = threading.Lock()
+
+    # === 世代管理 ===
+
+    @property
+    def prefix(self) -> str:
+        """
+        バックアップファイル名の接頭辞（データベースファイル名から作成）
+        """
+        return Path(self.db_path).stem + "-"
+
+    def list_backups(self) -> List[Path]:
+        """
+        既存のバックアップを古い順に取得
+
+        Returns:
+            List[Path]: バックアップファイルのパス
+        """
+        if not self.backup_dir.exists():
+            return []
+        backups = [
+            path for path in self.backup_dir.iterdir()
+            if path.name.startswith(self.prefix)
+            and (path.name.endswith(".db") or path.name.endswith(".db.gz"))
+        ]
+        # ファイル名に日時が入っているので名前順＝作成順
+        return sorted(backups, key=lambda path: path.name)
+
+    def rotate(self) -> List[Path]:
+        """
+        保存世代数を超えた古いバックアップを削除
+
+        Returns:
+            List[Path]: 削除したファイルのパス
+        """
+        backups = self.list_backups()
+        removed = backups[:max(0, len(backups) - self.keep_generations)]
+        for path in removed:
+            path.unlink()
+        return removed
+
+    # === バックアップ本体 ===
+
+    def run_backup(self) -> Dict[str, Any]:
+        """
+        バックアップを1回実行（呼び出したスレッドで同期的に実行）
+
+        Returns:
+            Dict[str, Any]: 保存先 (path)、ページ数 (pages)、所要時間 (duration)、
+                整合性チェック結果 (integrity)、削除した世代 (removed)、成功したか (success)
+        """
+        with self._lock:
+            started = time.perf_counter()
+            self.backup_dir.mkdir(parents=True, exist_ok=True)
+            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+            final_path = self.backup_dir / f"{self.prefix}{timestamp}.db"
+            temp_path = final_path.with_name(final_path.name + ".partial")
+            result = {'path': None, 'pages': 0, 'duration': 0.0,
+                      'integrity': None, 'removed': [], 'success': False}
+
+            try:
+                result['pages'] = self._copy_database(temp_path)
+
+                # バックアップの整合性チェック（元データベースには触れない）
+                if self.verify:
+                    result['integrity'] = self._check_integrity(temp_path)
+                    if result['integrity'] != "ok":
+                        raise sqlite3.DatabaseError(f"整合性チェック失敗: {result['integrity']}")
+
+                if self.compress:
+                    final_path = final_path.with_name(final_path.name + ".gz")
+                    with open(temp_path, 'rb') as src, gzip.open(final_path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                    temp_path.unlink()
+                else:
+                    temp_path.replace(final_path)
+
+                result['path'] = str(final_path)
+                result['removed'] = [str(path) for path in self.rotate()]
+                result['success'] = True
+                logger.info("バックアップ完了: %s", final_path)
+
+            except _BackupAborted:
+                result['error'] = "中断されました"
+                logger.info("バックアップを中断しました")
+            except (sqlite3.Error, OSError) as e:
+                result['error'] = str(e)
+                logger.error("バックアップ失敗: %s", e)
+            finally:
+                if temp_path.exists():
+                    temp_path.unlink()
+                result['duration'] = time.perf_counter() - started
+
+            return result
+
+    def _copy_database(self, target_path: Path) -> int:
+        """
+        バックアップAPIで数ページずつコピー（内部用）
+
+        Returns:
+            int: コピーした総ページ数
+        """
+        total_pages = 0
+        last_remaining = None
+        restarts = 0
+
+        def progress(status, remaining, total):
+            nonlocal total_pages, last_remaining, restarts
+            total_pages = total
+            if self._stop_event.is_set():
+                raise _BackupAborted()
+            # 別の接続から書き込まれるとコピーは最初からやり直しになる
+            if last_remaining is not None and remaining > last_remaining:
+                restarts += 1
+                if restarts > self.max_restarts:
+                    raise _BackupRestartLimit()
+            last_remaining = remaining
+            # ステップ間で読み取りロックを手放し、書き込みを先に通す
+            if remaining and self.step_sleep:
+                time.sleep(self.step_sleep)
+
+        source = sqlite3.connect(self.db_path)
+        target = sqlite3.connect(str(target_path))
+        try:
+            try:
+                source.backup(target, pages=self.pages_per_step, progress=progress)
+            except _BackupRestartLimit:
+                # 書き込みが続いて終わらない場合は1ステップでまとめてコピーする
+                logger.warning("書き込みが続いているため一括コピーに切り替えます（%d回やり直し）", restarts)
+                source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        return total_pages
+
+    @staticmethod
+    def _check_integrity(path: Path) -> str:
+        """
+        バックアップファイルの整合性をチェック（内部用）
+        """
+        conn = sqlite3.connect(str(path))
+        try:
+            rows = conn.execute("PRAGMA integrity_check").fetchall()
+            return ", ".join(row[0] for row in rows)
+        finally:
+            conn.close()
+
+    # === ワーカースレッド ===
+
+    def start(self):
+        """
+        ワーカースレッドを開始（interval_seconds ごとにバックアップを実行）
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name="BackupService", daemon=True)
+        self._thread.start()
+
+    def request_backup(self):
+        """
+        ワーカースレッドに今すぐバックアップするよう依頼
+        """
+        self.start()
+        self._wake_event.set()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        ワーカースレッドを停止（実行中のバックアップは次のステップで中断）
+
+        Args:
+            timeout: スレッド終了を待つ秒数
+        """
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _worker(self):
+        """
+        ワーカースレッドの本体（内部用）
+        """
+        while not self._stop_event.is_set():
+            # 定期実行の間隔が来るか、request_backup() で起こされるまで待つ
+            self._wake_event.wait(self.interval_seconds)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+            result = self.run_backup()
+            if self.on_complete:
+                self.on_complete(result)
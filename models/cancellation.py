@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+実行中のクエリの中断
+CancelToken を DatabaseManager.cancellable() に渡すと、その間に開いた接続に
+sqlite3 の進捗ハンドラーが設定され、cancel() または期限切れで実行中のSQL文が中断される。
+
+cancel() は別のスレッド（GUIスレッドなど）から呼べる。
+実行中の文は Connection.interrupt() ですぐに中断され、
+その後に始まる文は進捗ハンドラーが止める。
+
+使い方:
+    token = CancelToken(timeout=30)
+    with db.cancellable(token):         # 中断された場合は QueryCancelled
+        history = db.get_stock_history(limit=1000)
+    # 別スレッドから: token.cancel()
+"""
+
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+# 進捗ハンドラーを呼ぶ間隔（SQLiteの仮想マシン命令数）
+PROGRESS_HANDLER_INTERVAL = 1000
+
+
+class QueryCancelled(Exception):
+    """
+    キャンセルまたは期限切れでクエリが中断されたことを表す例外
+    """
+
+    def __init__(self, reason: str):
+        super().__init__("クエリがタイムアウトしました" if reason == 'timeout' else "クエリをキャンセルしました")
+        self.reason = reason
+
+
+def is_interrupted(error: BaseException) -> bool:
+    """
+    sqlite3 の例外が中断によるものか判定
+    """
+    return isinstance(error, sqlite3.OperationalError) and str(error) == "interrupted"
+
+
+class CancelToken:
+    """
+    1回の処理（読み込み・エクスポートなど）の中断要求と期限
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        Args:
+            timeout: 期限（秒）。省略時は期限なし
+        """
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    def cancel(self):
+        """
+        中断を要求（実行中の文もすぐに中断する）
+        """
+        self._cancelled.set()
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.interrupt()
+            except sqlite3.ProgrammingError:
+                # すでに閉じられた接続
+                pass
+
+    @property
+    def reason(self) -> Optional[str]:
+        """
+        中断の理由（'cancelled' / 'timeout'）。中断されていなければNone
+        """
+        if self._cancelled.is_set():
+            return 'cancelled'
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return 'timeout'
+        return None
+
+    def is_cancelled(self) -> bool:
+        """
+        中断を要求されたか、期限を過ぎていればTrue
+        """
+        return self.reason is not None
+
+    def check(self):
+        """
+        中断されていれば QueryCancelled を送出
+        """
+        reason = self.reason
+        if reason is not None:
+            raise QueryCancelled(reason)
+
+    def attach(self, connection: sqlite3.Connection):
+        """
+        接続に進捗ハンドラーを設定し、cancel() で中断する対象に加える
+        """
+        connection.set_progress_handler(self.is_cancelled, PROGRESS_HANDLER_INTERVAL)
+        with self._lock:
+            self._connections.append(connection)
+
+    def detach_all(self):
+        """
+        設定した進捗ハンドラーを外し、接続への参照を手放す
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                connection.set_progress_handler(None, 0)
+            except sqlite3.ProgrammingError:
+                pass
@@ -5,36 +5,153 @@
 SQLiteデータベースの作成・操作を担当
 """
 
+import logging
 import sqlite3
-import sys
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from typing import List, Optional, Dict, Any, Iterator, Iterable
+from datetime import date, datetime, timedelta
 
-# パス設定を修正
-sys.path.append(str(Path(__file__).parent))
+# パッケージ内の相対インポート（sys.pathの操作やQtへの依存はしない）
+from .stock_history import StockHistory
+from .product import Product, product_row_factory
+from .cancellation import CancelToken, QueryCancelled, is_interrupted
+from .slow_query_log import SlowQueryLog, TimedConnection, slow_query_log_path
+from .product_cache import ProductCache
+from .forecast import UsageState, fold_usage_events
+from utils.config import (
+    SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_LOG_MAX_ENTRIES, PRODUCT_CACHE_SIZE, SHOPPING_LIST_DAYS,
+    HISTORY_COMPACTION_AGE_DAYS, HISTORY_COMPACTION_PERIOD,
+    DEFAULT_CATEGORIES, DEFAULT_STORAGE_LOCATIONS, DEFAULT_PURCHASE_LOCATIONS
+)
+from utils.metrics import instrument_class
+from utils.tracing import trace_class
 
-try:
-    from stock_history import StockHistory, create_history_list_from_rows
-    from product import Product, create_product_list_from_rows
-except ImportError:
-    # 相対インポートを試行
-    try:
-        from .stock_history import StockHistory, create_history_list_from_rows
-        from .product import Product, create_product_list_from_rows
-    except ImportError as e:
-        print(f"インポートエラー: {e}")
-        print("models/stock_history.py と models/product.py ファイルが存在することを確認してください")
-        sys.exit(1)
-
-def create_database():
-    """データベースとテーブルを作成"""
+logger = logging.getLogger(__name__)
+
+# スキーマのバージョン（PRAGMA user_version）
+# 0: カテゴリ・保存場所・購入場所・操作種別を文字列で各行に持つ
+# 1: 参照テーブル（categories / storage_locations / purchase_locations / operation_types）の整数IDで持つ
+# 2: 使用ペースの予測状態（usage_forecasts）を持つ
+# 3: 在庫履歴にチェックポイント行の列（event_count / period_start）を持つ
+SCHEMA_VERSION = 3
+
+# 履歴の圧縮でまとめる期間と、期間を表す strftime の書式
+COMPACTION_PERIOD_FORMATS = {
+    'day': '%Y-%m-%d',
+    'month': '%Y-%m',
+    'year': '%Y'
+}
+
+# 参照テーブルと初期値
+LOOKUP_SEEDS = {
+    'categories': DEFAULT_CATEGORIES,
+    'storage_locations': DEFAULT_STORAGE_LOCATIONS,
+    'purchase_locations': DEFAULT_PURCHASE_LOCATIONS
+}
+
+# バージョン0のデータベースを移行するSQL（旧テーブルを退避して新しいスキーマに写す）
+# {drop_indexes} には旧テーブルのインデックスの削除、{schema} には schema.sql の内容が入る
+MIGRATE_TO_LOOKUP_TABLES_SQL = """
+BEGIN;
+{drop_indexes}
+ALTER TABLE products RENAME TO products_v0;
+ALTER TABLE stock_history RENAME TO stock_history_v0;
+{schema}
+;
+INSERT OR IGNORE INTO categories (name)
+    SELECT DISTINCT category FROM products_v0 WHERE category IS NOT NULL;
+INSERT OR IGNORE INTO storage_locations (name)
+    SELECT DISTINCT storage_location FROM products_v0 WHERE storage_location IS NOT NULL;
+INSERT OR IGNORE INTO purchase_locations (name)
+    SELECT DISTINCT purchase_location FROM products_v0 WHERE purchase_location IS NOT NULL;
+INSERT OR IGNORE INTO operation_types (name)
+    SELECT DISTINCT operation_type FROM stock_history_v0 WHERE operation_type IS NOT NULL;
+INSERT INTO products (
+    id, name, brand, size, category_id, current_stock, min_stock,
+    purchase_location_id, price, storage_location_id, expiry_date, created_at, updated_at
+)
+SELECT p.id, p.name, p.brand, p.size, c.id, p.current_stock, p.min_stock,
+       pl.id, p.price, sl.id, p.expiry_date, p.created_at, p.updated_at
+FROM products_v0 p
+JOIN categories c ON c.name = p.category
+LEFT JOIN purchase_locations pl ON pl.name = p.purchase_location
+LEFT JOIN storage_locations sl ON sl.name = p.storage_location
+ORDER BY p.id;
+INSERT INTO stock_history (
+    id, product_id, operation_type_id, quantity_change, stock_after, memo, created_at
+)
+SELECT h.id, h.product_id, o.id, h.quantity_change, h.stock_after, h.memo, h.created_at
+FROM stock_history_v0 h
+JOIN operation_types o ON o.name = h.operation_type
+ORDER BY h.id;
+-- AUTOINCREMENT の採番を引き継ぐ（削除済みのIDを再利用しない）
+DELETE FROM sqlite_sequence WHERE name IN ('products', 'stock_history');
+UPDATE sqlite_sequence SET name = 'products' WHERE name = 'products_v0';
+UPDATE sqlite_sequence SET name = 'stock_history' WHERE name = 'stock_history_v0';
+DROP TABLE stock_history_v0;
+DROP TABLE products_v0;
+PRAGMA user_version = 1;
+COMMIT;
+"""
+
+# 履歴の一括取り込みで、対象商品（temp.ingest_products）の履歴全体の増減と操作後在庫数を
+# 日時順に計算し直すCTE（calculate_stock_change と同じ規則）。
+# 棚卸し（1件ずつの調整の行）は stock_after の在庫数にそろえる操作として扱い、その行で区切った区間ごとに
+# 購入・使用の増減を累積し、0未満になった分はそれまでの最小値の分だけ底上げする（在庫を超える使用は在庫分だけの減少）。
+# 増減 (quantity_change) は直前の行との在庫数の差で、recorded_change / recorded_stock は計算し直す前の値
+INGEST_RECOMPUTE_STOCK_SQL = """
+WITH segmented AS (
+    SELECT h.id, h.product_id, h.created_at, h.quantity_change, h.stock_after, o.opening_stock,
+           h.operation_type_id = 3 AND h.event_count = 1 AS is_stocktake,
+           SUM(h.operation_type_id = 3 AND h.event_count = 1) OVER (
+               PARTITION BY h.product_id ORDER BY h.created_at, h.id ROWS UNBOUNDED PRECEDING
+           ) AS segment
+    FROM temp.ingest_products o
+    JOIN stock_history h ON h.product_id = o.product_id
+),
+running AS (
+    SELECT id, product_id, created_at, quantity_change, stock_after AS recorded_stock,
+           opening_stock, is_stocktake, segment,
+           CASE WHEN segment = 0 THEN opening_stock ELSE FIRST_VALUE(stock_after) OVER s END
+           + SUM(CASE WHEN is_stocktake THEN 0 ELSE quantity_change END) OVER s AS stock_after
+    FROM segmented
+    WINDOW s AS (PARTITION BY product_id, segment ORDER BY created_at, id ROWS UNBOUNDED PRECEDING)
+),
+floored AS (
+    SELECT id, product_id, created_at, quantity_change, recorded_stock, opening_stock, is_stocktake,
+           stock_after - MIN(0, MIN(stock_after) OVER (
+               PARTITION BY product_id, segment ORDER BY created_at, id ROWS UNBOUNDED PRECEDING
+           )) AS stock_after
+    FROM running
+),
+recomputed AS (
+    SELECT id, is_stocktake, quantity_change AS recorded_change, recorded_stock, stock_after,
+           stock_after - COALESCE(LAG(stock_after) OVER (
+               PARTITION BY product_id ORDER BY created_at, id
+           ), opening_stock) AS quantity_change
+    FROM floored
+)
+"""
+
+def create_database(db_path: str = 'inventory.db'):
+    """
+    データベースとテーブルを作成
+
+    既存のデータベースが古いスキーマ（バージョン0）の場合は参照テーブルの形に移行し、
+    チェックポイント行の列がない在庫履歴（バージョン2以前）には列を追加し、
+    使用ペースの予測がないデータベース（バージョン1以前）は履歴から予測を作る。
+
+    Args:
+        db_path: データベースファイルのパス
+    """
     
     # schema.sqlファイルを読み込み
     schema_path = Path(__file__).parent.parent / "schema.sql"
     
     if not schema_path.exists():
-        print(f"❌ エラー: schema.sqlファイルが見つかりません: {schema_path}")
+        logger.error("schema.sqlファイルが見つかりません: %s", schema_path)
         return False
     
     try:
@@ -42,31 +159,149 @@ def create_database():
             schema_sql = f.read()
         
         # データベースに接続してスキーマを実行
-        conn = sqlite3.connect('inventory.db')
-        conn.executescript(schema_sql)
-        conn.close()
+        conn = sqlite3.connect(db_path)
+        try:
+            # 新規作成時のみ有効（削除で空いたページを少しずつ返却できるようにする）
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if _needs_lookup_migration(conn):
+                _migrate_to_lookup_tables(conn, schema_sql)
+            else:
+                conn.executescript(schema_sql)
+            if version < 3:
+                _add_checkpoint_columns(conn)
+            if version < 2:
+                _rebuild_usage_forecasts(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            # カテゴリ・場所の初期値を登録（既にあるものはそのまま）
+            for table, names in LOOKUP_SEEDS.items():
+                conn.executemany(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)",
+                                 ((name,) for name in names))
+            conn.commit()
+        finally:
+            conn.close()
         
-        print("✅ データベースが作成されました")
+        logger.debug("データベースを作成しました: %s", db_path)
         return True
         
     except Exception as e:
-        print(f"❌ データベース作成エラー: {e}")
+        logger.error("データベース作成エラー: %s", e)
+        return False
+
+def _add_checkpoint_columns(conn: sqlite3.Connection):
+    """
+    在庫履歴にチェックポイント行の列がなければ追加する（コミットは呼び出し側・内部用）
+
+    既定値（event_count = 1 / period_start = NULL）のみのため、既存の行は書き換えない。
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(stock_history)")}
+    if 'event_count' not in columns:
+        conn.execute("ALTER TABLE stock_history ADD COLUMN event_count INTEGER NOT NULL DEFAULT 1")
+    if 'period_start' not in columns:
+        conn.execute("ALTER TABLE stock_history ADD COLUMN period_start TIMESTAMP")
+
+def _rebuild_usage_forecasts(conn: sqlite3.Connection, product_filter: str = ""):
+    """
+    使用ペースの予測を使用履歴から作り直す（コミットは呼び出し側・内部用）
+
+    履歴は商品ID・日時順に複合インデックスから読みながら商品ごとに畳み込むため、
+    使用するメモリは履歴の件数によらない。
+    チェックポイント行は期間中の使用の合計を1回の使用として反映する（使用回数は event_count 分数える）。
+
+    Args:
+        conn: データベース接続
+        product_filter: 対象商品を絞り込むIDの副問い合わせ（省略時は全商品）
+    """
+    product_condition = f"product_id IN ({product_filter})" if product_filter else ""
+    conn.execute("DELETE FROM usage_forecasts"
+                 + (f" WHERE {product_condition}" if product_condition else ""))
+    # operation_type_id = 2 は use（使用数は正の値にする）
+    events = conn.execute(f"""
+        SELECT product_id, julianday(created_at), -quantity_change, event_count
+        FROM stock_history
+        WHERE operation_type_id = 2 {"AND " + product_condition if product_condition else ""}
+        ORDER BY product_id, created_at, id
+    """)
+    conn.executemany("""
+        INSERT INTO usage_forecasts (product_id, usage_rate, last_used_day, use_count)
+        VALUES (?, ?, ?, ?)
+    """, ((product_id, *state) for product_id, state in fold_usage_events(events)))
+
+def _needs_lookup_migration(conn: sqlite3.Connection) -> bool:
+    """
+    文字列の列を持つ古いスキーマ（バージョン0）のデータベースか判定（内部用）
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
         return False
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+    return 'category' in columns
+
+def _migrate_to_lookup_tables(conn: sqlite3.Connection, schema_sql: str):
+    """
+    古いスキーマのデータベースを参照テーブルの形に移行（1つのトランザクションで行う・内部用）
+
+    商品・履歴のIDはそのまま引き継ぐ。失敗した場合は元のテーブルに戻る。
+
+    Args:
+        conn: データベース接続（外部キーの検査は無効のまま呼ぶ）
+        schema_sql: schema.sql の内容
+    """
+    # 旧テーブルのインデックスは新しいテーブルと同じ名前のため先に削除する
+    index_names = [row[0] for row in conn.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'index' AND tbl_name IN ('products', 'stock_history') AND sql IS NOT NULL
+    """)]
+    drop_indexes = "".join(f'DROP INDEX "{name}";\n' for name in index_names)
+    script = MIGRATE_TO_LOOKUP_TABLES_SQL.format(drop_indexes=drop_indexes, schema=schema_sql)
+    try:
+        conn.executescript(script)
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    logger.info("データベースを参照テーブルの形式に移行しました（スキーマバージョン 1）")
 
+@trace_class("db")
+@instrument_class("inventory_db_call_seconds", "DatabaseManager の公開メソッドの所要時間（秒）")
 class DatabaseManager:
     """
     データベース操作を管理するクラス - Phase 4 実機能実装版
+
+    公開メソッドの所要時間は utils.metrics.REGISTRY に method ラベル付きで記録され、
+    呼び出しの区間は utils.tracing.TRACER に記録される。
     """
     
-    def __init__(self, db_path: str = 'inventory.db'):
+    def __init__(self, db_path: str = 'inventory.db',
+                 slow_query_threshold_ms: Optional[float] = SLOW_QUERY_THRESHOLD_MS,
+                 product_cache_size: Optional[int] = PRODUCT_CACHE_SIZE):
         """
         データベースマネージャーを初期化
         
         Args:
             db_path: データベースファイルのパス
+            slow_query_threshold_ms: これ以上かかったSQL文を記録する（Noneで記録しない）
+            product_cache_size: get_product_object_by_id で覚えておく商品数（Noneで覚えない）
         """
         self.db_path = db_path
-        print(f"データベースマネージャー初期化: {self.db_path}")
+        self.slow_query_threshold_ms = slow_query_threshold_ms
+        self.slow_query_log = None
+        if slow_query_threshold_ms is not None and str(db_path) != ':memory:':
+            self.slow_query_log = SlowQueryLog(slow_query_log_path(db_path), SLOW_QUERY_LOG_MAX_ENTRIES)
+        # 商品IDごとの Product のキャッシュ（:memory: は接続ごとに別のデータベースになるため使わない）
+        self.product_cache = None
+        if product_cache_size and str(db_path) != ':memory:':
+            self.product_cache = ProductCache(db_path, product_cache_size)
+        # generate_shopping_list の結果（(日数, 作成日, data_version) ごと・在庫や商品の書き込みで捨てる）
+        self._shopping_lists: Dict[tuple, Dict[str, Any]] = {}
+        self._shopping_list_generation = 0
+        # 買い物リストの作成（ワーカースレッド）と書き込み（GUIスレッド）が同時に触るため、世代と辞書はこのロックの中で扱う
+        self._shopping_list_lock = threading.Lock()
+        # 他の接続のコミットを PRAGMA data_version で検出するための常時開いておく接続
+        self._watch_connection: Optional[sqlite3.Connection] = None
+        self._watch_lock = threading.Lock()
+        # cancellable() で指定された中断トークン（スレッドごと）
+        self._local = threading.local()
+        logger.debug("データベースマネージャー初期化: %s", self.db_path)
     
     def _get_connection(self) -> sqlite3.Connection:
         """
@@ -76,8 +311,13 @@ class DatabaseManager:
             sqlite3.Connection: データベース接続オブジェクト
         """
         try:
-            # データベースに接続
-            connection = sqlite3.connect(self.db_path)
+            # データベースに接続（遅いクエリを記録する場合は文ごとに時間を計る接続）
+            if self.slow_query_log is not None:
+                connection = sqlite3.connect(self.db_path, factory=TimedConnection)
+                connection.slow_query_log = self.slow_query_log
+                connection.slow_query_threshold = self.slow_query_threshold_ms / 1000
+            else:
+                connection = sqlite3.connect(self.db_path)
             
             # 外部キー制約を有効化（重要！）
             connection.execute("PRAGMA foreign_keys = ON")
@@ -85,11 +325,178 @@ class DatabaseManager:
             # Row factory設定（辞書形式でデータ取得）
             connection.row_factory = sqlite3.Row
             
+            # 中断トークンの範囲内なら、中断できるようにする
+            token = getattr(self._local, 'cancel_token', None)
+            if token is not None:
+                token.attach(connection)
+            
             return connection
 
         except sqlite3.Error as e:
-            print(f"データベース接続エラー: {e}")
+            logger.error("データベース接続エラー: %s", e)
+            raise
+
+    @contextmanager
+    def cancellable(self, token: CancelToken):
+        """
+        with 文の中で開いた接続を、トークンの cancel() や期限切れで中断できるようにする
+
+        中断された場合は with 文を抜けるときに QueryCancelled を送出する
+        （途中のメソッドが空の結果を返していても、その結果は使わないこと）。
+        中断後に with 文の中で起きた例外も、中断の結果とみなして QueryCancelled にする。
+
+        Args:
+            token: 中断トークン（別のスレッドから cancel() を呼べる）
+        """
+        previous = getattr(self._local, 'cancel_token', None)
+        self._local.cancel_token = token
+        try:
+            yield token
+        except Exception as e:
+            if token.is_cancelled():
+                raise QueryCancelled(token.reason) from e
             raise
+        finally:
+            self._local.cancel_token = previous
+            token.detach_all()
+        token.check()
+
+    def _invalidate_products(self, product_ids: Iterable[int], committed: bool = False):
+        """
+        書き込んだ商品をキャッシュから外し、買い物リストも作り直すようにする（内部用メソッド）
+
+        書き込みに失敗した場合に呼び出し側が書き換えたキャッシュ上のオブジェクトが残らないよう、
+        書き込みの前にも呼ぶ。コミットの後（committed=True）は新しい data_version を
+        このマネージャー自身の書き込みとして記録し、書き込んでいない商品はキャッシュに残す
+
+        Args:
+            product_ids: 書き込んだ（書き込む）商品ID
+            committed: このマネージャーのコミットの後に呼ぶ場合True
+        """
+        if self.product_cache is not None:
+            if committed:
+                self.product_cache.record_commit(product_ids)
+            else:
+                self.product_cache.invalidate(product_ids)
+        self._forget_shopping_lists()
+
+    def _commit(self, conn: sqlite3.Connection, product_ids: Iterable[int] = ()):
+        """
+        書き込みをコミットし、キャッシュに自分のコミットとして知らせる（内部用メソッド）
+
+        コミットの直前（書き込みロックを持っていて他の接続がコミットできない間）に
+        他の接続のコミットを確認しておくため、コミット後の data_version の変化は自分の書き込みの分になる
+
+        Args:
+            conn: 書き込み中の接続
+            product_ids: 商品の行を書き換えた商品ID
+        """
+        if self.product_cache is not None:
+            self.product_cache.refresh()
+        conn.commit()
+        self._invalidate_products(product_ids, committed=True)
+
+    def _data_version(self) -> Optional[int]:
+        """
+        監視用の接続から見た PRAGMA data_version を返す（内部用メソッド）
+
+        他の接続（別のプロセスや、このマネージャーの書き込み用の接続）がコミットするたびに変わる。
+        data_version は接続ごとの値のため、同じ接続で読み続ける。
+
+        Returns:
+            Optional[int]: data_version（:memory: や確認できない場合はNone）
+        """
+        if str(self.db_path) == ':memory:':
+            return None
+        with self._watch_lock:
+            try:
+                if self._watch_connection is None:
+                    self._watch_connection = sqlite3.connect(self.db_path, check_same_thread=False)
+                return self._watch_connection.execute("PRAGMA data_version").fetchone()[0]
+            except sqlite3.Error:
+                return None
+
+    def _forget_shopping_lists(self):
+        """
+        覚えている買い物リストを捨てる（書き込みの前とコミットの後に呼ぶ・内部用メソッド）
+
+        世代を進めるため、書き込みと並行して作成中だった買い物リストも覚えられなくなる
+        """
+        with self._shopping_list_lock:
+            self._shopping_list_generation += 1
+            self._shopping_lists.clear()
+
+    def _lookup_id(self, conn: sqlite3.Connection, table: str, name: Optional[str],
+                   known: Optional[Dict[str, int]] = None) -> Optional[int]:
+        """
+        参照テーブルの名前をIDに変換（未登録の名前は追加する・内部用メソッド）
+
+        追加は呼び出し側のトランザクションで行うため、書き込みが失敗すれば取り消される。
+
+        Args:
+            conn: 書き込み中の接続
+            table: 参照テーブル名（categories / storage_locations / purchase_locations / operation_types）
+            name: 名前（Noneの場合はNoneを返す）
+            known: 変換済みの名前とIDの辞書（まとめて追加する場合に同じ名前を何度も引かないため）
+
+        Returns:
+            Optional[int]: 参照テーブルのID
+        """
+        if name is None:
+            return None
+        if known is not None and name in known:
+            return known[name]
+        row = conn.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()
+        if row is not None:
+            lookup_id = row[0]
+        else:
+            lookup_id = conn.execute(f"INSERT INTO {table} (name) VALUES (?)", (name,)).lastrowid
+        if known is not None:
+            known[name] = lookup_id
+        return lookup_id
+
+    def _record_usage(self, conn: sqlite3.Connection, product_id: int, quantity: int, history_id: int):
+        """
+        使用を商品の使用ペースの予測に反映（履歴は読み直さない・内部用メソッド）
+
+        Args:
+            conn: 書き込み中の接続
+            product_id: 商品ID
+            quantity: 使用数（正の値）
+            history_id: 追加した履歴のID（記録日時を使う）
+        """
+        used_day = conn.execute(
+            "SELECT julianday(created_at) FROM stock_history WHERE id = ?", (history_id,)
+        ).fetchone()[0]
+        row = conn.execute(
+            "SELECT usage_rate, last_used_day, use_count FROM usage_forecasts WHERE product_id = ?",
+            (product_id,)
+        ).fetchone()
+        state = UsageState(*row) if row else UsageState()
+        conn.execute("""
+            INSERT OR REPLACE INTO usage_forecasts (product_id, usage_rate, last_used_day, use_count)
+            VALUES (?, ?, ?, ?)
+        """, (product_id, *state.record(quantity, used_day)))
+
+    def _history_product_id_range(self) -> tuple:
+        """
+        在庫履歴のある商品IDの最小値と最大値を取得（履歴がなければ (None, None)・内部用メソッド）
+        """
+        with self._get_connection() as conn:
+            # MIN と MAX を別々のサブクエリにすると、どちらもインデックスの端を読むだけで済む
+            return tuple(conn.execute("""
+                SELECT (SELECT MIN(product_id) FROM stock_history),
+                       (SELECT MAX(product_id) FROM stock_history)
+            """).fetchone())
+
+    def _log_read_error(self, message: str, error: sqlite3.Error):
+        """
+        読み込みの失敗をログに記録（中断による失敗はエラーにしない・内部用）
+        """
+        if is_interrupted(error):
+            logger.debug("%s: 中断されました", message)
+        else:
+            logger.error("%s: %s", message, error)
 
     # === 商品CRUD操作（Phase 4 新実装） ===
     
@@ -107,19 +514,19 @@ class DatabaseManager:
             with self._get_connection() as conn:
                 cursor = conn.execute("""
                     INSERT INTO products (
-                        name, brand, size, category, current_stock, min_stock,
-                        purchase_location, price, storage_location, expiry_date
+                        name, brand, size, category_id, current_stock, min_stock,
+                        purchase_location_id, price, storage_location_id, expiry_date
                     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     product.name,
                     product.brand,
                     product.size,
-                    product.category,
+                    self._lookup_id(conn, 'categories', product.category),
                     product.current_stock,
                     product.min_stock,
-                    product.purchase_location,
+                    self._lookup_id(conn, 'purchase_locations', product.purchase_location),
                     product.price,
-                    product.storage_location,
+                    self._lookup_id(conn, 'storage_locations', product.storage_location),
                     product.expiry_date
                 ))
                 
@@ -127,21 +534,72 @@ class DatabaseManager:
                 product.product_id = cursor.lastrowid
                 
                 # トランザクションをコミット
-                conn.commit()
+                self._commit(conn)
                 
-                print(f"✅ 商品追加成功: {product.name} (ID: {product.product_id})")
+                logger.info("商品追加成功: %s (ID: %s)", product.name, product.product_id)
                 return True
                 
         except sqlite3.IntegrityError as e:
-            print(f"❌ 商品追加失敗（整合性エラー）: {e}")
+            logger.warning("商品追加失敗（整合性エラー）: %s", e)
             return False
         except sqlite3.Error as e:
-            print(f"❌ 商品追加失敗（データベースエラー）: {e}")
+            logger.error("商品追加失敗（データベースエラー）: %s", e)
             return False
         except Exception as e:
-            print(f"❌ 商品追加失敗（予期しないエラー）: {e}")
+            logger.exception("商品追加失敗（予期しないエラー）: %s", e)
             return False
-    
+
+    def add_products(self, products: Iterable) -> int:
+        """
+        複数の商品を1トランザクションでまとめて追加（インポート用）
+
+        同じ商品名・ブランドの商品が既に存在する場合はスキップする
+
+        Args:
+            products: 追加する商品オブジェクトのイテラブル
+
+        Returns:
+            int: 実際に追加された件数（失敗時は0）
+        """
+        try:
+            with self._get_connection() as conn:
+                # 参照テーブルのIDは名前ごとに1回だけ引く
+                categories, purchase_locations, storage_locations = {}, {}, {}
+                cursor = conn.executemany("""
+                    INSERT OR IGNORE INTO products (
+                        name, brand, size, category_id, current_stock, min_stock,
+                        purchase_location_id, price, storage_location_id, expiry_date
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    (
+                        product.name,
+                        product.brand,
+                        product.size,
+                        self._lookup_id(conn, 'categories', product.category, categories),
+                        product.current_stock,
+                        product.min_stock,
+                        self._lookup_id(conn, 'purchase_locations', product.purchase_location,
+                                        purchase_locations),
+                        product.price,
+                        self._lookup_id(conn, 'storage_locations', product.storage_location,
+                                        storage_locations),
+                        product.expiry_date
+                    )
+                    for product in products
+                ))
+                # 参照テーブルへの追加を数えないよう、この文で追加した行数を使う
+                added_count = cursor.rowcount
+
+                # トランザクションをコミット
+                self._commit(conn)
+
+                logger.info("商品一括追加成功: %d件", added_count)
+                return added_count
+
+        except sqlite3.Error as e:
+            logger.error("商品一括追加失敗（データベースエラー）: %s", e)
+            return 0
+
     def update_product(self, product) -> bool:
         """
         商品情報をデータベースで更新
@@ -153,51 +611,52 @@ class DatabaseManager:
             bool: 成功時True
         """
         if not hasattr(product, 'product_id') or not product.product_id:
-            print("❌ 商品更新失敗: 商品IDが設定されていません")
+            logger.warning("商品更新失敗: 商品IDが設定されていません")
             return False
         
+        self._invalidate_products([product.product_id])
         try:
             with self._get_connection() as conn:
                 cursor = conn.execute("""
                     UPDATE products SET
-                        name = ?, brand = ?, size = ?, category = ?,
-                        current_stock = ?, min_stock = ?, purchase_location = ?,
-                        price = ?, storage_location = ?, expiry_date = ?,
+                        name = ?, brand = ?, size = ?, category_id = ?,
+                        current_stock = ?, min_stock = ?, purchase_location_id = ?,
+                        price = ?, storage_location_id = ?, expiry_date = ?,
                         updated_at = CURRENT_TIMESTAMP
                     WHERE id = ?
                 """, (
                     product.name,
                     product.brand,
                     product.size,
-                    product.category,
+                    self._lookup_id(conn, 'categories', product.category),
                     product.current_stock,
                     product.min_stock,
-                    product.purchase_location,
+                    self._lookup_id(conn, 'purchase_locations', product.purchase_location),
                     product.price,
-                    product.storage_location,
+                    self._lookup_id(conn, 'storage_locations', product.storage_location),
                     product.expiry_date,
                     product.product_id
                 ))
                 
                 # 更新された行数をチェック
                 if cursor.rowcount == 0:
-                    print(f"❌ 商品更新失敗: ID {product.product_id} の商品が見つかりません")
+                    logger.warning("商品更新失敗: ID %s の商品が見つかりません", product.product_id)
                     return False
                 
                 # トランザクションをコミット
-                conn.commit()
+                self._commit(conn, [product.product_id])
                 
-                print(f"✅ 商品更新成功: {product.name} (ID: {product.product_id})")
+                logger.info("商品更新成功: %s (ID: %s)", product.name, product.product_id)
                 return True
                 
         except sqlite3.IntegrityError as e:
-            print(f"❌ 商品更新失敗（整合性エラー）: {e}")
+            logger.warning("商品更新失敗（整合性エラー）: %s", e)
             return False
         except sqlite3.Error as e:
-            print(f"❌ 商品更新失敗（データベースエラー）: {e}")
+            logger.error("商品更新失敗（データベースエラー）: %s", e)
             return False
         except Exception as e:
-            print(f"❌ 商品更新失敗（予期しないエラー）: {e}")
+            logger.exception("商品更新失敗（予期しないエラー）: %s", e)
             return False
     
     def delete_product(self, product_id: int) -> bool:
@@ -210,6 +669,7 @@ class DatabaseManager:
         Returns:
             bool: 成功時True
         """
+        self._invalidate_products([product_id])
         try:
             with self._get_connection() as conn:
                 # まず商品が存在するかチェック
@@ -217,31 +677,31 @@ class DatabaseManager:
                 product_row = check_cursor.fetchone()
                 
                 if not product_row:
-                    print(f"❌ 商品削除失敗: ID {product_id} の商品が見つかりません")
+                    logger.warning("商品削除失敗: ID %s の商品が見つかりません", product_id)
                     return False
                 
                 product_name = product_row['name']
                 
-                # 関連する在庫履歴を削除
+                # 関連する在庫履歴と使用ペースの予測を削除
                 history_cursor = conn.execute("DELETE FROM stock_history WHERE product_id = ?", (product_id,))
                 deleted_history_count = history_cursor.rowcount
+                conn.execute("DELETE FROM usage_forecasts WHERE product_id = ?", (product_id,))
                 
                 # 商品を削除
                 product_cursor = conn.execute("DELETE FROM products WHERE id = ?", (product_id,))
                 
                 # トランザクションをコミット
-                conn.commit()
+                self._commit(conn, [product_id])
                 
-                print(f"✅ 商品削除成功: {product_name} (ID: {product_id})")
-                if deleted_history_count > 0:
-                    print(f"   関連履歴も削除: {deleted_history_count}件")
+                logger.info("商品削除成功: %s (ID: %s, 関連履歴 %d件)",
+                            product_name, product_id, deleted_history_count)
                 return True
                 
         except sqlite3.Error as e:
-            print(f"❌ 商品削除失敗（データベースエラー）: {e}")
+            logger.error("商品削除失敗（データベースエラー）: %s", e)
             return False
         except Exception as e:
-            print(f"❌ 商品削除失敗（予期しないエラー）: {e}")
+            logger.exception("商品削除失敗（予期しないエラー）: %s", e)
             return False
     
     def product_exists(self, product_id: int) -> bool:
@@ -278,6 +738,7 @@ class DatabaseManager:
         Returns:
             bool: 成功時True
         """
+        self._invalidate_products([stock_data['product_id']])
         try:
             with self._get_connection() as conn:
                 # 商品が存在するかチェック
@@ -288,7 +749,7 @@ class DatabaseManager:
                 product_row = check_cursor.fetchone()
                 
                 if not product_row:
-                    print(f"❌ 在庫更新失敗: ID {stock_data['product_id']} の商品が見つかりません")
+                    logger.warning("在庫更新失敗: ID %s の商品が見つかりません", stock_data['product_id'])
                     return False
                 
                 product_name = product_row['name']
@@ -297,7 +758,7 @@ class DatabaseManager:
                 # 在庫数の妥当性チェック
                 new_stock = stock_data['stock_after']
                 if new_stock < 0:
-                    print(f"❌ 在庫更新失敗: 在庫数が負の値になります ({new_stock})")
+                    logger.warning("在庫更新失敗: 在庫数が負の値になります (%s)", new_stock)
                     return False
                 
                 # 商品の在庫数を更新
@@ -308,53 +769,231 @@ class DatabaseManager:
                 """, (new_stock, stock_data['product_id']))
                 
                 if update_cursor.rowcount == 0:
-                    print(f"❌ 在庫更新失敗: 商品の更新に失敗しました")
+                    logger.warning("在庫更新失敗: 商品の更新に失敗しました")
                     return False
                 
                 # 在庫履歴を記録
                 history_cursor = conn.execute("""
                     INSERT INTO stock_history (
-                        product_id, operation_type, quantity_change, 
+                        product_id, operation_type_id, quantity_change, 
                         stock_after, memo
                     ) VALUES (?, ?, ?, ?, ?)
                 """, (
                     stock_data['product_id'],
-                    stock_data['operation_type'],
+                    self._lookup_id(conn, 'operation_types', stock_data['operation_type']),
                     stock_data['quantity_change'],
                     stock_data['stock_after'],
                     stock_data.get('memo')
                 ))
                 
-                # トランザクションをコミット
-                conn.commit()
+                # 使用は使用ペースの予測に反映（同じトランザクションで商品の状態を1行だけ更新）
+                if stock_data['operation_type'] == 'use':
+                    self._record_usage(conn, stock_data['product_id'],
+                                       -stock_data['quantity_change'], history_cursor.lastrowid)
                 
-                # 成功ログ
-                operation_names = {
-                    'purchase': '購入',
-                    'use': '使用', 
-                    'adjust': '調整'
-                }
-                operation_name = operation_names.get(stock_data['operation_type'], '不明')
-                change = stock_data['quantity_change']
+                # トランザクションをコミット
+                self._commit(conn, [stock_data['product_id']])
                 
-                print(f"✅ 在庫更新成功: {product_name}")
-                print(f"   操作: {operation_name} ({change:+d}個)")
-                print(f"   在庫: {current_stock}個 → {new_stock}個")
-                print(f"   履歴ID: {history_cursor.lastrowid}")
+                # 成功ログ（1行にまとめ、書式の適用は出力する場合のみ）
+                logger.info("在庫更新成功: %s %s %+d個 在庫 %d個 → %d個 (履歴ID: %d)",
+                            product_name, stock_data['operation_type'],
+                            stock_data['quantity_change'], current_stock, new_stock,
+                            history_cursor.lastrowid)
                 
                 return True
                 
         except sqlite3.IntegrityError as e:
-            print(f"❌ 在庫更新失敗（整合性エラー）: {e}")
+            logger.warning("在庫更新失敗（整合性エラー）: %s", e)
             return False
         except sqlite3.Error as e:
-            print(f"❌ 在庫更新失敗（データベースエラー）: {e}")
+            logger.error("在庫更新失敗（データベースエラー）: %s", e)
             return False
         except Exception as e:
-            print(f"❌ 在庫更新失敗（予期しないエラー）: {e}")
+            logger.exception("在庫更新失敗（予期しないエラー）: %s", e)
             return False
     
-    def get_stock_history(self, product_id: int = None, limit: int = 100) -> List:
+    def bulk_add_history(self, events: Iterable[dict], chunk_size: int = 50000) -> Dict[str, Any]:
+        """
+        過去の購入・使用履歴をまとめて取り込み、操作後在庫数を再計算
+
+        履歴はchunk_size件ごとのトランザクションで追加し、最後に対象商品の
+        増減と stock_after をウィンドウ関数（日時順の累積和）で1回だけ再計算する。
+        対象商品の使用ペースの予測も履歴から作り直す。
+        期首在庫は、既存履歴がある商品は最も古い履歴の直前の在庫数、
+        ない商品は取り込み開始時点の現在庫数とする。
+        対象商品の既存履歴の増減と stock_after も合わせて再計算される。
+        数量の意味は calculate_stock_change と同じで、調整は調整後の在庫数（棚卸しの結果）として扱い、
+        記録される増減はその時点の在庫数との差になる。在庫を超える使用は在庫数が0になるところまでの減少として記録する。
+        商品ID・操作種別・数量・日時が欠けているか変換できない履歴、数量が負の履歴と、
+        存在しない商品の履歴はスキップ件数として数える。
+
+        Args:
+            events: 取り込む履歴（辞書）のイテラブル
+                - product_id: 商品ID
+                - created_at: 操作日時（datetime または 'YYYY-MM-DD HH:MM:SS'）
+                - operation_type: 操作種別 ('purchase', 'use', 'adjust')
+                - quantity: 数量（0以上。購入・使用は増減数、調整は調整後の在庫数）
+                - memo: メモ（任意）
+            chunk_size: 1トランザクションで追加する件数
+
+        Returns:
+            Dict[str, Any]: 追加件数 (inserted)、スキップ件数 (skipped)、
+                対象商品数 (products)、在庫を超える減少を在庫分に減らした履歴数 (clamped_rows)
+        """
+        signs = {'purchase': 1, 'use': -1, 'adjust': 0}
+        operation_type_ids = {}
+        result = {'inserted': 0, 'skipped': 0, 'products': 0, 'clamped_rows': 0}
+        known_ids = set()
+        missing_ids = set()
+
+        conn = self._get_connection()
+        try:
+            # 大量の索引更新と再計算に備えてページキャッシュを広げる（64MB）
+            conn.execute("PRAGMA cache_size = -65536")
+            # 対象商品と期首在庫を記録する一時テーブル
+            conn.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS ingest_products (
+                    product_id INTEGER PRIMARY KEY,
+                    opening_stock INTEGER NOT NULL
+                )
+            """)
+            conn.execute("DELETE FROM temp.ingest_products")
+            # 再計算で値が変わる履歴（ウィンドウ関数の計算を1回で済ませるため一度書き出す）
+            conn.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS ingest_stock (
+                    id INTEGER PRIMARY KEY,
+                    quantity_change INTEGER NOT NULL,
+                    stock_after INTEGER NOT NULL,
+                    clamped INTEGER NOT NULL
+                )
+            """)
+            conn.execute("DELETE FROM temp.ingest_stock")
+            conn.commit()
+
+            def flush(chunk):
+                # 初めて出てきた商品の期首在庫を履歴追加より前に記録
+                new_ids = {row[0] for row in chunk} - known_ids - missing_ids
+                conn.executemany("""
+                    INSERT OR IGNORE INTO temp.ingest_products (product_id, opening_stock)
+                    SELECT p.id, COALESCE(
+                        (SELECT h.stock_after - h.quantity_change
+                         FROM stock_history h
+                         WHERE h.product_id = p.id
+                         ORDER BY h.created_at, h.id
+                         LIMIT 1),
+                        p.current_stock
+                    )
+                    FROM products p
+                    WHERE p.id = ?
+                """, ((product_id,) for product_id in new_ids))
+                for product_id in new_ids:
+                    if conn.execute("SELECT 1 FROM temp.ingest_products WHERE product_id = ?",
+                                    (product_id,)).fetchone():
+                        known_ids.add(product_id)
+                    else:
+                        missing_ids.add(product_id)
+
+                rows = [row for row in chunk if row[0] in known_ids]
+                conn.executemany("""
+                    INSERT INTO stock_history (
+                        product_id, operation_type_id, quantity_change,
+                        stock_after, memo, created_at
+                    ) VALUES (?, ?, ?, ?, ?, ?)
+                """, rows)
+                self._commit(conn)
+                result['inserted'] += len(rows)
+                result['skipped'] += len(chunk) - len(rows)
+
+            chunk = []
+            try:
+                for event in events:
+                    try:
+                        product_id = int(event['product_id'])
+                        quantity = int(event['quantity'])
+                        operation_type = event['operation_type']
+                        created_at = event['created_at']
+                        memo = event.get('memo')
+                    except (KeyError, TypeError, ValueError, AttributeError):
+                        result['skipped'] += 1
+                        continue
+                    if isinstance(created_at, datetime):
+                        created_at = created_at.strftime("%Y-%m-%d %H:%M:%S")
+                    if (operation_type not in signs or not isinstance(created_at, str) or not created_at
+                            or quantity < 0):
+                        result['skipped'] += 1
+                        continue
+                    # 増減と操作後在庫数は最後に再計算する（調整は調整後の在庫数を stock_after に入れておく）
+                    chunk.append((
+                        product_id,
+                        self._lookup_id(conn, 'operation_types', operation_type, operation_type_ids),
+                        signs[operation_type] * quantity,
+                        quantity if operation_type == 'adjust' else 0,
+                        None if memo is None else str(memo),
+                        created_at
+                    ))
+                    if len(chunk) >= chunk_size:
+                        flush(chunk)
+                        chunk = []
+                if chunk:
+                    flush(chunk)
+            finally:
+                # 途中で失敗しても、コミット済みの分の在庫数は必ず再計算する
+                conn.rollback()
+                if known_ids:
+                    conn.execute(INGEST_RECOMPUTE_STOCK_SQL + """
+                        INSERT INTO temp.ingest_stock (id, quantity_change, stock_after, clamped)
+                        SELECT id, quantity_change, stock_after,
+                               NOT is_stocktake AND quantity_change != recorded_change
+                        FROM recomputed
+                        WHERE stock_after != recorded_stock OR quantity_change != recorded_change
+                    """)
+                    result['clamped_rows'] = conn.execute(
+                        "SELECT COUNT(*) FROM temp.ingest_stock WHERE clamped"
+                    ).fetchone()[0]
+                    conn.execute("""
+                        UPDATE stock_history
+                        SET stock_after = s.stock_after,
+                            quantity_change = s.quantity_change
+                        FROM temp.ingest_stock s
+                        WHERE stock_history.id = s.id
+                    """)
+                    conn.execute("""
+                        UPDATE products
+                        SET current_stock = (
+                                SELECT h.stock_after
+                                FROM stock_history h
+                                WHERE h.product_id = products.id
+                                ORDER BY h.created_at DESC, h.id DESC
+                                LIMIT 1
+                            ),
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE id IN (SELECT product_id FROM temp.ingest_products)
+                    """)
+                    # 過去の使用が入るため、対象商品の使用ペースは履歴から作り直す
+                    _rebuild_usage_forecasts(conn, "SELECT product_id FROM temp.ingest_products")
+                    self._commit(conn, known_ids)
+                conn.execute("DROP TABLE IF EXISTS temp.ingest_products")
+                conn.execute("DROP TABLE IF EXISTS temp.ingest_stock")
+
+            result['products'] = len(known_ids)
+            logger.info("履歴一括取り込み成功: %d件 (商品%d件, スキップ%d件)",
+                        result['inserted'], result['products'], result['skipped'])
+            if missing_ids:
+                logger.warning("存在しない商品ID: %s", sorted(missing_ids)[:10])
+            if result['clamped_rows']:
+                logger.warning("在庫を超える減少を在庫分に減らした履歴: %d件", result['clamped_rows'])
+            return result
+
+        except sqlite3.Error as e:
+            logger.error("履歴一括取り込み失敗（データベースエラー）: %s", e)
+            result['products'] = len(known_ids)
+            result['error'] = str(e)
+            return result
+        finally:
+            conn.close()
+            self._invalidate_products(known_ids)
+
+    def get_stock_history(self, product_id: int = None, limit: int = 100) -> List[StockHistory]:
         """
         在庫履歴を取得
         
@@ -363,47 +1002,65 @@ class DatabaseManager:
             limit: 取得件数の上限
             
         Returns:
-            List: 在庫履歴のリスト
+            List[StockHistory]: 在庫履歴のリスト（新しい順）
         """
         try:
-            with self._get_connection() as conn:
-                if product_id:
-                    cursor = conn.execute("""
-                        SELECT h.*, p.name as product_name
-                        FROM stock_history h
-                        JOIN products p ON h.product_id = p.id
-                        WHERE h.product_id = ?
-                        ORDER BY h.created_at DESC
-                        LIMIT ?
-                    """, (product_id, limit))
-                else:
-                    cursor = conn.execute("""
-                        SELECT h.*, p.name as product_name
-                        FROM stock_history h
-                        JOIN products p ON h.product_id = p.id
-                        ORDER BY h.created_at DESC
-                        LIMIT ?
-                    """, (limit,))
-                
-                rows = cursor.fetchall()
-                
-                # StockHistoryオブジェクトのリストに変換を試行
-                try:
-                    histories = create_history_list_from_rows(rows)
-                except:
-                    # 変換に失敗した場合は、そのまま返す
-                    histories = rows
-                
-                print(f"✅ 履歴取得成功: {len(histories)}件")
-                return histories
+            histories = list(self.iter_stock_history(product_id, limit=limit))
+            logger.debug("履歴取得成功: %d件", len(histories))
+            return histories
                 
         except sqlite3.Error as e:
-            print(f"❌ 履歴取得失敗: {e}")
+            self._log_read_error("履歴取得失敗", e)
             return []
         except Exception as e:
-            print(f"❌ 履歴取得失敗（予期しないエラー）: {e}")
+            logger.exception("履歴取得失敗（予期しないエラー）: %s", e)
             return []
     
+    def iter_stock_history(self, product_id: int = None, limit: int = None,
+                           batch_size: int = 500) -> Iterator[StockHistory]:
+        """
+        在庫履歴をStockHistoryオブジェクトとして1件ずつ取得（全件をメモリに載せない）
+        
+        読み進めた分だけ fetchmany で取り出すため、件数が多くても使用メモリは batch_size 件分で一定。
+        途中でやめる場合は close() するか、最後まで読むと接続が閉じられる。
+        get_stock_history と違い、データベースのエラーは空のリストにせずそのまま送出する。
+        
+        Args:
+            product_id: 商品ID（指定時は該当商品のみ）
+            limit: 取得件数の上限（省略時・負の値は上限なし）
+            batch_size: 一度に読み込む行数
+            
+        Yields:
+            StockHistory: 在庫履歴（新しい順）
+        """
+        if limit is None:
+            limit = -1
+        if product_id:
+            sql = """
+                SELECT h.id, h.product_id, h.operation_type, h.quantity_change,
+                       h.stock_after, h.memo, h.created_at
+                FROM stock_history_details h
+                JOIN products p ON h.product_id = p.id
+                WHERE h.product_id = ?
+                ORDER BY h.created_at DESC, h.id DESC
+                LIMIT ?
+            """
+            params = (product_id, limit)
+        else:
+            sql = """
+                SELECT h.id, h.product_id, h.operation_type, h.quantity_change,
+                       h.stock_after, h.memo, h.created_at
+                FROM stock_history_details h
+                JOIN products p ON h.product_id = p.id
+                ORDER BY h.created_at DESC, h.id DESC
+                LIMIT ?
+            """
+            params = (limit,)
+        
+        for rows in self._iter_batches(sql, params, batch_size, as_tuples=True):
+            # 列の順番は HISTORY_COLUMNS と同じ
+            yield from map(StockHistory.from_row_tuple, rows)
+    
     def get_stock_statistics(self, product_id: int) -> Dict[str, Any]:
         """
         商品の在庫統計情報を取得
@@ -416,16 +1073,17 @@ class DatabaseManager:
         """
         try:
             with self._get_connection() as conn:
-                # 基本統計
+                # 基本統計（operation_type_id は 1: purchase, 2: use, 3: adjust）
+                # 件数と最初の日時はチェックポイント行にまとめた分も含める
                 cursor = conn.execute("""
                     SELECT 
-                        COUNT(*) as total_operations,
-                        SUM(CASE WHEN operation_type = 'purchase' THEN 1 ELSE 0 END) as purchase_count,
-                        SUM(CASE WHEN operation_type = 'use' THEN 1 ELSE 0 END) as use_count,
-                        SUM(CASE WHEN operation_type = 'adjust' THEN 1 ELSE 0 END) as adjust_count,
-                        SUM(CASE WHEN operation_type = 'purchase' THEN quantity_change ELSE 0 END) as total_purchased,
-                        SUM(CASE WHEN operation_type = 'use' THEN ABS(quantity_change) ELSE 0 END) as total_used,
-                        MIN(created_at) as first_operation,
+                        COALESCE(SUM(event_count), 0) as total_operations,
+                        SUM(CASE WHEN operation_type_id = 1 THEN event_count ELSE 0 END) as purchase_count,
+                        SUM(CASE WHEN operation_type_id = 2 THEN event_count ELSE 0 END) as use_count,
+                        SUM(CASE WHEN operation_type_id = 3 THEN event_count ELSE 0 END) as adjust_count,
+                        SUM(CASE WHEN operation_type_id = 1 THEN quantity_change ELSE 0 END) as total_purchased,
+                        SUM(CASE WHEN operation_type_id = 2 THEN ABS(quantity_change) ELSE 0 END) as total_used,
+                        MIN(COALESCE(period_start, created_at)) as first_operation,
                         MAX(created_at) as last_operation
                     FROM stock_history 
                     WHERE product_id = ?
@@ -457,7 +1115,7 @@ class DatabaseManager:
                     }
                     
         except sqlite3.Error as e:
-            print(f"❌ 統計取得失敗: {e}")
+            self._log_read_error("統計取得失敗", e)
             return {}
     
     # === 既存メソッド（変更なし） ===
@@ -476,16 +1134,16 @@ class DatabaseManager:
                            current_stock, min_stock, purchase_location, 
                            price, storage_location, expiry_date,
                            created_at, updated_at                  
-                    FROM products 
+                    FROM product_details 
                     ORDER BY name
                 """)
                 products = cursor.fetchall()
                 
-            print(f"商品取得完了: {len(products)}件")
+            logger.debug("商品取得完了: %d件", len(products))
             return products
             
         except sqlite3.Error as e:
-            print(f"商品取得エラー: {e}")
+            self._log_read_error("商品取得エラー", e)
             return []
     
     def get_product_by_id(self, product_id: int) -> Optional[sqlite3.Row]:
@@ -505,20 +1163,18 @@ class DatabaseManager:
                            current_stock, min_stock, purchase_location, 
                            price, storage_location, expiry_date,
                            created_at, updated_at
-                    FROM products 
+                    FROM product_details 
                     WHERE id = ?
                 """, (product_id,))
                 product = cursor.fetchone()
                 
-            if product:
-                print(f"商品取得: {product['name']}")
-            else:
-                print(f"商品が見つかりません: ID={product_id}")
+            if not product:
+                logger.debug("商品が見つかりません: ID=%s", product_id)
                 
             return product
 
         except sqlite3.Error as e:
-            print(f"商品取得エラー: {e}")
+            self._log_read_error("商品取得エラー", e)
             return None  
 
     def get_products_as_objects(self) -> list:
@@ -530,35 +1186,24 @@ class DatabaseManager:
         """
         try:
             with self._get_connection() as conn:
-                cursor = conn.execute("""
+                # 列の順番は PRODUCT_COLUMNS と同じ（行を直接 Product にする）
+                cursor = conn.cursor()
+                cursor.row_factory = product_row_factory
+                cursor.execute("""
                     SELECT id, name, brand, size, category, 
                            current_stock, min_stock, purchase_location, 
                            price, storage_location, expiry_date,
                            created_at, updated_at
-                    FROM products 
+                    FROM product_details 
                     ORDER BY name
                 """)
-                rows = cursor.fetchall()
-                
-            try:
-                products = create_product_list_from_rows(rows)
-            except:
-                # 変換に失敗した場合は、基本的なオブジェクトを作成
-                products = []
-                for row in rows:
-                    try:
-                        products.append(Product(data=row))
-                    except:
-                        # 最終手段として辞書から直接作成
-                        product_dict = dict(row)
-                        product_dict['product_id'] = product_dict.get('id')
-                        products.append(Product(**product_dict))
+                products = cursor.fetchall()
             
-            print(f"商品オブジェクト取得完了: {len(products)}件")
+            logger.debug("商品オブジェクト取得完了: %d件", len(products))
             return products
             
         except sqlite3.Error as e:
-            print(f"商品オブジェクト取得エラー: {e}")
+            self._log_read_error("商品オブジェクト取得エラー", e)
             return []
     
     def get_product_object_by_id(self, product_id: int) -> Optional:
@@ -568,42 +1213,769 @@ class DatabaseManager:
         Args:
             product_id: 商品ID
             
+        同じ商品は product_cache から同じオブジェクトを返す（SQLiteを読まない）。
+        返したオブジェクトを書き換えた場合は update_product で保存すること
+        （保存すると成否にかかわらずキャッシュから外れる）。
+        
         Returns:
             Optional: 商品オブジェクト（見つからない場合はNone）
         """
+        cache = self.product_cache
+        if cache is not None:
+            product = cache.get(product_id)
+            if product is not None:
+                return product
+            # 読み込みの間に書き込まれた商品は覚えない
+            generation = cache.generation
+        
         try:
             with self._get_connection() as conn:
-                cursor = conn.execute("""
+                cursor = conn.cursor()
+                cursor.row_factory = product_row_factory
+                cursor.execute("""
                     SELECT id, name, brand, size, category, 
                            current_stock, min_stock, purchase_location, 
                            price, storage_location, expiry_date,
                            created_at, updated_at
-                    FROM products 
+                    FROM product_details 
                     WHERE id = ?
                 """, (product_id,))
-                row = cursor.fetchone()
+                product = cursor.fetchone()
                 
-            if row:
-                try:
-                    product = Product(data=row)
-                except:
-                    # 変換に失敗した場合は、辞書から直接作成
-                    product_dict = dict(row)
-                    product_dict['product_id'] = product_dict.get('id')
-                    product = Product(**product_dict)
-                
-                print(f"商品オブジェクト取得: {product.name}")
-                return product
-            else:
-                print(f"商品が見つかりません: ID={product_id}")
-                return None
+            if product is None:
+                logger.debug("商品が見つかりません: ID=%s", product_id)
+            elif cache is not None:
+                product = cache.put(product, generation)
+            return product
                 
         except sqlite3.Error as e:
-            print(f"商品オブジェクト取得エラー: {e}")
+            self._log_read_error("商品オブジェクト取得エラー", e)
             return None
 
-# テスト実行（このファイルが直接実行された場合）
+    # === バッチ処理・CLI向け操作 ===
+
+    def iter_products(self, search: str = None, category: str = None,
+                      batch_size: int = 500) -> Iterator[Product]:
+        """
+        商品をProductオブジェクトとして1件ずつ取得（全件をメモリに載せない）
+
+        Args:
+            search: 商品名またはブランド名の部分一致検索文字列
+            category: カテゴリ（指定時は該当カテゴリのみ）
+            batch_size: 一度に読み込む行数
+
+        Yields:
+            Product: 商品オブジェクト（商品名順）
+        """
+        conditions = []
+        params = []
+        if search:
+            conditions.append("(name LIKE ? OR brand LIKE ?)")
+            params.extend([f"%{search}%", f"%{search}%"])
+        if category:
+            # 参照テーブルのIDで絞り込む（整数の比較でインデックスを使う）
+            conditions.append("category_id = (SELECT id FROM categories WHERE name = ?)")
+            params.append(category)
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        for rows in self._iter_batches(f"""
+            SELECT id, name, brand, size, category,
+                   current_stock, min_stock, purchase_location,
+                   price, storage_location, expiry_date,
+                   created_at, updated_at
+            FROM product_details
+            {where_clause}
+            ORDER BY name
+        """, params, batch_size, as_tuples=True):
+            # 列の順番は PRODUCT_COLUMNS と同じ
+            yield from map(Product.from_row_tuple, rows)
+
+    def _iter_batches(self, sql: str, params=(), batch_size: int = 1000,
+                      as_tuples: bool = False) -> Iterator[List[sqlite3.Row]]:
+        """
+        クエリ結果をfetchmanyで少しずつ取得（内部用メソッド）
+
+        Args:
+            sql: 実行するSELECT文
+            params: パラメータ
+            batch_size: 一度に読み込む行数
+            as_tuples: sqlite3.Rowではなくタプルで取得する場合True（数値処理向け）
+
+        Yields:
+            List[sqlite3.Row]: 最大batch_size件の行
+        """
+        conn = self._get_connection()
+        if as_tuples:
+            conn.row_factory = None
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    # === エクスポート用の逐次取得 ===
+
+    def iter_history_snapshot_batches(self, after_id: int = 0,
+                                      batch_size: int = 50000) -> Iterator[List[tuple]]:
+        """
+        在庫履歴を数値列のタプルとして少しずつ取得（列指向スナップショット用）
+
+        Args:
+            after_id: このIDより後の履歴のみ取得（差分更新用）
+            batch_size: 一度に読み込む行数
+
+        Yields:
+            List[tuple]: (履歴ID, 商品ID, UNIX時刻, 操作コード, 数量変化) のタプル
+                操作コードは purchase=1, use=2, adjust=3, その他=0
+        """
+        return self._iter_batches("""
+            SELECT id,
+                   product_id,
+                   COALESCE(CAST(strftime('%s', created_at) AS INTEGER), 0),
+                   CASE WHEN operation_type_id <= 3 THEN operation_type_id ELSE 0 END,
+                   quantity_change
+            FROM stock_history
+            WHERE id > ?
+            ORDER BY id
+        """, (after_id,), batch_size, as_tuples=True)
+
+    def count_products(self) -> int:
+        """
+        商品の件数を取得
+
+        Returns:
+            int: 商品数
+        """
+        with self._get_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def count_stock_history(self, product_id: int = None, through_id: int = None) -> int:
+        """
+        在庫履歴の件数を取得
+
+        Args:
+            product_id: 商品ID（指定時は該当商品のみ）
+            through_id: 履歴ID（指定時はこのID以下の履歴のみ・列指向スナップショットの確認用）
+
+        Returns:
+            int: 履歴件数
+        """
+        with self._get_connection() as conn:
+            if product_id:
+                cursor = conn.execute(
+                    "SELECT COUNT(*) FROM stock_history WHERE product_id = ?", (product_id,)
+                )
+            elif through_id is not None:
+                cursor = conn.execute("SELECT COUNT(*) FROM stock_history WHERE id <= ?", (through_id,))
+            else:
+                cursor = conn.execute("SELECT COUNT(*) FROM stock_history")
+            return cursor.fetchone()[0]
+
+    def iter_product_tuple_batches(self, batch_size: int = 50000) -> Iterator[List[tuple]]:
+        """
+        全商品を商品名順にタプルで少しずつ取得（列指向の ProductStore 用）
+
+        Args:
+            batch_size: 一度に読み込む行数
+
+        Yields:
+            List[tuple]: PRODUCT_COLUMNS の順に並んだ値のタプル
+        """
+        return self._iter_batches("""
+            SELECT id, name, brand, size, category,
+                   current_stock, min_stock, purchase_location,
+                   price, storage_location, expiry_date,
+                   created_at, updated_at
+            FROM product_details
+            ORDER BY name
+        """, (), batch_size, as_tuples=True)
+
+    def iter_product_row_batches(self, batch_size: int = 1000) -> Iterator[List[sqlite3.Row]]:
+        """
+        全商品の行をID順に少しずつ取得（エクスポート用）
+
+        Args:
+            batch_size: 一度に読み込む行数
+
+        Yields:
+            List[sqlite3.Row]: 商品データの行
+        """
+        return self._iter_batches("""
+            SELECT id, name, brand, size, category,
+                   current_stock, min_stock, purchase_location,
+                   price, storage_location, expiry_date,
+                   created_at, updated_at
+            FROM product_details
+            ORDER BY id
+        """, (), batch_size)
+
+    def iter_history_row_batches(self, product_id: int = None,
+                                 batch_size: int = 1000) -> Iterator[List[sqlite3.Row]]:
+        """
+        在庫履歴の行を記録順に少しずつ取得（エクスポート用）
+        商品を指定した場合は日時順（複合インデックスの並びのまま読み出す）
+
+        Args:
+            product_id: 商品ID（指定時は該当商品のみ）
+            batch_size: 一度に読み込む行数
+
+        Yields:
+            List[sqlite3.Row]: 在庫履歴の行（商品名付き）
+        """
+        if product_id:
+            return self._iter_batches("""
+                SELECT h.id, h.product_id, p.name as product_name, h.operation_type,
+                       h.quantity_change, h.stock_after, h.memo, h.created_at
+                FROM stock_history_details h
+                JOIN products p ON h.product_id = p.id
+                WHERE h.product_id = ?
+                ORDER BY h.created_at, h.id
+            """, (product_id,), batch_size)
+        return self._iter_batches("""
+            SELECT h.id, h.product_id, p.name as product_name, h.operation_type,
+                   h.quantity_change, h.stock_after, h.memo, h.created_at
+            FROM stock_history_details h
+            JOIN products p ON h.product_id = p.id
+            ORDER BY h.id
+        """, (), batch_size)
+
+    def iter_statistics_row_batches(self, batch_size: int = 1000) -> Iterator[List[sqlite3.Row]]:
+        """
+        商品ごとの在庫統計を少しずつ取得（エクスポート用）
+
+        Args:
+            batch_size: 一度に読み込む行数
+
+        Yields:
+            List[sqlite3.Row]: 商品ごとの統計行
+        """
+        # operation_type_id は 1: purchase, 2: use, 3: adjust（件数はチェックポイント行にまとめた分も含める）
+        return self._iter_batches("""
+            SELECT
+                p.id as product_id,
+                p.name,
+                p.category,
+                p.current_stock,
+                COALESCE(SUM(h.event_count), 0) as total_operations,
+                COALESCE(SUM(CASE WHEN h.operation_type_id = 1 THEN h.event_count ELSE 0 END), 0) as purchase_count,
+                COALESCE(SUM(CASE WHEN h.operation_type_id = 2 THEN h.event_count ELSE 0 END), 0) as use_count,
+                COALESCE(SUM(CASE WHEN h.operation_type_id = 3 THEN h.event_count ELSE 0 END), 0) as adjust_count,
+                COALESCE(SUM(CASE WHEN h.operation_type_id = 1 THEN h.quantity_change ELSE 0 END), 0) as total_purchased,
+                COALESCE(SUM(CASE WHEN h.operation_type_id = 2 THEN ABS(h.quantity_change) ELSE 0 END), 0) as total_used,
+                MIN(COALESCE(h.period_start, h.created_at)) as first_operation,
+                MAX(h.created_at) as last_operation
+            FROM product_details p
+            LEFT JOIN stock_history h ON h.product_id = p.id
+            GROUP BY p.id
+            ORDER BY p.id
+        """, (), batch_size)
+
+    def get_stock_summary(self) -> Dict[str, Any]:
+        """
+        在庫全体の集計情報を取得（レポート用）
+
+        Returns:
+            Dict[str, Any]: 商品数・在庫切れ数・在庫少数・期限切れ数・在庫金額
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute("""
+                    SELECT
+                        COUNT(*) as total_products,
+                        SUM(CASE WHEN current_stock <= 0 THEN 1 ELSE 0 END) as out_of_stock,
+                        SUM(CASE WHEN current_stock > 0 AND current_stock <= min_stock
+                                 THEN 1 ELSE 0 END) as low_stock,
+                        SUM(CASE WHEN expiry_date IS NOT NULL AND expiry_date != ''
+                                  AND expiry_date <= date('now', 'localtime')
+                                 THEN 1 ELSE 0 END) as expired,
+                        SUM(current_stock * COALESCE(price, 0)) as stock_value
+                    FROM products
+                """)
+                summary = cursor.fetchone()
+
+            return {
+                'total_products': summary['total_products'],
+                'out_of_stock': summary['out_of_stock'] or 0,
+                'low_stock': summary['low_stock'] or 0,
+                'expired': summary['expired'] or 0,
+                'stock_value': summary['stock_value'] or 0.0
+            }
+
+        except sqlite3.Error as e:
+            self._log_read_error("集計取得失敗", e)
+            return {}
+
+    # === 使用ペースの予測 ===
+
+    def get_usage_forecasts(self) -> Dict[int, Dict[str, Any]]:
+        """
+        使用ペースが分かっている全商品の残り日数と在庫がなくなる予測日を1回のクエリで取得
+
+        履歴は読まず、使用のたびに更新している usage_forecasts と現在在庫から求める。
+
+        Returns:
+            Dict[int, Dict[str, Any]]: 商品IDごとの
+                usage_rate（1日あたりの使用数）、days_of_cover（残り日数）、
+                depletion_date（在庫がなくなる予測日 'YYYY-MM-DD'）、use_count（使用回数）
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute("""
+                    SELECT f.product_id,
+                           f.usage_rate,
+                           MAX(p.current_stock, 0) / f.usage_rate AS days_of_cover,
+                           date(julianday('now', 'localtime') + MAX(p.current_stock, 0) / f.usage_rate)
+                               AS depletion_date,
+                           f.use_count
+                    FROM usage_forecasts f
+                    JOIN products p ON p.id = f.product_id
+                    WHERE f.usage_rate > 0
+                """)
+                cursor.row_factory = None
+                return {
+                    product_id: {
+                        'usage_rate': usage_rate,
+                        'days_of_cover': days_of_cover,
+                        'depletion_date': depletion_date,
+                        'use_count': use_count
+                    }
+                    for product_id, usage_rate, days_of_cover, depletion_date, use_count in cursor
+                }
+
+        except sqlite3.Error as e:
+            self._log_read_error("使用ペースの予測の取得失敗", e)
+            return {}
+
+    def rebuild_usage_forecasts(self) -> bool:
+        """
+        全商品の使用ペースの予測を使用履歴から作り直す（設定を変えた場合など）
+
+        Returns:
+            bool: 成功時True
+        """
+        try:
+            with self._get_connection() as conn:
+                _rebuild_usage_forecasts(conn)
+                self._commit(conn)
+                count = conn.execute("SELECT COUNT(*) FROM usage_forecasts").fetchone()[0]
+            logger.info("使用ペースの予測を作り直しました: %d件", count)
+            return True
+
+        except sqlite3.Error as e:
+            logger.error("使用ペースの予測の作り直し失敗: %s", e)
+            return False
+
+    # === 買い物リスト ===
+
+    def generate_shopping_list(self, days: int = SHOPPING_LIST_DAYS) -> Dict[str, Any]:
+        """
+        買い物リストを1回のクエリで作成（購入場所ごと）
+
+        在庫少・在庫切れの商品と、使用ペースから days 日以内に在庫がなくなる予測の商品を載せる。
+        購入数は「最小在庫 + days 日分の予測使用数 - 現在在庫」の切り上げ（1個以上）、
+        概算金額は 購入数 × 価格（価格が未設定・0円の商品は含めず、price もNoneにする）。
+
+        結果は同じ日数・同じ日付の間は覚えておき、在庫や商品が書き込まれるまで
+        （他のプロセスの書き込みは PRAGMA data_version で検出する）
+        データベースを読まずに同じ辞書を返す（変更しないこと）。
+
+        Args:
+            days: 在庫がなくなる予測を見る日数
+
+        Returns:
+            Dict[str, Any]: days、generated_at（作成日時）、
+                groups（購入場所ごとの purchase_location（未設定はNone）・items・estimated_cost のリスト、購入場所順）、
+                item_count（商品数）、estimated_cost（概算金額の合計）、unpriced_count（価格未設定の商品数）。
+                items の各要素は product_id・name・brand・size・current_stock・min_stock・
+                days_of_cover（予測がない商品はNone）・suggested_quantity・price・estimated_cost。
+                失敗時は空の辞書
+        """
+        data_version = self._data_version()
+        key = (days, date.today(), data_version)
+        with self._shopping_list_lock:
+            shopping_list = self._shopping_lists.get(key)
+            if shopping_list is not None:
+                return shopping_list
+            generation = self._shopping_list_generation
+
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute("""
+                    WITH needed AS (
+                        SELECT p.id, p.name, p.brand, p.size, NULLIF(pl.name, '') AS purchase_location,
+                               p.current_stock, p.min_stock, NULLIF(p.price, 0) AS price,
+                               MAX(p.current_stock, 0) / f.usage_rate AS days_of_cover,
+                               p.min_stock + COALESCE(f.usage_rate, 0) * :days - p.current_stock AS shortfall
+                        FROM products p
+                        LEFT JOIN usage_forecasts f ON f.product_id = p.id
+                        LEFT JOIN purchase_locations pl ON pl.id = p.purchase_location_id
+                        WHERE p.current_stock <= p.min_stock
+                           OR p.current_stock <= f.usage_rate * :days
+                    )
+                    SELECT id, name, brand, size, purchase_location, current_stock, min_stock,
+                           days_of_cover,
+                           MAX(1, CAST(shortfall AS INTEGER) + (shortfall > CAST(shortfall AS INTEGER)))
+                               AS suggested_quantity,
+                           price
+                    FROM needed
+                    ORDER BY purchase_location, name
+                """, {'days': days})
+                rows = cursor.fetchall()
+
+        except sqlite3.Error as e:
+            self._log_read_error("買い物リスト作成失敗", e)
+            return {}
+
+        groups = []
+        for row in rows:
+            item = dict(row)
+            purchase_location = item.pop('purchase_location')
+            item['product_id'] = item.pop('id')
+            item['estimated_cost'] = None if item['price'] is None else item['suggested_quantity'] * item['price']
+            if not groups or groups[-1]['purchase_location'] != purchase_location:
+                groups.append({'purchase_location': purchase_location, 'items': [], 'estimated_cost': 0.0})
+            groups[-1]['items'].append(item)
+            groups[-1]['estimated_cost'] += item['estimated_cost'] or 0.0
+
+        shopping_list = {
+            'days': days,
+            'generated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'groups': groups,
+            'item_count': len(rows),
+            'estimated_cost': sum(group['estimated_cost'] for group in groups),
+            'unpriced_count': sum(1 for row in rows if row['price'] is None)
+        }
+        # 作成中に書き込みがあった場合や、変更を確認できない場合は古い可能性があるため覚えない
+        with self._shopping_list_lock:
+            if data_version is not None and generation == self._shopping_list_generation:
+                if any(cached_key[2] != data_version for cached_key in self._shopping_lists):
+                    self._shopping_lists.clear()
+                self._shopping_lists[key] = shopping_list
+        logger.debug("買い物リスト作成: %d件", len(rows))
+        return shopping_list
+
+    # === 在庫履歴の整合性・圧縮 ===
+
+    def iter_stock_inconsistencies(self, batch_size: int = 200) -> Iterator[List[Dict[str, Any]]]:
+        """
+        在庫履歴の stock_after の連鎖の切れ目と、現在庫との食い違いを商品IDの範囲ごとに検出
+
+        商品ごとに日時順（同じ日時は履歴ID順）に並べ、ウィンドウ関数（LAG / LEAD）で
+        「1件前の stock_after + 今回の quantity_change」と今回の stock_after を比べる。
+        最後の履歴の stock_after は products.current_stock と比べる。
+        最初の履歴は期首在庫が分からないため比べず、履歴のない商品も対象外。
+
+        batch_size 個分の商品IDの範囲ごとに接続を開いて読み切ってから返すため、
+        呼び出し側は次のバッチまでの間に書き込める（修復用）。
+        メモリ使用量は1範囲で検出した件数までで、履歴の件数によらない。
+
+        Args:
+            batch_size: 1回のクエリで調べる商品IDの幅（1回のクエリが遅いクエリの記録に残らない程度にする）
+
+        Yields:
+            List[Dict[str, Any]]: 検出した食い違い（見つからなかった範囲は返さない）
+                - kind: 'broken_chain'（連鎖の切れ目）または 'stock_mismatch'（現在庫との食い違い）
+                - history_id, product_id, created_at, quantity_change: 対象の履歴
+                - stock_after: 記録されている操作後在庫数
+                - expected_stock: 連鎖から求めた操作後在庫数（現在庫との食い違いは現在庫）
+                - unrecorded_change: 履歴に記録されていない増減（この分の調整で直る）
+                - previous_created_at: 1件前の履歴の日時（現在庫との食い違いはNone）
+        """
+        first_id, last_id = self._history_product_id_range()
+        if first_id is None:
+            return
+
+        for range_start in range(first_id, last_id + 1, batch_size):
+            conn = self._get_connection()
+            try:
+                rows = conn.execute("""
+                    SELECT id, product_id, created_at, quantity_change, stock_after,
+                           previous_stock, previous_created_at, current_stock
+                    FROM (
+                        SELECT h.id, h.product_id, h.created_at, h.quantity_change, h.stock_after,
+                               LAG(h.stock_after) OVER w AS previous_stock,
+                               LAG(h.created_at) OVER w AS previous_created_at,
+                               CASE WHEN LEAD(h.id) OVER w IS NULL THEN (
+                                   SELECT p.current_stock FROM products p WHERE p.id = h.product_id
+                               ) END AS current_stock
+                        FROM stock_history h
+                        WHERE h.product_id BETWEEN ? AND ?
+                        WINDOW w AS (PARTITION BY h.product_id ORDER BY h.created_at, h.id)
+                    )
+                    WHERE stock_after != previous_stock + quantity_change
+                       OR stock_after != current_stock
+                    ORDER BY product_id, created_at, id
+                """, (range_start, range_start + batch_size - 1)).fetchall()
+            finally:
+                conn.close()
+
+            issues = []
+            for row in rows:
+                issue = {
+                    'history_id': row['id'],
+                    'product_id': row['product_id'],
+                    'created_at': row['created_at'],
+                    'quantity_change': row['quantity_change'],
+                    'stock_after': row['stock_after']
+                }
+                expected_stock = None if row['previous_stock'] is None else \
+                    row['previous_stock'] + row['quantity_change']
+                if expected_stock is not None and expected_stock != row['stock_after']:
+                    issues.append(dict(
+                        issue, kind='broken_chain', expected_stock=expected_stock,
+                        unrecorded_change=row['stock_after'] - expected_stock,
+                        previous_created_at=row['previous_created_at']
+                    ))
+                if row['current_stock'] is not None and row['current_stock'] != row['stock_after']:
+                    issues.append(dict(
+                        issue, kind='stock_mismatch', expected_stock=row['current_stock'],
+                        unrecorded_change=row['current_stock'] - row['stock_after'],
+                        previous_created_at=None
+                    ))
+            if issues:
+                yield issues
+
+    def verify_stock_consistency(self, repair: bool = False, batch_size: int = 200,
+                                 max_issues: int = 100) -> Dict[str, Any]:
+        """
+        在庫履歴の連鎖と現在庫を検証し、必要なら調整（adjust）の履歴を追加して修復
+
+        修復では、記録されていない増減を調整の履歴として追加する（既存の履歴と現在庫は変更しない）。
+            - 連鎖の切れ目: 1件前の履歴と同じ日時で、1件前の stock_after + 増減分を操作後在庫数とする
+              （1件前と同じ日時の履歴は間に入れられないため修復しない）
+            - 現在庫との食い違い: 現在日時（最後の履歴より前にはしない）で、現在庫を操作後在庫数とする
+        修復は iter_stock_inconsistencies のバッチごとに1トランザクションで書き込む。
+
+        Args:
+            repair: 修復する場合True
+            batch_size: 1回のクエリで調べる商品IDの幅
+            max_issues: 結果に含める食い違いの件数の上限（件数の集計は全件）
+
+        Returns:
+            Dict[str, Any]: 調べた履歴数 (checked_rows)、連鎖の切れ目の数 (broken_chains)、
+                現在庫との食い違いの数 (stock_mismatches)、食い違いのあった商品数 (products)、
+                追加した調整の履歴数 (repaired)、修復できなかった数 (unrepaired)、
+                食い違いの例 (issues・先頭から max_issues 件)。失敗時は error も含む
+        """
+        result = {
+            'checked_rows': 0, 'broken_chains': 0, 'stock_mismatches': 0, 'products': 0,
+            'repaired': 0, 'unrepaired': 0, 'issues': []
+        }
+        last_product_id = None
+        try:
+            result['checked_rows'] = self.count_stock_history()
+            for issues in self.iter_stock_inconsistencies(batch_size):
+                chain_adjustments = []
+                stock_adjustments = []
+                for issue in issues:
+                    if issue['product_id'] != last_product_id:
+                        result['products'] += 1
+                        last_product_id = issue['product_id']
+                    if len(result['issues']) < max_issues:
+                        result['issues'].append(issue)
+
+                    if issue['kind'] == 'broken_chain':
+                        result['broken_chains'] += 1
+                        if issue['previous_created_at'] == issue['created_at']:
+                            result['unrepaired'] += 1
+                            continue
+                        chain_adjustments.append((
+                            issue['product_id'], issue['unrecorded_change'],
+                            issue['stock_after'] - issue['quantity_change'],
+                            "整合性の修復（記録されていない増減）", issue['previous_created_at']
+                        ))
+                    else:
+                        result['stock_mismatches'] += 1
+                        stock_adjustments.append((
+                            issue['product_id'], issue['unrecorded_change'], issue['expected_stock'],
+                            "整合性の修復（現在庫との差）", issue['created_at']
+                        ))
+
+                if repair and (chain_adjustments or stock_adjustments):
+                    with self._get_connection() as conn:
+                        conn.executemany("""
+                            INSERT INTO stock_history (
+                                product_id, operation_type_id, quantity_change,
+                                stock_after, memo, created_at
+                            ) VALUES (?, 3, ?, ?, ?, ?)
+                        """, chain_adjustments)
+                        conn.executemany("""
+                            INSERT INTO stock_history (
+                                product_id, operation_type_id, quantity_change,
+                                stock_after, memo, created_at
+                            ) VALUES (?, 3, ?, ?, ?, MAX(CURRENT_TIMESTAMP, ?))
+                        """, stock_adjustments)
+                        self._commit(conn)
+                    result['repaired'] += len(chain_adjustments) + len(stock_adjustments)
+
+        except sqlite3.Error as e:
+            logger.error("在庫の整合性検証失敗（データベースエラー）: %s", e)
+            result['error'] = str(e)
+            return result
+
+        logger.info("在庫の整合性検証: 履歴%d件 連鎖の切れ目%d件 現在庫との食い違い%d件 修復%d件",
+                    result['checked_rows'], result['broken_chains'], result['stock_mismatches'],
+                    result['repaired'])
+        return result
+
+    def compact_stock_history(self, before: Optional[str] = None,
+                              period: str = HISTORY_COMPACTION_PERIOD,
+                              batch_size: int = 1000) -> Dict[str, Any]:
+        """
+        古い在庫履歴を期間ごとのチェックポイント行にまとめる
+
+        before より前の履歴を商品・期間・操作種別ごとに1行にまとめる。チェックポイント行は
+        増減の合計 (quantity_change)、まとめた件数 (event_count)、最初の日時 (period_start) を持ち、
+        日時 (created_at) は期間内の最後の履歴の日時にする。増加の行を減少の行より先に並べ、
+        操作後在庫数は期末在庫（期間の最後の履歴の stock_after）から逆算するため、
+        期末在庫と履歴の連鎖はそのまま保たれ、途中の操作後在庫数が0未満になることもない。
+        get_stock_statistics と統計のエクスポートの件数・数量・最初と最後の日時はまとめる前と同じ
+        （個々の履歴のメモは失われる）。
+
+        batch_size 個分の商品IDの範囲ごとに1トランザクションで置き換える。
+        行数が減らない期間（どの操作種別も1件ずつ）はそのままにする。
+        列指向スナップショット（models.history_snapshot）は次の更新で自動的に作り直される。
+
+        Args:
+            before: この日時より前の履歴をまとめる（'YYYY-MM-DD HH:MM:SS'・
+                省略時は HISTORY_COMPACTION_AGE_DAYS 日前）
+            period: まとめる期間 ('day', 'month', 'year')
+            batch_size: 1トランザクションで処理する商品IDの幅
+
+        Returns:
+            Dict[str, Any]: まとめた期間の数 (periods)、削除した履歴数 (compacted_rows)、
+                追加したチェックポイント行数 (checkpoint_rows)。失敗時は error も含む
+        """
+        if period not in COMPACTION_PERIOD_FORMATS:
+            raise ValueError(f"不明な期間です: {period}")
+        if before is None:
+            before = (datetime.now() - timedelta(days=HISTORY_COMPACTION_AGE_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+
+        result = {'periods': 0, 'compacted_rows': 0, 'checkpoint_rows': 0}
+        try:
+            first_id, last_id = self._history_product_id_range()
+            if first_id is None:
+                return result
+
+            for range_start in range(first_id, last_id + 1, batch_size):
+                conn = self._get_connection()
+                # 件数が多いためタプルで読み、削除する索引のページが収まるようページキャッシュを広げる（64MB）
+                conn.row_factory = None
+                try:
+                    conn.execute("PRAGMA cache_size = -65536")
+                    # 読み込んでから置き換えるまでの間に他の書き込みが入らないようにする
+                    conn.execute("BEGIN IMMEDIATE")
+                    rows = conn.execute("""
+                        SELECT product_id, operation_type_id, quantity_change, stock_after,
+                               created_at, event_count, COALESCE(period_start, created_at) AS started_at,
+                               strftime(?, created_at) AS period
+                        FROM stock_history
+                        WHERE product_id BETWEEN ? AND ? AND created_at < ?
+                        ORDER BY product_id, created_at, id
+                    """, (COMPACTION_PERIOD_FORMATS[period], range_start,
+                          range_start + batch_size - 1, before))
+
+                    # 商品・期間ごとに、操作種別ごとの [増減の合計, 件数, 最初の日時] を集計
+                    groups = []
+                    for (product_id, operation_type_id, quantity_change, stock_after,
+                         created_at, event_count, started_at, period_key) in rows:
+                        key = (product_id, period_key)
+                        if not groups or groups[-1]['key'] != key:
+                            groups.append({'key': key, 'first_created_at': created_at, 'rows': 0, 'totals': {}})
+                        group = groups[-1]
+                        group['rows'] += 1
+                        group['last_created_at'] = created_at
+                        group['closing_stock'] = stock_after
+                        totals = group['totals'].setdefault(operation_type_id, [0, 0, started_at])
+                        totals[0] += quantity_change
+                        totals[1] += event_count
+                        if started_at < totals[2]:
+                            totals[2] = started_at
+
+                    checkpoints = []
+                    for group in groups:
+                        product_id, period_key = group['key']
+                        if period_key is None or group['rows'] == len(group['totals']):
+                            continue
+                        cursor = conn.execute("""
+                            DELETE FROM stock_history
+                            WHERE product_id = ? AND created_at BETWEEN ? AND ? AND created_at < ?
+                        """, (product_id, group['first_created_at'], group['last_created_at'], before))
+                        result['compacted_rows'] += cursor.rowcount
+                        result['periods'] += 1
+
+                        # 増加の行を先、減少の行を後に並べ、最後の行が期末在庫になるよう操作後在庫数を逆算
+                        # （期首・期末在庫が0以上なら途中の操作後在庫数も0未満にならない）
+                        stock_after = group['closing_stock'] - sum(
+                            change for change, _, _ in group['totals'].values())
+                        for operation_type_id, (change, count, started_at) in sorted(
+                                group['totals'].items(), key=lambda item: (item[1][0] < 0, item[0])):
+                            stock_after += change
+                            checkpoints.append((
+                                product_id, operation_type_id, change, stock_after,
+                                f"チェックポイント {period_key}（{count}件）",
+                                group['last_created_at'], count, started_at
+                            ))
+
+                    conn.executemany("""
+                        INSERT INTO stock_history (
+                            product_id, operation_type_id, quantity_change, stock_after,
+                            memo, created_at, event_count, period_start
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """, checkpoints)
+                    self._commit(conn)
+                    result['checkpoint_rows'] += len(checkpoints)
+                finally:
+                    conn.close()
+
+        except sqlite3.Error as e:
+            logger.error("在庫履歴の圧縮失敗（データベースエラー）: %s", e)
+            result['error'] = str(e)
+            return result
+
+        logger.info("在庫履歴の圧縮: %s より前の %d期間 %d件 → %d件",
+                    before, result['periods'], result['compacted_rows'], result['checkpoint_rows'])
+        return result
+
+    # === 診断 ===
+
+    def get_slow_queries(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        記録された遅いクエリを新しい順に取得
+
+        Args:
+            limit: 取得する件数
+
+        Returns:
+            List[Dict[str, Any]]: 日時・所要時間・行数・メソッド・SQL・パラメータの型・実行計画
+        """
+        if self.slow_query_log is None:
+            return []
+        return self.slow_query_log.read(limit)
+
+    def clear_slow_queries(self) -> bool:
+        """
+        記録された遅いクエリを削除
+
+        Returns:
+            bool: 成功時True、失敗時False
+        """
+        if self.slow_query_log is None:
+            return True
+        try:
+            self.slow_query_log.clear()
+            return True
+        except OSError as e:
+            logger.error("遅いクエリの記録の削除失敗: %s", e)
+            return False
+
+# テスト実行（このファイルが直接実行された場合: python -m models.database）
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     print("=== Phase 4 データベース管理システムのテスト ===")
     
     # 1. データベース作成
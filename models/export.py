@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+データエクスポートモジュール
+商品・在庫履歴・統計をCSV/JSONL形式で逐次出力（Qtに依存しない）
+
+fetchmanyで少しずつ読み込んで書き出すため、
+数百万件の在庫履歴でもメモリ使用量は一定に保たれる
+"""
+
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+from typing import Callable, Dict, Any, Iterator, Optional, TextIO
+
+logger = logging.getLogger(__name__)
+
+# エクスポート対象ごとの列定義
+EXPORT_COLUMNS = {
+    'products': [
+        "id", "name", "brand", "size", "category", "current_stock", "min_stock",
+        "purchase_location", "price", "storage_location", "expiry_date",
+        "created_at", "updated_at"
+    ],
+    'history': [
+        "id", "product_id", "product_name", "operation_type",
+        "quantity_change", "stock_after", "memo", "created_at"
+    ],
+    'statistics': [
+        "product_id", "name", "category", "current_stock", "total_operations",
+        "purchase_count", "use_count", "adjust_count", "total_purchased",
+        "total_used", "first_operation", "last_operation"
+    ]
+}
+
+# エクスポート対象の表示名
+EXPORT_KIND_NAMES = {
+    'products': '商品',
+    'history': '在庫履歴',
+    'statistics': '在庫統計'
+}
+
+EXPORT_FORMATS = ['csv', 'jsonl']
+
+# 買い物リスト（DatabaseManager.generate_shopping_list の結果）の列定義
+SHOPPING_LIST_COLUMNS = [
+    "purchase_location", "product_id", "name", "brand", "size", "current_stock", "min_stock",
+    "days_of_cover", "suggested_quantity", "price", "estimated_cost"
+]
+
+
+def default_export_filename(kind: str, fmt: str, compress: bool = False) -> str:
+    """
+    エクスポートファイルの既定のファイル名を返す
+
+    Args:
+        kind: エクスポート対象 ('products', 'history', 'statistics')
+        fmt: 出力形式 ('csv', 'jsonl')
+        compress: gzip圧縮する場合True
+    """
+    filename = f"{kind}.{fmt}"
+    return filename + ".gz" if compress else filename
+
+
+def open_export_file(path: str, compress: bool = False) -> TextIO:
+    """
+    エクスポート先ファイルをテキストモードで開く
+
+    Args:
+        path: 出力先ファイルのパス
+        compress: gzip圧縮する場合True
+    """
+    if compress:
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def open_export_stream(binary_stream, compress: bool = False) -> TextIO:
+    """
+    標準出力などのバイナリストリームをエクスポート用テキストストリームで包む
+
+    Args:
+        binary_stream: 書き込み先のバイナリストリーム（sys.stdout.buffer など）
+        compress: gzip圧縮する場合True
+    """
+    if compress:
+        binary_stream = gzip.GzipFile(fileobj=binary_stream, mode='wb')
+    return io.TextIOWrapper(binary_stream, encoding='utf-8', newline='', write_through=False)
+
+
+def _iter_row_batches(db_manager, kind: str, product_id: Optional[int], batch_size: int):
+    """
+    エクスポート対象に応じた行バッチのイテレータを返す（内部用）
+    """
+    if kind == 'products':
+        return db_manager.iter_product_row_batches(batch_size=batch_size)
+    if kind == 'history':
+        return db_manager.iter_history_row_batches(product_id=product_id, batch_size=batch_size)
+    if kind == 'statistics':
+        return db_manager.iter_statistics_row_batches(batch_size=batch_size)
+    raise ValueError(f"不明なエクスポート対象です: {kind}")
+
+
+def _count_rows(db_manager, kind: str, product_id: Optional[int]) -> int:
+    """
+    進捗表示用に出力予定の件数を数える（内部用）
+    """
+    if kind == 'history':
+        return db_manager.count_stock_history(product_id)
+    return db_manager.count_products()
+
+
+def write_export(db_manager, kind: str, out: TextIO, fmt: str = 'csv',
+                 product_id: Optional[int] = None, batch_size: int = 1000,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 is_cancelled: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+    """
+    データをテキストストリームへ逐次書き出す
+
+    Args:
+        db_manager: DatabaseManager
+        kind: エクスポート対象 ('products', 'history', 'statistics')
+        out: 書き込み先のテキストストリーム
+        fmt: 出力形式 ('csv', 'jsonl')
+        product_id: 在庫履歴を特定の商品に限定する場合の商品ID
+        batch_size: 一度に読み込む行数
+        progress_callback: 進捗通知 (書き出し済み件数, 全件数) を受け取る関数
+        is_cancelled: Trueを返すと書き出しを中断する関数（バッチごとに確認）
+
+    Returns:
+        Dict[str, Any]: 書き出し件数 (rows) と中断されたか (cancelled)
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不明な出力形式です: {fmt}")
+    columns = EXPORT_COLUMNS[kind]
+    total = _count_rows(db_manager, kind, product_id) if progress_callback else 0
+
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        write_rows = writer.writerows
+    else:
+        def write_rows(rows):
+            out.writelines(
+                json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n"
+                for row in rows
+            )
+
+    written = 0
+    batches = _iter_row_batches(db_manager, kind, product_id, batch_size)
+    try:
+        for rows in batches:
+            if is_cancelled and is_cancelled():
+                return {'rows': written, 'cancelled': True}
+            write_rows(rows)
+            written += len(rows)
+            if progress_callback:
+                progress_callback(written, max(total, written))
+    finally:
+        # 中断時もデータベース接続を確実に閉じる
+        batches.close()
+
+    return {'rows': written, 'cancelled': False}
+
+
+def export_to_file(db_manager, kind: str, path: str, fmt: str = 'csv',
+                   compress: bool = False, product_id: Optional[int] = None,
+                   batch_size: int = 1000,
+                   progress_callback: Optional[Callable[[int, int], None]] = None,
+                   is_cancelled: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+    """
+    データをファイルへ逐次書き出す（中断・失敗時は書きかけのファイルを削除）
+
+    Args:
+        db_manager: DatabaseManager
+        kind: エクスポート対象 ('products', 'history', 'statistics')
+        path: 出力先ファイルのパス
+        fmt: 出力形式 ('csv', 'jsonl')
+        compress: gzip圧縮する場合True
+        product_id: 在庫履歴を特定の商品に限定する場合の商品ID
+        batch_size: 一度に読み込む行数
+        progress_callback: 進捗通知 (書き出し済み件数, 全件数) を受け取る関数
+        is_cancelled: Trueを返すと書き出しを中断する関数
+
+    Returns:
+        Dict[str, Any]: 書き出し件数 (rows)、中断されたか (cancelled)、出力先 (path)
+    """
+    completed = False
+    try:
+        with open_export_file(path, compress) as out:
+            result = write_export(
+                db_manager, kind, out, fmt=fmt, product_id=product_id,
+                batch_size=batch_size, progress_callback=progress_callback,
+                is_cancelled=is_cancelled
+            )
+        completed = not result['cancelled']
+    finally:
+        if not completed and os.path.exists(path):
+            os.remove(path)
+
+    result['path'] = path
+    if completed:
+        logger.info("エクスポート完了: %s %d件 → %s", EXPORT_KIND_NAMES[kind], result['rows'], path)
+    else:
+        logger.info("エクスポートを中断しました: %s", path)
+    return result
+
+
+def iter_shopping_list_rows(shopping_list: Dict[str, Any]) -> Iterator[tuple]:
+    """
+    買い物リストを SHOPPING_LIST_COLUMNS の順のタプルで1商品ずつ返す（購入場所順）
+
+    Args:
+        shopping_list: DatabaseManager.generate_shopping_list の結果
+    """
+    for group in shopping_list.get('groups', []):
+        for item in group['items']:
+            yield (group['purchase_location'],) + tuple(item[column] for column in SHOPPING_LIST_COLUMNS[1:])
+
+
+def write_shopping_list(shopping_list: Dict[str, Any], out: TextIO, fmt: str = 'csv') -> int:
+    """
+    買い物リストをテキストストリームへ書き出す（作成済みの結果を書くだけでデータベースは読まない）
+
+    Args:
+        shopping_list: DatabaseManager.generate_shopping_list の結果
+        out: 書き込み先のテキストストリーム
+        fmt: 出力形式 ('csv', 'jsonl')
+
+    Returns:
+        int: 書き出した商品数
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不明な出力形式です: {fmt}")
+    rows = iter_shopping_list_rows(shopping_list)
+    written = 0
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(SHOPPING_LIST_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+    else:
+        for row in rows:
+            out.write(json.dumps(dict(zip(SHOPPING_LIST_COLUMNS, row)), ensure_ascii=False) + "\n")
+            written += 1
+    return written
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+使用ペースの予測
+商品ごとに「1日あたりの使用数」を使用の間隔から指数加重移動平均で求める。
+状態（使用ペース・最後に使用した日時・使用回数）は usage_forecasts テーブルに商品ごとに1行で持ち、
+使用を記録するたびに前回の状態と今回の使用だけから更新する（履歴を読み直さない）。
+
+使用ペースは2回目の使用から求まる:
+    観測値 = 今回の使用数 / 前回の使用からの日数（FORECAST_MIN_INTERVAL_DAYS 未満は切り上げ）
+    使用ペース = 平滑化係数 × 観測値 + (1 - 平滑化係数) × 前回の使用ペース
+
+残り日数は 現在在庫 / 使用ペース、在庫がなくなる予測日は 今日 + 残り日数
+（DatabaseManager.get_usage_forecasts が全商品分を1回のクエリで求める）。
+画面・CLI・印刷では残り日数を小数第1位に四捨五入して表示する（round_days_of_cover / format_days_of_cover）。
+
+使い方:
+    state = UsageState()
+    state = state.record(quantity=1, used_day=2460000.5)   # used_day はユリウス日
+    state.usage_rate                                        # 1日あたりの使用数（1回目はNone）
+"""
+
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from utils.config import FORECAST_MIN_INTERVAL_DAYS, FORECAST_SMOOTHING
+
+
+class UsageState(NamedTuple):
+    """
+    商品1件の使用ペースの状態（usage_forecasts の1行）
+    """
+    usage_rate: Optional[float] = None
+    last_used_day: Optional[float] = None
+    use_count: int = 0
+
+    def record(self, quantity: int, used_day: float,
+               smoothing: float = FORECAST_SMOOTHING,
+               min_interval_days: float = FORECAST_MIN_INTERVAL_DAYS,
+               events: int = 1) -> 'UsageState':
+        """
+        使用を1回反映した新しい状態を返す
+
+        Args:
+            quantity: 使用数（正の値）
+            used_day: 使用した日時（ユリウス日）
+            smoothing: 新しい観測値の重み（0〜1）
+            min_interval_days: 使用間隔の下限（日）
+            events: 使用回数（チェックポイント行にまとめた使用は、合計を1回の使用として反映し回数だけ数える）
+
+        Returns:
+            UsageState: 更新後の状態
+        """
+        usage_rate = self.usage_rate
+        if self.last_used_day is not None:
+            interval = max(used_day - self.last_used_day, min_interval_days)
+            observed = quantity / interval
+            if usage_rate is None:
+                usage_rate = observed
+            else:
+                usage_rate = smoothing * observed + (1 - smoothing) * usage_rate
+        # 取り込み順が前後しても、最後に使用した日時は戻さない
+        last_used_day = used_day if self.last_used_day is None else max(used_day, self.last_used_day)
+        return UsageState(usage_rate, last_used_day, self.use_count + events)
+
+
+def round_days_of_cover(days_of_cover: Optional[float]) -> Optional[float]:
+    """
+    表示用に残り日数を小数第1位に四捨五入する（切り捨てると1日未満が0日と表示され、在庫切れに見えるため）
+
+    Args:
+        days_of_cover: 残り日数（予測がない場合はNone）
+
+    Returns:
+        Optional[float]: 四捨五入した残り日数（予測がない場合はNone）
+    """
+    if days_of_cover is None:
+        return None
+    return round(days_of_cover, 1)
+
+
+def format_days_of_cover(days_of_cover: Optional[float]) -> str:
+    """
+    残り日数を表示用の文字列にする（例: 0.9日・予測がない場合は空文字）
+    """
+    rounded = round_days_of_cover(days_of_cover)
+    return "" if rounded is None else f"{rounded:.1f}日"
+
+
+def fold_usage_events(events: Iterable[tuple]) -> Iterator[Tuple[int, UsageState]]:
+    """
+    商品ID・日時順に並んだ使用履歴から商品ごとの最終状態を求める（履歴からの作り直し用）
+
+    Args:
+        events: (商品ID, 使用日時のユリウス日, 使用数) のタプル（商品ID・日時順）。
+            4つ目の要素があれば使用回数（チェックポイント行の event_count）
+
+    Yields:
+        Tuple[int, UsageState]: 商品IDと状態（商品ごとに1件）
+    """
+    product_id = None
+    state = UsageState()
+    for event_product_id, used_day, quantity, *event_count in events:
+        if event_product_id != product_id:
+            if product_id is not None:
+                yield product_id, state
+            product_id = event_product_id
+            state = UsageState()
+        state = state.record(quantity, used_day, events=event_count[0] if event_count else 1)
+    if product_id is not None:
+        yield product_id, state
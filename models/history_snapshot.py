@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+在庫履歴の列指向スナップショット
+stock_history を列ごとの .npy ファイルに書き出し、NumPyのメモリマップで読み込む
+
+ディレクトリ構成:
+    id.npy               履歴ID (int64)
+    product_id.npy       商品ID (int64)
+    timestamp.npy        作成日時のUNIX時刻・秒 (int64)
+    operation.npy        操作コード (int8: purchase=1, use=2, adjust=3, その他=0)
+    quantity_change.npy  数量変化 (int64)
+    meta.json            最終取り込みIDと件数
+
+差分更新では前回の最終IDより後の履歴だけを各 .npy の末尾に追記する。
+商品削除や履歴の圧縮（DatabaseManager.compact_stock_history）で取り込み済みの履歴が消えた場合は、
+前回の最終ID以下の履歴の件数がメタ情報の件数と合わなくなるため、差分更新の代わりに作り直す。
+"""
+
+import io
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 操作種別と操作コードの対応
+OPERATION_CODES = {
+    'purchase': 1,
+    'use': 2,
+    'adjust': 3
+}
+
+# 列名とデータ型（iter_history_snapshot_batches のタプルの並び順）
+SNAPSHOT_COLUMNS = [
+    ('id', np.int64),
+    ('product_id', np.int64),
+    ('timestamp', np.int64),
+    ('operation', np.int8),
+    ('quantity_change', np.int64)
+]
+
+META_FILENAME = "meta.json"
+
+
+def _write_npy_header(f, version, dtype, length: int):
+    """
+    .npy ファイルのヘッダーを書き込む（内部用）
+    """
+    header = {
+        'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        'fortran_order': False,
+        'shape': (length,)
+    }
+    if version == (1, 0):
+        np.lib.format.write_array_header_1_0(f, header)
+    else:
+        np.lib.format.write_array_header_2_0(f, header)
+
+
+def _append_npy(path: Path, values: np.ndarray):
+    """
+    1次元の .npy ファイルの末尾に値を追記し、ヘッダーの件数をその場で書き換える（内部用）
+
+    NumPyは件数の桁が増えても書き換えられるようにヘッダーに余白を確保しているため、
+    既存データを読み直さずに追記できる。余白が足りない場合は全体を書き直す。
+    追記はヘッダーの件数が示す位置から行い、前回の追記が途中で止まって残ったデータは切り捨てる。
+    """
+    if not path.exists():
+        np.save(path, values)
+        return
+
+    with open(path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+        data_offset = f.tell()
+
+        # 新しいヘッダーが同じ長さに収まるか先に確認
+        new_header = io.BytesIO()
+        _write_npy_header(new_header, version, dtype, shape[0] + len(values))
+        if new_header.tell() == data_offset:
+            f.seek(data_offset + shape[0] * dtype.itemsize)
+            f.truncate()
+            f.write(values.astype(dtype, copy=False).tobytes())
+            f.seek(0)
+            f.write(new_header.getvalue())
+            return
+
+    # ヘッダーの余白が足りない場合（古いNumPyで作成したファイルなど）
+    existing = np.load(path)[:shape[0]]
+    np.save(path, np.concatenate([existing, values.astype(existing.dtype, copy=False)]))
+
+
+def _npy_length(path: Path) -> int:
+    """
+    .npy ファイルの件数をヘッダーから読み取る（内部用）
+    """
+    return np.load(path, mmap_mode='r').shape[0]
+
+
+class HistorySnapshot:
+    """
+    在庫履歴の列指向スナップショットを管理するクラス
+    """
+
+    def __init__(self, directory):
+        """
+        スナップショットを初期化
+
+        Args:
+            directory: スナップショットを保存するディレクトリ
+        """
+        self.directory = Path(directory)
+
+    def read_meta(self) -> Dict[str, Any]:
+        """
+        メタ情報（最終取り込みID・件数）を読み込む
+
+        Returns:
+            Dict[str, Any]: メタ情報（未作成の場合は初期値）
+        """
+        meta_path = self.directory / META_FILENAME
+        if not meta_path.exists():
+            return {'last_id': 0, 'rows': 0, 'updated_at': None}
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self, meta: Dict[str, Any]):
+        """
+        メタ情報を書き込む（一時ファイルから置き換えて途中状態を残さない）
+        """
+        meta_path = self.directory / META_FILENAME
+        temp_path = meta_path.with_suffix(".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, meta_path)
+
+    def _is_consistent(self, meta: Dict[str, Any]) -> bool:
+        """
+        全列のファイルがメタ情報の件数と一致しているか確認
+        """
+        for name, _ in SNAPSHOT_COLUMNS:
+            path = self.directory / f"{name}.npy"
+            if not path.exists() or _npy_length(path) != meta['rows']:
+                return False
+        return True
+
+    def refresh(self, db_manager, rebuild: bool = False, batch_size: int = 50000) -> int:
+        """
+        前回の最終IDより後の履歴を取り込んでスナップショットを更新
+
+        取り込み済みの履歴が削除・圧縮されていた場合は rebuild を指定しなくても作り直す。
+
+        Args:
+            db_manager: DatabaseManager
+            rebuild: Trueの場合は既存のスナップショットを破棄して全件を取り込む
+            batch_size: 一度に読み込む行数
+
+        Returns:
+            int: 今回追記した件数
+        """
+        meta = self.read_meta()
+        if (not rebuild and meta['rows'] > 0
+                and db_manager.count_stock_history(through_id=meta['last_id']) != meta['rows']):
+            logger.info("取り込み済みの履歴が削除・圧縮されたため、スナップショットを作り直します")
+            rebuild = True
+        if rebuild or (meta['rows'] > 0 and not self._is_consistent(meta)):
+            # 作り直し（前回の更新が途中で止まっていた場合もここに来る）
+            if self.directory.exists():
+                shutil.rmtree(self.directory)
+            meta = {'last_id': 0, 'rows': 0, 'updated_at': None}
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        appended = 0
+        for rows in db_manager.iter_history_snapshot_batches(meta['last_id'], batch_size):
+            table = np.array(rows, dtype=np.int64)
+            for index, (name, dtype) in enumerate(SNAPSHOT_COLUMNS):
+                _append_npy(self.directory / f"{name}.npy", table[:, index].astype(dtype))
+            appended += len(rows)
+            meta['last_id'] = int(table[-1, 0])
+            meta['rows'] += len(rows)
+            # バッチごとに記録して、中断しても次回はその続きから取り込む
+            meta['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self._write_meta(meta)
+
+        if appended == 0 and not (self.directory / META_FILENAME).exists():
+            # 履歴が0件でも空の列ファイルを用意しておく
+            for name, dtype in SNAPSHOT_COLUMNS:
+                np.save(self.directory / f"{name}.npy", np.empty(0, dtype=dtype))
+            meta['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self._write_meta(meta)
+
+        logger.info("履歴スナップショット更新: %d件追記（合計%d件）", appended, meta['rows'])
+        return appended
+
+    def load(self, mmap: bool = True) -> Dict[str, np.ndarray]:
+        """
+        スナップショットを列ごとの配列として読み込む
+
+        Args:
+            mmap: Trueの場合は読み取り専用のメモリマップで開く（コピーしない）
+
+        Returns:
+            Dict[str, np.ndarray]: 列名をキーとした配列
+        """
+        meta = self.read_meta()
+        columns = {}
+        for name, _ in SNAPSHOT_COLUMNS:
+            array = np.load(self.directory / f"{name}.npy", mmap_mode='r' if mmap else None)
+            # 書き込み途中で止まった追記分はメタ情報の件数までに切り詰める
+            columns[name] = array[:meta['rows']]
+        return columns
+
+
+def usage_totals_by_product(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    商品IDごとの使用数量の合計をベクトル演算で求める
+
+    Args:
+        columns: HistorySnapshot.load() の戻り値
+
+    Returns:
+        np.ndarray: 商品IDを添字とした使用数量の合計
+    """
+    is_use = columns['operation'] == OPERATION_CODES['use']
+    return np.bincount(
+        columns['product_id'][is_use],
+        weights=-columns['quantity_change'][is_use]
+    )
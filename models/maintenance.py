@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+データベース保守モジュール
+統計情報の更新・WALチェックポイント・段階的バキュームを担当（Qtに依存しない）
+
+各処理は持ち時間（予算）の範囲で少しずつ進め、時間切れになった処理は
+次回の実行時に続きから再開する。アプリが操作されていない間に呼び出す想定。
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 実行順の保守処理
+MAINTENANCE_STEPS = ['analyze', 'checkpoint', 'incremental_vacuum']
+
+
+def run_basic_maintenance(db_path: str = 'inventory.db') -> Dict[str, Any]:
+    """
+    整合性チェックと統計情報の更新を実行
+
+    Args:
+        db_path: データベースファイルのパス
+
+    Returns:
+        Dict[str, Any]: 各処理の結果と所要時間（ミリ秒）
+    """
+    results = {}
+    conn = sqlite3.connect(db_path)
+    try:
+        # 整合性チェック（quick_checkはインデックスの内容照合を省略した高速版）
+        started = time.perf_counter()
+        check_rows = conn.execute("PRAGMA quick_check").fetchall()
+        results['quick_check'] = {
+            'result': ", ".join(row[0] for row in check_rows),
+            'duration_ms': (time.perf_counter() - started) * 1000
+        }
+
+        # クエリプランナー用の統計情報を更新
+        started = time.perf_counter()
+        conn.execute("PRAGMA optimize")
+        results['optimize'] = {
+            'result': "ok",
+            'duration_ms': (time.perf_counter() - started) * 1000
+        }
+    finally:
+        conn.close()
+
+    return results
+
+
+def enable_incremental_vacuum(db_path: str = 'inventory.db') -> bool:
+    """
+    既存のデータベースを段階的バキューム（auto_vacuum=INCREMENTAL）に切り替える
+
+    切り替えにはVACUUMでファイル全体を書き直す必要があるため、
+    アプリを閉じている時に一度だけ実行する。
+
+    Args:
+        db_path: データベースファイルのパス
+
+    Returns:
+        bool: 切り替えた（または切り替え済みの）場合True
+    """
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return True
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            logger.info("段階的バキュームを有効にしました")
+            return True
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.error("段階的バキュームの有効化エラー: %s", e)
+        return False
+
+
+class MaintenanceScheduler:
+    """
+    保守処理を持ち時間の範囲で少しずつ実行するクラス
+    """
+
+    def __init__(self, db_path: str = 'inventory.db', vacuum_pages_per_step: int = 128,
+                 analysis_limit: int = 400):
+        """
+        保守スケジューラーを初期化
+
+        Args:
+            db_path: データベースファイルのパス
+            vacuum_pages_per_step: 段階的バキュームで1回に返却するページ数
+            analysis_limit: ANALYZEでインデックスごとに調べる行数の上限（0は無制限）
+        """
+        self.db_path = db_path
+        self.vacuum_pages_per_step = vacuum_pages_per_step
+        self.analysis_limit = analysis_limit
+
+        self.pending_steps: List[str] = list(MAINTENANCE_STEPS)
+        self.last_results: Dict[str, Dict[str, Any]] = {}
+        self.last_completed_at: Optional[float] = None
+
+        self._thread = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def is_running(self) -> bool:
+        """
+        バックグラウンドで実行中ならTrue
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self, budget_seconds: float = 2.0,
+            is_cancelled: Optional[Callable[[], bool]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        残っている保守処理を持ち時間の範囲で実行
+
+        Args:
+            budget_seconds: 持ち時間（秒）。超えた時点で次の区切りで止める
+            is_cancelled: Trueを返すと次の区切りで止める関数
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 処理名ごとの結果 (result)、所要時間 (duration_ms)、
+                最後まで終わったか (completed)
+        """
+        deadline = time.perf_counter() + budget_seconds
+
+        def should_stop():
+            return time.perf_counter() >= deadline or bool(is_cancelled and is_cancelled())
+
+        results = {}
+        try:
+            # 自動コミットで開き、各処理の区切りでロックを手放す
+            conn = sqlite3.connect(self.db_path, isolation_level=None)
+        except sqlite3.Error as e:
+            logger.error("保守処理の接続エラー: %s", e)
+            return results
+
+        try:
+            while self.pending_steps and not should_stop():
+                step = self.pending_steps[0]
+                started = time.perf_counter()
+                try:
+                    result, completed = getattr(self, f"_step_{step}")(conn, should_stop)
+                except sqlite3.Error as e:
+                    # ロック中などで失敗した処理は今回の周回では諦める
+                    result, completed = f"エラー: {e}", True
+                results[step] = {
+                    'result': result,
+                    'duration_ms': (time.perf_counter() - started) * 1000,
+                    'completed': completed
+                }
+                if not completed:
+                    break
+                self.pending_steps.pop(0)
+        finally:
+            conn.close()
+
+        if not self.pending_steps:
+            # 1周分が終わったら次回は最初から
+            self.pending_steps = list(MAINTENANCE_STEPS)
+            self.last_completed_at = time.time()
+
+        self.last_results = results
+        return results
+
+    def _step_analyze(self, conn, should_stop):
+        """
+        クエリプランナー用の統計情報を更新（内部用）
+        """
+        # 調べる行数を制限して大きな表でも短時間で終わらせる
+        conn.execute(f"PRAGMA analysis_limit = {int(self.analysis_limit)}")
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).fetchone()
+        if has_stats:
+            # 統計が古くなった表だけを再分析
+            conn.execute("PRAGMA optimize")
+            return "optimize", True
+        conn.execute("ANALYZE")
+        return "analyze", True
+
+    def _step_checkpoint(self, conn, should_stop):
+        """
+        WALの内容を本体へ書き戻す（内部用）
+        """
+        if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != 'wal':
+            return "WALモードではないためスキップ", True
+        # PASSIVEは読み書き中の接続を待たず、書き戻せる分だけ処理する
+        busy, log_frames, checkpointed = conn.execute(
+            "PRAGMA wal_checkpoint(PASSIVE)"
+        ).fetchone()
+        return f"{checkpointed}/{log_frames}フレーム", True
+
+    def _step_incremental_vacuum(self, conn, should_stop):
+        """
+        空きページを数ページずつファイルから返却（内部用）
+        """
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return "段階的バキュームが無効のためスキップ", True
+
+        initial_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        free_pages = initial_pages
+        while free_pages > 0:
+            if should_stop():
+                return f"{initial_pages - free_pages}ページ返却（残り{free_pages}ページ）", False
+            # 1回ごとに短いトランザクションで終わらせ、他の書き込みを待たせない
+            # （execute()では1ページ分しか進まないため、最後まで実行されるexecutescript()を使う）
+            conn.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_pages_per_step)});")
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return f"{initial_pages}ページ返却", True
+
+    # === バックグラウンド実行 ===
+
+    def start(self, budget_seconds: float = 2.0,
+              on_complete: Optional[Callable[[Dict[str, Dict[str, Any]]], None]] = None):
+        """
+        保守処理をワーカースレッドで1回実行
+
+        Args:
+            budget_seconds: 持ち時間（秒）
+            on_complete: 終了時に結果の辞書を受け取る関数（ワーカースレッドから呼ばれる）
+        """
+        if self.is_running:
+            return
+        self._cancel_event.clear()
+
+        def worker():
+            results = self.run(budget_seconds, is_cancelled=self._cancel_event.is_set)
+            if on_complete:
+                on_complete(results)
+
+        self._thread = threading.Thread(target=worker, name="MaintenanceScheduler", daemon=True)
+        self._thread.start()
+
+    def cancel(self, wait: bool = False, timeout: float = 5.0):
+        """
+        実行中の保守処理を次の区切りで止める
+
+        Args:
+            wait: Trueの場合はスレッドの終了を待つ
+            timeout: 終了を待つ秒数
+        """
+        self._cancel_event.set()
+        if wait and self._thread:
+            self._thread.join(timeout)
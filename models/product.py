@@ -5,19 +5,62 @@
 商品情報を管理するクラスを定義
 """
 
-from datetime import datetime #日付や時刻を扱うための機能を使えるようにします。
+from datetime import date, datetime #日付や時刻を扱うための機能を使えるようにします。
 #Optional 値が「ある場合」と「ない場合（None）」の両方を型ヒントで表せるようにします。
 #Dict 辞書型（keyとvalueのペアのコレクション）を型ヒントで表現します。
 #Dict[str, int] は「キーがstr型、値がint型の辞書」を意味します。
 #Any 任意の型を表すための型ヒントで、どんな型でも受け入れられることを示します。
 from typing import Optional, Dict, Any
+# 関数の結果を引数ごとに覚えておくための lru_cache を使います。
+from functools import lru_cache
 # sqlite3 モジュールを使って、SQLiteデータベースとやり取りできるようにします。
 import sqlite3
+# 同じ文字列を共有するための sys.intern を使います（参照がなくなれば解放される）。
+from sys import intern as _intern
+
+# Product.from_row_tuple / product_row_factory が前提とする products テーブルの列の順番
+PRODUCT_COLUMNS = (
+    "id", "name", "brand", "size", "category", "current_stock", "min_stock",
+    "purchase_location", "price", "storage_location", "expiry_date", "created_at", "updated_at"
+)
+
+#消費期限をまだ解析していないことを表す目印です（解析した結果の None「期限なし」と区別するため）。
+_UNPARSED = object()
+
+#消費期限の文字列（"2024-06-04" 形式）を日付に変換します。未設定や日付として読めない場合は None を返します。
+#同じ期限日の商品は多いため、変換結果は文字列ごとに覚えておきます（date は変更できないので共有しても安全）。
+@lru_cache(maxsize=4096)
+def parse_expiry_date(value) -> Optional[date]:
+    """
+    消費期限の文字列を日付に変換
+    
+    Args:
+        value: 消費期限（YYYY-MM-DD形式）
+        
+    Returns:
+        Optional[date]: 日付（未設定・不正な形式の場合None）
+    """
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
 
 class Product: # クラス定義（商品の設計図）
     """
     商品情報を管理するクラス
     """
+    #属性を固定して、オブジェクトごとの __dict__ を持たないようにします（大量に読み込んでもメモリを節約できる）。
+    #ここにない名前の属性は追加できません。
+    #在庫数・最小在庫数・消費期限は、値が変わったときに下の判定結果を消すため property 経由で設定します（先頭に _ が付いた名前に入る）。
+    #_status は在庫状況、_expiry は解析済みの消費期限（日付）を覚えておく場所です。
+    __slots__ = (
+        'product_id', 'name', 'brand', 'size', 'category', '_current_stock', '_min_stock',
+        'purchase_location', 'price', 'storage_location', '_expiry_date', 'created_at', 'updated_at',
+        '_status', '_expiry'
+    )
+
     #商品情報を管理するProductクラスのコンストラクタ（初期化メソッド）**です
     #data引数を使って、データベースから取得した商品情報を初期化することもできます。
     #data が None の場合は、他の引数（nameやbrandなど）で個別に値を指定して初期化します。
@@ -91,92 +134,97 @@ class Product: # クラス定義（商品の設計図）
         Args:
             data: sqlite3.Row または 辞書
         """
-        try: 
-        #「id」または「product_id」というキーの値を優先的に取得して、オブジェクトのIDとして使う
-        #オブジェクトのIDとは、「その商品だけを一意に特定できる番号（主キー）」
-        #データベースや辞書データから「商品ID」を柔軟に取得できる
-        #「id」または「product_id」どちらかのキーが存在すれば、その値をself.product_idにセットします。
-            self.product_id = data['id'] if 'id' in data.keys() else (data['product_id'] if 'product_id' in data.keys() else None)
-            #データベースや辞書データから「商品名」を安全に取得し、なければ空文字にすることができます。
-            #dataは辞書型（またはsqlite3.Rowなど）で、商品情報の各項目がキーと値のペアで格納されています。
-            #if 'name' in data.keys()で、dataの中に「name」というキーがあるかを確認します。
-            #もし「name」が存在すれば、その値をself.nameにセットします。
-            self.name = data['name'] if 'name' in data.keys() else ''
-            #データベースや辞書データから「ブランド名」を安全に取得し、なければ空文字にすることができます。
-            #if 'brand' in data.keys()で、dataの中に「brand」というキーがあるかを確認します。
-            #もし「brand」が存在すれば、その値をself.brandにセットします。
-            self.brand = data['brand'] if 'brand' in data.keys() else ''
-            #データベースや辞書データから「サイズ」を安全に取得し、なければ空文字にすることができます。
-            #if 'size' in data.keys()で、dataの中に「size」というキーがあるかを確認します。
-            #もし「size」が存在すれば、その値をself.sizeにセットします。
-            self.size = data['size'] if 'size' in data.keys() else ''
-            #データベースや辞書データから「カテゴリ」を安全に取得し、なければ空文字にすることができます。
-            #if 'category' in data.keys()で、dataの中に「category」というキーがあるかを確認します。
-            #もし「category」が存在すれば、その値をself.categoryにセットします。
-            self.category = data['category'] if 'category' in data.keys() else ''
-            #データベースや辞書データから「現在の在庫数」を安全に取得し、なければ0にすることができます。
-            #if 'current_stock' in data.keys()で、dataの中に「current_stock」というキーがあるかを確認します。
-            #もし「current_stock」が存在すれば、その値をself.current_stockにセットします。
-            #もし「current_stock」が存在しなければ、0をセットします。
-            self.current_stock = data['current_stock'] if 'current_stock' in data.keys() else 0
-            #データベースや辞書データから「最小在庫数」を安全に取得し、なければ1にすることができます。
-            #if 'min_stock' in data.keys()で、dataの中に「min_stock」というキーがあるかを確認します。
-            #もし「min_stock」が存在すれば、その値をself.min_stockにセットします。
-            #もし「min_stock」が存在しなければ、1をセットします。
-            self.min_stock = data['min_stock'] if 'min_stock' in data.keys() else 1
-            #データベースや辞書データから「購入場所」を安全に取得し、なければ空文字にすることができます。
-            #if 'purchase_location' in data.keys()で、dataの中に「purchase_location」というキーがあるかを確認します。
-            #もし「purchase_location」が存在すれば、その値をself.purchase_locationにセットします。
-            #もし「purchase_location」が存在しなければ、空文字をセットします。
-            self.purchase_location = data['purchase_location'] if 'purchase_location' in data.keys() else ''
-            #データベースや辞書データから「価格」を安全に取得し、なければ0.0にすることができます。
-            #if 'price' in data.keys()で、dataの中に「price」というキーがあるかを確認します。
-            #もし「price」が存在すれば、その値をself.priceにセットします。
-            self.price = data['price'] if 'price' in data.keys() else 0.0
-            #データベースや辞書データから「保存場所」を安全に取得し、なければ空文字にすることができます。
-            #if 'storage_location' in data.keys()で、dataの中に「storage_location」というキーがあるかを確認します。
-            #もし「storage_location」が存在すれば、その値をself.storage_locationにセットします。
-            #もし「storage_location」が存在しなければ、空文字をセットします。
-            self.storage_location = data['storage_location'] if 'storage_location' in data.keys() else ''
-            #データベースや辞書データから「消費期限」を安全に取得し、なければNoneにすることができます。
-            #if 'expiry_date' in data.keys()で、dataの中に「expiry_date」というキーがあるかを確認します。
-            #もし「expiry_date」が存在すれば、その値をself.expiry_dateにセットします。
-            #もし「expiry_date」が存在しなければ、Noneをセットします。
-            self.expiry_date = data['expiry_date'] if 'expiry_date' in data.keys() else None
-            #データベースや辞書データから「作成日時」を安全に取得し、なければNoneにすることができます。
-            #if 'created_at' in data.keys()で、dataの中に「created_at」というキーがあるかを確認します。
-            #もし「created_at」が存在すれば、その値をself.created_atにセットします。
-            #もし「created_at」が存在しなければ、Noneをセットします。
-            self.created_at = data['created_at'] if 'created_at' in data.keys() else None
-            #データベースや辞書データから「更新日時」を安全に取得し、なければNoneにすることができます。
-            #if 'updated_at' in data.keys()で、dataの中に「updated_at」というキーがあるかを確認します。
-            #もし「updated_at」が存在すれば、その値をself.updated_atにセットします。
-            #もし「updated_at」が存在しなければ、Noneをセットします。
-            self.updated_at = data['updated_at'] if 'updated_at' in data.keys() else None  
-        #もしdataが辞書型でない場合（例えば、sqlite3.Rowオブジェクトなど）やキーが存在しない場合は、
-        except (KeyError, TypeError):
-            #データベースや辞書型データから「商品ID」を安全かつ柔軟に取得するためのもの
-            #dataの中に「id」または「product_id」というキーが存在しない場合は、Noneをセットします。
-            #もしdataが辞書型でない場合やキーが存在しない場合は、product_idをNoneに設定します。
-            #この処理により、dataが不正な形式であっても、Productオブジェクトは作成されます。
-            #例外が発生した場合は、product_idをNoneに設定します。
-            self.product_id = data['id'] if 'id' in data.keys() else (data['product_id'] if 'product_id' in data.keys() else None)
-            self.name = data['name'] if 'name' in data.keys() else ''
-            self.brand = data['brand'] if 'brand' in data.keys() else ''
-            self.size = data['size'] if 'size' in data.keys() else ''
-            self.category = data['category'] if 'category' in data.keys() else ''
-            self.current_stock = data['current_stock'] if 'current_stock' in data.keys() else 0
-            self.min_stock = data['min_stock'] if 'min_stock' in data.keys() else 1
-            self.purchase_location = data['purchase_location'] if 'purchase_location' in data.keys() else ''
-            self.price = data['price'] if 'price' in data.keys() else 0.0
-            self.storage_location = data['storage_location'] if 'storage_location' in data.keys() else ''
-            self.expiry_date = data['expiry_date'] if 'expiry_date' in data.keys() else None
-            self.created_at = data['created_at'] if 'created_at' in data.keys() else None
-            self.updated_at = data['updated_at'] if 'updated_at' in data.keys() else None
- 
+        #キーの一覧は1回だけ取り出して集合にしておく（項目ごとに data.keys() を呼ばない）
+        #sqlite3.Row の keys() はリストを返すため、そのまま in で調べると毎回先頭から探すことになります。
+        keys = set(data.keys())
+        #「id」または「product_id」というキーの値を商品ID（主キー）として使う
+        self.product_id = data['id'] if 'id' in keys else (data['product_id'] if 'product_id' in keys else None)
+        #キーがなければ既定値（文字列は空文字、在庫数は0、最小在庫数は1など）をセットします。
+        self.name = data['name'] if 'name' in keys else ''
+        self.brand = data['brand'] if 'brand' in keys else ''
+        self.size = data['size'] if 'size' in keys else ''
+        self.category = data['category'] if 'category' in keys else ''
+        self.current_stock = data['current_stock'] if 'current_stock' in keys else 0
+        self.min_stock = data['min_stock'] if 'min_stock' in keys else 1
+        self.purchase_location = data['purchase_location'] if 'purchase_location' in keys else ''
+        self.price = data['price'] if 'price' in keys else 0.0
+        self.storage_location = data['storage_location'] if 'storage_location' in keys else ''
+        self.expiry_date = data['expiry_date'] if 'expiry_date' in keys else None
+        self.created_at = data['created_at'] if 'created_at' in keys else None
+        self.updated_at = data['updated_at'] if 'updated_at' in keys else None
 
+    #SELECT の列の順番が PRODUCT_COLUMNS と同じ行（タプル）から、キーを引かずに作成する高速な経路です。
+    #大量の商品を読み込むとき（一覧表示・CLI・エクスポート）に使います。
+    @classmethod
+    def from_row_tuple(cls, row) -> 'Product':
+        """
+        PRODUCT_COLUMNS の順に並んだ値から商品オブジェクトを作成
         
+        Args:
+            row: タプル（または sqlite3.Row）
+            
+        Returns:
+            Product: 商品オブジェクト
+        """
+        #__init__ を通さずにオブジェクトを作り、値を位置で一度に代入します。
+        product = cls.__new__(cls)
+        (product.product_id, product.name, brand, size, category,
+         product._current_stock, product._min_stock, purchase_location, product.price,
+         storage_location, product._expiry_date, product.created_at, product.updated_at) = row
+        #property を通さずに入れたので、判定結果は「まだ計算していない」状態にしておきます。
+        product._status = None
+        product._expiry = _UNPARSED
+        #ブランド・サイズ・カテゴリ・場所は種類が少ないため、同じ文字列は1つのオブジェクトを共有します。
+        #（sqlite3 は行ごとに新しい文字列を作るため、そのままだと同じ文字列が商品の数だけできる）
+        #None や空文字はそのまま代入されます。
+        product.brand = brand and _intern(brand)
+        product.size = size and _intern(size)
+        product.category = category and _intern(category)
+        product.purchase_location = purchase_location and _intern(purchase_location)
+        product.storage_location = storage_location and _intern(storage_location)
+        return product
+
+    #在庫数・最小在庫数・消費期限の property です。読むときはそのまま値を返し、
+    #書き換えたときは覚えておいた判定結果を消します（次に判定するときに計算し直す）。
+    @property
+    def current_stock(self) -> int:
+        return self._current_stock
+    
+    @current_stock.setter
+    def current_stock(self, value: int):
+        self._current_stock = value
+        self._status = None
+    
+    @property
+    def min_stock(self) -> int:
+        return self._min_stock
+    
+    @min_stock.setter
+    def min_stock(self, value: int):
+        self._min_stock = value
+        self._status = None
+    
+    @property
+    def expiry_date(self) -> Optional[str]:
+        return self._expiry_date
+    
+    @expiry_date.setter
+    def expiry_date(self, value: Optional[str]):
+        self._expiry_date = value
+        self._expiry = _UNPARSED
+    
+    #消費期限を日付（date）で返します。文字列の解析は最初の1回だけ行い、結果を覚えておきます。
+    @property
+    def expiry(self) -> Optional[date]:
+        """
+        解析済みの消費期限（未設定・不正な形式の場合None）
+        """
+        if self._expiry is _UNPARSED:
+            self._expiry = parse_expiry_date(self._expiry_date)
+        return self._expiry
+    
     #商品オブジェクトの在庫状況を判定し、その状態を文字列で返すメソッド
+    #一度判定した結果は在庫数か最小在庫数が変わるまで覚えておきます。
     def get_stock_status(self) -> str: #文字列を返すメソッド
         """
         在庫状況を返す
@@ -184,31 +232,32 @@ class Product: # クラス定義（商品の設計図）
         Returns:
             str: 'out_of_stock', 'low_stock', 'normal'
         """
-        if self.current_stock <= 0: # 在庫が0以下
-            return 'out_of_stock' # → 在庫切れ
-        elif self.current_stock <= self.min_stock: # 在庫が最小在庫以下
-            return 'low_stock' # → 在庫少
-        else: # それ以外
-            return 'normal' # → 正常
+        if self._status is None: # まだ判定していない場合
+            if self._current_stock <= 0: # 在庫が0以下
+                self._status = 'out_of_stock' # → 在庫切れ
+            elif self._current_stock <= self._min_stock: # 在庫が最小在庫以下
+                self._status = 'low_stock' # → 在庫少
+            else: # それ以外
+                self._status = 'normal' # → 正常
+        return self._status
     
     #「商品が消費期限切れかどうか」を判定して、期限切れならTrue、そうでなければFalseを返すもの
     #bool 「True（真）」または「False（偽）」の2つの値だけを持つ、Pythonの基本的なデータ型
-    def is_expired(self) -> bool:
+    #一覧の表示などで多くの商品をまとめて判定するときは、同じ today を渡して基準日をそろえます。
+    def is_expired(self, today: Optional[date] = None) -> bool:
         """
-        期限切れかどうかを判定
+        期限切れかどうかを判定（期限日の当日も期限切れ）
+        
+        Args:
+            today: 基準日（省略時は今日）
         
         Returns:
             bool: 期限切れの場合True
         """
-        if not self.expiry_date: # 期限日が設定されていない場合
+        expiry = self.expiry
+        if expiry is None: # 期限日が設定されていない・日付として読めない場合
             return False # 期限切れではない
-        
-        #消費期限が正しい日付なら期限切れかどうか判定し、もし日付が不正なら「期限切れではない」と判断します
-        try:
-            expiry = datetime.strptime(self.expiry_date, "%Y-%m-%d") # 文字列を日付に変換 "2024-06-04" 形式の文字列を期待
-            return expiry < datetime.now() # 現在の日付と比較して期限切れかどうかを判定
-        except ValueError: # 文字列が日付形式でない場合
-            return False
+        return expiry <= (today or date.today()) # 基準日と比較して期限切れかどうかを判定
     
     #商品の在庫数を新しい値（new_stock）に更新し、更新日時（updated_at）も記録できるようにします。
     def update_stock(self, new_stock: int):
@@ -380,6 +429,21 @@ def create_product_list_from_rows(rows) -> list[Product]:
     #for row in rows 「複数のデータ（rows）」から「1件ずつ（row）」取り出して処理するための基本的なPythonの構文
     return [Product(data=row) for row in rows]    
 
+#sqlite3 のカーソルに設定して、行を直接 Product にする row_factory です。
+#SELECT の列の順番は PRODUCT_COLUMNS と同じにしてください。
+def product_row_factory(cursor, row) -> Product:
+    """
+    sqlite3 の row_factory（SELECT の列が PRODUCT_COLUMNS の順であること）
+    
+    Args:
+        cursor: sqlite3.Cursor
+        row: 行のタプル
+        
+    Returns:
+        Product: 商品オブジェクト
+    """
+    return Product.from_row_tuple(row)
+
 # テスト用のサンプルデータ作成関数
 def create_sample_products():
     """
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+商品の識別子マップ（LRUキャッシュ）
+DatabaseManager.get_product_object_by_id が読み込んだ Product を商品IDごとに覚えておき、
+同じ商品を何度引いても SQLite を読まずに同じオブジェクトを返す
+
+他の接続（別のプロセスなど）のコミットは、常時開いておく監視用の接続の
+PRAGMA data_version の変化で検出し、キャッシュ全体を捨てる。data_version は接続ごとの値のため、
+同じ接続で読み続ける必要がある。確認は check_interval 秒に1回までで、続けて引く間は SQLite を読まない。
+
+このマネージャー自身の書き込みも data_version を変えるため、コミットの前に refresh() で他の接続の
+コミットを確認し、コミットの後に record_commit() で書き込んだ商品だけを外して新しい data_version を覚える。
+
+使い方:
+    cache = ProductCache(db_path, max_entries=1024)
+    product = cache.get(product_id)       # 見つからなければ None
+    if product is None:
+        generation = cache.generation     # 読み込む前の世代
+        product = ...                     # データベースから読み込む
+        product = cache.put(product, generation)
+    cache.invalidate([product_id])        # 書き込む商品を外す
+    cache.refresh()                       # コミットの直前（書き込みロックを持っている間）
+    conn.commit()
+    cache.record_commit([product_id])     # 自分のコミットとして覚える
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from utils.config import PRODUCT_CACHE_CHECK_SECONDS
+from utils.metrics import REGISTRY
+
+from .product import Product
+
+
+class ProductCache:
+    """
+    商品IDをキーにした Product の LRU キャッシュ（スレッドセーフ）
+    """
+
+    def __init__(self, db_path, max_entries: int = 1024,
+                 check_interval: float = PRODUCT_CACHE_CHECK_SECONDS):
+        """
+        Args:
+            db_path: 変更を監視するデータベースファイルのパス
+            max_entries: 覚えておく商品数（超えたら最も使われていないものから捨てる）
+            check_interval: 他の接続のコミットを確認する間隔（秒・0で参照のたびに確認）
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self._entries: "OrderedDict[int, Product]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._data_version = None
+        self._checked_at: Optional[float] = None
+        # 商品を外すたびに進め、その前から読み込んでいた商品を覚えないようにする
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def generation(self) -> int:
+        """
+        キャッシュから商品を外した回数（データベースから読み込む前に取得して put() に渡す）
+        """
+        return self._generation
+
+    def get(self, product_id: int) -> Optional[Product]:
+        """
+        キャッシュ済みの商品を返す（なければNone）
+        """
+        with self._lock:
+            self._check_data_version()
+            product = self._entries.get(product_id)
+            if product is None:
+                REGISTRY.counter("inventory_product_cache_total", "商品キャッシュの参照数", result="miss").inc()
+                return None
+            self._entries.move_to_end(product_id)
+            REGISTRY.counter("inventory_product_cache_total", "商品キャッシュの参照数", result="hit").inc()
+            return product
+
+    def put(self, product: Product, generation: Optional[int] = None) -> Product:
+        """
+        データベースから読み込んだ商品を覚える
+
+        読み込みの途中で別の誰かが同じ商品を入れていた場合は、先に入っていた方を返す
+        （同じ商品IDには常に同じオブジェクトを返すため）。
+        読み込みの間に商品が外された（書き込まれた）場合は、読み込んだ値が古い可能性があるため覚えない
+
+        Args:
+            product: データベースから読み込んだ商品
+            generation: 読み込む前に取得した generation
+        """
+        with self._lock:
+            if self._check_data_version():
+                return product
+            if generation is not None and generation != self._generation:
+                return product
+            existing = self._entries.get(product.product_id)
+            if existing is not None:
+                self._entries.move_to_end(product.product_id)
+                return existing
+            self._entries[product.product_id] = product
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return product
+
+    def invalidate(self, product_ids: Iterable[int]):
+        """
+        指定した商品を捨てる（書き込みの前後に呼ぶ）
+        """
+        with self._lock:
+            self._generation += 1
+            for product_id in product_ids:
+                self._entries.pop(product_id, None)
+
+    def refresh(self):
+        """
+        間隔にかかわらず、他の接続のコミットを今すぐ確認する（自分のコミットの直前に呼ぶ）
+        """
+        with self._lock:
+            self._check_data_version(force=True)
+
+    def record_commit(self, product_ids: Iterable[int]):
+        """
+        このマネージャー自身のコミットの後に呼び、書き込んだ商品を外して新しい data_version を覚える
+
+        書き込み中は他の接続がコミットできないため、直前の refresh() からの変化は自分のコミットの分になる
+        （コミットしてからここで読むまでの間に他の接続がコミットした場合だけは見落とす）。
+        """
+        with self._lock:
+            self._generation += 1
+            for product_id in product_ids:
+                self._entries.pop(product_id, None)
+            if self._data_version is None:
+                return
+            version = self._read_data_version()
+            if version is None:
+                self._entries.clear()
+            self._data_version = version
+            self._checked_at = time.monotonic()
+
+    def clear(self):
+        """
+        キャッシュ全体を捨てる
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def close(self):
+        """
+        監視用の接続を閉じる
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._generation += 1
+            self._entries.clear()
+            self._data_version = None
+            self._checked_at = None
+
+    def _read_data_version(self) -> Optional[int]:
+        """
+        監視用の接続から PRAGMA data_version を読む（ロック内で呼ぶ・内部用）
+
+        Returns:
+            Optional[int]: data_version（読めない場合はNone）
+        """
+        try:
+            if self._connection is None:
+                self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            return self._connection.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+    def _check_data_version(self, force: bool = False) -> bool:
+        """
+        前回から他の接続がコミットしていればキャッシュ全体を捨てる（ロック内で呼ぶ・内部用）
+
+        Args:
+            force: Trueの場合は確認の間隔にかかわらず確認する
+
+        Returns:
+            bool: キャッシュを捨てた場合True
+        """
+        now = time.monotonic()
+        if (not force and self._data_version is not None
+                and now - self._checked_at < self.check_interval):
+            return False
+        version = self._read_data_version()
+        self._checked_at = now
+        if version is None:
+            # 変更を確認できない間はキャッシュを使わない
+            self._generation += 1
+            self._entries.clear()
+            self._data_version = None
+            return True
+        if version != self._data_version:
+            self._generation += 1
+            self._entries.clear()
+            self._data_version = version
+            return True
+        return False
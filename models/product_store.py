@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+商品一覧の列指向ストア
+商品一覧を Product オブジェクトのリストではなく列ごとの NumPy 配列で持ち、
+在庫状況・期限切れ・絞り込み条件を全商品まとめて（1回の配列演算で）判定する
+
+列の持ち方:
+    ids                  商品ID (int64)
+    current_stock        現在在庫 (int64)
+    min_stock            最小在庫 (int64)
+    price                価格 (float64、未設定は NaN)
+    expiry_days          消費期限の日付の序数 (int64、未設定・不正な日付は NO_EXPIRY)
+    codes[列名]          ブランド・サイズ・カテゴリ・購入場所・保存場所・消費期限・
+                         登録日時・更新日時の辞書番号 (int32)。values[列名] のリストでの位置
+    names                商品名（Python のリスト）
+    search_names         小文字にした商品名（検索用の固定長文字列配列）
+
+Product オブジェクトは表示する行の分だけ products() / product() で作る。
+
+使い方:
+    store = ProductStore.load(db_manager)
+    mask = store.filter_mask(search="牛乳", status='low_stock')
+    for product in store.products(np.flatnonzero(mask)):
+        ...
+"""
+
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .product import Product, parse_expiry_date
+
+# 在庫状況コード（status_codes() の値）
+STATUS_NORMAL = 0
+STATUS_LOW_STOCK = 1
+STATUS_OUT_OF_STOCK = 2
+
+# 在庫状況コードと Product.get_stock_status() の文字列の対応
+STATUS_NAMES = ('normal', 'low_stock', 'out_of_stock')
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+# 消費期限がない（または日付として読めない）商品の expiry_days
+NO_EXPIRY = np.iinfo(np.int64).max
+
+# 辞書番号で持つ列（PRODUCT_COLUMNS での位置）
+ENCODED_COLUMNS = {
+    'brand': 2,
+    'size': 3,
+    'category': 4,
+    'purchase_location': 7,
+    'storage_location': 9,
+    'expiry_date': 10,
+    'created_at': 11,
+    'updated_at': 12
+}
+
+
+def _expiry_ordinal(value) -> int:
+    """
+    消費期限の文字列を日付の序数にする（Product.is_expired と同じ形式・内部用）
+    """
+    expiry = parse_expiry_date(value)
+    return NO_EXPIRY if expiry is None else expiry.toordinal()
+
+
+class ProductStore:
+    """
+    商品一覧の列指向ストア（並び順は読み込んだ順・商品名順）
+    """
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.current_stock = np.empty(0, dtype=np.int64)
+        self.min_stock = np.empty(0, dtype=np.int64)
+        self.price = np.empty(0, dtype=np.float64)
+        self.expiry_days = np.empty(0, dtype=np.int64)
+        self.codes: Dict[str, np.ndarray] = {
+            name: np.empty(0, dtype=np.int32) for name in ENCODED_COLUMNS
+        }
+        self.values: Dict[str, list] = {name: [] for name in ENCODED_COLUMNS}
+        self.names: List[str] = []
+        self.search_names = np.empty(0, dtype=str)
+
+    @classmethod
+    def load(cls, db_manager, batch_size: int = 50000) -> 'ProductStore':
+        """
+        データベースから全商品を読み込む
+
+        Args:
+            db_manager: DatabaseManager
+            batch_size: 一度に読み込む行数
+
+        Returns:
+            ProductStore: 商品名順のストア
+        """
+        return cls.from_batches(db_manager.iter_product_tuple_batches(batch_size))
+
+    @classmethod
+    def from_products(cls, products: Iterable[Product]) -> 'ProductStore':
+        """
+        Product オブジェクトのリストから作成
+        """
+        return cls.from_rows([
+            (p.product_id, p.name, p.brand, p.size, p.category, p.current_stock, p.min_stock,
+             p.purchase_location, p.price, p.storage_location, p.expiry_date,
+             p.created_at, p.updated_at)
+            for p in products
+        ])
+
+    @classmethod
+    def from_rows(cls, rows: List[tuple]) -> 'ProductStore':
+        """
+        PRODUCT_COLUMNS の順に並んだタプルのリストから作成
+        """
+        return cls.from_batches([rows] if rows else [])
+
+    @classmethod
+    def from_batches(cls, batches: Iterable[List[tuple]]) -> 'ProductStore':
+        """
+        PRODUCT_COLUMNS の順に並んだタプルのバッチから作成
+
+        Args:
+            batches: iter_product_tuple_batches() などのタプルのリストの列
+
+        Returns:
+            ProductStore: ストア
+        """
+        store = cls()
+        columns = [[] for _ in range(13)]
+        indexes = {name: {} for name in ENCODED_COLUMNS}
+
+        for rows in batches:
+            if not rows:
+                continue
+            batch_columns = list(zip(*rows))
+            for position in (0, 1, 5, 6, 8):
+                columns[position].extend(batch_columns[position])
+            # 重複の多い文字列は辞書番号にする（同じ値は1つだけ持つ）
+            for name, position in ENCODED_COLUMNS.items():
+                index = indexes[name]
+                for value in dict.fromkeys(batch_columns[position]):
+                    index.setdefault(value, len(index))
+                columns[position].extend(map(index.__getitem__, batch_columns[position]))
+
+        store.ids = np.array(columns[0], dtype=np.int64)
+        store.names = columns[1]
+        store.search_names = np.array([name.lower() for name in columns[1]], dtype=str)
+        store.current_stock = np.array(columns[5], dtype=np.int64)
+        store.min_stock = np.array(columns[6], dtype=np.int64)
+        store.price = np.array(columns[8], dtype=np.float64)
+        for name, position in ENCODED_COLUMNS.items():
+            store.codes[name] = np.array(columns[position], dtype=np.int32)
+            store.values[name] = list(indexes[name])
+
+        # 日付の解析は異なる値ごとに1回だけ行う
+        expiry_ordinals = np.array([_expiry_ordinal(value) for value in store.values['expiry_date']],
+                                   dtype=np.int64)
+        store.expiry_days = expiry_ordinals[store.codes['expiry_date']]
+        return store
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # === 判定（全商品をまとめて計算） ===
+
+    def status_codes(self) -> np.ndarray:
+        """
+        在庫状況コードを返す（Product.get_stock_status() と同じ判定）
+
+        Returns:
+            np.ndarray: STATUS_NORMAL / STATUS_LOW_STOCK / STATUS_OUT_OF_STOCK (int8)
+        """
+        codes = np.full(len(self), STATUS_NORMAL, dtype=np.int8)
+        codes[self.current_stock <= self.min_stock] = STATUS_LOW_STOCK
+        codes[self.current_stock <= 0] = STATUS_OUT_OF_STOCK
+        return codes
+
+    def expired_mask(self, today: Optional[date] = None) -> np.ndarray:
+        """
+        期限切れの商品をTrueにした配列を返す（Product.is_expired() と同じく当日も期限切れ）
+
+        Args:
+            today: 基準日（省略時は今日）
+        """
+        today = today or date.today()
+        return self.expiry_days <= today.toordinal()
+
+    def filter_mask(self, search: str = "", category: Optional[str] = None,
+                    status: Optional[str] = None, expired_only: bool = False,
+                    status_codes: Optional[np.ndarray] = None,
+                    expired: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        絞り込み条件をすべて満たす商品をTrueにした配列を返す
+
+        Args:
+            search: 商品名またはブランド名の部分一致（大文字小文字を区別しない）
+            category: カテゴリ（Noneはすべて）
+            status: 在庫状況 'out_of_stock' / 'low_stock' / 'normal'（Noneはすべて）
+            expired_only: 期限切れの商品のみの場合True
+            status_codes: 計算済みの status_codes()（省略時は計算する）
+            expired: 計算済みの expired_mask()（省略時は計算する）
+
+        Returns:
+            np.ndarray: bool の配列
+        """
+        mask = np.ones(len(self), dtype=bool)
+
+        if search:
+            search = search.lower()
+            # ブランドは種類ごとに1回だけ調べて辞書番号で広げる
+            brand_matches = np.array([search in (brand or "").lower() for brand in self.values['brand']],
+                                     dtype=bool)
+            name_matches = np.strings.find(self.search_names, search) >= 0
+            mask &= name_matches | brand_matches[self.codes['brand']]
+
+        if category is not None:
+            mask &= self.codes['category'] == self._code_of('category', category)
+
+        if status is not None:
+            if status_codes is None:
+                status_codes = self.status_codes()
+            mask &= status_codes == STATUS_CODES[status]
+
+        if expired_only:
+            mask &= self.expired_mask() if expired is None else expired
+
+        return mask
+
+    def _code_of(self, column: str, value) -> int:
+        """
+        値の辞書番号を返す（存在しない値は -1・内部用）
+        """
+        try:
+            return self.values[column].index(value)
+        except ValueError:
+            return -1
+
+    # === Product オブジェクトへの変換 ===
+
+    def products(self, indices: Iterable[int]) -> Iterator[Product]:
+        """
+        指定した位置の商品だけを Product オブジェクトにする
+
+        Args:
+            indices: 位置（np.flatnonzero(mask) など）
+
+        Returns:
+            Iterator[Product]: 商品オブジェクト（indices の順）
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        positions = indices.tolist()
+        encoded = {
+            name: [values[code] for code in self.codes[name][indices].tolist()]
+            for name, values in self.values.items()
+        }
+        prices = [None if price != price else price for price in self.price[indices].tolist()]  # NaN は未設定
+
+        # 列の順番は PRODUCT_COLUMNS と同じ
+        rows = zip(
+            self.ids[indices].tolist(), [self.names[i] for i in positions],
+            encoded['brand'], encoded['size'], encoded['category'],
+            self.current_stock[indices].tolist(), self.min_stock[indices].tolist(),
+            encoded['purchase_location'], prices, encoded['storage_location'], encoded['expiry_date'],
+            encoded['created_at'], encoded['updated_at']
+        )
+        return map(Product.from_row_tuple, rows)
+
+    def product(self, index: int) -> Product:
+        """
+        指定した位置の商品を Product オブジェクトにする
+        """
+        return next(self.products([index]))
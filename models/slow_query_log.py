@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+遅いクエリの記録モジュール
+DatabaseManager が使う接続の execute / fetch の所要時間を文ごとに計り、
+しきい値を超えた文を SQL・パラメータの型・行数・所要時間・EXPLAIN QUERY PLAN 付きで
+データベースと同じフォルダのJSON Linesファイルに記録する（件数の上限あり）
+
+記録先をデータベース内のテーブルにしないのは、計測中のトランザクションと
+書き込みロックを取り合わないようにするため。
+パラメータは値ではなく型（文字列は長さ）だけを記録する。
+
+使い方:
+    connection = sqlite3.connect(db_path, factory=TimedConnection)
+    connection.slow_query_log = SlowQueryLog(slow_query_log_path(db_path))
+    connection.slow_query_threshold = 0.1
+"""
+
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+def slow_query_log_path(db_path) -> Path:
+    """
+    データベースに対応する遅いクエリの記録ファイルのパスを返す
+    """
+    path = Path(db_path)
+    return path.with_name(path.name + ".slow_queries.jsonl")
+
+
+def describe_params(params) -> Any:
+    """
+    パラメータの値を伏せて型だけにする（文字列・バイト列は長さも付ける）
+    """
+    def describe(value):
+        if value is None:
+            return "null"
+        if isinstance(value, (str, bytes)):
+            return f"{type(value).__name__}({len(value)})"
+        return type(value).__name__
+
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        return {key: describe(value) for key, value in params.items()}
+    return [describe(value) for value in params]
+
+
+def _calling_method() -> Optional[str]:
+    """
+    文を発行した DatabaseManager のメソッド名を探す（遅いときだけ呼ぶ・内部用）
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename.endswith("database.py") and not code.co_name.startswith('_'):
+            return code.co_name
+        frame = frame.f_back
+    return None
+
+
+class SlowQueryLog:
+    """
+    遅いクエリの記録ファイル（JSON Lines・上限を超えたら古いものから削除）
+    """
+
+    def __init__(self, path, max_entries: int = 500):
+        """
+        Args:
+            path: 記録ファイルのパス
+            max_entries: 残す件数
+        """
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._count = None
+
+    def record(self, entry: Dict[str, Any]):
+        """
+        1件追記（件数が上限の2倍を超えたら上限まで切り詰める）
+        """
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            try:
+                if self._count is None:
+                    self._count = len(self._read_lines())
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                self._count += 1
+                if self._count > self.max_entries * 2:
+                    self._rewrite(self._read_lines()[-self.max_entries:])
+            except OSError as e:
+                logger.error("遅いクエリの記録に失敗しました: %s", e)
+
+    def read(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        記録を新しい順に取得
+
+        Args:
+            limit: 取得する件数（省略時はすべて）
+        """
+        with self._lock:
+            lines = self._read_lines()
+        entries = []
+        for line in reversed(lines):
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # 書き込み途中で終了した行は読み飛ばす
+                continue
+            if limit is not None and len(entries) >= limit:
+                break
+        return entries
+
+    def clear(self):
+        """
+        記録をすべて削除
+        """
+        with self._lock:
+            if self.path.exists():
+                self.path.unlink()
+            self._count = 0
+
+    def _read_lines(self) -> List[str]:
+        """
+        記録ファイルの行を読む（内部用）
+        """
+        if not self.path.exists():
+            return []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return [line for line in f if line.strip()]
+
+    def _rewrite(self, lines: List[str]):
+        """
+        記録ファイルを指定した行で置き換える（内部用）
+        """
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        os.replace(temp_path, self.path)
+        self._count = len(lines)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    文ごとの所要時間（execute と fetch の合計）を計るカーソル
+
+    結果を読み終えた時点（fetchall / 件数に満たない fetchmany / fetchone）、
+    または結果を返さない文は execute の直後に、しきい値と比べて記録する。
+    for 文で1行ずつ読む場合は C の実装のまま読ませるため計らず（大量の行で遅くなるため）、
+    execute の所要時間だけをカーソルを手放した時点で行数 -1（不明）として記録する。
+    """
+
+    _sql = None
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters, many=False)
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._elapsed += time.perf_counter() - started
+        if self.description is None:
+            self._finish(self.rowcount)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        # 実行計画の取得用に最初のパラメータだけ控えておく
+        iterator = iter(seq_of_parameters)
+        first = next(iterator, None)
+        self._start(sql, first, many=True)
+        started = time.perf_counter()
+        super().executemany(sql, iterator if first is None else itertools.chain([first], iterator))
+        self._elapsed += time.perf_counter() - started
+        self._finish(self.rowcount)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._elapsed += time.perf_counter() - started
+        if row is not None:
+            self._rows += 1
+        self._finish(self._rows)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._elapsed += time.perf_counter() - started
+        self._rows += len(rows)
+        if len(rows) < size:
+            self._finish(self._rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._elapsed += time.perf_counter() - started
+        self._rows += len(rows)
+        self._finish(self._rows)
+        return rows
+
+    def __del__(self):
+        # 読み終える前に手放された文（for 文で読んだ文など）
+        if self._sql is not None:
+            self._finish(self._rows or -1)
+
+    def _start(self, sql, params, many: bool):
+        """
+        計測を開始（内部用）
+        """
+        self._sql = sql
+        self._params = params
+        self._many = many
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def _finish(self, rows: int):
+        """
+        計測を終了し、しきい値を超えていれば記録（1文につき1回・内部用）
+        """
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        connection = self.connection
+        if self._elapsed < connection.slow_query_threshold or connection.slow_query_log is None:
+            return
+
+        entry = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'duration_ms': round(self._elapsed * 1000, 3),
+            'rows': rows,
+            'method': _calling_method(),
+            'sql': " ".join(sql.split()),
+            'params': describe_params(self._params),
+            'executemany': self._many,
+            'plan': explain_query_plan(connection, sql, self._params)
+        }
+        connection.slow_query_log.record(entry)
+        REGISTRY.counter("inventory_db_slow_queries_total", "しきい値を超えたSQL文の数").inc()
+        logger.warning("遅いクエリ %.0fms (%d行, %s): %s", entry['duration_ms'], rows,
+                       entry['method'], entry['sql'][:200])
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    TimedCursor で文を実行する接続
+    """
+
+    # しきい値（秒）と記録先（接続後に設定する）
+    slow_query_threshold = 0.1
+    slow_query_log: Optional[SlowQueryLog] = None
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or TimedCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def explain_query_plan(connection: sqlite3.Connection, sql: str, params=None) -> List[str]:
+    """
+    EXPLAIN QUERY PLAN の結果を木構造のインデント付きの行で返す
+
+    Args:
+        connection: 接続
+        sql: SQL文
+        params: SQL文のパラメータ（値によって計画は変わらないため、executemany は最初の1件）
+
+    Returns:
+        List[str]: 実行計画（取得できない文はエラー内容）
+    """
+    try:
+        cursor = connection.cursor(sqlite3.Cursor)
+        rows = cursor.execute("EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()
+    except sqlite3.Error as e:
+        return [f"（実行計画を取得できません: {e}）"]
+    depth = {0: -1}
+    lines = []
+    for node_id, parent_id, _, detail in rows:
+        depth[node_id] = depth.get(parent_id, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
@@ -9,11 +9,17 @@ from datetime import datetime
 #この記述は、Pythonの型ヒント（type hint）に使うためのimport文
 from typing import Optional, Dict, Any
 
+# StockHistory.from_row_tuple / history_row_factory が前提とする stock_history テーブルの列の順番
+HISTORY_COLUMNS = ("id", "product_id", "operation_type", "quantity_change", "stock_after", "memo", "created_at")
+
 #在庫管理システムにおける「在庫履歴情報」を扱うためのPythonクラス
 class StockHistory:
     """
     在庫履歴情報を管理するクラス
     """
+    #属性を固定して、オブジェクトごとの __dict__ を持たないようにします（履歴は件数が多いためメモリを節約できる）。
+    __slots__ = ('history_id', 'product_id', 'operation_type', 'quantity_change', 'stock_after', 'memo', 'created_at')
+    
     #StockHistoryクラスのインスタンスを柔軟に初期化するためのもの
     #data引数を使った初期化
     #**kwargsを使った個別指定での初期化 dataが渡されなかった場合は、キーワード引数で個別に属性を指定して初期化できます。
@@ -39,55 +45,34 @@ class StockHistory:
         """
         データベースデータから初期化（内部用）
         """
-        try:
-            #「在庫履歴データ（data）」から履歴ID（history_id）を柔軟に取得してセットする
-            # dataが辞書型の場合、キー 'id' または 'history_id' から履歴IDを取得します。
-            # もしどちらのキーも存在しない場合は、Noneをセットします
-            self.history_id = data['id'] if 'id' in data.keys() else (data['history_id'] if 'history_id' in data.keys() else None)
-            # dataが辞書型の場合、キー 'product_id' から商品IDを取得します。
-            # もしキー 'product_id' が存在しない場合は、Noneをセットします。
-            # これにより、在庫履歴が関連する商品を識別するためのIDをセットします。
-            self.product_id = data['product_id'] if 'product_id' in data.keys() else None
-            # dataが辞書型の場合、キー 'operation_type' から操作種別を取得します。
-            # もしキー 'operation_type' が存在しない場合は、空文字列をセットします。
-            # これにより、在庫の操作種別を表す文字列をセットします。
-            # 例えば、'purchase'（購入）、'use'（使用）、'adjust'（調整）などが考えられます。
-            self.operation_type = data['operation_type'] if 'operation_type' in data.keys() else ''
-            # dataが辞書型の場合、キー 'quantity_change' から数量変化を取得します。
-            # もしキー 'quantity_change' が存在しない場合は、0をセットします。
-            # これにより、在庫の数量変化を表す整数値をセットします。
-            # 例えば、在庫が5個増えた場合は5、3個減った場合は-3などが考えられます。
-            self.quantity_change = data['quantity_change'] if 'quantity_change' in data.keys() else 0
-            # dataが辞書型の場合、キー 'stock_after' から操作後の在庫数を取得します。
-            # もしキー 'stock_after' が存在しない場合は、0をセットします。
-            # これにより、在庫操作後の残り在庫数を表す整数値をセットします。
-            # 例えば、在庫操作後に残り10個の在庫がある場合は10、
-            # 5個の在庫がある場合は5などが考えられます。
-            self.stock_after = data['stock_after'] if 'stock_after' in data.keys() else 0
-            # dataが辞書型の場合、キー 'memo' からメモを取得します。
-            # もしキー 'memo' が存在しない場合は、空文字列をセットします。
-            # これにより、在庫履歴に関連するメモやコメントを表す文字列をセットします。
-            # 例えば、在庫操作の理由や詳細を記録するためのメモが考えられます。
-            # 例えば、「初回購入」や「使用」などのメモが考えられます。
-            self.memo = data['memo'] if 'memo' in data.keys() else ''
-            # dataが辞書型の場合、キー 'created_at' から作成日時を取得します。
-            # もしキー 'created_at' が存在しない場合は、Noneをセットします。
-            # これにより、在庫履歴の作成日時を表す文字列をセットします。
-            # 例えば、在庫履歴が作成された日時を記録するためのものです。
-            self.created_at = data['created_at'] if 'created_at' in data.keys() else None
-        # dataが辞書型以外の場合（例: sqlite3.Rowオブジェクトなど）に備えた処理
-        # 辞書型以外のデータ構造からも在庫履歴を初期化できるようにしています。
-        # 辞書型以外のデータ構造（例: sqlite3.Rowオブジェクトなど）から在庫履歴を初期化するための処理
-        except (KeyError, TypeError):   # 辞書以外（例: sqlite3.Rowオブジェクト）
-            # dataが辞書型でない場合、キー 'id' または 'history_id' から履歴IDを取得します。
-            # もしどちらのキーも存在しない場合は、Noneをセットします
-            self.history_id = data['id'] if 'id' in data.keys() else (data['history_id'] if 'history_id' in data.keys() else None)
-            self.product_id = data['product_id'] if 'product_id' in data.keys() else None
-            self.operation_type = data['operation_type'] if 'operation_type' in data.keys() else ''
-            self.quantity_change = data['quantity_change'] if 'quantity_change' in data.keys() else 0
-            self.stock_after = data['stock_after'] if 'stock_after' in data.keys() else 0
-            self.memo = data['memo'] if 'memo' in data.keys() else ''
-            self.created_at = data['created_at'] if 'created_at' in data.keys() else None
+        #キーの一覧は1回だけ取り出して集合にしておく（項目ごとに data.keys() を呼ばない）
+        keys = set(data.keys())
+        #「id」または「history_id」というキーの値を履歴IDとして使う
+        self.history_id = data['id'] if 'id' in keys else (data['history_id'] if 'history_id' in keys else None)
+        #キーがなければ既定値（操作種別・メモは空文字、数量は0、日時はNone）をセットします。
+        self.product_id = data['product_id'] if 'product_id' in keys else None
+        self.operation_type = data['operation_type'] if 'operation_type' in keys else ''
+        self.quantity_change = data['quantity_change'] if 'quantity_change' in keys else 0
+        self.stock_after = data['stock_after'] if 'stock_after' in keys else 0
+        self.memo = data['memo'] if 'memo' in keys else ''
+        self.created_at = data['created_at'] if 'created_at' in keys else None
+    
+    #SELECT の列の順番が HISTORY_COLUMNS と同じ行（タプル）から、キーを引かずに作成する高速な経路です。
+    @classmethod
+    def from_row_tuple(cls, row) -> 'StockHistory':
+        """
+        HISTORY_COLUMNS の順に並んだ値から在庫履歴オブジェクトを作成
+        
+        Args:
+            row: タプル（または sqlite3.Row）
+            
+        Returns:
+            StockHistory: 在庫履歴オブジェクト
+        """
+        history = cls.__new__(cls)
+        (history.history_id, history.product_id, history.operation_type, history.quantity_change,
+         history.stock_after, history.memo, history.created_at) = row
+        return history
     
     #キーワード引数（名前付きの値）から在庫履歴オブジェクトの各属性をセットする内部メソッド
     #キーワード引数から在庫履歴の情報を柔軟にセットできる内部用メソッド
@@ -328,6 +313,40 @@ def create_history_list_from_rows(rows) -> list[StockHistory]:
     #複数のデータベース行（rows）から、StockHistoryオブジェクトのリストを一括で生成して返しています。
     return [StockHistory(data=row) for row in rows]
 
+#sqlite3 のカーソルに設定して、行を直接 StockHistory にする row_factory です。
+#SELECT の列の順番は HISTORY_COLUMNS と同じにしてください。
+def history_row_factory(cursor, row) -> StockHistory:
+    """
+    sqlite3 の row_factory（SELECT の列が HISTORY_COLUMNS の順であること）
+    """
+    return StockHistory.from_row_tuple(row)
+
+#操作種別と数量から「数量変化」と「操作後の在庫数」を計算する関数です。
+#GUIの在庫増減ダイアログとCLIの両方で同じ計算ルールを使うためのものです。
+def calculate_stock_change(current_stock: int, operation_type: str, quantity: int) -> tuple[int, int]:
+    """
+    操作種別と数量から数量変化と操作後在庫数を計算
+
+    Args:
+        current_stock: 現在の在庫数
+        operation_type: 操作種別 ('purchase', 'use', 'adjust')
+        quantity: 数量（購入・使用は増減数、調整は調整後の在庫数）
+
+    Returns:
+        tuple[int, int]: (数量変化, 操作後在庫数)
+        数量変化は常に 操作後在庫数 - 現在の在庫数（履歴の増減を足し合わせると在庫数になる）
+    """
+    if operation_type == 'purchase':
+        new_stock = current_stock + quantity
+    elif operation_type == 'use':
+        # 使用時は在庫が負にならないようにする（在庫より多い使用は在庫分だけの減少として記録）
+        new_stock = max(0, current_stock - quantity)
+    elif operation_type == 'adjust':
+        new_stock = quantity
+    else:
+        raise ValueError(f"不明な操作種別です: {operation_type}")
+    return new_stock - current_stock, new_stock
+
 # テスト実行（このファイルが直接実行された場合）
 if __name__ == "__main__":
     print("=== 在庫履歴データモデルのテスト ===")
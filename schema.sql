@@ -1,15 +1,40 @@
+-- 参照テーブル（繰り返し出てくる文字列を小さな整数IDにする）
+-- カテゴリ・保存場所・購入場所の初期値は create_database が utils.config から登録する
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS storage_locations (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS purchase_locations (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS operation_types (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+-- 操作種別のIDは固定（SQLの集計と履歴スナップショットの操作コードがこの値を使う）
+INSERT OR IGNORE INTO operation_types (id, name) VALUES (1, 'purchase'), (2, 'use'), (3, 'adjust');
+
 -- テーブル作成（UNIQUE制約付き）
 CREATE TABLE IF NOT EXISTS products (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL,
     brand TEXT,
     size TEXT,
-    category TEXT NOT NULL,
+    category_id INTEGER NOT NULL REFERENCES categories (id),
     current_stock INTEGER NOT NULL DEFAULT 0,
     min_stock INTEGER NOT NULL DEFAULT 1,
-    purchase_location TEXT,
+    purchase_location_id INTEGER REFERENCES purchase_locations (id),
     price REAL,
-    storage_location TEXT,
+    storage_location_id INTEGER REFERENCES storage_locations (id),
     expiry_date DATE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -19,16 +44,52 @@ CREATE TABLE IF NOT EXISTS products (
 CREATE TABLE IF NOT EXISTS stock_history (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     product_id INTEGER NOT NULL,
-    operation_type TEXT NOT NULL,
+    operation_type_id INTEGER NOT NULL REFERENCES operation_types (id),
     quantity_change INTEGER NOT NULL,
     stock_after INTEGER NOT NULL,
     memo TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- 古い履歴を期間ごとにまとめたチェックポイント行では、まとめた件数と最初の日時（通常の行は 1 / NULL）
+    event_count INTEGER NOT NULL DEFAULT 1,
+    period_start TIMESTAMP,
     FOREIGN KEY (product_id) REFERENCES products (id)
 );
 
+-- 商品ごとの使用ペースの予測状態（使用を記録するたびに1行だけ更新する・models/forecast.py）
+CREATE TABLE IF NOT EXISTS usage_forecasts (
+    product_id INTEGER PRIMARY KEY REFERENCES products (id),
+    usage_rate REAL,                -- 1日あたりの使用数（指数加重移動平均・2回目の使用から）
+    last_used_day REAL NOT NULL,    -- 最後に使用した日時（ユリウス日）
+    use_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- 読み込み用のビュー（参照テーブルの名前を文字列の列として返す・列の順番は PRODUCT_COLUMNS と同じ）
+-- 参照テーブルはすべて LEFT JOIN にして、常に products / stock_history 側から読む（並び順にインデックスを使うため）
+CREATE VIEW IF NOT EXISTS product_details AS
+SELECT p.id, p.name, p.brand, p.size, c.name AS category,
+       p.current_stock, p.min_stock, pl.name AS purchase_location,
+       p.price, sl.name AS storage_location, p.expiry_date,
+       p.created_at, p.updated_at,
+       p.category_id
+FROM products p
+LEFT JOIN categories c ON c.id = p.category_id
+LEFT JOIN purchase_locations pl ON pl.id = p.purchase_location_id
+LEFT JOIN storage_locations sl ON sl.id = p.storage_location_id;
+
+-- 列の順番は HISTORY_COLUMNS と同じ
+CREATE VIEW IF NOT EXISTS stock_history_details AS
+SELECT h.id, h.product_id, o.name AS operation_type, h.quantity_change,
+       h.stock_after, h.memo, h.created_at,
+       h.operation_type_id
+FROM stock_history h
+LEFT JOIN operation_types o ON o.id = h.operation_type_id;
+
 -- インデックス作成
-CREATE INDEX IF NOT EXISTS idx_products_category ON products(category);
+-- カテゴリで絞り込んだ商品を名前順に取得するための複合インデックス（category_id単独の検索も兼ねる）
+CREATE INDEX IF NOT EXISTS idx_products_category_name ON products(category_id, name);
+DROP INDEX IF EXISTS idx_products_category;
 CREATE INDEX IF NOT EXISTS idx_products_stock_status ON products(current_stock, min_stock);
-CREATE INDEX IF NOT EXISTS idx_stock_history_product_id ON stock_history(product_id);
-CREATE INDEX IF NOT EXISTS idx_stock_history_created_at ON stock_history(created_at);
\ No newline at end of file
+-- 商品ごとの履歴を日時順に取得するための複合インデックス（product_id単独の検索も兼ねる）
+CREATE INDEX IF NOT EXISTS idx_stock_history_product_created ON stock_history(product_id, created_at);
+DROP INDEX IF EXISTS idx_stock_history_product_id;
+CREATE INDEX IF NOT EXISTS idx_stock_history_created_at ON stock_history(created_at);
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+テスト共通設定
+プロジェクトルートをインポートパスに追加（どこから pytest を実行しても models を読み込めるように）
+
+共通のフィクスチャ:
+    db_path  スキーマ作成済みの空のデータベースファイルのパス
+    db       db_path を開いた DatabaseManager（遅いクエリのログは無効）
+
+商品や履歴が必要なテストファイルでは、同じ名前のフィクスチャで db を受け取って登録する:
+
+    @pytest.fixture
+    def db(db):
+        db.add_products([...])
+        return db
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.database import DatabaseManager, create_database  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "inventory.db")
+    create_database(path)
+    return path
+
+
+@pytest.fixture
+def db(db_path):
+    return DatabaseManager(db_path, slow_query_threshold_ms=None)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+models.backup（オンラインバックアップと世代管理）のテスト
+"""
+
+import gzip
+import logging
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+import models.backup
+from models.backup import BackupService
+from models.product import Product
+
+
+@pytest.fixture
+def db(db):
+    db.add_products([Product(name=f"商品{i}", category="食品", current_stock=i) for i in range(50)])
+    return db
+
+
+def product_count(path):
+    conn = sqlite3.connect(str(path))
+    try:
+        return conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_backups_rotate_to_the_newest_generations(db, tmp_path):
+    backup_dir = tmp_path / "backups"
+    backup_dir.mkdir()
+    # 別のデータベースのバックアップや関係ないファイルは消さない
+    others = [backup_dir / "household-20240101-000000-000000.db", backup_dir / "inventory-notes.txt"]
+    for path in others:
+        path.write_bytes(b"")
+
+    service = BackupService(db.db_path, backup_dir, keep_generations=2, compress=False, step_sleep=0)
+    results = [service.run_backup() for _ in range(3)]
+    assert all(result['success'] and result['integrity'] == "ok" for result in results)
+    assert [result['removed'] for result in results] == [[], [], [results[0]['path']]]
+
+    assert [str(path) for path in service.list_backups()] == [results[1]['path'], results[2]['path']]
+    assert all(path.exists() for path in others)
+    assert not list(backup_dir.glob("*.partial"))
+    assert product_count(results[2]['path']) == 50
+
+
+def test_compressed_backup_restores_to_an_intact_database(db, tmp_path):
+    service = BackupService(db.db_path, tmp_path / "backups", pages_per_step=1, step_sleep=0)
+    result = service.run_backup()
+    assert result['success'] and result['path'].endswith(".db.gz")
+    assert result['pages'] > 1
+
+    restored = tmp_path / "restored.db"
+    with gzip.open(result['path'], 'rb') as src:
+        restored.write_bytes(src.read())
+    assert BackupService._check_integrity(restored) == "ok"
+    assert product_count(restored) == 50
+
+
+def test_writes_during_copy_fall_back_to_a_single_step_copy(db, tmp_path, monkeypatch, caplog):
+    writes = []
+
+    def write_between_steps(seconds):
+        # ステップ間に別の接続から書き込み、ページ数を増やしてコピーをやり直させる
+        conn = sqlite3.connect(db.db_path)
+        with conn:
+            conn.execute("INSERT INTO products (name, category_id, current_stock) VALUES (?, 1, 0)",
+                         (f"追加{len(writes)}" + "x" * 8000,))
+        conn.close()
+        writes.append(seconds)
+
+    monkeypatch.setattr(models.backup.time, 'sleep', write_between_steps)
+    service = BackupService(db.db_path, tmp_path / "backups", compress=False,
+                            pages_per_step=1, step_sleep=0.01, max_restarts=1)
+    with caplog.at_level(logging.WARNING, logger="models.backup"):
+        result = service.run_backup()
+
+    assert result['success'] and result['integrity'] == "ok"
+    assert len(writes) >= 2
+    assert "一括コピーに切り替えます" in caplog.text
+    # 一括コピーはやり直し前の書き込みもすべて含む
+    assert product_count(result['path']) == 50 + len(writes)
+
+
+def test_stop_interrupts_a_running_backup_without_leaving_files(db, tmp_path, monkeypatch):
+    backup_dir = tmp_path / "backups"
+    service = BackupService(db.db_path, backup_dir, pages_per_step=1, step_sleep=0.01)
+    # 最初のステップ間のスリープ中に停止を依頼する
+    monkeypatch.setattr(models.backup.time, 'sleep', lambda seconds: service.stop())
+
+    result = service.run_backup()
+    assert result['success'] is False
+    assert result['error'] == "中断されました"
+    assert result['path'] is None
+    assert list(Path(backup_dir).iterdir()) == []
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+models.cancellation と DatabaseManager.cancellable のテスト
+"""
+
+import threading
+import time
+
+import pytest
+
+from models.cancellation import CancelToken, QueryCancelled
+from models.export import export_to_file
+from models.product import Product
+
+# 打ち切られない限り終わらないクエリ
+ENDLESS_QUERY = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT COUNT(*) FROM c"
+
+
+@pytest.fixture
+def db(db):
+    db.add_products(Product({'name': f"商品{index}", 'category': "食品", 'current_stock': 10})
+                         for index in range(50))
+    db.bulk_add_history(
+        {'product_id': product_id, 'created_at': f"2024-01-{day:02d} 09:00:00",
+         'operation_type': 'purchase', 'quantity': 1, 'memo': None}
+        for product_id in range(1, 51) for day in range(1, 21)
+    )
+    return db
+
+
+def test_cancel_from_another_thread_interrupts_running_statement(db):
+    token = CancelToken()
+    timer = threading.Timer(0.1, token.cancel)
+    timer.start()
+    started = time.monotonic()
+
+    with pytest.raises(QueryCancelled) as excinfo:
+        with db.cancellable(token):
+            with db._get_connection() as conn:
+                conn.execute(ENDLESS_QUERY).fetchone()
+
+    assert excinfo.value.reason == 'cancelled'
+    assert time.monotonic() - started < 5
+
+
+def test_deadline_aborts_methods_that_swallow_errors(db):
+    token = CancelToken(timeout=0)
+
+    with pytest.raises(QueryCancelled) as excinfo:
+        with db.cancellable(token):
+            db.get_stock_history(limit=-1)
+
+    assert excinfo.value.reason == 'timeout'
+
+
+def test_cancelled_batch_iteration_stops_and_manager_recovers(db):
+    token = CancelToken()
+
+    with pytest.raises(QueryCancelled):
+        with db.cancellable(token):
+            for batch_number, _ in enumerate(db.iter_history_row_batches(batch_size=10)):
+                if batch_number == 2:
+                    token.cancel()
+
+    # トークンの範囲外では通常どおり読める
+    assert db.count_stock_history() == 1000
+    assert len(db.get_stock_history(limit=-1)) == 1000
+
+
+def test_uncancelled_block_returns_normally(db):
+    with db.cancellable(CancelToken(timeout=60)) as token:
+        summary = db.get_stock_summary()
+
+    assert summary['total_products'] == 50
+    assert not token.is_cancelled()
+
+
+def test_cancelled_export_removes_partial_file(db, tmp_path):
+    token = CancelToken()
+    path = tmp_path / "history.csv"
+
+    def progress(written, total):
+        if written >= 100:
+            token.cancel()
+
+    with pytest.raises(QueryCancelled):
+        with db.cancellable(token):
+            export_to_file(db, 'history', str(path), batch_size=50,
+                           progress_callback=progress, is_cancelled=token.is_cancelled)
+
+    assert not path.exists()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+models.export（商品・在庫履歴・統計のCSV/JSONL逐次出力）のテスト
+"""
+
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from models.export import EXPORT_COLUMNS, export_to_file, open_export_stream, write_export
+from models.product import Product
+
+
+@pytest.fixture
+def db(db):
+    db.add_products([
+        Product(name="牛乳", brand="北海道, 特選", category="食品", current_stock=2, price=198),
+        Product(name='洗剤 "詰め替え"', category="洗剤", current_stock=0),
+    ])
+    db.bulk_add_history([
+        {'product_id': product_id, 'operation_type': 'purchase', 'quantity': 3,
+         'created_at': f"2024-05-0{day} 09:00:00", 'memo': "まとめ買い\n2回目"}
+        for day in range(1, 4) for product_id in (1, 2)
+    ])
+    return db
+
+
+def read_csv(path, opener=open):
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_csv_is_utf8_with_header_and_quoted_fields(db, tmp_path):
+    path = tmp_path / "products.csv"
+    result = export_to_file(db, 'products', str(path), batch_size=1)
+    assert (result['rows'], result['cancelled'], result['path']) == (2, False, str(path))
+
+    # BOMなしのUTF-8で、カンマや引用符を含む値も1列に収まる
+    raw = path.read_bytes()
+    assert not raw.startswith(b"\xef\xbb\xbf")
+    assert "牛乳".encode('utf-8') in raw
+    rows = read_csv(path)
+    assert rows[0] == EXPORT_COLUMNS['products']
+    products = [dict(zip(rows[0], row)) for row in rows[1:]]
+    assert [(p['id'], p['name'], p['brand'], p['current_stock'], p['price']) for p in products] == [
+        ("1", "牛乳", "北海道, 特選", "11", "198.0"),
+        ("2", '洗剤 "詰め替え"', "", "9", "0.0"),
+    ]
+
+
+def test_history_csv_keeps_multiline_memo_and_filters_by_product(db, tmp_path):
+    path = tmp_path / "history.csv"
+    assert export_to_file(db, 'history', str(path), product_id=2, batch_size=2)['rows'] == 3
+
+    rows = read_csv(path)
+    assert rows[0] == EXPORT_COLUMNS['history']
+    assert [(row[1], row[2], row[4], row[5], row[6]) for row in rows[1:]] == [
+        ("2", '洗剤 "詰め替え"', "3", str(stock), "まとめ買い\n2回目") for stock in (3, 6, 9)
+    ]
+
+
+def test_gzip_round_trip(db, tmp_path):
+    plain = tmp_path / "history.csv"
+    packed = tmp_path / "history.csv.gz"
+    export_to_file(db, 'history', str(plain))
+    export_to_file(db, 'history', str(packed), compress=True)
+
+    assert packed.read_bytes()[:2] == b"\x1f\x8b"
+    assert read_csv(packed, gzip.open) == read_csv(plain)
+
+
+def test_jsonl_writes_one_object_per_row_without_escaping(db):
+    buffer = io.BytesIO()
+    out = open_export_stream(buffer)
+    result = write_export(db, 'statistics', out, fmt='jsonl')
+    out.flush()
+
+    lines = buffer.getvalue().decode('utf-8').splitlines()
+    assert result['rows'] == len(lines) == 2
+    assert "牛乳" in lines[0]
+    records = [json.loads(line) for line in lines]
+    assert list(records[0]) == EXPORT_COLUMNS['statistics']
+    assert [(r['name'], r['purchase_count'], r['total_purchased']) for r in records] == [
+        ("牛乳", 3, 9), ('洗剤 "詰め替え"', 3, 9)
+    ]
+
+
+def test_progress_is_reported_per_batch(db):
+    progress = []
+    write_export(db, 'history', io.StringIO(), batch_size=4,
+                 progress_callback=lambda written, total: progress.append((written, total)))
+    assert progress == [(4, 6), (6, 6)]
+
+
+def test_unknown_kind_or_format_is_rejected(db, tmp_path):
+    with pytest.raises(ValueError):
+        write_export(db, 'history', io.StringIO(), fmt='xml')
+    path = tmp_path / "unknown.csv"
+    with pytest.raises(KeyError):
+        export_to_file(db, 'orders', str(path))
+    assert not path.exists()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+models.forecast（使用ペースの予測）と DatabaseManager の予測の更新・取得のテスト
+"""
+
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+from models.database import create_database
+from models.forecast import UsageState, fold_usage_events, format_days_of_cover, round_days_of_cover
+from models.product import Product
+
+
+@pytest.fixture
+def db(db):
+    db.add_products([
+        Product(name="牛乳", category="食品", current_stock=10),
+        Product(name="洗剤", category="洗剤", current_stock=3),
+    ])
+    return db
+
+
+def use(db, product_id, quantity):
+    stock = db.get_product_object_by_id(product_id).current_stock
+    assert db.update_stock_and_add_history({
+        'product_id': product_id, 'operation_type': 'use',
+        'quantity_change': -quantity, 'stock_after': stock - quantity
+    })
+
+
+def test_usage_rate_is_exponentially_weighted_over_intervals():
+    state = UsageState().record(2, used_day=100.0)
+    assert (state.usage_rate, state.last_used_day, state.use_count) == (None, 100.0, 1)
+
+    state = state.record(2, used_day=104.0, smoothing=0.5)
+    assert state.usage_rate == pytest.approx(0.5)
+    state = state.record(3, used_day=105.0, smoothing=0.5)
+    assert state.usage_rate == pytest.approx(0.5 * 3 + 0.5 * 0.5)
+
+    # 同じ日の連続した使用は下限の間隔で割る
+    state = state.record(1, used_day=105.1, smoothing=1.0, min_interval_days=1.0)
+    assert state.usage_rate == pytest.approx(1.0)
+    assert state.use_count == 4
+
+
+def test_fold_matches_incremental_updates():
+    events = [(1, 10.0, 1), (1, 12.0, 2), (1, 15.0, 1), (3, 1.0, 5), (3, 2.0, 5)]
+    expected = {}
+    for product_id, used_day, quantity in events:
+        expected[product_id] = expected.get(product_id, UsageState()).record(quantity, used_day)
+
+    assert dict(fold_usage_events(events)) == expected
+    assert list(fold_usage_events([])) == []
+
+
+def test_use_updates_state_without_reading_history(db):
+    statements = []
+    original = db._get_connection
+
+    def traced_connection():
+        connection = original()
+        connection.set_trace_callback(statements.append)
+        return connection
+
+    db._get_connection = traced_connection
+    use(db, 1, 1)
+    use(db, 1, 2)
+    assert not any("FROM stock_history WHERE product_id" in " ".join(sql.split()) for sql in statements)
+
+    with sqlite3.connect(db.db_path) as conn:
+        usage_rate, use_count = conn.execute(
+            "SELECT usage_rate, use_count FROM usage_forecasts WHERE product_id = 1"
+        ).fetchone()
+    # 同じ日の2回目の使用は1日で2個の使用とみなす
+    assert (usage_rate, use_count) == (pytest.approx(2.0), 2)
+
+    # 購入・調整は予測に影響しない
+    assert db.update_stock_and_add_history({
+        'product_id': 1, 'operation_type': 'purchase', 'quantity_change': 5, 'stock_after': 12
+    })
+    assert db.get_usage_forecasts()[1]['use_count'] == 2
+
+
+def test_forecasts_give_days_of_cover_and_depletion_date(db):
+    db.bulk_add_history(
+        {'product_id': 1, 'operation_type': 'use', 'quantity': 1,
+         'created_at': f"2024-01-{day:02d} 09:00:00"}
+        for day in range(1, 20, 2)
+    )
+    forecasts = db.get_usage_forecasts()
+
+    # 2日に1個のペースで、取り込み後の在庫は 10 - 10 = 0 個
+    assert list(forecasts) == [1]
+    assert forecasts[1]['usage_rate'] == pytest.approx(0.5)
+    assert forecasts[1]['days_of_cover'] == 0
+    assert forecasts[1]['depletion_date'] == date.today().isoformat()
+
+    assert db.update_stock_and_add_history({
+        'product_id': 1, 'operation_type': 'purchase', 'quantity_change': 6, 'stock_after': 6
+    })
+    forecast = db.get_usage_forecasts()[1]
+    assert forecast['days_of_cover'] == pytest.approx(12)
+    assert forecast['depletion_date'] == (date.today() + timedelta(days=12)).isoformat()
+
+
+def test_rebuild_matches_incremental_state_and_delete_removes_it(db):
+    for quantity in (1, 2):
+        use(db, 2, quantity)
+    incremental = db.get_usage_forecasts()
+
+    assert db.rebuild_usage_forecasts()
+    assert db.get_usage_forecasts() == incremental
+
+    assert db.delete_product(2)
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM usage_forecasts").fetchone()[0] == 0
+
+
+def test_existing_database_gets_forecasts_from_history(db):
+    db.bulk_add_history(
+        {'product_id': 2, 'operation_type': 'use', 'quantity': 1,
+         'created_at': f"2024-02-{day:02d} 09:00:00"}
+        for day in (1, 4, 7)
+    )
+    expected = db.get_usage_forecasts()
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("DELETE FROM usage_forecasts")
+        conn.execute("PRAGMA user_version = 1")
+
+    assert create_database(db.db_path)
+    assert db.get_usage_forecasts() == expected
+    assert expected[2]['usage_rate'] == pytest.approx(1 / 3)
+
+
+def test_days_of_cover_is_shown_rounded_to_one_decimal():
+    # 切り捨てると1日未満が「0日」（在庫切れ）に見える
+    assert [round_days_of_cover(days) for days in (0.94, 0.96, 1.99, None)] == [0.9, 1.0, 2.0, None]
+    assert [format_days_of_cover(days) for days in (0.9, 12.0, None)] == ["0.9日", "12.0日", ""]
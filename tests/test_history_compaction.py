@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DatabaseManager.compact_stock_history（古い在庫履歴のチェックポイント行への圧縮）のテスト
+"""
+
+import argparse
+import io
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+from cli import past_date
+from models.database import create_database
+from models.export import write_export
+from models.product import Product
+
+
+@pytest.fixture
+def db(db):
+    db.add_products([
+        Product(name="牛乳", category="食品", current_stock=5),
+        Product(name="洗剤", category="洗剤", current_stock=2),
+    ])
+    # 牛乳は2024年1〜2月に購入・使用を繰り返し、7月に最近の使用が1件
+    events = []
+    for month in (1, 2):
+        for day in range(1, 11):
+            events.append({'product_id': 1, 'operation_type': 'purchase', 'quantity': 2,
+                           'created_at': f"2024-{month:02d}-{day:02d} 08:00:00"})
+            events.append({'product_id': 1, 'operation_type': 'use', 'quantity': 1,
+                           'created_at': f"2024-{month:02d}-{day:02d} 20:00:00"})
+    events.append({'product_id': 1, 'operation_type': 'use', 'quantity': 1,
+                   'created_at': "2024-07-01 09:00:00"})
+    # 洗剤は1月に1件ずつで、まとめても行数が減らない
+    events.append({'product_id': 2, 'operation_type': 'purchase', 'quantity': 3,
+                   'created_at': "2024-01-05 10:00:00"})
+    events.append({'product_id': 2, 'operation_type': 'use', 'quantity': 1,
+                   'created_at': "2024-01-20 10:00:00"})
+    db.bulk_add_history(events)
+    return db
+
+
+def export_statistics(db):
+    out = io.StringIO()
+    write_export(db, 'statistics', out, fmt='jsonl')
+    return out.getvalue()
+
+
+def test_compaction_keeps_statistics_stock_and_chain(db):
+    statistics = [db.get_stock_statistics(product_id) for product_id in (1, 2)]
+    exported = export_statistics(db)
+    stocks = [db.get_product_object_by_id(product_id).current_stock for product_id in (1, 2)]
+
+    result = db.compact_stock_history(before="2024-06-01 00:00:00")
+    assert result == {'periods': 2, 'compacted_rows': 40, 'checkpoint_rows': 4}
+    assert db.count_stock_history(1) == 5
+    assert db.count_stock_history(2) == 2
+
+    assert [db.get_stock_statistics(product_id) for product_id in (1, 2)] == statistics
+    assert export_statistics(db) == exported
+    assert [db.get_product_object_by_id(product_id).current_stock for product_id in (1, 2)] == stocks
+    assert db.verify_stock_consistency()['issues'] == []
+
+    # 期間内の最後の日時に、操作種別ごとの合計と期末在庫から逆算した操作後在庫数を持つ
+    history = db.get_stock_history(1, limit=-1)
+    assert [(h.operation_type, h.quantity_change, h.stock_after, h.created_at) for h in history] == [
+        ('use', -1, stocks[0], "2024-07-01 09:00:00"),
+        ('use', -10, stocks[0] + 1, "2024-02-10 20:00:00"),
+        ('purchase', 20, stocks[0] + 11, "2024-02-10 20:00:00"),
+        ('use', -10, stocks[0] - 9, "2024-01-10 20:00:00"),
+        ('purchase', 20, stocks[0] + 1, "2024-01-10 20:00:00"),
+    ]
+    assert history[1].memo == "チェックポイント 2024-02（10件）"
+
+    # もう一度実行しても変わらない
+    assert db.compact_stock_history(before="2024-06-01 00:00:00")['compacted_rows'] == 0
+
+
+def test_checkpoint_rows_never_go_below_zero(db):
+    db.add_products([Product(name="電池", category="防災用品", current_stock=0)])
+    db.bulk_add_history(
+        {'product_id': 3, 'operation_type': operation_type, 'quantity': quantity,
+         'created_at': f"2024-03-0{day} 09:00:00"}
+        for day, (operation_type, quantity) in enumerate(
+            (('adjust', 10), ('use', 3), ('use', 2), ('adjust', 1)), 1)
+    )
+    assert db.compact_stock_history(before="2024-06-01 00:00:00")['checkpoint_rows'] == 6
+
+    # 増加の行が先に並び、表示順（新しい順）も連鎖の逆順になる
+    history = db.get_stock_history(3, limit=-1)
+    assert [(h.operation_type, h.quantity_change, h.stock_after) for h in history] == [
+        ('use', -5, 1), ('adjust', 6, 6)
+    ]
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute("SELECT MIN(stock_after) FROM stock_history").fetchone()[0] >= 0
+    assert db.verify_stock_consistency()['issues'] == []
+
+
+def test_checkpoints_merge_into_longer_periods(db):
+    statistics = db.get_stock_statistics(1)
+    assert db.compact_stock_history(before="2024-06-01 00:00:00", period='month')['checkpoint_rows'] == 4
+    result = db.compact_stock_history(before="2024-06-01 00:00:00", period='year')
+    assert result == {'periods': 1, 'compacted_rows': 4, 'checkpoint_rows': 2}
+
+    assert db.get_stock_statistics(1) == statistics
+    with sqlite3.connect(db.db_path) as conn:
+        rows = conn.execute("""
+            SELECT operation_type_id, quantity_change, event_count, period_start
+            FROM stock_history WHERE product_id = 1 AND created_at < '2024-06-01'
+            ORDER BY operation_type_id
+        """).fetchall()
+    assert rows == [(1, 40, 20, "2024-01-01 08:00:00"), (2, -20, 20, "2024-01-01 20:00:00")]
+    assert db.verify_stock_consistency()['issues'] == []
+
+    with pytest.raises(ValueError):
+        db.compact_stock_history(period='week')
+
+
+def test_forecast_rebuild_counts_compacted_uses(db):
+    use_count = db.get_usage_forecasts()[1]['use_count']
+    db.compact_stock_history(before="2024-06-01 00:00:00")
+
+    assert db.rebuild_usage_forecasts()
+    assert db.get_usage_forecasts()[1]['use_count'] == use_count == 21
+
+
+def test_existing_database_gets_checkpoint_columns(db):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("DROP VIEW stock_history_details")
+        conn.execute("ALTER TABLE stock_history DROP COLUMN period_start")
+        conn.execute("ALTER TABLE stock_history DROP COLUMN event_count")
+        conn.execute("PRAGMA user_version = 2")
+
+    assert create_database(db.db_path)
+    with sqlite3.connect(db.db_path) as conn:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(stock_history)")]
+        assert columns[-2:] == ['event_count', 'period_start']
+        assert conn.execute("SELECT COUNT(*) FROM stock_history WHERE event_count != 1").fetchone()[0] == 0
+    assert db.get_stock_statistics(1)['total_operations'] == 41
+
+
+def test_cli_before_must_be_a_past_date():
+    assert past_date("2024-06-01") == "2024-06-01 00:00:00"
+    for text in ("2024/06/01", "昨日", (date.today() + timedelta(days=1)).isoformat()):
+        with pytest.raises(argparse.ArgumentTypeError):
+            past_date(text)
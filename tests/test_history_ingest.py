@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DatabaseManager.bulk_add_history（過去の在庫履歴の一括取り込み）のテスト
+"""
+
+import random
+import sqlite3
+
+import pytest
+
+from models.product import Product
+from models.stock_history import calculate_stock_change
+
+
+@pytest.fixture
+def db(db):
+    db.add_products([
+        Product(name="電池", category="防災用品", current_stock=3),
+        Product(name="洗剤", category="洗剤", current_stock=0),
+    ])
+    return db
+
+
+def chain(db, product_id):
+    return [(h.quantity_change, h.stock_after) for h in reversed(db.get_stock_history(product_id, limit=-1))]
+
+
+def test_use_beyond_stock_is_recorded_as_the_stock_removed(db):
+    result = db.bulk_add_history(
+        {'product_id': 1, 'operation_type': operation_type, 'quantity': quantity,
+         'created_at': f"2024-05-0{day} 09:00:00"}
+        for day, (operation_type, quantity) in enumerate((('purchase', 1), ('use', 5), ('purchase', 2)), 1)
+    )
+    assert (result['inserted'], result['clamped_rows']) == (3, 1)
+    assert chain(db, 1) == [(1, 4), (-4, 0), (2, 2)]
+    assert db.get_product_object_by_id(1).current_stock == 2
+    assert db.verify_stock_consistency()['issues'] == []
+
+
+def test_recompute_matches_event_by_event_replay(db):
+    rng = random.Random(7)
+    events = [
+        {'product_id': rng.choice((1, 2)), 'operation_type': rng.choice(('purchase', 'use', 'use', 'adjust')),
+         'quantity': rng.randint(-2, 4), 'created_at': f"2024-06-{rng.randint(1, 28):02d} 10:00:00"}
+        for _ in range(200)
+    ]
+    result = db.bulk_add_history(events)
+    valid = [event for event in events if event['quantity'] >= 0]
+    assert (result['inserted'], result['skipped']) == (len(valid), len(events) - len(valid))
+
+    # 同じ日時は取り込んだ順（IDの順）に並び、GUI・CLIと同じ calculate_stock_change の規則で計算される
+    for product_id, stock in ((1, 3), (2, 0)):
+        expected = []
+        ordered = sorted((event['created_at'], index) for index, event in enumerate(valid)
+                         if event['product_id'] == product_id)
+        for _, index in ordered:
+            change, stock = calculate_stock_change(stock, valid[index]['operation_type'], valid[index]['quantity'])
+            expected.append((change, stock))
+        assert chain(db, product_id) == expected
+        assert db.get_product_object_by_id(product_id).current_stock == stock
+    assert db.verify_stock_consistency()['issues'] == []
+
+
+def test_adjust_sets_the_counted_stock_level(db):
+    result = db.bulk_add_history(
+        {'product_id': 1, 'operation_type': operation_type, 'quantity': quantity,
+         'created_at': f"2024-05-0{day} 09:00:00"}
+        for day, (operation_type, quantity) in enumerate(
+            (('purchase', 2), ('adjust', 4), ('use', 10), ('adjust', 6), ('use', 1)), 1)
+    )
+    assert (result['inserted'], result['clamped_rows']) == (5, 1)
+    assert chain(db, 1) == [(2, 5), (-1, 4), (-4, 0), (6, 6), (-1, 5)]
+    assert db.get_product_object_by_id(1).current_stock == 5
+    assert db.verify_stock_consistency()['issues'] == []
+
+
+def test_back_filled_history_keeps_a_later_stocktake(db):
+    # GUIで棚卸しした後に、それより前の購入・使用の記録を取り込む
+    change, stock = calculate_stock_change(3, 'adjust', 8)
+    assert db.update_stock_and_add_history({
+        'product_id': 1, 'operation_type': 'adjust', 'quantity_change': change, 'stock_after': stock
+    })
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE stock_history SET created_at = '2024-05-10 09:00:00'")
+
+    db.bulk_add_history([
+        {'product_id': 1, 'operation_type': 'purchase', 'quantity': 4, 'created_at': "2024-05-01 09:00:00"},
+        {'product_id': 1, 'operation_type': 'use', 'quantity': 1, 'created_at': "2024-05-02 09:00:00"},
+        {'product_id': 1, 'operation_type': 'use', 'quantity': 2, 'created_at': "2024-05-20 09:00:00"},
+    ])
+    # 棚卸しの在庫数 8 はそのままで、増減が直前の在庫数との差になる
+    assert chain(db, 1) == [(4, 7), (-1, 6), (2, 8), (-2, 6)]
+    assert db.get_product_object_by_id(1).current_stock == 6
+    assert db.verify_stock_consistency()['issues'] == []
+
+
+def test_malformed_events_are_skipped_and_counted(db):
+    good = {'product_id': 1, 'operation_type': 'purchase', 'quantity': 1, 'created_at': "2024-05-01 09:00:00"}
+    events = [
+        dict(good, product_id="2", quantity="3"),   # 文字列の数値は変換して取り込む
+        {key: value for key, value in good.items() if key != 'product_id'},
+        {key: value for key, value in good.items() if key != 'quantity'},
+        dict(good, quantity="三"),
+        dict(good, quantity=None),
+        dict(good, operation_type='sell'),
+        dict(good, quantity=-1),
+        dict(good, created_at=""),
+        dict(good, product_id=99),
+        None,
+        dict(good, memo=12),
+    ]
+    result = db.bulk_add_history(events)
+    assert (result['inserted'], result['skipped'], result['products']) == (2, 9, 2)
+    assert 'error' not in result
+    assert db.get_product_object_by_id(2).current_stock == 3
+    assert db.get_stock_history(1)[0].memo == "12"
+
+
+def test_failure_keeps_committed_chunks_with_recomputed_stock(db):
+    def events():
+        for day in range(1, 6):
+            yield {'product_id': 1, 'operation_type': 'purchase', 'quantity': 1,
+                   'created_at': f"2024-05-0{day} 09:00:00"}
+        raise RuntimeError("読み込み失敗")
+
+    with pytest.raises(RuntimeError):
+        db.bulk_add_history(events(), chunk_size=2)
+
+    # 2件ずつコミットした4件だけが残り、途中の5件目は取り消される
+    assert db.count_stock_history(1) == 4
+    assert chain(db, 1) == [(1, 4), (1, 5), (1, 6), (1, 7)]
+    assert db.get_product_object_by_id(1).current_stock == 7
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+models.history_snapshot（在庫履歴の列指向スナップショット）のテスト
+"""
+
+import numpy as np
+import pytest
+
+from models.history_snapshot import HistorySnapshot, SNAPSHOT_COLUMNS, _append_npy, usage_totals_by_product
+from models.product import Product
+
+
+@pytest.fixture
+def db(db):
+    db.add_products([
+        Product(name="牛乳", category="食品", current_stock=0),
+        Product(name="洗剤", category="洗剤", current_stock=0),
+    ])
+    add(db, 1, 'purchase', 5)
+    add(db, 1, 'use', 1)
+    add(db, 1, 'use', 1)
+    return db
+
+
+def add(db, product_id, operation_type, quantity):
+    stock = db.get_product_object_by_id(product_id).current_stock
+    change = quantity if operation_type == 'purchase' else -quantity
+    assert db.update_stock_and_add_history({
+        'product_id': product_id, 'operation_type': operation_type,
+        'quantity_change': change, 'stock_after': stock + change
+    })
+
+
+def test_refresh_appends_only_new_rows_and_rewrites_headers(db, tmp_path):
+    snapshot = HistorySnapshot(tmp_path / "snapshot")
+    assert snapshot.refresh(db) == 3
+    add(db, 2, 'purchase', 7)
+    assert snapshot.refresh(db) == 1
+    assert snapshot.refresh(db) == 0
+
+    columns = snapshot.load()
+    assert list(columns['quantity_change']) == [5, -1, -1, 7]
+    assert list(columns['product_id']) == [1, 1, 1, 2]
+    # ヘッダーの件数も追記後の件数になっている
+    for name, dtype in SNAPSHOT_COLUMNS:
+        array = np.load(tmp_path / "snapshot" / f"{name}.npy")
+        assert array.dtype == dtype and len(array) == 4
+    assert list(usage_totals_by_product(columns)) == [0, 2]
+
+
+def test_leftover_bytes_from_an_interrupted_append_are_discarded(db, tmp_path):
+    snapshot = HistorySnapshot(tmp_path / "snapshot")
+    snapshot.refresh(db)
+    # データだけ書いてヘッダーを書き換える前に止まった追記
+    with open(tmp_path / "snapshot" / "quantity_change.npy", 'ab') as f:
+        f.write(np.array([999], dtype=np.int64).tobytes())
+
+    add(db, 2, 'purchase', 7)
+    assert snapshot.refresh(db) == 1
+    assert list(snapshot.load()['quantity_change']) == [5, -1, -1, 7]
+    assert list(np.load(tmp_path / "snapshot" / "quantity_change.npy")) == [5, -1, -1, 7]
+
+
+def test_append_falls_back_to_rewrite_when_the_header_is_full(tmp_path):
+    path = tmp_path / "values.npy"
+    # 件数の桁が増えると同じ長さに収まらない、余白のないヘッダー
+    header = "{'descr': '<i8', 'fortran_order': False, 'shape': (9,), }"
+    header += " " * (64 - 10 - len(header) - 1) + "\n"
+    with open(path, 'wb') as f:
+        f.write(b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, 'little') + header.encode('latin1'))
+        f.write(np.arange(9, dtype=np.int64).tobytes())
+    assert list(np.load(path)) == list(range(9))
+
+    _append_npy(path, np.array([9, 10], dtype=np.int64))
+    assert list(np.load(path)) == list(range(11))
+
+
+def test_columns_out_of_step_with_meta_are_rebuilt(db, tmp_path):
+    snapshot = HistorySnapshot(tmp_path / "snapshot")
+    snapshot.refresh(db)
+    # 1列だけ追記が済んだところで止まった状態
+    _append_npy(tmp_path / "snapshot" / "id.npy", np.array([100], dtype=np.int64))
+
+    add(db, 2, 'purchase', 7)
+    assert snapshot.refresh(db) == 4
+    assert snapshot.read_meta()['rows'] == 4
+    assert list(snapshot.load()['id']) == [1, 2, 3, 4]
+
+
+def test_deleted_or_compacted_history_triggers_a_rebuild(db, tmp_path):
+    snapshot = HistorySnapshot(tmp_path / "snapshot")
+    db.bulk_add_history(
+        [{'product_id': 2, 'operation_type': 'purchase', 'quantity': 5, 'created_at': "2022-12-31 09:00:00"}]
+        + [{'product_id': 2, 'operation_type': 'use', 'quantity': 1, 'created_at': f"2023-01-{day:02d} 09:00:00"}
+           for day in range(1, 4)]
+    )
+    snapshot.refresh(db)
+    before = usage_totals_by_product(snapshot.load())
+    assert list(before) == [0, 2, 3]
+
+    # チェックポイント行は新しいIDで追加されるため、差分更新だけでは使用数を二重に数えてしまう
+    assert db.compact_stock_history(before="2023-12-31 00:00:00")['compacted_rows'] == 3
+    assert snapshot.refresh(db) == db.count_stock_history()
+    assert list(usage_totals_by_product(snapshot.load())) == list(before)
+
+    assert db.delete_product(2)
+    snapshot.refresh(db)
+    assert list(snapshot.load()['product_id']) == [1, 1, 1]
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+utils.logging_setup のテスト
+"""
+
+import io
+import logging
+
+import pytest
+
+from utils.logging_setup import setup_logging, shutdown_logging
+
+
+@pytest.fixture
+def restore_levels():
+    names = ["", "models.database"]
+    saved = {name: logging.getLogger(name or None).level for name in names}
+    yield
+    shutdown_logging()
+    for name, level in saved.items():
+        logging.getLogger(name or None).setLevel(level)
+
+
+def test_levels_file_output_and_lazy_formatting(tmp_path, restore_levels):
+    stream = io.StringIO()
+    log_file = tmp_path / "logs" / "inventory.log"
+    setup_logging(log_file=log_file, stream=stream, fmt="%(name)s %(levelname)s %(message)s",
+                  levels={"": "INFO", "models.database": "WARNING"})
+
+    class Expensive:
+        def __init__(self):
+            self.formatted = False
+
+        def __str__(self):
+            self.formatted = True
+            return "expensive"
+
+    filtered, emitted = Expensive(), Expensive()
+    database_logger = logging.getLogger("models.database")
+    database_logger.info("取得完了: %s", filtered)
+    database_logger.warning("在庫更新失敗: %s", emitted)
+    logging.getLogger("views.main_window").info("初期化完了")
+    shutdown_logging()
+
+    expected = ["models.database WARNING 在庫更新失敗: expensive",
+                "views.main_window INFO 初期化完了"]
+    assert stream.getvalue().splitlines() == expected
+    assert log_file.read_text(encoding='utf-8').splitlines() == expected
+    # 出力レベル未満のメッセージは組み立てられない
+    assert not filtered.formatted
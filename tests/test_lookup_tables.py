@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+参照テーブル（カテゴリ・場所・操作種別）と古いスキーマからの移行のテスト
+"""
+
+import sqlite3
+
+import pytest
+
+from models.database import SCHEMA_VERSION, DatabaseManager, create_database
+from models.product import Product
+from utils.config import DEFAULT_CATEGORIES, DEFAULT_STORAGE_LOCATIONS
+
+# 参照テーブル導入前（スキーマバージョン0）の schema.sql
+LEGACY_SCHEMA = """
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    brand TEXT,
+    size TEXT,
+    category TEXT NOT NULL,
+    current_stock INTEGER NOT NULL DEFAULT 0,
+    min_stock INTEGER NOT NULL DEFAULT 1,
+    purchase_location TEXT,
+    price REAL,
+    storage_location TEXT,
+    expiry_date DATE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(name, brand)
+);
+CREATE TABLE stock_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    operation_type TEXT NOT NULL,
+    quantity_change INTEGER NOT NULL,
+    stock_after INTEGER NOT NULL,
+    memo TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products (id)
+);
+CREATE INDEX idx_products_category_name ON products(category, name);
+CREATE INDEX idx_products_stock_status ON products(current_stock, min_stock);
+CREATE INDEX idx_stock_history_product_created ON stock_history(product_id, created_at);
+CREATE INDEX idx_stock_history_created_at ON stock_history(created_at);
+"""
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany("""
+        INSERT INTO products (id, name, brand, category, current_stock, purchase_location,
+                              storage_location, expiry_date, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, '2024-01-01 09:00:00', '2024-01-02 09:00:00')
+    """, [
+        (1, "牛乳", "明治", "食品", 2, "スーパー", "冷蔵庫", "2030-01-01"),
+        (2, "洗剤", None, "独自カテゴリ", 0, None, "", None),
+        (5, "醤油", "キッコーマン", "調味料", 1, "ネット通販", "キッチン", None),
+    ])
+    # 削除済みの商品（ID 6）の採番は移行後も再利用しない
+    conn.execute("INSERT INTO products (id, name, category) VALUES (6, '削除済み', '食品')")
+    conn.execute("DELETE FROM products WHERE id = 6")
+    conn.executemany("""
+        INSERT INTO stock_history (id, product_id, operation_type, quantity_change, stock_after, memo, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (1, 1, 'purchase', 3, 3, "まとめ買い", "2024-01-03 09:00:00"),
+        (2, 1, 'use', -1, 2, None, "2024-01-04 09:00:00"),
+        (4, 5, 'adjust', 1, 1, "棚卸し", "2024-01-05 09:00:00"),
+    ])
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_fresh_database_is_seeded_and_versioned(tmp_path):
+    db_path = str(tmp_path / "inventory.db")
+    assert create_database(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert [row[0] for row in conn.execute("SELECT name FROM categories ORDER BY id")] == DEFAULT_CATEGORIES
+        assert [row[0] for row in conn.execute("SELECT name FROM storage_locations ORDER BY id")] == \
+               DEFAULT_STORAGE_LOCATIONS
+        assert conn.execute("SELECT id, name FROM operation_types ORDER BY id").fetchall() == \
+               [(1, 'purchase'), (2, 'use'), (3, 'adjust')]
+
+    # 2回目以降の起動では何も変わらない
+    assert create_database(db_path)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM categories").fetchone()[0] == len(DEFAULT_CATEGORIES)
+
+
+def test_legacy_database_is_migrated_keeping_ids_and_strings(legacy_db):
+    assert create_database(legacy_db)
+    db = DatabaseManager(legacy_db, slow_query_threshold_ms=None)
+
+    products = {product.product_id: product for product in db.get_products_as_objects()}
+    assert sorted(products) == [1, 2, 5]
+    assert (products[1].category, products[1].purchase_location, products[1].storage_location) == \
+           ("食品", "スーパー", "冷蔵庫")
+    assert (products[2].category, products[2].purchase_location, products[2].storage_location) == \
+           ("独自カテゴリ", None, "")
+    assert products[1].created_at == "2024-01-01 09:00:00"
+
+    history = db.get_stock_history(limit=-1)
+    assert [(h.history_id, h.product_id, h.operation_type, h.memo) for h in history] == [
+        (4, 5, 'adjust', "棚卸し"), (2, 1, 'use', None), (1, 1, 'purchase', "まとめ買い")
+    ]
+
+    with sqlite3.connect(legacy_db) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+        assert {'category_id', 'storage_location_id', 'purchase_location_id'} <= columns
+        assert 'category' not in columns
+        assert not conn.execute("PRAGMA foreign_key_check").fetchall()
+        # 既定値にないカテゴリも参照テーブルに移り、既定値も登録される
+        names = {row[0] for row in conn.execute("SELECT name FROM categories")}
+        assert {"独自カテゴリ", *DEFAULT_CATEGORIES} <= names
+
+    # 削除済みのIDは再利用されない
+    product = Product(name="新商品", category="食品")
+    assert db.add_product(product)
+    assert product.product_id == 7
+
+
+def test_failed_migration_leaves_legacy_tables(legacy_db):
+    with sqlite3.connect(legacy_db) as conn:
+        # 同じ名前で列の異なるテーブルがあると、途中でカテゴリを写せずに失敗する
+        conn.execute("CREATE TABLE categories (label TEXT)")
+
+    assert not create_database(legacy_db)
+
+    with sqlite3.connect(legacy_db) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+        assert conn.execute("SELECT category FROM products WHERE id = 1").fetchone()[0] == "食品"
+        assert conn.execute("SELECT COUNT(*) FROM stock_history").fetchone()[0] == 3
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert 'products_v0' not in tables
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'idx_products_category_name'"
+                            ).fetchone()[0] == 1
+
+
+def test_writes_store_lookup_ids_and_add_new_names(db, db_path):
+
+    assert db.add_products([
+        Product(name="牛乳", category="食品", storage_location="冷蔵庫"),
+        Product(name="電池", category="防災用品", storage_location="物置", purchase_location="家電量販店"),
+        Product(name="懐中電灯", category="防災用品", storage_location="物置"),
+    ]) == 3
+    product = db.get_product_object_by_id(3)
+    product.category = "食品"
+    assert db.update_product(product)
+    assert db.update_stock_and_add_history({
+        'product_id': 1, 'operation_type': 'purchase', 'quantity_change': 2, 'stock_after': 2
+    })
+
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("""
+            SELECT p.name, c.name, p.category_id
+            FROM products p JOIN categories c ON c.id = p.category_id
+            ORDER BY p.id
+        """).fetchall()
+        assert [(name, category) for name, category, _ in rows] == \
+               [("牛乳", "食品"), ("電池", "防災用品"), ("懐中電灯", "食品")]
+        assert all(isinstance(category_id, int) for _, _, category_id in rows)
+        assert conn.execute("SELECT COUNT(*) FROM storage_locations WHERE name = '物置'").fetchone()[0] == 1
+        assert conn.execute("SELECT operation_type_id FROM stock_history").fetchone()[0] == 1
+
+    assert [p.name for p in db.iter_products(category="食品")] == ["懐中電灯", "牛乳"]
+    assert list(db.iter_products(category="存在しないカテゴリ")) == []
+
+
+def test_failed_write_does_not_leave_new_lookup_names(db, db_path):
+    assert db.add_product(Product(name="牛乳", brand="明治", category="食品"))
+
+    # 商品名・ブランドの重複で失敗した追加のカテゴリは残らない
+    assert not db.add_product(Product(name="牛乳", brand="明治", category="乳製品"))
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM categories WHERE name = '乳製品'").fetchone()[0] == 0
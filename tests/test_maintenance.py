@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+models.maintenance（持ち時間の範囲で進める保守処理）のテスト
+"""
+
+import sqlite3
+
+import pytest
+
+from models.maintenance import (
+    MAINTENANCE_STEPS, MaintenanceScheduler, enable_incremental_vacuum, run_basic_maintenance
+)
+
+
+@pytest.fixture
+def db_path(db_path):
+    # 大きな表を作って消し、返却できる空きページを用意する
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("CREATE TABLE filler (data BLOB)")
+        conn.executemany("INSERT INTO filler VALUES (?)", [(b"x" * 4000,) for _ in range(200)])
+    conn.execute("DROP TABLE filler")
+    conn.close()
+    return db_path
+
+
+def pragma(path, name):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"PRAGMA {name}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_full_run_analyzes_and_returns_free_pages(db_path):
+    assert pragma(db_path, "auto_vacuum") == 2
+    free_pages = pragma(db_path, "freelist_count")
+    assert free_pages > 100
+
+    scheduler = MaintenanceScheduler(db_path, vacuum_pages_per_step=16)
+    results = scheduler.run(budget_seconds=60)
+    assert list(results) == MAINTENANCE_STEPS
+    assert all(step['completed'] and step['duration_ms'] >= 0 for step in results.values())
+    assert results['analyze']['result'] == "analyze"
+    assert results['checkpoint']['result'] == "WALモードではないためスキップ"
+    # ANALYZEで作られる統計表が空きページを使うため、返却数は事前の空きページ以下になる
+    assert results['incremental_vacuum']['result'].endswith("ページ返却")
+
+    assert pragma(db_path, "freelist_count") == 0
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0
+    conn.close()
+    # 1周終わると次回は最初からで、統計があればPRAGMA optimizeだけになる
+    assert scheduler.pending_steps == MAINTENANCE_STEPS
+    assert scheduler.last_completed_at is not None
+    assert scheduler.run(budget_seconds=60)['analyze']['result'] == "optimize"
+
+
+def test_stopped_vacuum_resumes_on_the_next_run(db_path):
+    # 統計表を先に作り、analyze の段階で空きページが使われないようにする
+    conn = sqlite3.connect(db_path)
+    conn.execute("ANALYZE")
+    conn.close()
+    free_pages = pragma(db_path, "freelist_count")
+    scheduler = MaintenanceScheduler(db_path, vacuum_pages_per_step=8)
+    calls = []
+
+    def cancel_during_vacuum():
+        # analyze・checkpoint の前後と、バキュームを3回返却した後で止める
+        calls.append(None)
+        return len(calls) > 6
+
+    results = scheduler.run(budget_seconds=60, is_cancelled=cancel_during_vacuum)
+    assert results['incremental_vacuum']['completed'] is False
+    assert results['incremental_vacuum']['result'] == f"24ページ返却（残り{free_pages - 24}ページ）"
+    assert scheduler.pending_steps == ['incremental_vacuum']
+    assert scheduler.last_completed_at is None
+    assert pragma(db_path, "freelist_count") == free_pages - 24
+
+    results = scheduler.run(budget_seconds=60)
+    assert list(results) == ['incremental_vacuum']
+    assert results['incremental_vacuum']['result'] == f"{free_pages - 24}ページ返却"
+    assert scheduler.pending_steps == MAINTENANCE_STEPS
+    assert pragma(db_path, "freelist_count") == 0
+
+
+def test_exhausted_budget_runs_nothing(db_path):
+    scheduler = MaintenanceScheduler(db_path)
+    assert scheduler.run(budget_seconds=0) == {}
+    assert scheduler.pending_steps == MAINTENANCE_STEPS
+    assert scheduler.last_completed_at is None
+
+
+def test_checkpoint_runs_in_wal_mode(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    with conn:
+        conn.execute("INSERT INTO categories (name) VALUES ('保守テスト')")
+
+    result = MaintenanceScheduler(db_path).run(budget_seconds=60)['checkpoint']['result']
+    frames = int(result.split("/")[1].removesuffix("フレーム"))
+    assert frames > 0 and result == f"{frames}/{frames}フレーム"
+    conn.close()
+
+
+def test_existing_database_switches_to_incremental_vacuum(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x)")
+    conn.close()
+    assert pragma(path, "auto_vacuum") == 0
+    assert MaintenanceScheduler(path).run(budget_seconds=60)['incremental_vacuum']['result'] == \
+        "段階的バキュームが無効のためスキップ"
+
+    assert enable_incremental_vacuum(path)
+    assert pragma(path, "auto_vacuum") == 2
+    assert enable_incremental_vacuum(path)
+
+
+def test_basic_maintenance_reports_quick_check(db_path):
+    results = run_basic_maintenance(db_path)
+    assert results['quick_check']['result'] == "ok"
+    assert results['optimize']['result'] == "ok"
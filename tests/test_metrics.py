@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+utils.metrics のテスト
+"""
+
+import json
+
+import pytest
+
+from utils.metrics import MetricsRegistry, MetricsExporter, instrument_class, timed
+
+
+def test_counter_and_gauge_are_shared_per_label_set():
+    registry = MetricsRegistry()
+    registry.counter("calls_total", "呼び出し回数", method="a").inc()
+    registry.counter("calls_total", method="a").inc(2)
+    registry.counter("calls_total", method="b").inc()
+    registry.gauge("rows").set(5)
+    registry.gauge("rows").inc(-2)
+
+    assert registry.counter("calls_total", method="a").value == 3
+    assert registry.counter("calls_total", method="b").value == 1
+    assert registry.gauge("rows").value == 3
+
+
+def test_metric_type_conflict_is_rejected():
+    registry = MetricsRegistry()
+    registry.counter("value")
+    with pytest.raises(ValueError):
+        registry.gauge("value")
+
+
+def test_histogram_buckets_and_quantiles():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds")
+    for value in [0.0001] * 90 + [0.2] * 10:
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 100
+    assert snapshot['max'] == pytest.approx(0.2)
+    assert snapshot['p50'] <= 0.0005
+    assert 0.1 < snapshot['p99'] <= 0.25
+    # 累積件数の最後は全件
+    assert snapshot['buckets'][-1] == ["+Inf", 100]
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry()
+    registry.counter("calls_total", "呼び出し回数", method='say "hi"').inc()
+    registry.histogram("latency_seconds", "所要時間", method="a").observe(0.003)
+
+    text = registry.to_prometheus_text()
+    assert "# TYPE calls_total counter" in text
+    assert 'calls_total{method="say \\"hi\\""} 1.0' in text
+    assert 'latency_seconds_bucket{le="0.0025",method="a"} 0' in text
+    assert 'latency_seconds_bucket{le="0.005",method="a"} 1' in text
+    assert 'latency_seconds_bucket{le="+Inf",method="a"} 1' in text
+    assert 'latency_seconds_count{method="a"} 1' in text
+
+
+def test_timed_records_calls_generators_and_errors():
+    registry = MetricsRegistry()
+
+    @timed("op_seconds", registry=registry, operation="plain")
+    def plain():
+        return 1
+
+    @timed("op_seconds", registry=registry, operation="generator")
+    def numbers():
+        yield from range(3)
+
+    @timed("op_seconds", registry=registry, operation="failing")
+    def failing():
+        raise RuntimeError("失敗")
+
+    assert plain() == 1
+    generator = numbers()
+    # ジェネレーターは読み終わった時点で記録される
+    assert registry.histogram("op_seconds", operation="generator").count == 0
+    assert list(generator) == [0, 1, 2]
+    with pytest.raises(RuntimeError):
+        failing()
+
+    assert registry.histogram("op_seconds", operation="plain").count == 1
+    assert registry.histogram("op_seconds", operation="generator").count == 1
+    assert registry.histogram("op_seconds", operation="failing").count == 1
+    assert registry.counter("op_seconds_errors_total", operation="failing").value == 1
+
+
+def test_instrument_class_wraps_public_methods_only(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr("utils.metrics.REGISTRY", registry)
+
+    @instrument_class("call_seconds")
+    class Service:
+        def public(self):
+            return "ok"
+
+        def _private(self):
+            return "hidden"
+
+    service = Service()
+    assert service.public() == "ok"
+    assert service._private() == "hidden"
+    assert Service.public.__name__ == "public"
+    names = [labels['method'] for _, _, _, labels, _ in registry.collect()]
+    assert names == ["public"]
+
+
+def test_exporter_writes_json_on_stop(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("calls_total").inc()
+    path = tmp_path / "metrics.json"
+
+    exporter = MetricsExporter(path, interval_seconds=3600, registry=registry)
+    exporter.start()
+    exporter.stop()
+
+    snapshot = json.loads(path.read_text(encoding='utf-8'))
+    assert snapshot['metrics'][0]['name'] == "calls_total"
+    assert snapshot['metrics'][0]['value'] == 1
+    assert not (tmp_path / "metrics.json.tmp").exists()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Product / StockHistory の行からの作成（row_factory の高速経路と辞書からの経路）のテスト
+"""
+
+import sqlite3
+from datetime import date
+from unittest import mock
+
+import pytest
+
+import models.product
+from models.product import PRODUCT_COLUMNS, Product, product_row_factory
+from models.stock_history import HISTORY_COLUMNS, StockHistory, history_row_factory
+
+
+@pytest.fixture
+def db(db):
+    db.add_products([
+        Product(name="牛乳", brand="明治", size="1L", category="食品", current_stock=2,
+                min_stock=1, purchase_location="スーパー", price=198.0,
+                storage_location="冷蔵庫", expiry_date="2030-01-01"),
+        Product(name="ヨーグルト", brand="明治", category="食品", current_stock=0,
+                purchase_location="スーパー", storage_location="冷蔵庫"),
+    ])
+    db.update_stock_and_add_history({
+        'product_id': 1, 'operation_type': 'use', 'quantity_change': -1,
+        'stock_after': 1, 'memo': "朝食"
+    })
+    return db
+
+
+def test_fast_path_matches_keyed_construction(db):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(f"SELECT {', '.join(PRODUCT_COLUMNS)} FROM product_details ORDER BY name").fetchall()
+
+    for row, product in zip(rows, db.get_products_as_objects()):
+        keyed = Product(data=row)
+        assert [getattr(product, name) for name in Product.__slots__] == \
+               [getattr(keyed, name) for name in Product.__slots__]
+
+
+def test_query_methods_return_model_objects(db):
+    product = db.get_product_object_by_id(1)
+    assert isinstance(product, Product)
+    assert (product.product_id, product.name, product.current_stock) == (1, "牛乳", 1)
+    assert db.get_product_object_by_id(999) is None
+    assert [p.name for p in db.iter_products(batch_size=1)] == ["ヨーグルト", "牛乳"]
+
+    history = db.get_stock_history(product_id=1)
+    assert len(history) == 1
+    assert isinstance(history[0], StockHistory)
+    assert (history[0].operation_type, history[0].quantity_change, history[0].memo) == ('use', -1, "朝食")
+
+
+def test_repeated_strings_are_shared_between_products(db):
+    first, second = db.get_products_as_objects()
+
+    assert first.category is second.category
+    assert first.storage_location is second.storage_location
+    assert first.brand is second.brand
+
+
+def test_models_are_slotted():
+    product = Product(name="洗剤")
+    history = StockHistory(product_id=1, operation_type='purchase')
+
+    for obj in (product, history):
+        assert not hasattr(obj, '__dict__')
+        with pytest.raises(AttributeError):
+            obj.unknown_attribute = 1
+
+
+def test_keyed_construction_fills_defaults_for_missing_keys():
+    product = Product(data={'product_id': 5, 'name': "洗剤"})
+    assert (product.product_id, product.name, product.brand, product.min_stock, product.price) == \
+           (5, "洗剤", '', 1, 0.0)
+
+    history = StockHistory(data={'history_id': 7, 'stock_after': 3})
+    assert (history.history_id, history.operation_type, history.stock_after, history.created_at) == \
+           (7, '', 3, None)
+
+
+def test_row_factories_follow_column_order():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = history_row_factory
+    values = (1, 2, 'purchase', 3, 3, "まとめ買い", "2024-01-01 09:00:00")
+    history = conn.execute(
+        "SELECT " + ", ".join(f"? AS {name}" for name in HISTORY_COLUMNS), values
+    ).fetchone()
+    assert (history.history_id, history.product_id, history.memo) == (1, 2, "まとめ買い")
+
+    conn.row_factory = product_row_factory
+    product = conn.execute("SELECT " + ", ".join("?" for _ in PRODUCT_COLUMNS),
+                           (3, "洗剤", "", None, "日用品", 1, 1, "", 0.0, "", None, None, None)).fetchone()
+    assert (product.product_id, product.name, product.category) == (3, "洗剤", "日用品")
+
+
+def test_stock_status_is_cached_until_stock_changes(db):
+    product = db.get_product_object_by_id(1)
+    assert product.get_stock_status() == 'low_stock'
+
+    product.update_stock(5)
+    assert product.get_stock_status() == 'normal'
+    product.min_stock = 5
+    assert product.get_stock_status() == 'low_stock'
+    product.current_stock = 0
+    assert product.get_stock_status() == 'out_of_stock'
+
+
+def test_expiry_is_parsed_once_and_reparsed_after_change(db):
+    product = db.get_product_object_by_id(1)
+
+    with mock.patch.object(models.product, 'parse_expiry_date',
+                           wraps=models.product.parse_expiry_date) as parse:
+        assert product.is_expired(date(2029, 12, 31)) is False
+        assert product.is_expired(date(2030, 1, 1)) is True
+        assert product.expiry == date(2030, 1, 1)
+        assert parse.call_count == 1
+
+        product.expiry_date = "不明"
+        assert product.is_expired(date(2030, 1, 1)) is False
+        product.expiry_date = "2020-01-01"
+        assert product.is_expired() is True
+        assert parse.call_count == 3
+
+
+def test_stock_history_can_be_streamed_lazily(db):
+    db.bulk_add_history(
+        {'product_id': 2, 'created_at': f"2024-01-{day:02d} 09:00:00", 'operation_type': 'purchase',
+         'quantity': 1, 'memo': None}
+        for day in range(1, 21)
+    )
+
+    stream = db.iter_stock_history(2, batch_size=3)
+    assert not isinstance(stream, list)
+    first = next(stream)
+    assert isinstance(first, StockHistory)
+    assert first.created_at == "2024-01-20 09:00:00"
+    stream.close()
+
+    streamed = list(db.iter_stock_history(batch_size=7))
+    assert [h.history_id for h in streamed] == [h.history_id for h in db.get_stock_history(limit=-1)]
+    assert len(list(db.iter_stock_history(2, limit=5, batch_size=2))) == 5
+
+
+def test_streaming_raises_database_errors_instead_of_returning_rows(db):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("DROP VIEW stock_history_details")
+
+    assert db.get_stock_history() == []
+    with pytest.raises(sqlite3.OperationalError):
+        list(db.iter_stock_history())
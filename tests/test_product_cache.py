@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DatabaseManager の商品キャッシュ（models.product_cache）のテスト
+"""
+
+import sqlite3
+
+import pytest
+
+from models.database import DatabaseManager
+from models.product import Product
+from utils.metrics import REGISTRY
+
+
+class CountingDatabaseManager(DatabaseManager):
+    """
+    開いた接続の数を数える DatabaseManager
+    """
+
+    connections = 0
+
+    def _get_connection(self):
+        self.connections += 1
+        return super()._get_connection()
+
+
+@pytest.fixture
+def db(db_path):
+    manager = CountingDatabaseManager(db_path, slow_query_threshold_ms=None, product_cache_size=2)
+    manager.add_products(Product(name=f"商品{index}", category="食品", current_stock=5) for index in range(3))
+    yield manager
+    manager.product_cache.close()
+
+
+def test_repeated_lookups_return_the_same_object_without_sqlite(db):
+    first = db.get_product_object_by_id(1)
+    connections = db.connections
+
+    assert db.get_product_object_by_id(1) is first
+    assert db.get_product_object_by_id(1) is first
+    assert db.connections == connections
+
+
+def test_writes_through_the_manager_invalidate_the_product(db):
+    product = db.get_product_object_by_id(1)
+
+    assert db.update_stock_and_add_history({
+        'product_id': 1, 'operation_type': 'use', 'quantity_change': -2, 'stock_after': 3
+    })
+    reloaded = db.get_product_object_by_id(1)
+    assert reloaded is not product
+    assert reloaded.current_stock == 3
+
+    assert db.delete_product(1)
+    assert db.get_product_object_by_id(1) is None
+
+
+def test_failed_update_does_not_leave_the_edited_object_cached(db):
+    product = db.get_product_object_by_id(1)
+    product.name = "商品2"
+
+    # 商品名とブランドの重複で失敗する
+    assert db.update_product(product) is False
+    assert db.get_product_object_by_id(1).name == "商品0"
+
+
+def test_repeated_lookups_do_not_check_data_version_every_time(db):
+    db.get_product_object_by_id(1)
+    statements = []
+    db.product_cache._connection.set_trace_callback(statements.append)
+
+    for _ in range(3):
+        db.get_product_object_by_id(1)
+    assert statements == []
+
+
+def test_own_writes_keep_other_cached_products(db):
+    first = db.get_product_object_by_id(1)
+    third = db.get_product_object_by_id(3)
+
+    assert db.update_stock_and_add_history({
+        'product_id': 3, 'operation_type': 'use', 'quantity_change': -1, 'stock_after': 4
+    })
+    assert db.get_product_object_by_id(1) is first
+    assert db.get_product_object_by_id(3) is not third
+    assert db.get_product_object_by_id(3).current_stock == 4
+
+
+def test_commits_from_other_connections_are_detected(db):
+    db.product_cache.check_interval = 0
+    assert db.get_product_object_by_id(2).current_stock == 5
+
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE products SET current_stock = 9 WHERE id = 2")
+
+    assert db.get_product_object_by_id(2).current_stock == 9
+
+
+def test_other_commits_are_checked_before_own_commit(db):
+    # 確認の間隔内でも、自分のコミットの前に他の接続のコミットを確認する
+    db.product_cache.check_interval = 3600
+    assert db.get_product_object_by_id(2).current_stock == 5
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE products SET current_stock = 9 WHERE id = 2")
+    assert db.get_product_object_by_id(2).current_stock == 5
+
+    assert db.update_stock_and_add_history({
+        'product_id': 1, 'operation_type': 'use', 'quantity_change': -1, 'stock_after': 4
+    })
+    assert db.get_product_object_by_id(2).current_stock == 9
+
+
+def test_product_read_before_a_write_is_not_cached(db):
+    cache = db.product_cache
+    assert cache.get(1) is None
+    generation = cache.generation
+    stale = Product(name="商品0", category="食品", current_stock=5, product_id=1)
+
+    # 読み込みの間に別のスレッドが同じ商品を書き込んだ
+    cache.invalidate([1])
+    assert cache.put(stale, generation) is stale
+    assert cache.get(1) is None
+
+
+def test_least_recently_used_product_is_evicted(db):
+    first = db.get_product_object_by_id(1)
+    db.get_product_object_by_id(2)
+    db.get_product_object_by_id(1)
+    db.get_product_object_by_id(3)
+
+    assert len(db.product_cache) == 2
+    connections = db.connections
+    assert db.get_product_object_by_id(1) is first
+    assert db.connections == connections
+    db.get_product_object_by_id(2)
+    assert db.connections == connections + 1
+
+
+def test_cache_can_be_disabled(db_path):
+    manager = DatabaseManager(db_path, slow_query_threshold_ms=None, product_cache_size=None)
+    manager.add_product(Product(name="洗剤", category="洗剤"))
+
+    assert manager.product_cache is None
+    assert manager.get_product_object_by_id(1) is not manager.get_product_object_by_id(1)
+
+
+def test_lookups_are_counted_after_the_metrics_are_reset(db):
+    db.get_product_object_by_id(1)
+    REGISTRY.reset()
+
+    db.get_product_object_by_id(1)
+    db.get_product_object_by_id(1)
+    db.get_product_object_by_id(2)
+    assert REGISTRY.counter("inventory_product_cache_total", result="hit").value == 2
+    assert REGISTRY.counter("inventory_product_cache_total", result="miss").value == 1
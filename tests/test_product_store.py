@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+models.product_store（列指向の商品ストア）のテスト
+ベクトル化した判定が Product.get_stock_status() / is_expired() と一致するかを確認する
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from models.product import Product
+from models.product_store import ProductStore, STATUS_NAMES
+
+TODAY = date.today()
+
+
+@pytest.fixture
+def db(db):
+    expiry_dates = [None, "", "不明", (TODAY - timedelta(days=3)).isoformat(), TODAY.isoformat(),
+                    (TODAY + timedelta(days=1)).isoformat()]
+    db.add_products(
+        Product(name=f"商品{index:02d}", brand=["明治", "Kao", None][index % 3],
+                category=["食品", "洗剤", "日用品"][index % 3], current_stock=index % 4,
+                min_stock=index % 3, price=float(index * 10), storage_location="棚",
+                expiry_date=expiry_dates[index % len(expiry_dates)])
+        for index in range(30)
+    )
+    return db
+
+
+def test_loaded_store_materialises_the_same_products(db):
+    store = ProductStore.load(db, batch_size=7)
+    expected = db.get_products_as_objects()
+
+    assert len(store) == len(expected) == 30
+    for product, reference in zip(store.products(range(len(store))), expected):
+        assert [getattr(product, name) for name in Product.__slots__] == \
+               [getattr(reference, name) for name in Product.__slots__]
+    # 重複する値は辞書に1つだけ
+    assert sorted(store.values['category']) == ["日用品", "洗剤", "食品"]
+
+
+def test_vectorised_status_and_expiry_match_product_methods(db):
+    store = ProductStore.load(db)
+    products = list(store.products(range(len(store))))
+
+    assert [STATUS_NAMES[code] for code in store.status_codes()] == \
+           [product.get_stock_status() for product in products]
+    assert store.expired_mask().tolist() == [product.is_expired() for product in products]
+
+
+def test_filter_mask_combines_all_conditions(db):
+    store = ProductStore.load(db)
+    products = list(store.products(range(len(store))))
+
+    mask = store.filter_mask(search="kao", category="洗剤", status='out_of_stock', expired_only=True)
+
+    expected = [
+        "kao" in product.name.lower() or "kao" in (product.brand or "").lower()
+        for product in products
+    ]
+    expected = [
+        match and product.category == "洗剤" and product.get_stock_status() == 'out_of_stock'
+        and product.is_expired()
+        for match, product in zip(expected, products)
+    ]
+    assert mask.tolist() == expected
+    assert mask.any()
+
+
+def test_unknown_category_and_empty_store():
+    store = ProductStore.from_products([Product(product_id=1, name="洗剤", category="洗剤")])
+    assert not store.filter_mask(category="存在しない").any()
+    assert store.filter_mask(search="洗").tolist() == [True]
+
+    empty = ProductStore.from_rows([])
+    assert len(empty) == 0
+    assert empty.filter_mask(search="a", status='normal', expired_only=True).tolist() == []
+    assert list(empty.products(np.flatnonzero(empty.filter_mask()))) == []
+
+
+def test_missing_price_is_restored_as_none():
+    store = ProductStore.from_products([Product(product_id=1, name="洗剤", category="洗剤", price=None)])
+
+    assert np.isnan(store.price[0])
+    assert store.product(0).price is None
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+クエリプランの回帰テスト
+DatabaseManager が発行する全SQLを記録し、EXPLAIN QUERY PLAN で
+想定したインデックスが使われているか・全件走査や一時B-treeでの並べ替えが起きていないかを確認する
+
+新しいSQLを追加した場合は QUERY_PLAN_EXPECTATIONS に想定を追加すること
+（どの想定にも当てはまらないSQLがあるとテストが失敗する）
+"""
+
+import re
+import sqlite3
+
+import pytest
+
+from models.database import DatabaseManager, create_database
+from models.product import Product
+
+# 想定するクエリプラン
+# (テストID, SQLの正規表現, 使うべきインデックス, 全件走査を許可, 一時B-treeを許可)
+QUERY_PLAN_EXPECTATIONS = [
+    # --- 主キーでの1件操作 ---
+    ("product_by_id", r"^SELECT .+ FROM (products|product_details) WHERE id = \S+$",
+     "INTEGER PRIMARY KEY", False, False),
+    ("update_product_by_id", r"^UPDATE products SET .+ WHERE id = \S+$",
+     "INTEGER PRIMARY KEY", False, False),
+    ("delete_product_by_id", r"^DELETE FROM products WHERE id = \S+$",
+     "INTEGER PRIMARY KEY", False, False),
+    ("insert_values", r"^INSERT (OR IGNORE )?INTO (products|stock_history) \(.+\) VALUES \(",
+     None, False, False),
+
+    # --- 参照テーブル（カテゴリ・場所・操作種別の名前とID） ---
+    ("lookup_id_by_name",
+     r"^SELECT id FROM (categories|storage_locations|purchase_locations|operation_types) WHERE name = ",
+     "sqlite_autoindex_", False, False),
+    ("lookup_history_time", r"^SELECT julianday\(created_at\) FROM stock_history WHERE id = \S+$",
+     "INTEGER PRIMARY KEY", False, False),
+    ("insert_lookup_name",
+     r"^INSERT INTO (categories|storage_locations|purchase_locations|operation_types) \(name\) VALUES \(",
+     None, False, False),
+
+    # --- 使用ペースの予測 ---
+    ("usage_state_by_product", r"^SELECT usage_rate, .+ FROM usage_forecasts WHERE product_id = \S+$",
+     "INTEGER PRIMARY KEY", False, False),
+    ("save_usage_state", r"^INSERT (OR REPLACE )?INTO usage_forecasts \(.+\) VALUES \(",
+     None, False, False),
+    ("delete_usage_state_by_product", r"^DELETE FROM usage_forecasts WHERE product_id = \S+$",
+     "INTEGER PRIMARY KEY", False, False),
+    ("usage_forecasts", r"FROM usage_forecasts f JOIN products p ON p\.id = f\.product_id WHERE f\.usage_rate > 0$",
+     "INTEGER PRIMARY KEY", True, False),
+    ("rebuild_usage_clear", r"^DELETE FROM usage_forecasts( WHERE product_id IN \(SELECT product_id "
+     r"FROM temp\.ingest_products\))?$", None, True, False),
+    ("rebuild_usage_events", r"FROM stock_history WHERE operation_type_id = 2 .*ORDER BY product_id, created_at, id$",
+     "idx_stock_history_product_created", True, False),
+    ("count_usage_forecasts", r"^SELECT COUNT\(\*\) FROM usage_forecasts$", None, True, False),
+    ("shopping_list", r"^WITH needed AS \( SELECT .+ FROM products p LEFT JOIN usage_forecasts f ON f\.product_id = p\.id "
+     r"LEFT JOIN purchase_locations pl ON pl\.id = p\.purchase_location_id WHERE .+ \) "
+     r"SELECT .+ FROM needed ORDER BY purchase_location, name$",
+     "INTEGER PRIMARY KEY", True, True),
+
+    # --- 在庫履歴の整合性・圧縮（商品IDの範囲ごとにインデックス順で読む） ---
+    ("history_product_id_range", r"^SELECT \(SELECT MIN\(product_id\) FROM stock_history\), "
+     r"\(SELECT MAX\(product_id\) FROM stock_history\)$",
+     "idx_stock_history_product_created", True, False),
+    # 並べ替えるのは食い違いとして残った行だけ
+    ("stock_chain_check", r"FROM stock_history h WHERE h\.product_id BETWEEN \S+ AND \S+ "
+     r"WINDOW w AS \(PARTITION BY h\.product_id ORDER BY h\.created_at, h\.id\) \) .+ "
+     r"ORDER BY product_id, created_at, id$",
+     "idx_stock_history_product_created", True, True),
+    ("compaction_read", r"FROM stock_history WHERE product_id BETWEEN \S+ AND \S+ AND created_at < '[^']+' "
+     r"ORDER BY product_id, created_at, id$",
+     "idx_stock_history_product_created", False, False),
+    ("compaction_delete", r"^DELETE FROM stock_history WHERE product_id = \S+ AND created_at BETWEEN ",
+     "idx_stock_history_product_created", False, False),
+
+    # --- 商品ごとの在庫履歴（画面表示・在庫操作で頻繁に使う） ---
+    ("history_by_product",
+     r"^SELECT h\.id, h\.product_id, .+ h\.created_at FROM stock_history_details h JOIN products p "
+     r"ON h\.product_id = p\.id WHERE h\.product_id = \S+ ORDER BY h\.created_at DESC, h\.id DESC",
+     "idx_stock_history_product_created", False, False),
+    ("statistics_by_product", r"^SELECT COALESCE\(SUM\(event_count\), 0\) as total_operations, .+ "
+     r"FROM stock_history WHERE product_id = ",
+     "idx_stock_history_product_created", False, False),
+    ("count_history_by_product", r"^SELECT COUNT\(\*\) FROM stock_history WHERE product_id = ",
+     "idx_stock_history_product_created", False, False),
+    ("delete_history_by_product", r"^DELETE FROM stock_history WHERE product_id = ",
+     "idx_stock_history_product_created", False, False),
+    ("export_history_by_product",
+     r"^SELECT h\.id, .+ FROM stock_history_details h JOIN products p ON h\.product_id = p\.id "
+     r"WHERE h\.product_id = \S+ ORDER BY h\.created_at, h\.id$",
+     "idx_stock_history_product_created", False, False),
+
+    # --- 一覧表示（全件を返すため走査は避けられないが、並べ替えはインデックスで行う） ---
+    ("recent_history", r"^SELECT h\.id, h\.product_id, .+ h\.created_at FROM stock_history_details h JOIN products p "
+     r"ON h\.product_id = p\.id ORDER BY h\.created_at DESC, h\.id DESC LIMIT",
+     "idx_stock_history_created_at", True, False),
+    ("products_by_name", r"FROM product_details ORDER BY name$",
+     "sqlite_autoindex_products_1", True, False),
+    ("search_products_by_name", r"FROM product_details WHERE \(name LIKE [^)]+\) ORDER BY name$",
+     "sqlite_autoindex_products_1", True, False),
+    ("products_in_category_by_name",
+     r"FROM product_details WHERE (\(name LIKE .+\) AND )?category_id = \(SELECT id FROM categories "
+     r"WHERE name = \S+\) ORDER BY name$",
+     "idx_products_category_name", False, False),
+
+    # --- エクスポート・集計（全件が対象） ---
+    ("history_snapshot", r"FROM stock_history WHERE id > \S+ ORDER BY id$",
+     "INTEGER PRIMARY KEY", False, False),
+    ("count_products", r"^SELECT COUNT\(\*\) FROM products$", None, True, False),
+    ("count_history", r"^SELECT COUNT\(\*\) FROM stock_history$", None, True, False),
+    ("count_history_through_id", r"^SELECT COUNT\(\*\) FROM stock_history WHERE id <= ",
+     "INTEGER PRIMARY KEY", False, False),
+    ("export_products", r"FROM product_details ORDER BY id$", None, True, False),
+    ("export_history", r"^SELECT h\.id, .+ FROM stock_history_details h JOIN products p "
+     r"ON h\.product_id = p\.id ORDER BY h\.id$", None, True, False),
+    ("export_statistics", r"FROM product_details p LEFT JOIN stock_history h ON h\.product_id = p\.id GROUP BY p\.id",
+     "idx_stock_history_product_created", True, False),
+    ("stock_summary", r"^SELECT COUNT\(\*\) as total_products, .+ FROM products$", None, True, False),
+
+    # --- 履歴の一括取り込み（バッチ処理のため走査・並べ替えを許可） ---
+    ("ingest_opening_stock", r"^INSERT OR IGNORE INTO temp\.ingest_products ",
+     "idx_stock_history_product_created", False, False),
+    ("ingest_product_lookup", r"^SELECT 1 FROM temp\.ingest_products WHERE product_id = ",
+     "INTEGER PRIMARY KEY", False, False),
+    ("ingest_clear", r"^DELETE FROM temp\.ingest_products$", None, True, False),
+    ("ingest_clear_stock", r"^DELETE FROM temp\.ingest_stock$", None, True, False),
+    ("ingest_recompute_stock", r"^WITH segmented AS \(.+\) INSERT INTO temp\.ingest_stock ",
+     "idx_stock_history_product_created", True, True),
+    ("ingest_clamp_count", r"^SELECT COUNT\(\*\) FROM temp\.ingest_stock WHERE clamped$", None, True, False),
+    ("ingest_apply_stock", r"^UPDATE stock_history SET stock_after = s\.stock_after, .+ FROM temp\.ingest_stock s ",
+     "INTEGER PRIMARY KEY", True, False),
+    ("ingest_recompute_current_stock", r"^UPDATE products SET current_stock = \( SELECT h\.stock_after ",
+     "idx_stock_history_product_created", False, False),
+]
+
+# プランを確認しない文（トランザクション制御・設定・DDL）
+IGNORED_STATEMENT = re.compile(r"^(BEGIN|COMMIT|ROLLBACK|PRAGMA|CREATE|DROP)\b", re.IGNORECASE)
+
+# SQLを発行しないメソッド
+METHODS_WITHOUT_SQL = {'get_slow_queries', 'clear_slow_queries', 'cancellable'}
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    空白・改行をまとめて1行にする
+    """
+    return " ".join(sql.split())
+
+
+def find_expectations(sql: str):
+    """
+    SQLに当てはまる想定を返す
+    """
+    return [
+        expectation for expectation in QUERY_PLAN_EXPECTATIONS
+        if re.search(expectation[1], sql, re.DOTALL)
+    ]
+
+
+class RecordingDatabaseManager(DatabaseManager):
+    """
+    発行したSQLを記録するDatabaseManager
+    """
+
+    def __init__(self, db_path):
+        # 遅いクエリの EXPLAIN QUERY PLAN が記録に混ざらないようにする
+        super().__init__(db_path, slow_query_threshold_ms=None)
+        self.statements = []
+        self.called_methods = set()
+
+    def _get_connection(self):
+        connection = super()._get_connection()
+        # パラメータを埋め込んだ状態のSQLが渡される
+        connection.set_trace_callback(self.statements.append)
+        return connection
+
+    def call(self, method_name, *args, **kwargs):
+        """
+        メソッドを呼び出して記録（ジェネレーターは最後まで読み切る）
+        """
+        self.called_methods.add(method_name)
+        result = getattr(self, method_name)(*args, **kwargs)
+        if hasattr(result, '__next__'):
+            result = list(result)
+        return result
+
+
+def seed_database(db_path, product_count=300, history_count=6000):
+    """
+    テスト用の商品と在庫履歴を登録
+    """
+    create_database(str(db_path))
+    manager = DatabaseManager(str(db_path))
+    manager.add_products(
+        Product({
+            'name': f"商品{index:04d}", 'brand': f"ブランド{index % 17}",
+            'category': f"カテゴリ{index % 8}", 'current_stock': index % 9,
+            'min_stock': 2, 'expiry_date': "2030-01-01" if index % 3 else None
+        })
+        for index in range(product_count)
+    )
+    manager.bulk_add_history(
+        {
+            'product_id': index % product_count + 1,
+            'operation_type': ('purchase', 'use', 'adjust')[index % 3],
+            'quantity': index % 5 + 1,
+            'created_at': f"2024-{index % 12 + 1:02d}-{index % 28 + 1:02d} 10:00:00"
+        }
+        for index in range(history_count)
+    )
+
+
+def exercise_all_methods(db: RecordingDatabaseManager):
+    """
+    SQLを発行する全メソッドを呼び出す
+    """
+    product = db.call('get_product_object_by_id', 3)
+    product.name = product.name + "（改）"
+    db.call('update_product', product)
+    db.call('add_product', Product({'name': "追加商品", 'category': "新しいカテゴリ"}))
+    db.call('add_products', [Product({'name': "一括追加商品", 'category': "カテゴリ2"})])
+    db.call('product_exists', 3)
+    db.call('get_product_by_id', 3)
+    db.call('get_all_products')
+    db.call('get_products_as_objects')
+    db.call('update_stock_and_add_history', {
+        'product_id': 5, 'operation_type': 'purchase',
+        'quantity_change': 2, 'stock_after': 9, 'memo': "テスト"
+    })
+    db.call('update_stock_and_add_history', {
+        'product_id': 5, 'operation_type': 'use',
+        'quantity_change': -1, 'stock_after': 8, 'memo': None
+    })
+    db.call('bulk_add_history', [
+        {'product_id': 7, 'operation_type': 'use', 'quantity': 1, 'created_at': "2024-06-01 09:00:00"},
+        {'product_id': 7, 'operation_type': 'use', 'quantity': 1000, 'created_at': "2024-06-02 09:00:00"}
+    ])
+    db.call('get_stock_history', 5)
+    db.call('get_stock_history')
+    db.call('iter_stock_history', 5, batch_size=2)
+    db.call('iter_stock_history', limit=10)
+    db.call('get_stock_statistics', 5)
+    db.call('get_stock_summary')
+    db.call('iter_products')
+    db.call('iter_products', search="商品00")
+    db.call('iter_products', category="カテゴリ3")
+    db.call('iter_products', search="商品00", category="カテゴリ3")
+    db.call('iter_history_snapshot_batches', 100)
+    db.call('count_products')
+    db.call('count_stock_history')
+    db.call('count_stock_history', 5)
+    db.call('count_stock_history', through_id=100)
+    db.call('iter_product_tuple_batches')
+    db.call('iter_product_row_batches')
+    db.call('iter_history_row_batches')
+    db.call('iter_history_row_batches', 5)
+    db.call('iter_statistics_row_batches')
+    db.call('get_usage_forecasts')
+    db.call('rebuild_usage_forecasts')
+    db.call('generate_shopping_list')
+    db.call('generate_shopping_list', days=30)
+    db.call('iter_stock_inconsistencies', batch_size=100)
+    db.call('verify_stock_consistency', repair=True)
+    db.call('compact_stock_history', before="2024-07-01 00:00:00")
+    db.call('delete_product', 10)
+
+
+@pytest.fixture(scope="module", params=[False, True], ids=["no_stats", "analyzed"])
+def captured_plans(request, tmp_path_factory):
+    """
+    全メソッドを実行して、発行されたSQLとそのクエリプランを集める
+
+    統計情報なし（初回起動直後）と ANALYZE 済み（保守処理の実行後）の両方で確認する
+    """
+    db_path = tmp_path_factory.mktemp("plans") / "inventory.db"
+    seed_database(db_path)
+    if request.param:
+        conn = sqlite3.connect(str(db_path))
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.close()
+
+    db = RecordingDatabaseManager(str(db_path))
+    exercise_all_methods(db)
+
+    explain_conn = sqlite3.connect(str(db_path))
+    plans = {}
+    try:
+        for statement in db.statements:
+            sql = normalize_sql(statement)
+            if sql.upper().startswith("CREATE TEMP"):
+                # 一時テーブルを参照するSQLを説明できるように同じものを作る
+                explain_conn.execute(statement)
+            if IGNORED_STATEMENT.match(sql) or sql in plans:
+                continue
+            rows = explain_conn.execute("EXPLAIN QUERY PLAN " + statement).fetchall()
+            plans[sql] = [row[3] for row in rows]
+    finally:
+        explain_conn.close()
+
+    return db, plans
+
+
+def test_all_public_methods_are_exercised(captured_plans):
+    db, _ = captured_plans
+    public_methods = {
+        name for name, value in vars(DatabaseManager).items()
+        if callable(value) and not name.startswith('_')
+    }
+    missing = public_methods - db.called_methods - METHODS_WITHOUT_SQL
+    assert not missing, f"exercise_all_methods で呼び出していないメソッド: {sorted(missing)}"
+
+
+def test_every_statement_has_expectation(captured_plans):
+    _, plans = captured_plans
+    unknown = [sql for sql in plans if not find_expectations(sql)]
+    assert not unknown, "想定が登録されていないSQL:\n" + "\n".join(unknown)
+
+
+@pytest.mark.parametrize(
+    "label, pattern, index, allow_scan, allow_temp_btree",
+    QUERY_PLAN_EXPECTATIONS,
+    ids=[expectation[0] for expectation in QUERY_PLAN_EXPECTATIONS]
+)
+def test_query_plan(captured_plans, label, pattern, index, allow_scan, allow_temp_btree):
+    _, plans = captured_plans
+    matched = {sql: plan for sql, plan in plans.items() if re.search(pattern, sql, re.DOTALL)}
+    assert matched, f"{label}: 該当するSQLが発行されていません（想定が古くなっていないか確認）"
+
+    for sql, plan in matched.items():
+        detail = "\n".join(plan)
+        if index:
+            assert any(index in line for line in plan), \
+                f"{label}: {index} が使われていません\n{sql}\n{detail}"
+        if not allow_scan:
+            scans = [line for line in plan if line.startswith("SCAN ")]
+            assert not scans, f"{label}: 全件走査しています\n{sql}\n{detail}"
+        if not allow_temp_btree:
+            assert "USE TEMP B-TREE" not in detail, \
+                f"{label}: 一時B-treeで並べ替えています\n{sql}\n{detail}"
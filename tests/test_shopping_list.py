@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DatabaseManager.generate_shopping_list（買い物リスト）と書き出しのテスト
+"""
+
+import csv
+import io
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from models.export import SHOPPING_LIST_COLUMNS, write_shopping_list
+from models.product import Product
+
+
+@pytest.fixture
+def db(db):
+    db.add_products([
+        Product(name="牛乳", category="食品", current_stock=0, min_stock=2,
+                purchase_location="スーパー", price=200),
+        Product(name="洗剤", category="洗剤", current_stock=20, min_stock=1,
+                purchase_location="ドラッグストア", price=300),
+        Product(name="卵", category="食品", current_stock=6, min_stock=1, purchase_location="スーパー"),
+        Product(name="電池", category="防災用品", current_stock=1, min_stock=1),
+        Product(name="醤油", category="調味料", current_stock=5, min_stock=1,
+                purchase_location="スーパー", price=400),
+    ])
+    # 卵は1日1個のペースで使用（残り6日）
+    db.bulk_add_history(
+        {'product_id': 3, 'operation_type': 'use', 'quantity': 1,
+         'created_at': f"2024-03-{day:02d} 09:00:00"}
+        for day in range(1, 5)
+    )
+    assert db.get_product_object_by_id(3).current_stock == 2
+    return db
+
+
+def items_by_name(shopping_list):
+    return {item['name']: (group['purchase_location'], item)
+            for group in shopping_list['groups'] for item in group['items']}
+
+
+def test_selects_low_stock_and_soon_depleted_products(db):
+    shopping_list = db.generate_shopping_list(days=7)
+    items = items_by_name(shopping_list)
+
+    # 洗剤・醤油は在庫が十分で使用予測もない
+    assert sorted(items) == ["卵", "牛乳", "電池"]
+    assert [group['purchase_location'] for group in shopping_list['groups']] == [None, "スーパー"]
+
+    # 最小在庫 + 7日分の予測使用数 - 現在在庫（切り上げ・1個以上）
+    assert items["牛乳"][1]['suggested_quantity'] == 2
+    assert items["卵"][1]['suggested_quantity'] == 1 + 7 - 2
+    assert items["卵"][1]['days_of_cover'] == pytest.approx(2)
+    assert items["電池"][1]['suggested_quantity'] == 1
+    assert items["電池"][1]['days_of_cover'] is None
+
+    # 価格未設定の商品は金額に含めない
+    assert items["牛乳"][1]['estimated_cost'] == 400
+    assert items["卵"][1]['estimated_cost'] is None
+    assert shopping_list['estimated_cost'] == 400
+    assert (shopping_list['item_count'], shopping_list['unpriced_count']) == (3, 2)
+
+    # 予測の日数が短ければ、在庫少でない卵は載らない
+    assert sorted(items_by_name(db.generate_shopping_list(days=1))) == ["牛乳", "電池"]
+
+
+def test_result_is_cached_until_next_write(db):
+    statements = []
+    original = db._get_connection
+
+    def traced_connection():
+        connection = original()
+        connection.set_trace_callback(statements.append)
+        return connection
+
+    db._get_connection = traced_connection
+    shopping_list = db.generate_shopping_list()
+    statement_count = len(statements)
+    assert db.generate_shopping_list() is shopping_list
+    assert len(statements) == statement_count
+
+    assert db.update_stock_and_add_history({
+        'product_id': 1, 'operation_type': 'purchase', 'quantity_change': 5, 'stock_after': 5
+    })
+    refreshed = db.generate_shopping_list()
+    assert refreshed is not shopping_list
+    assert "牛乳" not in items_by_name(refreshed)
+
+    product = db.get_product_object_by_id(5)
+    product.current_stock = 0
+    assert db.update_product(product)
+    assert "醤油" in items_by_name(db.generate_shopping_list())
+
+
+def test_writes_from_another_connection_refresh_the_cached_list(db):
+    shopping_list = db.generate_shopping_list()
+    assert db.generate_shopping_list() is shopping_list
+
+    # CLI など別のプロセスからの書き込み
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE products SET current_stock = 0 WHERE id = 2")
+    refreshed = db.generate_shopping_list()
+    assert refreshed is not shopping_list
+    assert "洗剤" in items_by_name(refreshed)
+    assert db.generate_shopping_list() is refreshed
+
+
+def test_write_on_another_thread_waits_for_the_cache_update(db):
+    writers = []
+
+    class InterruptedDict(dict):
+        # 古い data_version の結果を調べている最中に、別スレッドで書き込みが起きる
+        def __iter__(self):
+            keys = super().__iter__()
+            writer = threading.Thread(target=db._forget_shopping_lists)
+            writer.start()
+            writer.join(0.2)
+            writers.append(writer)
+            return keys
+
+    db._shopping_lists = InterruptedDict({(7, None, -1): {}})
+    generation = db._shopping_list_generation
+    shopping_list = db.generate_shopping_list()
+    writers[0].join()
+
+    assert shopping_list['item_count'] == 3
+    # 書き込みは覚えた後に行われ、覚えた結果も捨てる
+    assert db._shopping_list_generation == generation + 1
+    assert db._shopping_lists == {}
+
+
+def test_write_shopping_list_as_csv_and_jsonl(db):
+    shopping_list = db.generate_shopping_list()
+
+    out = io.StringIO()
+    assert write_shopping_list(shopping_list, out, fmt='csv') == 3
+    rows = list(csv.reader(io.StringIO(out.getvalue())))
+    assert rows[0] == SHOPPING_LIST_COLUMNS
+    assert [row[2] for row in rows[1:]] == ["電池", "卵", "牛乳"]
+
+    out = io.StringIO()
+    assert write_shopping_list(shopping_list, out, fmt='jsonl') == 3
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert records[2] == {
+        'purchase_location': "スーパー", 'product_id': 1, 'name': "牛乳", 'brand': "", 'size': "",
+        'current_stock': 0, 'min_stock': 2, 'days_of_cover': None, 'suggested_quantity': 2,
+        'price': 200, 'estimated_cost': 400
+    }
+
+    with pytest.raises(ValueError):
+        write_shopping_list(shopping_list, io.StringIO(), fmt='xml')
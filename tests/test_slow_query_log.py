@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+models.slow_query_log のテスト（しきい値0ミリ秒ですべての文を記録させて確認する）
+"""
+
+import sqlite3
+
+from models.database import DatabaseManager
+from models.product import Product
+from models.slow_query_log import SlowQueryLog, TimedConnection, slow_query_log_path
+
+
+def make_db(db_path, threshold_ms):
+    db = DatabaseManager(db_path, slow_query_threshold_ms=threshold_ms)
+    for index in range(5):
+        db.add_product(Product({'name': f"商品{index}", 'category': "食品", 'current_stock': index}))
+    db.clear_slow_queries()
+    return db
+
+
+def test_slow_select_is_recorded_with_plan_and_param_shapes(db_path):
+    db = make_db(db_path, threshold_ms=0)
+
+    assert db.get_product_by_id(3) is not None
+
+    entries = [entry for entry in db.get_slow_queries() if entry['sql'].startswith("SELECT")]
+    assert len(entries) == 1
+    entry = entries[0]
+    assert entry['method'] == "get_product_by_id"
+    assert entry['rows'] == 1
+    assert entry['params'] == ["int"]
+    assert entry['duration_ms'] >= 0
+    assert any("INTEGER PRIMARY KEY" in line for line in entry['plan'])
+    assert slow_query_log_path(db.db_path).exists()
+
+
+def test_batched_fetch_is_recorded_once_with_total_rows(db_path):
+    db = make_db(db_path, threshold_ms=0)
+
+    products = list(db.iter_products(batch_size=2))
+
+    entries = [entry for entry in db.get_slow_queries() if entry['method'] == "iter_products"
+               and entry['sql'].startswith("SELECT")]
+    assert len(products) == 5
+    assert len(entries) == 1
+    assert entries[0]['rows'] == 5
+
+
+def test_iterated_cursor_keeps_the_c_iterator_and_is_recorded_once(tmp_path):
+    log = SlowQueryLog(tmp_path / "slow.jsonl")
+    conn = sqlite3.connect(":memory:", factory=TimedConnection)
+    conn.slow_query_log = log
+    conn.slow_query_threshold = 0
+    conn.execute("CREATE TABLE items (qty INTEGER)")
+    conn.executemany("INSERT INTO items VALUES (?)", ((i,) for i in range(10)))
+
+    cursor = conn.execute("SELECT qty FROM items")
+    assert type(cursor).__next__ is sqlite3.Cursor.__next__
+    assert sum(qty for qty, in cursor) == 45
+    del cursor
+
+    # 行ごとには計らないため、行数は不明 (-1) として手放した時点で記録する
+    selects = [entry for entry in log.read() if entry['sql'].startswith("SELECT")]
+    assert [entry['rows'] for entry in selects] == [-1]
+
+
+def test_fast_statements_are_not_recorded(db_path):
+    db = make_db(db_path, threshold_ms=60_000)
+
+    db.get_products_as_objects()
+
+    assert db.get_slow_queries() == []
+    assert not slow_query_log_path(db.db_path).exists()
+
+
+def test_executemany_with_generator_records_first_param_shape(tmp_path):
+    log = SlowQueryLog(tmp_path / "slow.jsonl")
+    conn = sqlite3.connect(":memory:", factory=TimedConnection)
+    conn.slow_query_log = log
+    conn.slow_query_threshold = 0
+    conn.execute("CREATE TABLE items (name TEXT, qty INTEGER)")
+
+    conn.executemany("INSERT INTO items VALUES (?, ?)", ((f"item{i}", i) for i in range(10)))
+
+    assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 10
+    insert = [entry for entry in log.read() if entry['sql'].startswith("INSERT")][0]
+    assert insert['executemany'] is True
+    assert insert['params'] == ["str(5)", "int"]
+    assert insert['rows'] == 10
+
+
+def test_log_is_bounded_and_newest_first(tmp_path):
+    log = SlowQueryLog(tmp_path / "slow.jsonl", max_entries=3)
+    for index in range(10):
+        log.record({'sql': f"SELECT {index}"})
+
+    entries = log.read()
+    assert len(entries) <= 6
+    assert [entry['sql'] for entry in log.read(limit=3)] == ["SELECT 9", "SELECT 8", "SELECT 7"]
+
+    log.clear()
+    assert log.read() == []
+
+
+def test_memory_database_has_no_log():
+    db = DatabaseManager(":memory:", slow_query_threshold_ms=0)
+
+    assert db.slow_query_log is None
+    assert db.get_slow_queries() == []
+    assert db.clear_slow_queries() is True
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+utils.stall_watchdog のテスト（GUIスレッドの代わりにテストのスレッドを監視する）
+"""
+
+import threading
+import time
+
+from utils.stall_watchdog import StallWatchdog, capture_stack
+
+
+def blocking_call(seconds):
+    time.sleep(seconds)
+
+
+def test_stall_is_reported_with_blocking_frame():
+    watchdog = StallWatchdog(threshold_ms=100, heartbeat_ms=20,
+                             thread_ident=threading.get_ident())
+    watchdog.start()
+    try:
+        watchdog.beat()
+        blocking_call(0.4)
+        watchdog.beat()
+    finally:
+        watchdog.stop()
+
+    assert len(watchdog.stalls) == 1
+    stall = watchdog.stalls[0]
+    assert stall['duration_ms'] >= 300
+    assert stall['location'].startswith("test_stall_watchdog.py:")
+    assert stall['location'].endswith("in blocking_call")
+    assert "blocking_call(0.4)" in stall['stack']
+
+
+def test_regular_beats_are_not_stalls():
+    watchdog = StallWatchdog(threshold_ms=200, heartbeat_ms=20,
+                             thread_ident=threading.get_ident())
+    watchdog.start()
+    try:
+        for _ in range(10):
+            watchdog.beat()
+            time.sleep(0.02)
+        watchdog.beat()
+    finally:
+        watchdog.stop()
+
+    assert list(watchdog.stalls) == []
+
+
+def test_capture_stack_of_missing_thread_returns_none():
+    assert capture_stack(-1) is None
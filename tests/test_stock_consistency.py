@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DatabaseManager.verify_stock_consistency（在庫履歴の連鎖と現在庫の検証・修復）のテスト
+"""
+
+import sqlite3
+
+import pytest
+
+from models.product import Product
+from models.stock_history import calculate_stock_change
+
+
+@pytest.fixture
+def db(db):
+    db.add_products([
+        Product(name="牛乳", category="食品", current_stock=2),
+        Product(name="洗剤", category="洗剤", current_stock=5),
+        Product(name="電池", category="防災用品", current_stock=3),
+    ])
+    db.bulk_add_history(
+        {'product_id': product_id, 'operation_type': operation_type, 'quantity': 1,
+         'created_at': f"2024-04-{day:02d} 09:00:00"}
+        for product_id in (1, 2)
+        for day, operation_type in ((1, 'purchase'), (2, 'use'), (3, 'purchase'))
+    )
+    return db
+
+
+def overwrite_stock(db, product_id, current_stock):
+    # 簡易編集ダイアログと同じく、履歴を残さずに現在庫を書き換える
+    product = db.get_product_object_by_id(product_id)
+    product.current_stock = current_stock
+    assert db.update_product(product)
+
+
+def test_consistent_history_has_no_issues(db):
+    result = db.verify_stock_consistency()
+    assert result == {
+        'checked_rows': 6, 'broken_chains': 0, 'stock_mismatches': 0, 'products': 0,
+        'repaired': 0, 'unrepaired': 0, 'issues': []
+    }
+
+
+def test_overwritten_stock_is_detected_and_repaired(db):
+    # 現在庫を書き換えただけなら現在庫との食い違い、その後に在庫操作をすると連鎖の切れ目になる
+    overwrite_stock(db, 1, 10)
+    overwrite_stock(db, 2, 0)
+    assert db.update_stock_and_add_history({
+        'product_id': 2, 'operation_type': 'purchase', 'quantity_change': 2, 'stock_after': 2
+    })
+
+    result = db.verify_stock_consistency(batch_size=1)
+    assert (result['broken_chains'], result['stock_mismatches'], result['products']) == (1, 1, 2)
+    mismatch, chain = result['issues']
+    assert (mismatch['kind'], mismatch['product_id'], mismatch['stock_after'],
+            mismatch['expected_stock'], mismatch['unrecorded_change']) == ('stock_mismatch', 1, 3, 10, 7)
+    assert (chain['kind'], chain['product_id'], chain['stock_after'],
+            chain['expected_stock'], chain['unrecorded_change']) == ('broken_chain', 2, 2, 8, -6)
+    assert chain['previous_created_at'] == "2024-04-03 09:00:00"
+    assert result['repaired'] == 0
+
+    repaired = db.verify_stock_consistency(repair=True)
+    assert repaired['repaired'] == 2
+    assert db.verify_stock_consistency()['issues'] == []
+
+    # 既存の履歴と現在庫は変えず、調整の履歴を追加する
+    assert [db.get_product_object_by_id(product_id).current_stock for product_id in (1, 2, 3)] == [10, 2, 3]
+    history = db.get_stock_history(2, limit=-1)
+    assert [(h.operation_type, h.quantity_change, h.stock_after) for h in history][:2] == \
+           [('purchase', 2, 2), ('adjust', -6, 0)]
+    assert db.get_stock_statistics(1)['adjust_count'] == 1
+
+
+def test_same_time_break_is_reported_but_not_repaired(db):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE stock_history SET created_at = '2024-04-02 09:00:00', stock_after = 7 "
+                     "WHERE product_id = 1 AND created_at = '2024-04-03 09:00:00'")
+        conn.execute("UPDATE products SET current_stock = 7 WHERE id = 1")
+
+    result = db.verify_stock_consistency(repair=True, max_issues=0)
+    assert (result['broken_chains'], result['repaired'], result['unrepaired']) == (1, 0, 1)
+    assert result['issues'] == []
+    assert db.count_stock_history() == 6
+
+
+def test_use_beyond_stock_keeps_the_chain(db):
+    # 在庫3個の電池を1個購入し、在庫より多い5個を使用してから2個購入する（CLI・在庫増減ダイアログと同じ計算）
+    for operation_type, quantity in (('purchase', 1), ('use', 5), ('purchase', 2)):
+        stock = db.get_product_object_by_id(3).current_stock
+        quantity_change, stock_after = calculate_stock_change(stock, operation_type, quantity)
+        assert db.update_stock_and_add_history({
+            'product_id': 3, 'operation_type': operation_type,
+            'quantity_change': quantity_change, 'stock_after': stock_after
+        })
+
+    history = db.get_stock_history(3, limit=-1)
+    assert [(h.quantity_change, h.stock_after) for h in reversed(history)] == [(1, 4), (-4, 0), (2, 2)]
+    assert db.get_product_object_by_id(3).current_stock == 2
+
+    result = db.verify_stock_consistency(repair=True)
+    assert (result['broken_chains'], result['stock_mismatches'], result['repaired']) == (0, 0, 0)
+    assert db.count_stock_history(3) == 3
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+utils.tracing のテスト
+"""
+
+import json
+import threading
+
+import pytest
+
+from utils.tracing import Tracer, trace_class, traced
+
+
+def complete_events(tracer):
+    return [event for event in tracer.to_chrome_trace()['traceEvents'] if event['ph'] == 'X']
+
+
+def test_nested_spans_are_contained_in_parent():
+    tracer = Tracer(capacity=100)
+
+    @traced(category="db", tracer=tracer)
+    def query():
+        return 1
+
+    with tracer.span("MainWindow.manage_stock", "ui.action", product_id=3):
+        with tracer.span("StockManagementDialog.exec", "ui.wait"):
+            pass
+        query()
+
+    events = complete_events(tracer)
+    assert [event['name'] for event in events] == [
+        "MainWindow.manage_stock", "StockManagementDialog.exec",
+        "test_nested_spans_are_contained_in_parent.<locals>.query"
+    ]
+    parent, *children = events
+    assert parent['args'] == {'product_id': 3}
+    for child in children:
+        assert child['tid'] == parent['tid']
+        assert parent['ts'] <= child['ts']
+        assert child['ts'] + child['dur'] <= parent['ts'] + parent['dur']
+
+
+def test_ring_buffer_keeps_newest_spans():
+    tracer = Tracer(capacity=3)
+    for index in range(5):
+        with tracer.span(f"span-{index}"):
+            pass
+
+    assert len(tracer) == 3
+    assert [event['name'] for event in complete_events(tracer)] == ["span-2", "span-3", "span-4"]
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer(enabled=False)
+
+    @traced(tracer=tracer)
+    def work():
+        return "done"
+
+    with tracer.span("ignored"):
+        assert work() == "done"
+    assert len(tracer) == 0
+
+
+def test_generator_span_covers_iteration_and_errors_are_recorded():
+    tracer = Tracer()
+
+    @traced("iter_rows", tracer=tracer)
+    def iter_rows():
+        yield from range(3)
+
+    @traced("failing", tracer=tracer)
+    def failing():
+        raise RuntimeError("失敗")
+
+    rows = iter_rows()
+    assert len(tracer) == 0
+    assert list(rows) == [0, 1, 2]
+    with pytest.raises(RuntimeError):
+        failing()
+    assert [event['name'] for event in complete_events(tracer)] == ["iter_rows", "failing"]
+
+
+def test_trace_class_names_spans_after_class(monkeypatch):
+    tracer = Tracer()
+    monkeypatch.setattr("utils.tracing.TRACER", tracer)
+
+    @trace_class("db")
+    class Service:
+        def fetch(self):
+            return "ok"
+
+        def _helper(self):
+            return "hidden"
+
+    service = Service()
+    assert service.fetch() == "ok"
+    service._helper()
+    events = complete_events(tracer)
+    assert [(event['name'], event['cat']) for event in events] == [("Service.fetch", "db")]
+
+
+def test_dump_writes_chrome_trace_with_thread_names(tmp_path):
+    tracer = Tracer()
+    worker = threading.Thread(target=lambda: tracer.record("backup", "worker", 0.0, 0.001),
+                              name="BackupWorker")
+    worker.start()
+    worker.join()
+
+    path = tmp_path / "trace.json"
+    assert tracer.dump(path) == 1
+
+    trace = json.loads(path.read_text(encoding='utf-8'))
+    metadata = [event for event in trace['traceEvents'] if event['ph'] == 'M']
+    assert metadata == [{'name': 'thread_name', 'ph': 'M', 'pid': metadata[0]['pid'],
+                         'tid': worker.ident, 'args': {'name': "BackupWorker"}}]
+    assert trace['traceEvents'][-1]['dur'] == 1000.0
@@ -49,6 +49,84 @@ def get_database_path():
     #アプリ用データフォルダ内のデータベースファイル（DB_NAME）のパスを取得できます。
     return get_app_data_dir() / DB_NAME
 
+def get_backup_dir():
+    """
+    バックアップの保存ディレクトリを取得
+    
+    Returns:
+        Path: バックアップ用ディレクトリのパス
+    """
+    return get_app_data_dir() / "backups"
+
+def get_log_path():
+    """
+    ログファイルのパスを取得
+    
+    Returns:
+        Path: ログファイルのパス
+    """
+    return get_app_data_dir() / "logs" / "inventory.log"
+
+# ログ設定
+LOG_FORMAT = "%(asctime)s %(levelname)-7s [%(threadName)s] %(name)s: %(message)s"
+LOG_FILE_MAX_BYTES = 1_000_000  # 1ファイルの上限（超えたら切り替え）
+LOG_FILE_BACKUP_COUNT = 5       # 残す古いログファイルの数
+# ロガーごとの出力レベル（"" はルートロガー）
+LOG_LEVELS = {
+    "": "INFO",
+    "models.database": "WARNING",   # 取得・更新のたびに出るメッセージは DEBUG / INFO
+}
+
+# トレース設定（操作 → データベース → 再描画 の区間を記録し、必要なときに書き出す）
+TRACE_ENABLED = True
+TRACE_BUFFER_SIZE = 20000       # 保持する区間の数（古いものから捨てる）
+
+# イベントループの停止検知（GUIスレッドを止めている処理をスタック付きでログに記録）
+STALL_WATCHDOG_ENABLED = True
+STALL_THRESHOLD_MS = 100        # 停止とみなす時間
+STALL_HEARTBEAT_MS = 50         # GUIスレッドから応答を知らせる間隔
+STALL_HANG_SECONDS = 5.0        # 停止が続いている最中にもエラーとして記録するまでの秒数
+STALL_STACK_LIMIT = 20          # 記録するスタックのフレーム数
+
+# バックアップ設定
+BACKUP_KEEP_GENERATIONS = 7     # 残す世代数
+BACKUP_COMPRESS = True          # gzip圧縮して保存
+BACKUP_PAGES_PER_STEP = 256     # 1ステップでコピーするページ数
+BACKUP_STEP_SLEEP = 0.05        # ステップ間のスリープ（秒）
+BACKUP_INTERVAL_CHOICES = [("無効", None), ("6時間", 6 * 3600), ("12時間", 12 * 3600), ("24時間", 24 * 3600)]
+
+# 保守処理設定（操作が途切れている間に少しずつ実行）
+MAINTENANCE_IDLE_SECONDS = 120          # 無操作とみなすまでの秒数
+MAINTENANCE_INTERVAL_HOURS = 24         # 1周終わってから次の周回までの間隔
+MAINTENANCE_BUDGET_SECONDS = 2.0        # 1回の持ち時間
+MAINTENANCE_VACUUM_PAGES_PER_STEP = 128 # 段階的バキュームで1回に返却するページ数
+
+# バックグラウンドの読み込み（履歴・レポート）の期限（秒・キャンセルボタンでも中断できる）
+QUERY_TIMEOUT_SECONDS = 60
+
+# 遅いクエリの記録（しきい値を超えたSQL文を実行計画付きでデータベースの隣のファイルに記録・Noneで無効）
+SLOW_QUERY_THRESHOLD_MS = 100           # 記録する所要時間
+SLOW_QUERY_LOG_MAX_ENTRIES = 500        # 残す件数（古いものから削除）
+
+# 商品キャッシュ（get_product_object_by_id で読み込んだ商品を覚えておく数・Noneで無効）
+PRODUCT_CACHE_SIZE = 1024
+PRODUCT_CACHE_CHECK_SECONDS = 0.5       # 他の接続（別のプロセスなど）の書き込みを確認する間隔
+
+# 使用ペースの予測（使用の間隔から1日あたりの使用数を指数加重移動平均で求める）
+FORECAST_SMOOTHING = 0.3                # 新しい使用間隔の重み（0〜1・大きいほど最近の使い方に早く追従）
+FORECAST_MIN_INTERVAL_DAYS = 1.0        # これより短い使用間隔はこの日数とみなす（同じ日の連続した使用で跳ねないように）
+
+# 買い物リスト（在庫少・在庫切れに加えて、この日数以内に在庫がなくなる予測の商品も載せる）
+SHOPPING_LIST_DAYS = 7
+
+# 在庫履歴の圧縮（古い履歴を期間ごとのチェックポイント行にまとめる・cli.py compact-history）
+HISTORY_COMPACTION_AGE_DAYS = 365       # これより古い履歴をまとめる
+HISTORY_COMPACTION_PERIOD = 'month'     # まとめる期間 ('day', 'month', 'year')
+
+# メトリクス設定（データフォルダ内に定期的に書き出す・Noneで無効）
+METRICS_EXPORT_FILE = None              # "metrics.prom"（Prometheus形式）または "metrics.json"
+METRICS_EXPORT_INTERVAL_SECONDS = 60    # 書き出し間隔
+
 # カテゴリ設定
 DEFAULT_CATEGORIES = [
     "日用品",
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ログ出力の設定
+各モジュールは logging.getLogger(__name__) で取得したロガーに書き込み、
+実際の出力（コンソール・ローテーションするファイル）は QueueListener のスレッドで行う
+
+GUIスレッドやデータベース処理のスレッドはキューにレコードを積むだけなので、
+遅いコンソールやディスクへの書き込みを待たされない。
+
+使い方:
+    from utils.logging_setup import setup_logging
+
+    setup_logging(log_file=get_log_path())
+    ...  # 終了時には shutdown_logging() が自動で呼ばれる
+"""
+
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+from utils.config import (
+    LOG_FORMAT, LOG_LEVELS, LOG_FILE_MAX_BYTES, LOG_FILE_BACKUP_COUNT
+)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+_atexit_registered = False
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    メッセージの組み立て（% 書式の適用）も出力スレッドに任せる QueueHandler（内部用）
+
+    標準の QueueHandler は積む前に呼び出し元のスレッドで書式を適用するため、
+    レコードをそのまま積んで QueueListener 側の Formatter で組み立てる。
+    同じプロセス内のキューなので引数や例外情報を文字列にしておく必要はない。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return copy.copy(record)
+
+
+def apply_levels(levels: Dict[str, str]):
+    """
+    ロガーごとの出力レベルを設定
+
+    Args:
+        levels: ロガー名 → レベル名（"" はルートロガー）
+    """
+    for name, level in levels.items():
+        logging.getLogger(name or None).setLevel(level)
+
+
+def setup_logging(log_file=None, console: bool = True, levels: Optional[Dict[str, str]] = None,
+                  stream=None, fmt: str = LOG_FORMAT) -> logging.handlers.QueueListener:
+    """
+    ログ出力を設定（すでに設定済みなら出力先を作り直す）
+
+    Args:
+        log_file: ログファイルのパス（省略時はファイルに出力しない）
+        console: コンソール（標準エラー出力）にも出力するか
+        levels: ロガーごとの出力レベル（省略時は utils/config.py の LOG_LEVELS）
+        stream: コンソール出力の書き込み先（省略時は sys.stderr）
+        fmt: ログの書式
+
+    Returns:
+        QueueListener: 出力を担当するリスナー
+    """
+    global _listener, _queue_handler, _atexit_registered
+    shutdown_logging()
+    if not _atexit_registered:
+        # 終了時にキューに残ったログを取りこぼさない
+        atexit.register(shutdown_logging)
+        _atexit_registered = True
+
+    formatter = logging.Formatter(fmt)
+    handlers = []
+    if console:
+        console_handler = logging.StreamHandler(stream or sys.stderr)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+    if log_file:
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT,
+            encoding='utf-8', delay=True
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = _DeferredQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    apply_levels(LOG_LEVELS if levels is None else levels)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """
+    キューに残っているログを書き出してから出力を停止
+    """
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+メトリクス計測
+カウンター・ゲージ・応答時間のヒストグラムをプロセス内で集計する（Qtに依存しない）
+
+集計結果はデバッグ用の画面で確認できるほか、
+Prometheusのテキスト形式またはJSONでファイルに書き出せる。
+
+使い方:
+    from utils.metrics import REGISTRY, timed
+
+    @timed("inventory_gui_seconds", operation="refresh_table")
+    def refresh_table(self):
+        ...
+
+    REGISTRY.counter("inventory_stock_updates_total", "在庫更新の回数").inc()
+"""
+
+import functools
+import inspect
+import json
+import logging
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 応答時間ヒストグラムの区切り（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """
+    増加のみする値（呼び出し回数など）
+    """
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        """
+        値を増やす
+        """
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'value': self._value}
+
+
+class Gauge:
+    """
+    増減する現在値（表示件数など）
+    """
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        """
+        値を設定
+        """
+        with self._lock:
+            self._value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        """
+        値を増やす（負の値で減らす）
+        """
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'value': self._value}
+
+
+class Histogram:
+    """
+    観測値の分布（応答時間など）を区切りごとの件数で集計
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # 最後の要素は最大の区切りを超えた件数
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """
+        値を1件記録
+        """
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+            if value > self._max:
+                self._max = value
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def quantile(self, fraction: float) -> float:
+        """
+        区切りごとの件数から分位点を推定（区切りの中は線形補間）
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            maximum = self._max
+        if total == 0:
+            return 0.0
+        target = fraction * total
+        cumulative = 0
+        lower = 0.0
+        for index, count in enumerate(counts):
+            upper = self.buckets[index] if index < len(self.buckets) else maximum
+            if count and cumulative + count >= target:
+                return lower + (upper - lower) * (target - cumulative) / count
+            cumulative += count
+            lower = upper
+        return maximum
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self._counts)
+            total_sum = self._sum
+            total = self._count
+            maximum = self._max
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(list(self.buckets) + [math.inf], counts):
+            cumulative += count
+            buckets.append(["+Inf" if bound == math.inf else bound, cumulative])
+        return {
+            'count': total,
+            'sum': total_sum,
+            'max': maximum,
+            'p50': self.quantile(0.50),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': buckets
+        }
+
+
+_METRIC_TYPES = {'counter': Counter, 'gauge': Gauge, 'histogram': Histogram}
+
+
+class MetricsRegistry:
+    """
+    メトリクスを名前とラベルで管理するクラス
+    """
+
+    def __init__(self):
+        # 名前 → {'type', 'help', 'children': {ラベルのタプル: メトリクス}}
+        self._families: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, metric_type: str, name: str, help_text: str, labels: Dict[str, str]):
+        """
+        メトリクスを取得（未登録なら作成・内部用）
+        """
+        key = tuple(sorted(labels.items()))
+        family = self._families.get(name)
+        if family is not None and family['type'] == metric_type:
+            child = family['children'].get(key)
+            if child is not None:
+                return child
+        with self._lock:
+            family = self._families.setdefault(
+                name, {'type': metric_type, 'help': help_text, 'children': {}}
+            )
+            if family['type'] != metric_type:
+                raise ValueError(f"{name} は {family['type']} として登録済みです")
+            if help_text and not family['help']:
+                family['help'] = help_text
+            return family['children'].setdefault(key, _METRIC_TYPES[metric_type]())
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        """
+        カウンターを取得
+        """
+        return self._get('counter', name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str = "", **labels) -> Gauge:
+        """
+        ゲージを取得
+        """
+        return self._get('gauge', name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str = "", **labels) -> Histogram:
+        """
+        ヒストグラムを取得
+        """
+        return self._get('histogram', name, help_text, labels)
+
+    def reset(self):
+        """
+        すべてのメトリクスを破棄
+        """
+        with self._lock:
+            self._families.clear()
+
+    def collect(self) -> List[Tuple[str, str, str, Dict[str, str], Any]]:
+        """
+        登録済みのメトリクスを一覧で返す
+
+        Returns:
+            List[Tuple]: (名前, 種類, 説明, ラベル, メトリクス) のリスト（名前順）
+        """
+        with self._lock:
+            families = {name: (family['type'], family['help'], dict(family['children']))
+                        for name, family in self._families.items()}
+        return [
+            (name, metric_type, help_text, dict(key), metric)
+            for name, (metric_type, help_text, children) in sorted(families.items())
+            for key, metric in sorted(children.items())
+        ]
+
+    # === 書き出し ===
+
+    def to_json(self) -> Dict[str, Any]:
+        """
+        全メトリクスのスナップショットを辞書で返す
+        """
+        return {
+            'timestamp': time.time(),
+            'metrics': [
+                {'name': name, 'type': metric_type, 'help': help_text,
+                 'labels': labels, **metric.snapshot()}
+                for name, metric_type, help_text, labels, metric in self.collect()
+            ]
+        }
+
+    def to_prometheus_text(self) -> str:
+        """
+        全メトリクスをPrometheusのテキスト形式で返す
+        """
+        lines = []
+        current_name = None
+        for name, metric_type, help_text, labels, metric in self.collect():
+            if name != current_name:
+                current_name = name
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type == 'histogram':
+                snapshot = metric.snapshot()
+                for bound, cumulative in snapshot['buckets']:
+                    bucket_labels = dict(labels, le=str(bound))
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {snapshot['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        """
+        拡張子に応じた形式でファイルへ書き出す（.json はJSON、それ以外はPrometheus形式）
+
+        書きかけのファイルを読まれないよう、一時ファイルから置き換える。
+        """
+        path = Path(path)
+        temp_path = path.with_name(path.name + ".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            if path.suffix == ".json":
+                json.dump(self.to_json(), f, ensure_ascii=False, indent=2)
+            else:
+                f.write(self.to_prometheus_text())
+        os.replace(temp_path, path)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """
+    ラベルをPrometheusの形式 {key="value"} にする（内部用）
+    """
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in sorted(labels.items())
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+# アプリ全体で共有するレジストリ
+REGISTRY = MetricsRegistry()
+
+
+def _timed_generator(generator, histogram: Histogram, started: float):
+    """
+    ジェネレーターを最後まで（または閉じられるまで）読んだ時間を記録（内部用）
+    """
+    try:
+        yield from generator
+    finally:
+        histogram.observe(time.perf_counter() - started)
+
+
+def timed(name: str, help_text: str = "", registry: Optional[MetricsRegistry] = None, **labels):
+    """
+    関数の所要時間をヒストグラムに記録するデコレーター
+
+    ジェネレーターを返す関数は、読み終わるまでの時間を記録する。
+    例外が発生した場合は <name>_errors_total も増やす。
+    包んだ関数は任意の引数を受け取るため、Qtのシグナルに直接つなぐと
+    シグナルの引数まで渡される点に注意（引数を捨てるラムダ経由でつなぐ）。
+
+    Args:
+        name: ヒストグラムの名前
+        help_text: 説明
+        registry: 記録先（省略時は REGISTRY）
+        **labels: ラベル
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            target = registry or REGISTRY
+            histogram = target.histogram(name, help_text, **labels)
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                target.counter(f"{name}_errors_total", "例外で終了した回数", **labels).inc()
+                histogram.observe(time.perf_counter() - started)
+                raise
+            if inspect.isgenerator(result):
+                return _timed_generator(result, histogram, started)
+            histogram.observe(time.perf_counter() - started)
+            return result
+        return wrapper
+    return decorator
+
+
+def instrument_class(name: str, help_text: str = "", label: str = "method"):
+    """
+    クラスの公開メソッドすべてに timed を適用するクラスデコレーター
+
+    Args:
+        name: ヒストグラムの名前
+        help_text: 説明
+        label: メソッド名を入れるラベルの名前
+    """
+    def decorator(cls):
+        for attribute, value in list(vars(cls).items()):
+            if attribute.startswith('_') or not inspect.isfunction(value):
+                continue
+            setattr(cls, attribute, timed(name, help_text, **{label: attribute})(value))
+        return cls
+    return decorator
+
+
+class MetricsExporter:
+    """
+    メトリクスを一定間隔でファイルへ書き出すクラス（ワーカースレッドで実行）
+    """
+
+    def __init__(self, path, interval_seconds: float = 60.0,
+                 registry: Optional[MetricsRegistry] = None):
+        """
+        Args:
+            path: 書き出し先（.json はJSON、それ以外はPrometheusのテキスト形式）
+            interval_seconds: 書き出し間隔（秒）
+            registry: 書き出すレジストリ（省略時は REGISTRY）
+        """
+        self.path = Path(path)
+        self.interval_seconds = interval_seconds
+        self.registry = registry or REGISTRY
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """
+        定期的な書き出しを開始
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name="MetricsExporter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        書き出しを停止（最後に1回書き出す）
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _worker(self):
+        """
+        ワーカースレッドの本体（内部用）
+        """
+        while True:
+            stopped = self._stop_event.wait(self.interval_seconds)
+            try:
+                self.registry.write_file(self.path)
+            except OSError as e:
+                logger.error("メトリクス書き出しエラー: %s", e)
+            if stopped:
+                break
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+イベントループの停止検知
+GUIスレッドのタイマーから定期的に beat() を呼び、間隔が空いたら停止とみなして
+その間にGUIスレッドが実行していた箇所（Pythonのスタック）と停止時間をログに記録する
+
+監視スレッドは停止中に sys._current_frames() でGUIスレッドのスタックを取得するため、
+重い処理がどの関数のどの行で止まっていたかが分かる（Qtには依存しない）。
+
+使い方:
+    watchdog = StallWatchdog(threshold_ms=100)
+    timer.timeout.connect(watchdog.beat)   # GUIスレッドで heartbeat_ms ごとに呼ぶ
+    watchdog.start()
+"""
+
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+from utils.config import (
+    STALL_THRESHOLD_MS, STALL_HEARTBEAT_MS, STALL_HANG_SECONDS, STALL_STACK_LIMIT
+)
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# 停止箇所として優先して示す、このアプリのソースのディレクトリ
+_PROJECT_ROOT = str(Path(__file__).resolve().parent.parent)
+
+
+def capture_stack(thread_ident: int, limit: int = STALL_STACK_LIMIT) -> Optional[Tuple[str, str]]:
+    """
+    指定したスレッドの現在のスタックを取得
+
+    Args:
+        thread_ident: スレッドID
+        limit: 残すフレーム数（内側から）
+
+    Returns:
+        Optional[Tuple[str, str]]: (停止箇所, 整形したスタック)。スレッドが無い場合はNone
+    """
+    frame = sys._current_frames().get(thread_ident)
+    if frame is None:
+        return None
+    stack = traceback.extract_stack(frame)[-limit:]
+    # ライブラリの中で止まっていても、呼び出し元のアプリのコードを停止箇所とする
+    own_frames = [entry for entry in stack
+                  if entry.filename.startswith(_PROJECT_ROOT) and entry.filename != __file__]
+    culprit = (own_frames or stack)[-1]
+    location = f"{Path(culprit.filename).name}:{culprit.lineno} in {culprit.name}"
+    return location, "".join(traceback.format_list(stack))
+
+
+class StallWatchdog:
+    """
+    イベントループの停止を検知するクラス（監視はワーカースレッドで実行）
+    """
+
+    def __init__(self, threshold_ms: float = STALL_THRESHOLD_MS,
+                 heartbeat_ms: float = STALL_HEARTBEAT_MS,
+                 hang_seconds: float = STALL_HANG_SECONDS,
+                 thread_ident: Optional[int] = None):
+        """
+        Args:
+            threshold_ms: 停止とみなす時間（ミリ秒）
+            heartbeat_ms: beat() を呼ぶ間隔（ミリ秒）
+            hang_seconds: 停止が続いている間に一度エラーとして記録するまでの秒数
+            thread_ident: 監視するスレッド（省略時はメインスレッド）
+        """
+        self.threshold = threshold_ms / 1000
+        self.heartbeat = heartbeat_ms / 1000
+        self.hang_seconds = hang_seconds
+        self.thread_ident = thread_ident or threading.main_thread().ident
+        # 直近の停止の記録（新しいものが後ろ）
+        self.stalls = deque(maxlen=100)
+
+        self._lock = threading.Lock()
+        self._last_beat = time.monotonic()
+        self._captured: Optional[Tuple[str, str]] = None
+        self._hang_reported = False
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    # === 監視対象のスレッドから呼ぶ ===
+
+    def beat(self):
+        """
+        監視対象のスレッドが応答していることを知らせる（停止明けなら記録する）
+        """
+        now = time.monotonic()
+        with self._lock:
+            gap = now - self._last_beat
+            self._last_beat = now
+            captured, self._captured = self._captured, None
+            self._hang_reported = False
+        stalled = gap - self.heartbeat
+        if stalled >= self.threshold:
+            self._report(stalled, captured)
+
+    # === 監視スレッド ===
+
+    def start(self):
+        """
+        監視を開始
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            self._last_beat = time.monotonic()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name="StallWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        """
+        監視を停止
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _worker(self):
+        """
+        ワーカースレッドの本体（内部用）
+        """
+        interval = min(self.threshold, self.heartbeat) / 2
+        while not self._stop_event.wait(interval):
+            with self._lock:
+                last_beat = self._last_beat
+                stalled = time.monotonic() - last_beat - self.heartbeat
+                need_capture = stalled >= self.threshold and self._captured is None
+                need_hang_report = stalled >= self.hang_seconds and not self._hang_reported
+            if not (need_capture or need_hang_report):
+                continue
+
+            captured = capture_stack(self.thread_ident)
+            with self._lock:
+                # 取得中に応答が戻っていたら、その停止はもう beat() で記録されている
+                if self._last_beat != last_beat:
+                    continue
+                if need_capture:
+                    self._captured = captured
+                if need_hang_report:
+                    self._hang_reported = True
+            if need_hang_report and captured:
+                logger.error("イベントループが %.1f秒以上応答していません: %s\n%s",
+                             stalled, captured[0], captured[1])
+
+    def _report(self, stalled: float, captured: Optional[Tuple[str, str]]):
+        """
+        停止を記録（内部用）
+        """
+        location, stack = captured or ("（スタック取得前に回復）", "")
+        record: Dict[str, Any] = {
+            'at': datetime.now().isoformat(timespec='milliseconds'),
+            'duration_ms': stalled * 1000,
+            'location': location,
+            'stack': stack
+        }
+        self.stalls.append(record)
+        REGISTRY.histogram("inventory_event_loop_stall_seconds", "イベントループの停止時間（秒）").observe(stalled)
+        logger.warning("イベントループが %.0fms 停止しました: %s\n%s", stalled * 1000, location, stack)
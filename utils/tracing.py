@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+処理の区間（スパン）の記録
+画面操作 → データベース呼び出し → 再描画 のような入れ子の区間をリングバッファに記録し、
+必要なときに Chrome の trace_event 形式のJSONで書き出す（Qtに依存しない）
+
+書き出したファイルは Perfetto (https://ui.perfetto.dev) や chrome://tracing で開ける。
+同じスレッドの区間は時刻の包含関係で入れ子として表示される。
+
+使い方:
+    from utils.tracing import TRACER, traced
+
+    @traced(category="ui.action")
+    def manage_stock(self):
+        with TRACER.span("StockManagementDialog.exec", "ui.wait"):
+            ...
+
+    TRACER.dump("trace.json")
+"""
+
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional
+
+from utils.config import TRACE_BUFFER_SIZE, TRACE_ENABLED
+
+
+class Tracer:
+    """
+    区間をリングバッファに記録するクラス（古いものから捨てられる）
+    """
+
+    def __init__(self, capacity: int = TRACE_BUFFER_SIZE, enabled: bool = TRACE_ENABLED):
+        """
+        Args:
+            capacity: 保持する区間の最大数
+            enabled: Falseの場合は何も記録しない
+        """
+        self.enabled = enabled
+        # (名前, 分類, 開始, 所要時間, スレッドID, 付加情報) ※時刻は perf_counter の秒
+        self._events = deque(maxlen=capacity)
+        self._thread_names: Dict[int, str] = {}
+
+    @property
+    def capacity(self) -> int:
+        return self._events.maxlen
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    @contextmanager
+    def span(self, name: str, category: str = "app", **args):
+        """
+        with 文の中の処理を1つの区間として記録
+
+        Args:
+            name: 区間の名前
+            category: 分類（ui.action / db など、表示の色分けや絞り込みに使われる）
+            **args: 区間に付ける情報（件数など）
+        """
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, category, started, time.perf_counter() - started, args)
+
+    def record(self, name: str, category: str, started: float, duration: float,
+               args: Optional[Dict[str, Any]] = None):
+        """
+        計測済みの区間を追加（deque への追加はスレッドセーフ）
+        """
+        thread = threading.current_thread()
+        if thread.ident not in self._thread_names:
+            self._thread_names[thread.ident] = thread.name
+        self._events.append((name, category, started, duration, thread.ident, args or None))
+
+    def clear(self):
+        """
+        記録した区間をすべて破棄
+        """
+        self._events.clear()
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """
+        Chrome の trace_event 形式（JSON Object Format）の辞書を返す
+        """
+        pid = os.getpid()
+        events: List[Dict[str, Any]] = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in list(self._thread_names.items())
+        ]
+        for name, category, started, duration, tid, args in sorted(list(self._events), key=lambda e: e[2]):
+            event = {
+                'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                # 単位はマイクロ秒
+                'ts': round(started * 1_000_000, 3), 'dur': round(duration * 1_000_000, 3)
+            }
+            if args:
+                event['args'] = {key: _json_value(value) for key, value in args.items()}
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, path) -> int:
+        """
+        記録した区間をJSONファイルに書き出す
+
+        Args:
+            path: 書き出し先
+
+        Returns:
+            int: 書き出した区間の数
+        """
+        trace = self.to_chrome_trace()
+        path = Path(path)
+        temp_path = path.with_name(path.name + ".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(trace, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        return sum(1 for event in trace['traceEvents'] if event['ph'] == 'X')
+
+
+def _json_value(value):
+    """
+    付加情報をJSONに書ける値にする（内部用）
+    """
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+# アプリ全体で共有するトレーサー
+TRACER = Tracer()
+
+
+def _traced_generator(generator, tracer: Tracer, name: str, category: str, started: float):
+    """
+    ジェネレーターを最後まで（または閉じられるまで）読んだ区間を記録（内部用）
+    """
+    try:
+        yield from generator
+    finally:
+        tracer.record(name, category, started, time.perf_counter() - started)
+
+
+def traced(name: Optional[str] = None, category: str = "app", tracer: Optional[Tracer] = None):
+    """
+    関数の実行を1つの区間として記録するデコレーター
+
+    ジェネレーターを返す関数は、読み終わるまでを1つの区間にする。
+
+    Args:
+        name: 区間の名前（省略時は「クラス名.メソッド名」）
+        category: 分類
+        tracer: 記録先（省略時は TRACER）
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            target = tracer if tracer is not None else TRACER
+            if not target.enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                target.record(span_name, category, started, time.perf_counter() - started)
+                raise
+            if inspect.isgenerator(result):
+                return _traced_generator(result, target, span_name, category, started)
+            target.record(span_name, category, started, time.perf_counter() - started)
+            return result
+        return wrapper
+    return decorator
+
+
+def trace_class(category: str):
+    """
+    クラスの公開メソッドすべてに traced を適用するクラスデコレーター
+
+    Args:
+        category: 分類
+    """
+    def decorator(cls):
+        for attribute, value in list(vars(cls).items()):
+            if attribute.startswith('_') or not inspect.isfunction(value):
+                continue
+            setattr(cls, attribute, traced(f"{cls.__name__}.{attribute}", category)(value))
+        return cls
+    return decorator
@@ -1 +1,791 @@
- 
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ダイアログ実装
+バックグラウンド処理を伴うダイアログ類
+"""
+import html
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+# PySide6のUI部品をインポート
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QComboBox, QCheckBox,
+    QLineEdit, QPushButton, QProgressBar, QLabel, QFileDialog, QMessageBox,
+    QTableWidget, QTableWidgetItem, QHeaderView, QSplitter, QPlainTextEdit, QTextBrowser, QSpinBox
+)
+from PySide6.QtCore import Qt, QThread, QTimer, Signal
+from PySide6.QtPrintSupport import QPrintDialog, QPrinter
+
+sys.path.append(str(Path(__file__).parent.parent))
+from models.cancellation import CancelToken, QueryCancelled
+from models.database import DatabaseManager
+from models.export import (
+    EXPORT_KIND_NAMES, EXPORT_FORMATS, default_export_filename, export_to_file, write_shopping_list
+)
+from models.forecast import format_days_of_cover
+from utils.config import QUERY_TIMEOUT_SECONDS, SHOPPING_LIST_DAYS
+from utils.metrics import REGISTRY
+
+
+class QueryWorker(QThread):
+    """
+    データベースの読み込みをバックグラウンドで実行するワーカースレッド（中断・期限付き）
+
+    func は DatabaseManager を受け取って結果を返す関数（ワーカースレッドで実行される）。
+    """
+    completed = Signal(object)
+    cancelled = Signal(str)
+    failed = Signal(str)
+
+    def __init__(self, db_manager, func, timeout=QUERY_TIMEOUT_SECONDS, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.func = func
+        self.token = CancelToken(timeout)
+        # 終わったら破棄する（中断後に別の読み込みで置き換えられた場合も）
+        self.finished.connect(self.deleteLater)
+
+    def cancel(self):
+        """
+        読み込みの中断を要求（実行中のSQL文もすぐに中断される）
+        """
+        self.token.cancel()
+
+    def run(self):
+        """
+        ワーカースレッドで読み込みを実行
+        """
+        try:
+            with self.db_manager.cancellable(self.token):
+                result = self.func(self.db_manager)
+            self.completed.emit(result)
+        except QueryCancelled as e:
+            self.cancelled.emit(e.reason)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+def supersede_worker(worker):
+    """
+    実行中の読み込みを中断し、結果が届いても無視されるようにする
+    （新しい読み込みを始める前に呼ぶ）
+    """
+    if worker is None or not worker.isRunning():
+        return
+    for signal in (worker.completed, worker.cancelled, worker.failed):
+        signal.disconnect()
+    worker.cancel()
+
+
+def stop_workers(owner):
+    """
+    owner の子の読み込み（置き換えられたものも含む）をすべて中断し、終わるまで待つ
+    """
+    for worker in owner.findChildren(QueryWorker):
+        worker.cancel()
+        worker.wait()
+
+
+class ExportWorker(QThread):
+    """
+    エクスポートをバックグラウンドで実行するワーカースレッド
+    """
+    progress = Signal(int, int)
+    completed = Signal(dict)
+    failed = Signal(str)
+
+    def __init__(self, db_manager, kind, path, fmt, compress, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.kind = kind
+        self.path = path
+        self.fmt = fmt
+        self.compress = compress
+        self.token = CancelToken()
+
+    def cancel(self):
+        """
+        エクスポートの中断を要求（読み込み中のSQL文もすぐに中断される）
+        """
+        self.token.cancel()
+
+    def run(self):
+        """
+        ワーカースレッドでエクスポートを実行
+        """
+        try:
+            with self.db_manager.cancellable(self.token):
+                result = export_to_file(
+                    self.db_manager, self.kind, self.path, fmt=self.fmt,
+                    compress=self.compress,
+                    progress_callback=self.progress.emit,
+                    is_cancelled=self.token.is_cancelled
+                )
+            self.completed.emit(result)
+        except QueryCancelled:
+            # 集計などの途中で中断された（書きかけのファイルは削除済み）
+            self.completed.emit({'rows': 0, 'cancelled': True, 'path': self.path})
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class ExportDialog(QDialog):
+    """
+    データエクスポートダイアログ
+    """
+
+    def __init__(self, db_manager=None, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager or DatabaseManager()
+        self.worker = None
+        self.setup_ui()
+
+    def setup_ui(self):
+        """
+        エクスポートダイアログのUI作成
+        """
+        self.setWindowTitle("エクスポート")
+        self.setModal(True)
+        self.resize(450, 220)
+
+        layout = QVBoxLayout(self)
+        form_layout = QFormLayout()
+
+        # エクスポート対象
+        self.kind_combo = QComboBox()
+        for kind, name in EXPORT_KIND_NAMES.items():
+            self.kind_combo.addItem(name, kind)
+        form_layout.addRow("対象:", self.kind_combo)
+
+        # 出力形式
+        self.format_combo = QComboBox()
+        for fmt in EXPORT_FORMATS:
+            self.format_combo.addItem(fmt.upper(), fmt)
+        form_layout.addRow("形式:", self.format_combo)
+
+        # gzip圧縮
+        self.gzip_check = QCheckBox("gzip圧縮する")
+        form_layout.addRow("", self.gzip_check)
+
+        # 出力先
+        path_layout = QHBoxLayout()
+        self.path_input = QLineEdit()
+        self.path_input.setPlaceholderText("出力先ファイル")
+        path_layout.addWidget(self.path_input)
+        browse_button = QPushButton("参照...")
+        browse_button.clicked.connect(self.choose_path)
+        path_layout.addWidget(browse_button)
+        form_layout.addRow("出力先:", path_layout)
+
+        layout.addLayout(form_layout)
+
+        # 進捗表示
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
+
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        # ボタン
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.start_button = QPushButton("エクスポート")
+        self.start_button.clicked.connect(self.start_export)
+        button_layout.addWidget(self.start_button)
+        self.cancel_button = QPushButton("閉じる")
+        self.cancel_button.clicked.connect(self.cancel_or_close)
+        button_layout.addWidget(self.cancel_button)
+        layout.addLayout(button_layout)
+
+        # 対象・形式の変更時にファイル名を追従させる
+        self.kind_combo.currentIndexChanged.connect(self.update_default_path)
+        self.format_combo.currentIndexChanged.connect(self.update_default_path)
+        self.gzip_check.toggled.connect(self.update_default_path)
+        self.update_default_path()
+
+    def update_default_path(self):
+        """
+        選択内容に合わせて出力先ファイル名を更新
+        """
+        directory = Path(self.path_input.text()).parent if self.path_input.text() else Path.home()
+        filename = default_export_filename(
+            self.kind_combo.currentData(), self.format_combo.currentData(),
+            self.gzip_check.isChecked()
+        )
+        self.path_input.setText(str(directory / filename))
+
+    def choose_path(self):
+        """
+        出力先ファイルを選択
+        """
+        path, _ = QFileDialog.getSaveFileName(self, "エクスポート先", self.path_input.text())
+        if path:
+            self.path_input.setText(path)
+
+    def start_export(self):
+        """
+        バックグラウンドでエクスポートを開始
+        """
+        path = self.path_input.text().strip()
+        if not path:
+            QMessageBox.warning(self, "入力エラー", "出力先ファイルを指定してください。")
+            return
+
+        self.worker = ExportWorker(
+            self.db_manager, self.kind_combo.currentData(), path,
+            self.format_combo.currentData(), self.gzip_check.isChecked(), parent=self
+        )
+        self.worker.progress.connect(self.on_progress)
+        self.worker.completed.connect(self.on_completed)
+        self.worker.failed.connect(self.on_failed)
+
+        self.set_running(True)
+        self.status_label.setText("エクスポート中...")
+        self.worker.start()
+
+    def set_running(self, running):
+        """
+        実行中かどうかに応じてUIを切り替え
+        """
+        self.start_button.setEnabled(not running)
+        self.kind_combo.setEnabled(not running)
+        self.format_combo.setEnabled(not running)
+        self.gzip_check.setEnabled(not running)
+        self.path_input.setEnabled(not running)
+        self.cancel_button.setText("キャンセル" if running else "閉じる")
+
+    def cancel_or_close(self):
+        """
+        実行中なら中断を要求し、そうでなければ閉じる
+        """
+        if self.worker and self.worker.isRunning():
+            self.worker.cancel()
+            self.status_label.setText("中断しています...")
+        else:
+            self.reject()
+
+    def on_progress(self, written, total):
+        """
+        進捗を表示
+        """
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(written)
+        self.status_label.setText(f"{written:,} / {total:,} 件")
+
+    def on_completed(self, result):
+        """
+        エクスポート完了時の処理
+        """
+        self.set_running(False)
+        if result['cancelled']:
+            self.status_label.setText("エクスポートを中断しました")
+        else:
+            self.status_label.setText(f"{result['rows']:,}件を書き出しました: {result['path']}")
+
+    def on_failed(self, message):
+        """
+        エクスポート失敗時の処理
+        """
+        self.set_running(False)
+        self.status_label.setText("エクスポートに失敗しました")
+        QMessageBox.critical(self, "エラー", f"エクスポートに失敗しました:\n{message}")
+
+    def reject(self):
+        """
+        実行中のワーカーを止めてから閉じる
+        """
+        if self.worker and self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait()
+        super().reject()
+
+
+def build_report_html(db_manager) -> str:
+    """
+    在庫レポートのHTMLを作成（ワーカースレッドで実行するためQtを使わない）
+    """
+    summary = db_manager.get_stock_summary()
+    if not summary:
+        raise RuntimeError("在庫の集計を取得できませんでした")
+
+    lines = [
+        "<h3>📊 在庫レポート</h3>",
+        "<ul>",
+        f"<li>商品数: {summary['total_products']:,}件</li>",
+        f"<li>在庫切れ: {summary['out_of_stock']:,}件</li>",
+        f"<li>在庫少: {summary['low_stock']:,}件</li>",
+        f"<li>期限切れ: {summary['expired']:,}件</li>",
+        f"<li>在庫金額: ¥{summary['stock_value']:,.0f}</li>",
+        "</ul>",
+        "<h3>⚠️ 要対応の商品</h3>",
+        "<table border='1' style='border-collapse: collapse; width: 100%;'>",
+        "<tr style='background-color: #f0f0f0;'>"
+        "<th>ID</th><th>商品名</th><th>カテゴリ</th><th>在庫/最低</th><th>消費期限</th></tr>"
+    ]
+    today = date.today()
+    for product in db_manager.iter_products():
+        if product.get_stock_status() == 'normal' and not product.is_expired(today):
+            continue
+        lines.append(
+            f"<tr><td>{product.product_id}</td><td>{html.escape(product.name)}</td>"
+            f"<td>{html.escape(product.category)}</td>"
+            f"<td>{product.current_stock}/{product.min_stock}</td>"
+            f"<td>{product.expiry_date or ''}</td></tr>"
+        )
+    lines.append("</table>")
+    return "\n".join(lines)
+
+
+class ReportDialog(QDialog):
+    """
+    在庫レポートダイアログ（バックグラウンドで集計し、キャンセルできる）
+    """
+
+    def __init__(self, db_manager=None, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager or DatabaseManager()
+        self.worker = None
+        self.setup_ui()
+        self.load_report()
+
+    def setup_ui(self):
+        """
+        UIを構築
+        """
+        self.setWindowTitle("在庫レポート")
+        self.resize(700, 500)
+
+        layout = QVBoxLayout(self)
+        self.report_browser = QTextBrowser()
+        layout.addWidget(self.report_browser)
+
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        button_layout = QHBoxLayout()
+        self.refresh_button = QPushButton("更新")
+        self.refresh_button.clicked.connect(self.load_report)
+        self.cancel_button = QPushButton("キャンセル")
+        self.cancel_button.clicked.connect(self.cancel_load)
+        self.close_button = QPushButton("閉じる")
+        self.close_button.clicked.connect(self.reject)
+        button_layout.addWidget(self.refresh_button)
+        button_layout.addWidget(self.cancel_button)
+        button_layout.addStretch()
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+
+    def load_report(self):
+        """
+        レポートの集計を開始（実行中の集計は中断して置き換える）
+        """
+        supersede_worker(self.worker)
+        self.worker = QueryWorker(self.db_manager, build_report_html, parent=self)
+        self.worker.completed.connect(self.on_loaded)
+        self.worker.cancelled.connect(self.on_cancelled)
+        self.worker.failed.connect(self.on_failed)
+        self.cancel_button.setEnabled(True)
+        self.status_label.setText("集計中...")
+        self.worker.start()
+
+    def cancel_load(self):
+        """
+        集計を中断
+        """
+        if self.worker is not None:
+            self.worker.cancel()
+            self.status_label.setText("中断しています...")
+
+    def on_loaded(self, report_html):
+        self.worker = None
+        self.cancel_button.setEnabled(False)
+        self.report_browser.setHtml(report_html)
+        self.status_label.setText(f"集計日時: {datetime.now():%Y-%m-%d %H:%M:%S}")
+
+    def on_cancelled(self, reason):
+        self.worker = None
+        self.cancel_button.setEnabled(False)
+        self.status_label.setText("集計がタイムアウトしました" if reason == 'timeout' else "集計を中断しました")
+
+    def on_failed(self, message):
+        self.worker = None
+        self.cancel_button.setEnabled(False)
+        self.status_label.setText(f"集計に失敗しました: {message}")
+
+    def reject(self):
+        """
+        実行中の集計を止めてから閉じる
+        """
+        stop_workers(self)
+        super().reject()
+
+
+def build_shopping_list_html(shopping_list) -> str:
+    """
+    買い物リストの印刷用HTMLを作成（作成済みの結果を整形するだけでデータベースは読まない）
+    """
+    lines = [
+        f"<h3>🛒 買い物リスト（{shopping_list['days']}日以内に在庫がなくなる商品を含む）</h3>",
+        f"<p>作成日時: {shopping_list['generated_at']}　"
+        f"{shopping_list['item_count']:,}件　約¥{shopping_list['estimated_cost']:,.0f}</p>"
+    ]
+    if shopping_list['unpriced_count']:
+        lines.append(f"<p>※ 価格未設定の {shopping_list['unpriced_count']:,}件は金額に含みません</p>")
+    for group in shopping_list['groups']:
+        lines += [
+            f"<h4>{html.escape(group['purchase_location'] or '購入場所未設定')}"
+            f"（約¥{group['estimated_cost']:,.0f}）</h4>",
+            "<table border='1' style='border-collapse: collapse; width: 100%;'>",
+            "<tr style='background-color: #f0f0f0;'>"
+            "<th>☐</th><th>商品名</th><th>ブランド</th><th>サイズ</th><th>在庫/最低</th>"
+            "<th>残り日数</th><th>購入数</th><th>概算金額</th></tr>"
+        ]
+        for item in group['items']:
+            days_of_cover = format_days_of_cover(item['days_of_cover'])
+            cost = '' if item['estimated_cost'] is None else f"¥{item['estimated_cost']:,.0f}"
+            lines.append(
+                f"<tr><td>☐</td><td>{html.escape(item['name'])}</td>"
+                f"<td>{html.escape(item['brand'] or '')}</td><td>{html.escape(item['size'] or '')}</td>"
+                f"<td>{item['current_stock']}/{item['min_stock']}</td><td>{days_of_cover}</td>"
+                f"<td>{item['suggested_quantity']}</td><td>{cost}</td></tr>"
+            )
+        lines.append("</table>")
+    return "\n".join(lines)
+
+
+class ShoppingListDialog(QDialog):
+    """
+    買い物リストダイアログ（バックグラウンドで作成し、印刷・CSV保存できる）
+    """
+
+    def __init__(self, db_manager=None, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager or DatabaseManager()
+        self.worker = None
+        self.shopping_list = None
+        self.setup_ui()
+        self.load_shopping_list()
+
+    def setup_ui(self):
+        """
+        UIを構築
+        """
+        self.setWindowTitle("買い物リスト")
+        self.resize(800, 600)
+
+        layout = QVBoxLayout(self)
+        days_layout = QHBoxLayout()
+        days_layout.addWidget(QLabel("在庫がなくなる予測:"))
+        self.days_spin = QSpinBox()
+        self.days_spin.setRange(0, 365)
+        self.days_spin.setValue(SHOPPING_LIST_DAYS)
+        self.days_spin.setSuffix("日以内")
+        self.days_spin.valueChanged.connect(self.load_shopping_list)
+        days_layout.addWidget(self.days_spin)
+        days_layout.addStretch()
+        layout.addLayout(days_layout)
+
+        self.list_browser = QTextBrowser()
+        layout.addWidget(self.list_browser)
+
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        button_layout = QHBoxLayout()
+        self.print_button = QPushButton("印刷...")
+        self.print_button.clicked.connect(self.print_list)
+        self.save_button = QPushButton("CSV保存...")
+        self.save_button.clicked.connect(self.save_csv)
+        self.cancel_button = QPushButton("キャンセル")
+        self.cancel_button.clicked.connect(self.cancel_load)
+        self.close_button = QPushButton("閉じる")
+        self.close_button.clicked.connect(self.reject)
+        button_layout.addWidget(self.print_button)
+        button_layout.addWidget(self.save_button)
+        button_layout.addWidget(self.cancel_button)
+        button_layout.addStretch()
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+
+    def load_shopping_list(self):
+        """
+        買い物リストの作成を開始（実行中の作成は中断して置き換える）
+        """
+        supersede_worker(self.worker)
+        days = self.days_spin.value()
+        self.worker = QueryWorker(self.db_manager, lambda db: db.generate_shopping_list(days), parent=self)
+        self.worker.completed.connect(self.on_loaded)
+        self.worker.cancelled.connect(self.on_cancelled)
+        self.worker.failed.connect(self.on_failed)
+        self.set_loading(True)
+        self.status_label.setText("作成中...")
+        self.worker.start()
+
+    def set_loading(self, loading):
+        self.cancel_button.setEnabled(loading)
+        self.print_button.setEnabled(not loading and bool(self.shopping_list))
+        self.save_button.setEnabled(not loading and bool(self.shopping_list))
+
+    def cancel_load(self):
+        """
+        作成を中断
+        """
+        if self.worker is not None:
+            self.worker.cancel()
+            self.status_label.setText("中断しています...")
+
+    def on_loaded(self, shopping_list):
+        self.worker = None
+        if not shopping_list:
+            self.on_failed("データベースを読み込めませんでした")
+            return
+        self.shopping_list = shopping_list
+        self.set_loading(False)
+        self.list_browser.setHtml(build_shopping_list_html(shopping_list))
+        self.status_label.setText(f"作成日時: {shopping_list['generated_at']}")
+
+    def on_cancelled(self, reason):
+        self.worker = None
+        self.set_loading(False)
+        self.status_label.setText("作成がタイムアウトしました" if reason == 'timeout' else "作成を中断しました")
+
+    def on_failed(self, message):
+        self.worker = None
+        self.set_loading(False)
+        self.status_label.setText(f"作成に失敗しました: {message}")
+
+    def print_list(self):
+        """
+        表示中の買い物リストを印刷
+        """
+        printer = QPrinter(QPrinter.HighResolution)
+        dialog = QPrintDialog(printer, self)
+        if dialog.exec() == QDialog.Accepted:
+            self.list_browser.document().print_(printer)
+
+    def save_csv(self):
+        """
+        表示中の買い物リストをCSVファイルに保存
+        """
+        path, _ = QFileDialog.getSaveFileName(
+            self, "買い物リストを保存", str(Path.home() / "shopping_list.csv"), "CSV (*.csv)"
+        )
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8', newline='') as out:
+                rows = write_shopping_list(self.shopping_list, out, fmt='csv')
+            self.status_label.setText(f"保存しました（{rows}件）: {path}")
+        except OSError as e:
+            QMessageBox.critical(self, "エラー", f"保存に失敗しました:\n{e}")
+
+    def reject(self):
+        """
+        実行中の作成を止めてから閉じる
+        """
+        stop_workers(self)
+        super().reject()
+
+
+class MetricsDialog(QDialog):
+    """
+    メトリクスを一覧表示するデバッグ用ダイアログ（DEBUG_MODE のときのみメニューに表示）
+    """
+
+    COLUMNS = ["名前", "ラベル", "件数/値", "平均(ms)", "p50(ms)", "p95(ms)", "p99(ms)", "最大(ms)"]
+
+    def __init__(self, registry=None, parent=None):
+        super().__init__(parent)
+        self.registry = registry or REGISTRY
+        self.setWindowTitle("メトリクス")
+        self.resize(900, 500)
+        self.setup_ui()
+        self.refresh()
+
+        # 開いている間は1秒ごとに更新
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(1000)
+
+    def setup_ui(self):
+        """
+        UIを構築
+        """
+        layout = QVBoxLayout(self)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setColumnWidth(0, 220)
+        self.table.setColumnWidth(1, 240)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        self.reset_button = QPushButton("リセット")
+        self.reset_button.clicked.connect(self.reset_metrics)
+        self.export_button = QPushButton("書き出し...")
+        self.export_button.clicked.connect(self.export_metrics)
+        self.close_button = QPushButton("閉じる")
+        self.close_button.clicked.connect(self.reject)
+        button_layout.addWidget(self.reset_button)
+        button_layout.addWidget(self.export_button)
+        button_layout.addStretch()
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+
+    def refresh(self):
+        """
+        表示を最新の値に更新
+        """
+        metrics = self.registry.collect()
+        self.table.setRowCount(len(metrics))
+        for row, (name, metric_type, _, labels, metric) in enumerate(metrics):
+            label_text = ", ".join(f"{key}={value}" for key, value in labels.items())
+            if metric_type == 'histogram':
+                snapshot = metric.snapshot()
+                mean = snapshot['sum'] / snapshot['count'] if snapshot['count'] else 0.0
+                values = [f"{snapshot['count']:,}"] + [
+                    f"{seconds * 1000:.2f}"
+                    for seconds in (mean, snapshot['p50'], snapshot['p95'],
+                                    snapshot['p99'], snapshot['max'])
+                ]
+            else:
+                values = [f"{metric.value:g}"] + [""] * 5
+            for column, text in enumerate([name, label_text] + values):
+                item = QTableWidgetItem(text)
+                if column >= 2:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+
+    def reset_metrics(self):
+        """
+        集計をリセット
+        """
+        self.registry.reset()
+        self.refresh()
+
+    def export_metrics(self):
+        """
+        現在の値をファイルに書き出す
+        """
+        path, _ = QFileDialog.getSaveFileName(
+            self, "メトリクスの書き出し", str(Path.home() / "metrics.prom"),
+            "Prometheus (*.prom *.txt);;JSON (*.json)"
+        )
+        if not path:
+            return
+        try:
+            self.registry.write_file(path)
+            QMessageBox.information(self, "書き出し完了", f"メトリクスを書き出しました:\n{path}")
+        except OSError as e:
+            QMessageBox.critical(self, "エラー", f"書き出しに失敗しました:\n{e}")
+
+
+class SlowQueryDialog(QDialog):
+    """
+    記録された遅いクエリを一覧表示するデバッグ用ダイアログ（DEBUG_MODE のときのみメニューに表示）
+    """
+
+    COLUMNS = ["日時", "時間(ms)", "行数", "メソッド", "SQL"]
+
+    def __init__(self, db_manager, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.entries = []
+        self.setWindowTitle("遅いクエリ")
+        self.resize(900, 600)
+        self.setup_ui()
+        self.refresh()
+
+    def setup_ui(self):
+        """
+        UIを構築
+        """
+        layout = QVBoxLayout(self)
+
+        threshold = self.db_manager.slow_query_threshold_ms
+        self.info_label = QLabel(
+            f"{threshold:g}ms 以上かかったSQL文（新しい順）" if self.db_manager.slow_query_log
+            else "遅いクエリの記録は無効です"
+        )
+        layout.addWidget(self.info_label)
+
+        splitter = QSplitter(Qt.Vertical)
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setColumnWidth(0, 150)
+        self.table.setColumnWidth(3, 200)
+        self.table.itemSelectionChanged.connect(self.show_details)
+        splitter.addWidget(self.table)
+
+        # 選択した文のSQL全体・パラメータの型・実行計画
+        self.details = QPlainTextEdit()
+        self.details.setReadOnly(True)
+        splitter.addWidget(self.details)
+        layout.addWidget(splitter)
+
+        button_layout = QHBoxLayout()
+        self.refresh_button = QPushButton("更新")
+        self.refresh_button.clicked.connect(self.refresh)
+        self.clear_button = QPushButton("クリア")
+        self.clear_button.clicked.connect(self.clear_entries)
+        self.close_button = QPushButton("閉じる")
+        self.close_button.clicked.connect(self.reject)
+        button_layout.addWidget(self.refresh_button)
+        button_layout.addWidget(self.clear_button)
+        button_layout.addStretch()
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+
+    def refresh(self):
+        """
+        記録を読み直して表示
+        """
+        self.entries = self.db_manager.get_slow_queries(limit=200)
+        self.table.setRowCount(len(self.entries))
+        for row, entry in enumerate(self.entries):
+            values = [entry.get('at', ""), f"{entry.get('duration_ms', 0):,.1f}",
+                      f"{entry.get('rows', 0):,}", entry.get('method') or "", entry.get('sql', "")]
+            for column, text in enumerate(values):
+                item = QTableWidgetItem(text)
+                if column in (1, 2):
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+        self.details.clear()
+
+    def show_details(self):
+        """
+        選択した文の詳細を表示
+        """
+        row = self.table.currentRow()
+        if not 0 <= row < len(self.entries):
+            self.details.clear()
+            return
+        entry = self.entries[row]
+        lines = [
+            entry.get('sql', ""),
+            "",
+            f"パラメータ: {entry.get('params')}" + ("（executemany の最初の1件）" if entry.get('executemany') else ""),
+            "",
+            "実行計画:"
+        ] + ["  " + line for line in entry.get('plan', [])]
+        self.details.setPlainText("\n".join(lines))
+
+    def clear_entries(self):
+        """
+        記録を削除
+        """
+        if not self.db_manager.clear_slow_queries():
+            QMessageBox.critical(self, "エラー", "遅いクエリの記録を削除できませんでした")
+        self.refresh()
@@ -4,14 +4,19 @@
 メインウィンドウ実装 - 修正版
 インポートパスを修正
 """
+import html
+import logging
 import sqlite3
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import sys
 import json
+import time
 from pathlib import Path
 
+import numpy as np
+
 # PySide6のUI部品をインポート
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
@@ -19,16 +24,37 @@ from PySide6.QtWidgets import (
     QComboBox, QLabel, QToolBar, QStatusBar, QMessageBox,
     QHeaderView, QAbstractItemView, QDialog, QFormLayout,
     QSpinBox, QDoubleSpinBox, QTextEdit, QDateEdit, QDialogButtonBox,
-    QSplitter, QTextBrowser
+    QSplitter, QTextBrowser, QFileDialog
 )
-from PySide6.QtCore import Qt, QTimer, Signal, QDate, QSettings
+from PySide6.QtCore import Qt, QTimer, Signal, QDate, QSettings, QEvent
 from PySide6.QtGui import QAction, QIcon, QColor, QFont, QKeySequence
 
 # 正しいインポートパス
 sys.path.append(str(Path(__file__).parent.parent))
-from models.stock_history import StockHistory, create_history_list_from_rows
+from models.stock_history import StockHistory, create_history_list_from_rows, calculate_stock_change
+from models.forecast import round_days_of_cover
 from models.product import Product, create_product_list_from_rows
+from models.product_store import ProductStore, STATUS_NAMES
 from models.database import DatabaseManager
+from models.backup import BackupService
+from models.maintenance import MaintenanceScheduler
+from views.dialogs import (
+    ExportDialog, MetricsDialog, ReportDialog, ShoppingListDialog, SlowQueryDialog,
+    QueryWorker, supersede_worker, stop_workers
+)
+from utils.metrics import REGISTRY, MetricsExporter, timed
+from utils.tracing import TRACER, traced
+from utils.stall_watchdog import StallWatchdog
+from utils.config import (
+    get_app_data_dir, get_backup_dir, BACKUP_KEEP_GENERATIONS, BACKUP_COMPRESS,
+    BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP, BACKUP_INTERVAL_CHOICES,
+    MAINTENANCE_IDLE_SECONDS, MAINTENANCE_INTERVAL_HOURS,
+    MAINTENANCE_BUDGET_SECONDS, MAINTENANCE_VACUUM_PAGES_PER_STEP,
+    METRICS_EXPORT_FILE, METRICS_EXPORT_INTERVAL_SECONDS, DEBUG_MODE,
+    STALL_WATCHDOG_ENABLED, STALL_THRESHOLD_MS, STALL_HEARTBEAT_MS
+)
+
+logger = logging.getLogger(__name__)
 
 def create_database():
     """データベースとテーブルを作成"""
@@ -44,17 +70,21 @@ def create_database():
     conn.executescript(schema_sql)
     conn.close()
     
-    print("データベースが作成されました")
+    logger.info("データベースが作成されました")
 
 class HistoryDialog(QDialog):
     """
-    在庫履歴表示ダイアログ
+    在庫履歴表示ダイアログ（バックグラウンドで読み込み、キャンセルできる）
     """
     
-    def __init__(self, product_id=None, parent=None):
+    # 表示件数の選択肢（-1 は上限なし）
+    LIMIT_CHOICES = [("最新100件", 100), ("最新1000件", 1000), ("すべて", -1)]
+    
+    def __init__(self, product_id=None, parent=None, db_manager=None):
         super().__init__(parent)
         self.product_id = product_id
-        self.db_manager = DatabaseManager()
+        self.db_manager = db_manager or DatabaseManager()
+        self.worker = None
         self.setup_ui()
         self.load_history()
     
@@ -68,50 +98,127 @@ class HistoryDialog(QDialog):
         
         layout = QVBoxLayout(self)
         
+        # 表示件数（変更すると読み込み中のものを中断して読み直す）
+        limit_layout = QHBoxLayout()
+        limit_layout.addWidget(QLabel("表示件数:"))
+        self.limit_combo = QComboBox()
+        for text, limit in self.LIMIT_CHOICES:
+            self.limit_combo.addItem(text, limit)
+        self.limit_combo.currentIndexChanged.connect(lambda _: self.load_history())
+        limit_layout.addWidget(self.limit_combo)
+        limit_layout.addStretch()
+        layout.addLayout(limit_layout)
+        
         # 履歴表示用テキストブラウザ
         self.history_browser = QTextBrowser()
         self.history_browser.setFont(QFont("Consolas", 10))
         layout.addWidget(self.history_browser)
         
-        # 閉じるボタン
+        # キャンセル・閉じるボタン
+        button_layout = QHBoxLayout()
+        self.cancel_button = QPushButton("キャンセル")
+        self.cancel_button.clicked.connect(self.cancel_load)
+        button_layout.addWidget(self.cancel_button)
+        button_layout.addStretch()
         close_button = QPushButton("閉じる")
         close_button.clicked.connect(self.close)
-        layout.addWidget(close_button)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
     
     def load_history(self):
         """
-        履歴データを読み込み
+        履歴データの読み込みを開始（読み込み中のものは中断して置き換える）
+        """
+        product_id = self.product_id
+        limit = self.limit_combo.currentData()
+        
+        def load(db_manager):
+            # 履歴は読み進めながらHTMLにする（StockHistory を全件ためない）
+            histories = db_manager.iter_stock_history(product_id, limit=limit)
+            statistics = db_manager.get_stock_statistics(product_id) if product_id else None
+            return format_history_html(histories, statistics)
+        
+        supersede_worker(self.worker)
+        self.worker = QueryWorker(self.db_manager, load, parent=self)
+        self.worker.completed.connect(self.on_loaded)
+        self.worker.cancelled.connect(self.on_cancelled)
+        self.worker.failed.connect(self.on_failed)
+        self.cancel_button.setEnabled(True)
+        self.history_browser.setText("読み込み中...")
+        self.worker.start()
+    
+    def cancel_load(self):
         """
-        try:
-            # 仮の履歴データ（実際はデータベースから取得）
-            history_text = """
-<h3>📦 在庫履歴</h3>
-<table border='1' style='border-collapse: collapse; width: 100%;'>
-<tr style='background-color: #f0f0f0;'>
-    <th>日時</th><th>操作</th><th>変更</th><th>残り</th><th>メモ</th>
-</tr>
-<tr>
-    <td>2024-06-04 16:00</td><td>購入</td><td>+5個</td><td>5個</td><td>初回購入</td>
-</tr>
-<tr>
-    <td>2024-06-05 09:30</td><td>使用</td><td>-2個</td><td>3個</td><td>朝の使用</td>
-</tr>
-<tr>
-    <td>2024-06-06 14:20</td><td>使用</td><td>-1個</td><td>2個</td><td>お客様用</td>
-</tr>
-</table>
-<br>
-<p><strong>📊 統計情報:</strong></p>
-<ul>
-<li>総購入回数: 1回</li>
-<li>総使用回数: 2回</li>
-<li>平均使用間隔: 1.5日</li>
-</ul>
-            """
-            self.history_browser.setHtml(history_text)
-            
-        except Exception as e:
-            self.history_browser.setText(f"履歴の読み込みに失敗しました: {e}")
+        読み込みを中断
+        """
+        if self.worker is not None:
+            self.worker.cancel()
+    
+    def on_loaded(self, history_html):
+        self.worker = None
+        self.cancel_button.setEnabled(False)
+        self.history_browser.setHtml(history_html)
+    
+    def on_cancelled(self, reason):
+        self.worker = None
+        self.cancel_button.setEnabled(False)
+        self.history_browser.setText(
+            "読み込みがタイムアウトしました" if reason == 'timeout' else "読み込みを中断しました"
+        )
+    
+    def on_failed(self, message):
+        self.worker = None
+        self.cancel_button.setEnabled(False)
+        self.history_browser.setText(f"履歴の読み込みに失敗しました: {message}")
+    
+    def closeEvent(self, event):
+        """
+        読み込み中なら中断してから閉じる
+        """
+        stop_workers(self)
+        super().closeEvent(event)
+    
+    def reject(self):
+        stop_workers(self)
+        super().reject()
+
+
+def format_history_html(histories, statistics=None) -> str:
+    """
+    在庫履歴のHTMLを作成（ワーカースレッドで実行するためQtを使わない）
+    
+    Args:
+        histories: StockHistory のリストまたはイテレータ（新しい順・1回だけ読む）
+        statistics: 商品の統計情報（get_stock_statistics の結果・商品を指定した場合のみ）
+    """
+    lines = [
+        "<h3>📦 在庫履歴</h3>",
+        "<table border='1' style='border-collapse: collapse; width: 100%;'>",
+        "<tr style='background-color: #f0f0f0;'>",
+        "    <th>日時</th><th>操作</th><th>変更</th><th>残り</th><th>メモ</th>",
+        "</tr>"
+    ]
+    count = 0
+    for count, history in enumerate(histories, 1):
+        lines.append(
+            f"<tr><td>{history.created_at or ''}</td><td>{history.get_operation_display()}</td>"
+            f"<td>{history.quantity_change:+d}個</td><td>{history.stock_after}個</td><td>{html.escape(history.memo or '')}</td></tr>"
+        )
+    lines.append("</table>")
+    if not count:
+        lines.append("<p>履歴はありません</p>")
+    
+    if statistics:
+        lines += [
+            "<br>",
+            "<p><strong>📊 統計情報:</strong></p>",
+            "<ul>",
+            f"<li>総購入回数: {statistics['purchase_count'] or 0}回（{statistics['total_purchased']}個）</li>",
+            f"<li>総使用回数: {statistics['use_count'] or 0}回（{statistics['total_used']}個）</li>",
+            f"<li>期間: {statistics['first_operation'] or '-'} 〜 {statistics['last_operation'] or '-'}</li>",
+            "</ul>"
+        ]
+    return "\n".join(lines)
 
 class SettingsDialog(QDialog):
     """
@@ -162,6 +269,13 @@ class SettingsDialog(QDialog):
         self.show_toolbar.addItems(["表示", "非表示"])
         form_layout.addRow("ツールバー:", self.show_toolbar)
         
+        # バックアップ設定
+        form_layout.addRow(QLabel("<b>バックアップ設定</b>"))
+        
+        self.auto_backup = QComboBox()
+        self.auto_backup.addItems([name for name, _ in BACKUP_INTERVAL_CHOICES])
+        form_layout.addRow("自動バックアップ:", self.auto_backup)
+        
         layout.addLayout(form_layout)
         
         # ボタン
@@ -187,6 +301,9 @@ class SettingsDialog(QDialog):
         
         show_toolbar_index = settings.value("show_toolbar", 0, int)
         self.show_toolbar.setCurrentIndex(show_toolbar_index)
+        
+        auto_backup_index = settings.value("auto_backup_index", 0, int)
+        self.auto_backup.setCurrentIndex(auto_backup_index)
     
     def save_settings(self):
         """
@@ -198,6 +315,7 @@ class SettingsDialog(QDialog):
         settings.setValue("low_stock_warning", self.low_stock_warning.value())
         settings.setValue("auto_refresh_index", self.auto_refresh.currentIndex())
         settings.setValue("show_toolbar", self.show_toolbar.currentIndex())
+        settings.setValue("auto_backup_index", self.auto_backup.currentIndex())
         
         QMessageBox.information(self, "設定", "設定を保存しました")
         self.accept()
@@ -533,16 +651,13 @@ class StockManagementDialog(QDialog):
         # 操作種別と数量変化を決定
         if operation == "購入（増加）":
             operation_type = "purchase"
-            quantity_change = quantity
-            new_stock = product.current_stock + quantity
         elif operation == "使用（減少）":
             operation_type = "use"
-            quantity_change = -quantity
-            new_stock = max(0, product.current_stock - quantity)
         else:  # 調整
             operation_type = "adjust"
-            quantity_change = quantity - product.current_stock
-            new_stock = quantity
+        quantity_change, new_stock = calculate_stock_change(
+            product.current_stock, operation_type, quantity
+        )
         
         return {
             'product_id': product.product_id,
@@ -560,10 +675,22 @@ class EnhancedProductTable(QTableWidget):
     product_selected = Signal(int)
     product_double_clicked = Signal(int)
     
+    # 在庫状況フィルタの表示名と在庫状況の対応
+    STATUS_FILTERS = {
+        "在庫切れ": "out_of_stock",
+        "在庫少": "low_stock",
+        "正常": "normal"
+    }
+    
     def __init__(self):
         super().__init__()
-        self.original_data = []
-        self.filtered_data = []
+        # 全商品は列指向のストアで持ち、表示する行の位置だけを配列で持つ
+        self.store = ProductStore()
+        self.status_codes = self.store.status_codes()
+        self.expired = self.store.expired_mask()
+        self.visible_rows = np.arange(0)
+        # 商品IDごとの使用ペースの予測（DatabaseManager.get_usage_forecasts の結果）
+        self.forecasts = {}
         self.setup_table()
         self.setup_connections()
         
@@ -572,7 +699,7 @@ class EnhancedProductTable(QTableWidget):
         テーブルの詳細設定
         """
         # 列数と列名を設定  
-        self.columns = ["ID", "商品名", "ブランド", "カテゴリ", "現在在庫", "最小在庫", "状態", "価格", "保存場所", "消費期限", "⚠️"]
+        self.columns = ["ID", "商品名", "ブランド", "カテゴリ", "現在在庫", "最小在庫", "状態", "価格", "保存場所", "消費期限", "残り日数", "⚠️"]
         self.setColumnCount(len(self.columns))
         self.setHorizontalHeaderLabels(self.columns)
         
@@ -604,7 +731,7 @@ class EnhancedProductTable(QTableWidget):
         self.verticalHeader().setDefaultSectionSize(25)
         self.verticalHeader().setVisible(False)
         
-        print("強化テーブル（期限切れ警告付き）の設定が完了しました")
+        logger.debug("強化テーブル（期限切れ警告付き）の設定が完了しました")
     
     def setup_connections(self):
         """
@@ -613,31 +740,72 @@ class EnhancedProductTable(QTableWidget):
         self.selectionModel().selectionChanged.connect(self.on_selection_changed)
         self.cellDoubleClicked.connect(self.on_cell_double_clicked)
         
-    def load_products(self, products):
+    def load_products(self, products, forecasts=None):
         """
         商品データを読み込んでテーブルに表示
-        """
-        self.original_data = products
-        self.filtered_data = products.copy()
+        
+        Args:
+            products: ProductStore または Product のリスト
+            forecasts: 商品IDごとの使用ペースの予測（省略時は残り日数を表示しない）
+        """
+        if not isinstance(products, ProductStore):
+            products = ProductStore.from_products(products)
+        self.store = products
+        self.forecasts = forecasts or {}
+        # 在庫状況と期限切れは読み込み時に全商品まとめて判定しておく
+        self.status_codes = self.store.status_codes()
+        self.expired = self.store.expired_mask()
+        self.visible_rows = np.arange(len(self.store))
         self.refresh_table()
+    
+    @property
+    def total_count(self):
+        """
+        読み込んだ商品数
+        """
+        return len(self.store)
+    
+    @property
+    def filtered_count(self):
+        """
+        表示中の商品数
+        """
+        return len(self.visible_rows)
         
+    @traced(category="ui")
+    @timed("inventory_gui_seconds", "画面処理の所要時間（秒）", operation="refresh_table")
     def refresh_table(self):
         """
         テーブル表示を更新
         """
+        REGISTRY.gauge("inventory_table_rows", "テーブルに表示中の行数").set(self.filtered_count)
         self.setSortingEnabled(False)
-        self.setRowCount(len(self.filtered_data))
+        self.setRowCount(self.filtered_count)
         
-        for row, product in enumerate(self.filtered_data):
-            self.add_product_to_table(row, product)
+        # Product オブジェクトは表示する行の分だけ作る
+        statuses = self.status_codes[self.visible_rows].tolist()
+        expired = self.expired[self.visible_rows].tolist()
+        for row, product in enumerate(self.store.products(self.visible_rows)):
+            self.add_product_to_table(row, product, STATUS_NAMES[statuses[row]], expired[row])
         
         self.setSortingEnabled(True)
-        print(f"テーブル更新完了: {len(self.filtered_data)}件表示")
+        logger.debug("テーブル更新完了: %d件表示", self.filtered_count)
     
-    def add_product_to_table(self, row, product):
+    def add_product_to_table(self, row, product, status=None, is_expired=None):
         """
         商品データをテーブルの指定行に追加（期限切れ警告付き）
+        
+        Args:
+            row: 行番号
+            product: 商品オブジェクト
+            status: 判定済みの在庫状況（省略時は product から判定）
+            is_expired: 判定済みの期限切れ（省略時は product から判定）
         """
+        if status is None:
+            status = product.get_stock_status()
+        if is_expired is None:
+            is_expired = product.is_expired()
+        
         # 各列にデータを設定
         self.setItem(row, 0, QTableWidgetItem(str(product.product_id)))
         self.setItem(row, 1, QTableWidgetItem(product.name))
@@ -657,12 +825,12 @@ class EnhancedProductTable(QTableWidget):
         self.setItem(row, 5, min_stock_item)
         
         # 在庫状況を日本語で表示
-        status_text = self.get_status_text(product.get_stock_status())
+        status_text = self.get_status_text(status)
         status_item = QTableWidgetItem(status_text)
         status_item.setTextAlignment(Qt.AlignCenter)
         
         # 在庫状況に応じてフォントスタイルを設定
-        self.set_status_style(status_item, product.get_stock_status())
+        self.set_status_style(status_item, status)
         
         self.setItem(row, 6, status_item)
         
@@ -676,23 +844,35 @@ class EnhancedProductTable(QTableWidget):
         
         # 消費期限（新機能：期限切れ警告）
         expiry_item = QTableWidgetItem(product.expiry_date or "")
-        if product.expiry_date and product.is_expired():
+        if is_expired:
             expiry_item.setForeground(QColor(220, 20, 60))  # 赤色
             expiry_item.setFont(QFont("Arial", 9, QFont.Bold))
         self.setItem(row, 9, expiry_item)
         
+        # 残り日数（使用ペースの予測から・並べ替えできるよう数値で持つ）
+        forecast_item = QTableWidgetItem()
+        forecast = self.forecasts.get(product.product_id)
+        if forecast is not None:
+            forecast_item.setData(Qt.DisplayRole, round_days_of_cover(forecast['days_of_cover']))
+            forecast_item.setToolTip(
+                f"在庫がなくなる予測日: {forecast['depletion_date']}"
+                f"（1日あたり約{forecast['usage_rate']:.2f}個使用）"
+            )
+        forecast_item.setTextAlignment(Qt.AlignCenter)
+        self.setItem(row, 10, forecast_item)
+        
         # 警告アイコン列（新機能）
         warning_item = QTableWidgetItem()
-        warning_text = self.get_warning_text(product)
+        warning_text = self.get_warning_text(product, status, is_expired)
         warning_item.setText(warning_text)
         warning_item.setTextAlignment(Qt.AlignCenter)
         if warning_text:
             warning_item.setForeground(QColor(255, 140, 0))  # オレンジ色
             warning_item.setFont(QFont("Arial", 12, QFont.Bold))
-        self.setItem(row, 10, warning_item)
+        self.setItem(row, 11, warning_item)
         
         # 在庫状況に応じて行の背景色を設定
-        self.set_row_color(row, product.get_stock_status(), product.is_expired())
+        self.set_row_color(row, status, is_expired)
     
     def get_status_text(self, status):
         """
@@ -705,18 +885,19 @@ class EnhancedProductTable(QTableWidget):
         }
         return status_map.get(status, '不明')
     
-    def get_warning_text(self, product):
+    def get_warning_text(self, product, status=None, is_expired=None):
         """
         警告アイコンテキストを取得（新機能）
         """
         warnings = []
         
         # 期限切れチェック
-        if product.expiry_date and product.is_expired():
+        if product.is_expired() if is_expired is None else is_expired:
             warnings.append("🚨")
         
         # 在庫切れ・在庫少チェック
-        status = product.get_stock_status()
+        if status is None:
+            status = product.get_stock_status()
         if status == 'out_of_stock':
             warnings.append("❌")
         elif status == 'low_stock':
@@ -777,6 +958,13 @@ class EnhancedProductTable(QTableWidget):
         product_id = int(self.item(row, 0).text())
         self.product_double_clicked.emit(product_id)
     
+    def paintEvent(self, event):
+        """
+        再描画（トレースに区間を記録）
+        """
+        with TRACER.span("EnhancedProductTable.paint", "ui.paint"):
+            super().paintEvent(event)
+    
     def get_selected_product_id(self):
         """
         選択されている商品のIDを取得
@@ -787,55 +975,27 @@ class EnhancedProductTable(QTableWidget):
             return int(self.item(row, 0).text())
         return None
     
-    def filter_by_text(self, search_text):
-        """
-        テキストでフィルタリング
-        """
-        if not search_text:
-            self.filtered_data = self.original_data.copy()
-        else:
-            search_text = search_text.lower()
-            self.filtered_data = [
-                product for product in self.original_data
-                if search_text in product.name.lower() or 
-                   search_text in (product.brand or "").lower()
-            ]
-        
-        self.refresh_table()
-    
-    def filter_by_category(self, category):
-        """
-        カテゴリでフィルタリング
-        """
-        if category == "すべて":
-            self.filtered_data = self.original_data.copy()
-        else:
-            self.filtered_data = [
-                product for product in self.original_data
-                if product.category == category
-            ]
-        
-        self.refresh_table()
-    
-    def filter_by_stock_status(self, status_filter):
-        """
-        在庫状況でフィルタリング
-        """
-        if status_filter == "すべて":
-            self.filtered_data = self.original_data.copy()
-        else:
-            status_map = {
-                "在庫切れ": "out_of_stock",
-                "在庫少": "low_stock", 
-                "正常": "normal"
-            }
-            target_status = status_map.get(status_filter)
-            if target_status:
-                self.filtered_data = [
-                    product for product in self.original_data
-                    if product.get_stock_status() == target_status
-                ]
-        
+    def apply_filter(self, search_text="", category="すべて", status_filter="すべて", expired_only=False):
+        """
+        すべての絞り込み条件を満たす商品だけを表示
+        
+        Args:
+            search_text: 商品名またはブランド名の部分一致
+            category: カテゴリ（"すべて"は絞り込まない）
+            status_filter: 在庫状況の表示名（"すべて"は絞り込まない）
+            expired_only: 期限切れの商品のみの場合True
+        """
+        # 期限切れは日付が変わると変わるため、絞り込みのたびに判定し直す（配列の比較1回）
+        self.expired = self.store.expired_mask()
+        mask = self.store.filter_mask(
+            search=search_text,
+            category=None if category == "すべて" else category,
+            status=self.STATUS_FILTERS.get(status_filter),
+            expired_only=expired_only,
+            status_codes=self.status_codes,
+            expired=self.expired
+        )
+        self.visible_rows = np.flatnonzero(mask)
         self.refresh_table()
 
 
@@ -844,14 +1004,22 @@ class MainWindow(QMainWindow):
     在庫管理アプリのメインウィンドウクラス - 全機能実装版
     """
     
-    def __init__(self):
+    # バックアップ完了通知（ワーカースレッドからGUIスレッドへ渡す）
+    backup_finished = Signal(dict)
+    # 保守処理の完了通知（同上）
+    maintenance_finished = Signal(dict)
+    
+    def __init__(self, db_manager=None):
         """
         メインウィンドウを初期化
+        
+        Args:
+            db_manager: 使用するDatabaseManager（省略時は既定のデータベース）
         """
         super().__init__()
         
         # データベースマネージャーを初期化
-        self.db_manager = DatabaseManager()
+        self.db_manager = db_manager or DatabaseManager()
         
         # 設定管理
         self.settings = QSettings("InventoryApp", "Settings")
@@ -865,6 +1033,35 @@ class MainWindow(QMainWindow):
         self.auto_refresh_timer = QTimer(self)
         self.auto_refresh_timer.timeout.connect(self.load_products)
         
+        # バックアップサービス（ワーカースレッドで実行）
+        self.backup_service = BackupService(
+            self.db_manager.db_path, get_backup_dir(),
+            keep_generations=BACKUP_KEEP_GENERATIONS, compress=BACKUP_COMPRESS,
+            pages_per_step=BACKUP_PAGES_PER_STEP, step_sleep=BACKUP_STEP_SLEEP,
+            on_complete=self.backup_finished.emit
+        )
+        self.backup_finished.connect(self.on_backup_finished)
+        
+        # 保守処理（操作が途切れている間に少しずつ実行）
+        self.maintenance = MaintenanceScheduler(
+            self.db_manager.db_path,
+            vacuum_pages_per_step=MAINTENANCE_VACUUM_PAGES_PER_STEP
+        )
+        self.maintenance_finished.connect(self.on_maintenance_finished)
+        self.last_input_time = time.monotonic()
+        QApplication.instance().installEventFilter(self)
+        self.idle_timer = QTimer(self)
+        self.idle_timer.timeout.connect(self.run_idle_maintenance)
+        self.idle_timer.start(30000)
+        
+        # メトリクスの定期書き出し（設定されている場合のみ）
+        self.metrics_exporter = None
+        if METRICS_EXPORT_FILE:
+            self.metrics_exporter = MetricsExporter(
+                get_app_data_dir() / METRICS_EXPORT_FILE, METRICS_EXPORT_INTERVAL_SECONDS
+            )
+            self.metrics_exporter.start()
+        
         # UI要素を初期化
         self.setup_ui()
         
@@ -880,7 +1077,16 @@ class MainWindow(QMainWindow):
         # 期限切れ警告チェック
         self.check_expiry_warnings()
         
-        print("全機能実装版メインウィンドウの初期化が完了しました")
+        # イベントループの停止検知（GUIスレッドのタイマーが遅れたら停止とみなす）
+        self.stall_watchdog = None
+        if STALL_WATCHDOG_ENABLED:
+            self.stall_watchdog = StallWatchdog(STALL_THRESHOLD_MS, STALL_HEARTBEAT_MS)
+            self.heartbeat_timer = QTimer(self)
+            self.heartbeat_timer.timeout.connect(self.stall_watchdog.beat)
+            self.heartbeat_timer.start(STALL_HEARTBEAT_MS)
+            self.stall_watchdog.start()
+        
+        logger.info("全機能実装版メインウィンドウの初期化が完了しました")
     
     def setup_ui(self):
         """
@@ -913,7 +1119,7 @@ class MainWindow(QMainWindow):
         # ステータスバーを作成
         self.create_statusbar()
         
-        print("全機能UI要素の作成が完了しました")
+        logger.debug("全機能UI要素の作成が完了しました")
     
     def create_menubar(self):
         """
@@ -924,12 +1130,17 @@ class MainWindow(QMainWindow):
         # ファイルメニュー
         file_menu = menubar.addMenu("ファイル(&F)")
         
-        # エクスポート機能（仮実装）
+        # エクスポート機能
         export_action = QAction("エクスポート(&E)", self)
         export_action.setShortcut(QKeySequence("Ctrl+E"))
         export_action.triggered.connect(self.export_data)
         file_menu.addAction(export_action)
         
+        # バックアップ
+        backup_action = QAction("今すぐバックアップ(&B)", self)
+        backup_action.triggered.connect(self.backup_now)
+        file_menu.addAction(backup_action)
+        
         file_menu.addSeparator()
         
         # 終了
@@ -962,6 +1173,31 @@ class MainWindow(QMainWindow):
         history_action.triggered.connect(self.show_history)
         tools_menu.addAction(history_action)
         
+        # 在庫レポート（バックグラウンドで集計）
+        report_action = QAction("在庫レポート(&P)", self)
+        report_action.triggered.connect(self.show_report)
+        tools_menu.addAction(report_action)
+        
+        # 買い物リスト（在庫少・在庫切れと、もうすぐなくなる予測の商品）
+        shopping_list_action = QAction("買い物リスト(&L)", self)
+        shopping_list_action.triggered.connect(self.show_shopping_list)
+        tools_menu.addAction(shopping_list_action)
+        
+        # メトリクス・遅いクエリ（デバッグモードのみ）
+        if DEBUG_MODE:
+            metrics_action = QAction("メトリクス(&M)", self)
+            metrics_action.triggered.connect(self.show_metrics)
+            tools_menu.addAction(metrics_action)
+            
+            slow_query_action = QAction("遅いクエリ(&Q)", self)
+            slow_query_action.triggered.connect(self.show_slow_queries)
+            tools_menu.addAction(slow_query_action)
+        
+        # トレースの書き出し（操作ごとの処理時間の内訳を Perfetto などで確認する）
+        trace_action = QAction("トレースを保存(&R)...", self)
+        trace_action.triggered.connect(self.save_trace)
+        tools_menu.addAction(trace_action)
+        
         tools_menu.addSeparator()
         
         # 設定
@@ -1033,7 +1269,7 @@ class MainWindow(QMainWindow):
         self.settings_action.setShortcut(QKeySequence("Ctrl+,"))
         self.toolbar.addAction(self.settings_action)
         
-        print("強化ツールバーの作成が完了しました")
+        logger.debug("強化ツールバーの作成が完了しました")
     
     def create_search_area(self):
         """
@@ -1099,7 +1335,7 @@ class MainWindow(QMainWindow):
         self.selection_label.setStyleSheet("color: #666666; font-style: italic;")
         search_layout.addWidget(self.selection_label)
         
-        print("強化検索エリアの作成が完了しました")
+        logger.debug("強化検索エリアの作成が完了しました")
         return search_layout
     
     def create_statusbar(self):
@@ -1126,7 +1362,7 @@ class MainWindow(QMainWindow):
         self.count_label = QLabel("商品数: 0件")
         self.status_bar.addPermanentWidget(self.count_label)
         
-        print("強化ステータスバーの作成が完了しました")
+        logger.debug("強化ステータスバーの作成が完了しました")
     
     def setup_connections(self):
         """
@@ -1141,18 +1377,18 @@ class MainWindow(QMainWindow):
         self.history_action.triggered.connect(self.show_history)
         self.settings_action.triggered.connect(self.show_settings)
         
-        # 検索・フィルタの接続
-        self.search_input.textChanged.connect(self.apply_filters)
+        # 検索・フィルタの接続（apply_filters は計測用に包んでいるため、シグナルの引数は渡さない）
+        self.search_input.textChanged.connect(lambda _: self.apply_filters())
         self.clear_search_btn.clicked.connect(self.clear_search)
-        self.category_combo.currentTextChanged.connect(self.apply_filters)
-        self.stock_status_combo.currentTextChanged.connect(self.apply_filters)
-        self.expiry_combo.currentTextChanged.connect(self.apply_filters)
+        self.category_combo.currentTextChanged.connect(lambda _: self.apply_filters())
+        self.stock_status_combo.currentTextChanged.connect(lambda _: self.apply_filters())
+        self.expiry_combo.currentTextChanged.connect(lambda _: self.apply_filters())
         
         # テーブルのシグナル接続
         self.product_table.product_selected.connect(self.on_product_selected)
         self.product_table.product_double_clicked.connect(self.on_product_double_clicked)
         
-        print("全シグナル・スロット接続が完了しました")
+        logger.debug("全シグナル・スロット接続が完了しました")
     
     def load_settings(self):
         """
@@ -1172,6 +1408,18 @@ class MainWindow(QMainWindow):
         intervals = [0, 60000, 300000, 600000]  # 無効, 1分, 5分, 10分
         if auto_refresh_index > 0 and auto_refresh_index < len(intervals):
             self.auto_refresh_timer.start(intervals[auto_refresh_index])
+        
+        # 自動バックアップ設定
+        auto_backup_index = self.settings.value("auto_backup_index", 0, int)
+        if 0 <= auto_backup_index < len(BACKUP_INTERVAL_CHOICES):
+            interval = BACKUP_INTERVAL_CHOICES[auto_backup_index][1]
+        else:
+            interval = None
+        if interval != self.backup_service.interval_seconds:
+            self.backup_service.stop()
+            self.backup_service.interval_seconds = interval
+            if interval:
+                self.backup_service.start()
     
     def save_settings(self):
         """
@@ -1185,6 +1433,15 @@ class MainWindow(QMainWindow):
         ウィンドウ閉じる時の処理（新機能）
         """
         self.save_settings()
+        # 実行中のバックアップは中断して書きかけのファイルを残さない
+        self.backup_service.stop()
+        self.idle_timer.stop()
+        self.maintenance.cancel(wait=True)
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        if self.stall_watchdog:
+            self.heartbeat_timer.stop()
+            self.stall_watchdog.stop()
         event.accept()
     
     # === 新機能メソッド ===
@@ -1201,14 +1458,9 @@ class MainWindow(QMainWindow):
         期限切れ警告チェック（新機能）
         """
         try:
-            products = self.db_manager.get_products_as_objects()
-            
-            expired_products = []
-            
-            for product in products:
-                if product.expiry_date:
-                    if product.is_expired():
-                        expired_products.append(product.name)
+            # 一覧に読み込み済みの判定結果を使う
+            table = self.product_table
+            expired_products = [table.store.names[index] for index in np.flatnonzero(table.expired)]
             
             # 警告メッセージを作成
             warnings = []
@@ -1227,7 +1479,7 @@ class MainWindow(QMainWindow):
                 self.warning_label.setText("")
                 
         except Exception as e:
-            print(f"期限切れチェックエラー: {e}")
+            logger.exception("期限切れチェックエラー: %s", e)
     
     def show_settings(self):
         """
@@ -1240,12 +1492,58 @@ class MainWindow(QMainWindow):
     
     def export_data(self):
         """
-        データエクスポート（仮実装）
+        データエクスポート（商品・履歴・統計をCSV/JSONLで出力）
         """
-        QMessageBox.information(
-            self, "エクスポート", 
-            "CSV形式でのデータエクスポート機能は今後実装予定です。"
-        )
+        dialog = ExportDialog(db_manager=self.db_manager, parent=self)
+        dialog.exec()
+    
+    def backup_now(self):
+        """
+        バックアップをワーカースレッドで開始
+        """
+        self.status_label.setText("バックアップ中...")
+        self.backup_service.request_backup()
+    
+    def on_backup_finished(self, result):
+        """
+        バックアップ完了時の処理（GUIスレッドで実行）
+        """
+        if result['success']:
+            self.status_label.setText(f"バックアップ完了: {Path(result['path']).name}")
+        else:
+            self.status_label.setText(f"バックアップ失敗: {result.get('error', '')}")
+    
+    def eventFilter(self, obj, event):
+        """
+        ユーザー操作を検知して無操作時間を計る（保守処理中なら中断させる）
+        """
+        if event.type() in (QEvent.KeyPress, QEvent.MouseButtonPress,
+                            QEvent.MouseMove, QEvent.Wheel):
+            self.last_input_time = time.monotonic()
+            if self.maintenance.is_running:
+                self.maintenance.cancel()
+        return super().eventFilter(obj, event)
+    
+    def run_idle_maintenance(self):
+        """
+        一定時間操作がなければ保守処理を持ち時間の範囲で進める
+        """
+        if self.maintenance.is_running:
+            return
+        if time.monotonic() - self.last_input_time < MAINTENANCE_IDLE_SECONDS:
+            return
+        # 1周終わった後は次の周回まで間隔をあける
+        last_completed = self.maintenance.last_completed_at
+        if last_completed and time.time() - last_completed < MAINTENANCE_INTERVAL_HOURS * 3600:
+            return
+        self.maintenance.start(MAINTENANCE_BUDGET_SECONDS, on_complete=self.maintenance_finished.emit)
+    
+    def on_maintenance_finished(self, results):
+        """
+        保守処理の結果を記録（GUIスレッドで実行）
+        """
+        for step, result in results.items():
+            logger.info("保守処理 %s: %s (%.1fms)", step, result['result'], result['duration_ms'])
     
     def show_about(self):
         """
@@ -1259,24 +1557,29 @@ class MainWindow(QMainWindow):
             "<p>PySide6ベースのデスクトップアプリケーション</p>"
         )
     
+    @traced(category="ui")
+    @timed("inventory_gui_seconds", "画面処理の所要時間（秒）", operation="load_products")
     def load_products(self):
         """
         データベースから商品データを読み込んでテーブルに表示
         """
         try:
-            products = self.db_manager.get_products_as_objects()
-            self.product_table.load_products(products)
+            products = ProductStore.load(self.db_manager)
+            REGISTRY.gauge("inventory_products_loaded", "読み込んだ商品数").set(len(products))
+            self.product_table.load_products(products, self.db_manager.get_usage_forecasts())
             
             self.update_status_display(len(products), len(products))
             self.status_label.setText("商品データを読み込みました")
             
-            print(f"全機能版 商品データ読み込み完了: {len(products)}件")
+            logger.debug("全機能版 商品データ読み込み完了: %d件", len(products))
             
         except Exception as e:
             self.status_label.setText("データ読み込みエラー")
             QMessageBox.critical(self, "エラー", f"商品データの読み込みに失敗しました:\n{e}")
-            print(f"商品データ読み込みエラー: {e}")
+            logger.exception("商品データ読み込みエラー: %s", e)
     
+    @traced(category="ui")
+    @timed("inventory_gui_seconds", "画面処理の所要時間（秒）", operation="apply_filters")
     def apply_filters(self):
         """
         すべてのフィルタを適用（期限フィルタ追加）
@@ -1286,36 +1589,16 @@ class MainWindow(QMainWindow):
         self.current_status = self.stock_status_combo.currentText()
         current_expiry = self.expiry_combo.currentText()
         
-        # 基本フィルタを適用
-        if self.current_search:
-            self.product_table.filter_by_text(self.current_search)
-        
-        if self.current_category != "すべて":
-            self.product_table.filter_by_category(self.current_category)
-        
-        if self.current_status != "すべて":
-            self.product_table.filter_by_stock_status(self.current_status)
-        
-        # 期限フィルタ（新機能）
-        if current_expiry == "期限切れ":
-            self.product_table.filtered_data = [
-                product for product in self.product_table.filtered_data
-                if product.expiry_date and product.is_expired()
-            ]
-            self.product_table.refresh_table()
-        
-        # すべてがデフォルトの場合は全件表示
-        if (self.current_search == "" and 
-            self.current_category == "すべて" and 
-            self.current_status == "すべて" and
-            current_expiry == "すべて"):
-            self.product_table.filtered_data = self.product_table.original_data.copy()
-            self.product_table.refresh_table()
+        # すべての条件をまとめて判定し、テーブルは1回だけ更新する
+        self.product_table.apply_filter(
+            self.current_search,
+            self.current_category,
+            self.current_status,
+            expired_only=(current_expiry == "期限切れ")
+        )
         
         # 表示件数を更新
-        total_count = len(self.product_table.original_data)
-        filtered_count = len(self.product_table.filtered_data)
-        self.update_status_display(filtered_count, total_count)
+        self.update_status_display(self.product_table.filtered_count, self.product_table.total_count)
         
         # フィルタ情報を表示
         self.update_filter_display()
@@ -1374,7 +1657,7 @@ class MainWindow(QMainWindow):
                 self.selection_label.setText(f"選択: {product.name} (ID: {product_id})")
                 self.status_label.setText(f"'{product.name}' を選択しました")
         except Exception as e:
-            print(f"商品情報取得エラー: {e}")
+            logger.exception("商品情報取得エラー: %s", e)
     
     def on_product_double_clicked(self, product_id):
         """
@@ -1384,13 +1667,16 @@ class MainWindow(QMainWindow):
     
     # === 基本ボタン機能の実装 ===
     
+    @traced(category="ui.action")
     def add_product(self):
         """
         新しい商品を追加
         """
         dialog = SimpleProductDialog(parent=self)
         
-        if dialog.exec() == QDialog.Accepted:
+        with TRACER.span("SimpleProductDialog.exec", "ui.wait"):
+            accepted = dialog.exec() == QDialog.Accepted
+        if accepted:
             try:
                 # 入力データを取得
                 product_data = dialog.get_product_data()
@@ -1423,8 +1709,9 @@ class MainWindow(QMainWindow):
                     
             except Exception as e:
                 QMessageBox.critical(self, "エラー", f"商品の追加に失敗しました:\n{e}")
-                print(f"商品追加エラー: {e}")
+                logger.exception("商品追加エラー: %s", e)
 
+    @traced(category="ui.action")
     def edit_product(self):
         """
         選択した商品を編集
@@ -1447,7 +1734,9 @@ class MainWindow(QMainWindow):
             # 編集ダイアログを表示
             dialog = SimpleProductDialog(product=product, parent=self)
             
-            if dialog.exec() == QDialog.Accepted:
+            with TRACER.span("SimpleProductDialog.exec", "ui.wait"):
+                accepted = dialog.exec() == QDialog.Accepted
+            if accepted:
                 # 編集されたデータを取得
                 updated_data = dialog.get_product_data()
                 
@@ -1479,8 +1768,9 @@ class MainWindow(QMainWindow):
                     
         except Exception as e:
             QMessageBox.critical(self, "エラー", f"商品の編集に失敗しました:\n{e}")
-            print(f"商品編集エラー: {e}")
+            logger.exception("商品編集エラー: %s", e)
 
+    @traced(category="ui.action")
     def delete_product(self):
         """
         選択した商品を削除
@@ -1503,12 +1793,13 @@ class MainWindow(QMainWindow):
             confirmation_msg += f"現在在庫: {product.current_stock}個\n"
             confirmation_msg += "\nこの操作は取り消すことができません。"
             
-            reply = QMessageBox.question(
-                self, "削除確認",
-                confirmation_msg,
-                QMessageBox.Yes | QMessageBox.No,
-                QMessageBox.No
-            )
+            with TRACER.span("QMessageBox.question", "ui.wait"):
+                reply = QMessageBox.question(
+                    self, "削除確認",
+                    confirmation_msg,
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.No
+                )
             
             if reply == QMessageBox.Yes:
                 # データベースから実際に削除
@@ -1540,24 +1831,29 @@ class MainWindow(QMainWindow):
                     
         except Exception as e:
             QMessageBox.critical(self, "エラー", f"商品の削除に失敗しました:\n{e}")
-            print(f"商品削除エラー: {e}")
+            logger.exception("商品削除エラー: %s", e)
 
+    @traced(category="ui.action")
     def manage_stock(self):
         """
         在庫数を管理
         """
         try:
-            # 全商品を取得
-            products = self.db_manager.get_products_as_objects()
+            # 一覧に読み込み済みの全商品を使う（データベースを読み直さない）
+            store = self.product_table.store
+            products = list(store.products(range(len(store))))
             
             if not products:
                 QMessageBox.information(self, "情報", "管理する商品がありません")
                 return
             
             # 在庫増減ダイアログを表示
-            dialog = StockManagementDialog(products=products, parent=self)
+            with TRACER.span("StockManagementDialog.__init__", "ui", products=len(products)):
+                dialog = StockManagementDialog(products=products, parent=self)
             
-            if dialog.exec() == QDialog.Accepted:
+            with TRACER.span("StockManagementDialog.exec", "ui.wait"):
+                accepted = dialog.exec() == QDialog.Accepted
+            if accepted:
                 # 在庫変更データを取得
                 stock_data = dialog.get_stock_data()
                 
@@ -1583,7 +1879,8 @@ class MainWindow(QMainWindow):
                     if stock_data.get('memo'):
                         success_msg += f"\nメモ: {stock_data['memo']}"
                     
-                    QMessageBox.information(self, "成功", success_msg)
+                    with TRACER.span("QMessageBox.information", "ui.wait"):
+                        QMessageBox.information(self, "成功", success_msg)
                     
                     # 商品一覧を更新
                     self.load_products()
@@ -1599,7 +1896,7 @@ class MainWindow(QMainWindow):
                     
         except Exception as e:
             QMessageBox.critical(self, "エラー", f"在庫管理でエラーが発生しました:\n{e}")
-            print(f"在庫管理エラー: {e}")
+            logger.exception("在庫管理エラー: %s", e)
 
     def show_history(self):
         """
@@ -1608,7 +1905,51 @@ class MainWindow(QMainWindow):
         selected_id = self.product_table.get_selected_product_id()
         
         # 履歴ダイアログを表示
-        dialog = HistoryDialog(product_id=selected_id, parent=self)
+        dialog = HistoryDialog(product_id=selected_id, parent=self, db_manager=self.db_manager)
+        dialog.exec()
+    
+    def show_report(self):
+        """
+        在庫レポートを表示
+        """
+        dialog = ReportDialog(self.db_manager, parent=self)
+        dialog.exec()
+    
+    def show_shopping_list(self):
+        """
+        買い物リストを表示
+        """
+        dialog = ShoppingListDialog(self.db_manager, parent=self)
+        dialog.exec()
+    
+    def save_trace(self):
+        """
+        記録した処理の区間を Chrome の trace_event 形式で保存
+        """
+        default_path = Path.home() / f"inventory-trace-{datetime.now():%Y%m%d-%H%M%S}.json"
+        path, _ = QFileDialog.getSaveFileName(
+            self, "トレースを保存", str(default_path), "Trace (*.json)"
+        )
+        if not path:
+            return
+        try:
+            count = TRACER.dump(path)
+            self.status_label.setText(f"トレースを保存しました（{count}区間）: {path}")
+        except OSError as e:
+            QMessageBox.critical(self, "エラー", f"トレースの保存に失敗しました:\n{e}")
+    
+    def show_metrics(self):
+        """
+        メトリクスを表示（デバッグモードのみ）
+        """
+        dialog = MetricsDialog(parent=self)
+        dialog.exec()
+    
+    def show_slow_queries(self):
+        """
+        記録された遅いクエリを表示（デバッグモードのみ）
+        """
+        dialog = SlowQueryDialog(self.db_manager, parent=self)
         dialog.exec()
 
 
@@ -1617,6 +1958,8 @@ def main():
     """
     メインウィンドウのテスト実行
     """
+    from utils.logging_setup import setup_logging
+    setup_logging()
     app = QApplication(sys.argv)
     
     # アプリケーション情報を設定（設定管理用）